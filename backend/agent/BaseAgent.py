@@ -1,13 +1,12 @@
 """BaseAgent - base class for all agent implementations."""
 
 import uuid
-import asyncio
-import concurrent.futures
 from enum import Enum
-from typing import Dict, Any, List, Optional
-from agents import Agent, Runner
+from typing import Dict, Any, List, Optional, Tuple
+from agents import Agent
+from backend.utils.llm_scheduler import run_agent
 from backend.database.agent_db import get_agent_info_summary
-from backend.database import AgentDBManager
+from backend.database import AgentDBManager, current_unit_of_work, unit_of_work
 
 
 class AgentType(Enum):
@@ -89,6 +88,115 @@ class BaseAgent(Agent):
             output_type=output_type
         )
     
+    # Version of the state schema produced by _to_state (bump when its fields change)
+    STATE_VERSION = 1
+    
+    def _to_state(self) -> Dict[str, Any]:
+        """
+        Return the authoritative state persisted for this agent (see database/agent_state.py).
+        
+        Only plain JSON-compatible values; SDK objects (model settings, tools, output
+        schemas) are not persisted and are rebuilt when the agent is loaded.
+        
+        Returns:
+            State dictionary
+        """
+        agent_type = self.type.value if isinstance(self.type, AgentType) else str(self.type)
+        return {
+            'id': self.id,
+            'type': agent_type,
+            'name': self.name,
+            'parent_agent_id': self.parent_agent_id,
+            'sub_agent_ids': list(getattr(self, 'sub_agent_ids', None) or []),
+            'instructions': self.instructions if isinstance(self.instructions, str) else None,
+        }
+    
+    @classmethod
+    def _default_output_type(cls):
+        """Output type passed to the SDK Agent when restoring from state (None = plain text)."""
+        return None
+    
+    @classmethod
+    def _from_state(cls, state: Dict[str, Any], DB_PATH: Optional[str] = None) -> 'BaseAgent':
+        """
+        Rebuild an agent from a state dictionary produced by _to_state.
+        
+        The subclass __init__ is bypassed (it saves to the database and creates
+        sub-agents); only the SDK Agent fields are initialized.
+        
+        Args:
+            state: State dictionary (already upgraded to STATE_VERSION)
+            DB_PATH: Database path the agent was loaded from
+            
+        Returns:
+            The restored agent (tools are not restored here)
+        """
+        from backend.config.model_config import get_model_name
+        
+        agent = cls.__new__(cls)
+        Agent.__init__(
+            agent,
+            name=state.get('name') or '',
+            instructions=state.get('instructions') or '',
+            tools=[],
+            mcp_config={},
+            model=get_model_name(),
+            output_type=cls._default_output_type()
+        )
+        agent.DB_PATH = DB_PATH
+        agent._restore_state(state)
+        return agent
+    
+    def _restore_state(self, state: Dict[str, Any]) -> None:
+        """Set the persisted fields from a state dictionary and recompute derived fields."""
+        self.name = state.get('name') or ''
+        self.instructions = state.get('instructions') or ''
+        self.id = state['id']
+        self.parent_agent_id = state.get('parent_agent_id')
+        self.sub_agent_ids = list(state.get('sub_agent_ids') or [])
+        self.type = AgentType(state['type']) if state.get('type') in AgentType._value2member_map_ else state.get('type')
+        self._apply_state(state)
+        self._rebuild_derived_state()
+    
+    def _mark_saved(self, version: int, state: Dict[str, Any], merged: bool) -> None:
+        """
+        Record the row version and state just written by save_agent/save_agents.
+        
+        Args:
+            version: New agents.version of the row (checked by the next save)
+            state: The state that was written
+            merged: Whether state includes concurrent edits merged in by the save
+        """
+        if merged:
+            # Pick up the other writer's changes so the in-memory agent matches the row
+            self._restore_state(state)
+        self._db_version = version
+        self._base_state = state
+        
+        # Update the cached instance of this agent (if any) instead of invalidating it
+        from backend.utils.agent_manager import get_agent_manager
+        get_agent_manager().agent_saved(self)
+    
+    @classmethod
+    def _upgrade_state(cls, state: Dict[str, Any], version: int) -> Dict[str, Any]:
+        """Upgrade a state dictionary written with an older STATE_VERSION (none so far)."""
+        return state
+    
+    def _apply_state(self, state: Dict[str, Any]) -> None:
+        """Set subclass-specific fields from a state dictionary (override in subclasses)."""
+        pass
+    
+    def _rebuild_derived_state(self) -> None:
+        """Recompute fields that are derived from the persisted state (override in subclasses)."""
+        pass
+    
+    def _save_related_rows(self, db_path: Optional[str]) -> None:
+        """
+        Write state kept outside the agents row (override in subclasses).
+        Called by save_agent/save_agents inside the same transaction as the agent row.
+        """
+        pass
+    
     def _get_db_manager(self) -> AgentDBManager:
         """
         Get or create an AgentDBManager instance for this agent.
@@ -137,8 +245,8 @@ class BaseAgent(Agent):
         Base implementation: loads tools from database using tool_ids.
         If no tool_ids in database, creates send_message tool if agent has sub-agents.
         """
-        # Try to load tools from database first
-        tool_ids = self._get_tool_ids_from_db()
+        # Use the tool_ids the agent was loaded with, else read them from the database
+        tool_ids = self._stored_tool_ids if self._stored_tool_ids is not None else self._get_tool_ids_from_db()
         if tool_ids:
             self._recreate_tools_from_db(tool_ids)
         else:
@@ -155,33 +263,67 @@ class BaseAgent(Agent):
             else:
                 self.tools = []
     
+    # Tools bound by bind_for_run (empty: the tool_ids stored for the agent)
+    DEFAULT_TOOL_IDS: List[str] = []
+    # tool_ids of the row the agent was loaded from, until bind_for_run creates the tools (see load_agent)
+    _stored_tool_ids: Optional[List[str]] = None
+    # Prompt template rendered into the instructions by _render_instructions (None: not rendered)
+    PROMPT_NAME: Optional[str] = None
+    # Levels of sub-agents whose cards appear in the rendered instructions
+    PROMPT_AGENT_DEPTH = 0
+    
+    def bind_for_run(self) -> bool:
+        """
+        Bind tools and render instructions right before the agent runs.
+        
+        Skipped while the binding fingerprint (tool IDs, sub-agents and their row
+        versions, prompt template version) is unchanged. Nothing is written to the
+        database; tool_ids are stored with the agent's next save.
+        
+        Returns:
+            True if tools and instructions were rebound
+        """
+        if self.tools is not None and getattr(self, '_binding', None) == self._binding_fingerprint():
+            return False
+        self._bind_tools()
+        self._render_instructions()
+        self._binding = self._binding_fingerprint()
+        return True
+    
+    def _binding_fingerprint(self) -> Tuple:
+        """Inputs of the bound tools and rendered instructions (see bind_for_run)."""
+        from backend.database.agent_db import get_subtree_versions
+        from backend.prompts.prompt_loader import get_prompt_version
+        
+        return (
+            tuple(self._current_tool_ids()),
+            tuple(getattr(self, 'sub_agent_ids', None) or ()),
+            get_subtree_versions(self.id, self.PROMPT_AGENT_DEPTH, self.DB_PATH),
+            get_prompt_version(self.PROMPT_NAME) if self.PROMPT_NAME else None,
+        )
+    
+    def _current_tool_ids(self) -> List[str]:
+        """IDs of the tools currently bound to the agent (tool ID, or the SDK tool name)."""
+        return [getattr(tool, '_tool_id', None) or getattr(tool, 'name', '') for tool in (self.tools or [])]
+    
+    def _bind_tools(self) -> None:
+        """Create the tools (DEFAULT_TOOL_IDS if set, else the stored tool_ids) unless already bound."""
+        if self.DEFAULT_TOOL_IDS:
+            if self._current_tool_ids() != self.DEFAULT_TOOL_IDS:
+                self._recreate_tools_from_db(self.DEFAULT_TOOL_IDS)
+        elif not self.tools:
+            self._recreate_tools()
+        self._stored_tool_ids = None
+    
+    def _render_instructions(self) -> None:
+        """Render the instructions from PROMPT_NAME (override in subclasses that have one)."""
+        pass
+    
     def _get_tool_ids_from_db(self) -> List[str]:
         """Get tool_ids from database."""
-        import json
-        import sqlite3
-        from backend.database.agent_db import get_db_path
-        
-        db_path = get_db_path(self.DB_PATH if hasattr(self, 'DB_PATH') else None)
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        tool_ids_json = None
-        try:
-            cursor.execute("SELECT tool_ids FROM agents WHERE id = ?", (self.id,))
-            row = cursor.fetchone()
-            if row and row[0]:
-                tool_ids_json = row[0]
-        except sqlite3.OperationalError:
-            pass
-        
-        conn.close()
-        
-        if tool_ids_json and tool_ids_json != '[]':
-            try:
-                return json.loads(tool_ids_json)
-            except (json.JSONDecodeError, TypeError):
-                return []
-        return []
+        from backend.database.agent_db import get_tool_ids
+        
+        return get_tool_ids(self.id, self.DB_PATH if hasattr(self, 'DB_PATH') else None)
     
     def add_tool(self, tool_id: str):
         """Dynamically add a tool to this agent."""
@@ -190,6 +332,9 @@ class BaseAgent(Agent):
         registry = get_tool_registry()
         tool = registry.create_tool(tool_id, self)
         if tool:
+            if self._stored_tool_ids is not None:
+                # Loaded but not bound yet: create the stored tools first so they are kept
+                self._bind_tools()
             if self.tools is None:
                 self.tools = []
             self.tools.append(tool)
@@ -199,6 +344,8 @@ class BaseAgent(Agent):
     
     def remove_tool(self, tool_id: str):
         """Dynamically remove a tool from this agent."""
+        if self._stored_tool_ids is not None:
+            self._bind_tools()
         if self.tools:
             # Remove tool by checking _tool_id attribute
             self.tools = [
@@ -209,9 +356,7 @@ class BaseAgent(Agent):
     
     def _save_tool_ids_to_db(self):
         """Save current tool_ids to database."""
-        import json
-        import sqlite3
-        from backend.database.agent_db import get_db_path
+        from backend.database.agent_db import update_tool_ids
         
         # Extract tool_ids from current tools
         tool_ids = []
@@ -221,18 +366,7 @@ class BaseAgent(Agent):
                 if tool_id:
                     tool_ids.append(tool_id)
         
-        db_path = get_db_path(self.DB_PATH if hasattr(self, 'DB_PATH') else None)
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        tool_ids_json = json.dumps(tool_ids, ensure_ascii=False)
-        cursor.execute(
-            "UPDATE agents SET tool_ids = ? WHERE id = ?",
-            (tool_ids_json, self.id)
-        )
-        
-        conn.commit()
-        conn.close()
+        update_tool_ids(self.id, tool_ids, self.DB_PATH if hasattr(self, 'DB_PATH') else None)
     
     async def receive_messgae(self, message: str):
         """
@@ -252,54 +386,26 @@ class BaseAgent(Agent):
         # Add tool logging hook
         from backend.utils.tool_logging_hooks import ToolLoggingHook
         tool_logging_hook = ToolLoggingHook()
+
+        # Tools and instructions are bound lazily (memoized, see bind_for_run), off the event loop
+        from backend.database.async_db import run_db
+        await run_db(self.bind_for_run)
+        
+        # 流式聊天中，委托给子agent的运行也推送给客户端（非流式时为空操作）
+        from backend.utils.chat_stream import emit_stream_event, preview
+        emit_stream_event("agent_start", agent=self.name, agent_id=self.id, message=preview(message))
         
         if session_id:
             # Track this agent run if we have a session_id
             with track_agent_run(session_id, self, message):
-                result = await Runner.run(self, message, hooks=tool_logging_hook)
+                result = await run_agent(self, message, hooks=tool_logging_hook)
         else:
             # No session_id, run without tracing but with tool logging
-            result = await Runner.run(self, message, hooks=tool_logging_hook)
+            result = await run_agent(self, message, hooks=tool_logging_hook)
         
+        emit_stream_event("agent_end", agent=self.name, agent_id=self.id, output=preview(getattr(result, 'final_output', result)))
         return result
     
-    def run_async_safely(self, coro):
-        """
-        Safely run an async coroutine from a synchronous context.
-        Handles different event loop states (running, not running, or doesn't exist).
-        
-        Args:
-            coro: The coroutine to run
-            
-        Returns:
-            The result of the coroutine
-        """
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
-        try:
-            if loop.is_running():
-                # If event loop is already running, create a new one in a separate thread
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    def run_in_new_loop():
-                        new_loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(new_loop)
-                        try:
-                            return new_loop.run_until_complete(coro)
-                        finally:
-                            new_loop.close()
-                    
-                    future = executor.submit(run_in_new_loop)
-                    return future.result()
-            else:
-                # Event loop exists but is not running, use it directly
-                return loop.run_until_complete(coro)
-        except Exception as e:
-            raise RuntimeError(f"Error running async function: {str(e)}") from e
-    
     def _create_send_message_tool(self):
         """
         Create a send_message tool function for communicating with sub-agents.
@@ -344,15 +450,14 @@ class BaseAgent(Agent):
     def save_to_db(self) -> None:
         """
         Save the agent to the database.
-        Uses AgentDBManager to handle create/update logic.
-        First tries to update, if agent doesn't exist, creates it.
-        """
-        db_manager = self._get_db_manager()
-        # Try to update first (most common case)
-        success = db_manager.update_agent(self)
-        # If update failed because agent doesn't exist, create it
-        if not success:
-            db_manager.create_new(self)
+        Inside a unit_of_work() scope the agent is only marked dirty and written once
+        when the scope exits; otherwise it is upserted immediately via AgentDBManager.
+        """
+        uow = current_unit_of_work()
+        if uow is not None:
+            uow.register(self)
+            return
+        self._get_db_manager().save(self)
 
     def load_agent_from_db_by_id(self, agent_id: str) -> Optional['BaseAgent']:
         """
@@ -399,19 +504,21 @@ class BaseAgent(Agent):
         old_parent_id = self.parent_agent_id
         self.parent_agent_id = new_parent_id
         
-        # If had an old parent, remove self from old parent's sub_agent_ids
-        if old_parent_id:
-            old_parent = self.load_agent_from_db_by_id(old_parent_id)
-            if old_parent:
-                old_parent._remove_sub_agent_by_id(self.id)
-        
-        # If has a new parent, add self to new parent's sub_agent_ids
-        if new_parent_id:
-            new_parent = self.load_agent_from_db_by_id(new_parent_id)
-            if new_parent:
-                new_parent._add_sub_agents(self.id)
-        
-        # Save self to database
-        self.save_to_db()
+        # Old parent, new parent and self are written together in one transaction
+        with unit_of_work():
+            # If had an old parent, remove self from old parent's sub_agent_ids
+            if old_parent_id:
+                old_parent = self.load_agent_from_db_by_id(old_parent_id)
+                if old_parent:
+                    old_parent._remove_sub_agent_by_id(self.id)
+            
+            # If has a new parent, add self to new parent's sub_agent_ids
+            if new_parent_id:
+                new_parent = self.load_agent_from_db_by_id(new_parent_id)
+                if new_parent:
+                    new_parent._add_sub_agents(self.id)
+            
+            # Save self to database
+            self.save_to_db()
 
 
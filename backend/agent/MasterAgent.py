@@ -4,7 +4,9 @@ from typing import Dict, Any, Optional
 
 from backend.agent.BaseAgent import BaseAgent, AgentType
 from backend.models import AgentCard
-from backend.tools.utils import get_all_agent_info
+from backend.tools.utils import get_all_agent_info, get_agent_tree_info
+from backend.tools.utils.agent_utils import tree_agent_card
+from backend.database.agent_db import get_agent_tree
 from backend.prompts.prompt_loader import load_prompt
 
 
@@ -38,13 +40,14 @@ class MasterAgent(BaseAgent):
         registry = get_tool_registry()
         
         send_message = registry.create_tool("send_message", self)
+        broadcast_message = registry.create_tool("broadcast_message", self)
         create_notebook = registry.create_tool("create_notebook", self)
         
         # Set tools list
-        self.tools = [t for t in [send_message, create_notebook] if t is not None]
+        self.tools = [t for t in [send_message, broadcast_message, create_notebook] if t is not None]
         
         # Load prompt with tool usage (after tools are created)
-        tool_ids = ['send_message', 'create_notebook']
+        tool_ids = ['send_message', 'broadcast_message', 'create_notebook']
         instructions = load_prompt(
             "master_agent",
             variables={"agents_list": get_all_agent_info({})},
@@ -55,37 +58,24 @@ class MasterAgent(BaseAgent):
         # Save to database after tools are set (tool_ids will be saved automatically)
         self.save_to_db()
     
+    # get_agent_tree_info shows three levels; MasterAgent cards on the last one summarize a fourth
+    DEFAULT_TOOL_IDS = ['send_message', 'broadcast_message', 'create_notebook']
+    PROMPT_NAME = "master_agent"
+    PROMPT_AGENT_DEPTH = 4
+    
     def _recreate_tools(self):
         """Recreate tools after loading from database (tools cannot be pickled)."""
-        # Default tool IDs for MasterAgent
-        default_tool_ids = ['send_message', 'create_notebook']
-        self._recreate_tools_from_db(default_tool_ids)
-        
-        # Ensure tool_ids are saved to database (important for API to return correct tools)
-        import json
-        import sqlite3
-        from backend.database.agent_db import get_db_path
-        db_path = get_db_path(self.DB_PATH if hasattr(self, 'DB_PATH') else None)
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        tool_ids_json = json.dumps(default_tool_ids, ensure_ascii=False)
-        cursor.execute(
-            "UPDATE agents SET tool_ids = ? WHERE id = ?",
-            (tool_ids_json, self.id)
-        )
-        conn.commit()
-        conn.close()
-        print(f"[MasterAgent._recreate_tools] Saved tool_ids to database: {default_tool_ids}")
-        
-        # Update instructions after recreating tools (to ensure latest prompt with current agents_list)
-        agent_dict = self._load_sub_agents_dict()
+        self._recreate_tools_from_db(self.DEFAULT_TOOL_IDS)
+    
+    def _render_instructions(self) -> None:
+        """Render the prompt with the current agents_list (see bind_for_run)."""
         instructions = load_prompt(
             "master_agent",
-            variables={"agents_list": get_all_agent_info(agent_dict)},
-            tool_ids=default_tool_ids
+            variables={"agents_list": get_agent_tree_info(self.id, db_path=self.DB_PATH)},
+            tool_ids=self.DEFAULT_TOOL_IDS
         )
         self.instructions = instructions
-        print(f"[MasterAgent._recreate_tools] Updated instructions (length: {len(instructions)})")
+        print(f"[MasterAgent._render_instructions] Updated instructions (length: {len(instructions)})")
 
     def _load_sub_agents_dict(self) -> Dict[str, Any]:
         """
@@ -113,37 +103,15 @@ class MasterAgent(BaseAgent):
     def agent_card(self) -> AgentCard:
         """
         返回agent card信息，只包含描述，不包含大纲。
-        描述内容为管理的所有子agent的概览信息。
+        描述内容为管理的所有子agent的概览信息（从 agents 表的层级索引读取，不加载子 agent）。
         
         Returns:
             AgentCard对象，包含标题、描述等信息
         """
-        agent_dict = self._load_sub_agents_dict()
-        
-        # Build description from sub-agents
-        descriptions = []
-        if agent_dict:
-            for agent_id, agent in agent_dict.items():
-                agent_type = type(agent).__name__
-                if agent_type == "NoteBookAgent":
-                    title = getattr(agent, 'notebook_title', '未命名笔记本')
-                    desc = getattr(agent, 'notebook_description', '')
-                    if desc:
-                        descriptions.append(f"- {title}: {desc[:100]}..." if len(desc) > 100 else f"- {title}: {desc}")
-                    else:
-                        descriptions.append(f"- {title}")
-                elif agent_type == "MasterAgent":
-                    name = getattr(agent, 'name', 'MasterAgent')
-                    sub_agent_ids = getattr(agent, 'sub_agent_ids', None) or []
-                    descriptions.append(f"- {name} (管理 {len(sub_agent_ids)} 个子Agent)")
-        
-        description_text = "\n".join(descriptions) if descriptions else "暂无子Agent"
-        
-        return AgentCard(
-            title=self.name,
-            agent_id=self.id,
-            parent_agent_id=self.parent_agent_id,
-            description=description_text,
-            outline={}  # MasterAgent 没有大纲
-        )
-
+        tree = get_agent_tree(self.id, 1, self.DB_PATH)
+        if tree is None:
+            # Not saved yet: no sub-agents in the database
+            tree = {'id': self.id, 'type': "Master", 'name': self.name, 'children': []}
+        # Name and parent of this instance (may not be saved yet)
+        tree.update(name=self.name, parent_agent_id=self.parent_agent_id)
+        return tree_agent_card(tree)
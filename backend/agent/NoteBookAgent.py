@@ -1,8 +1,13 @@
 """NoteBookAgent - simplified implementation following the effective design pattern."""
 
-from typing import Optional, Dict
+from typing import Optional, Dict, Any
 
 from backend.agent.BaseAgent import BaseAgent, AgentType
+from backend.database.unit_of_work import unit_of_work
+from backend.database.notebook_content_db import (
+    INLINE, NORMALIZED, get_content_storage_mode,
+    flatten_sections, save_content_rows, load_notebook_sections, delete_notebook_content,
+)
 from backend.models import Outline, Section
 from backend.models import AgentCard
 from backend.prompts.prompt_loader import load_prompt
@@ -10,6 +15,9 @@ from backend.prompts.prompt_loader import load_prompt
 class NoteBookAgent(BaseAgent):
     """Notebook agent that manages notebook content."""
     
+    # Notes markdown; None until generated from outline and sections (see notes)
+    _notes: Optional[str] = None
+    
     def __init__(
         self, 
         messgae: str = "",
@@ -80,127 +88,180 @@ class NoteBookAgent(BaseAgent):
         else:
             self.name = f"NoteBookAgent_{self.id[:8]}"
         
-        # Ensure all content has IDs (for backward compatibility and new content)
-        if self.sections:
-            from backend.utils.content_id_utils import ensure_ids
-            ensure_ids(self)
-        
-        # Generate notes from outline and sections if available (after super().__init__)
-        # IMPORTANT: Always generate notes with IDs included so AI can use modify_by_id tool
-        if self.outline and self.sections and not self.notes:
-            # Import here to avoid circular import
-            from backend.tools.utils import generate_markdown_from_agent
-            self.notes = generate_markdown_from_agent(self, include_ids=True)
+        # The saves below are coalesced into a single write at the end of the scope
+        with unit_of_work():
+            # Ensure all content has IDs (for backward compatibility and new content)
+            if self.sections:
+                from backend.utils.content_id_utils import ensure_ids
+                ensure_ids(self)
+            
+            # Generate notes from outline and sections if available (after super().__init__)
+            # IMPORTANT: Always generate notes with IDs included so AI can use modify_by_id tool
+            if self.outline and self.sections and not self.notes:
+                # Import here to avoid circular import
+                from backend.tools.utils import generate_markdown_from_agent
+                self.notes = generate_markdown_from_agent(self, include_ids=True)
+            
+            # Save to database after initialization
+            self.save_to_db()
+            
+            # Create tools using registry
+            from backend.tools.tool_registry import get_tool_registry
+            registry = get_tool_registry()
+            
+            modify_by_id = registry.create_tool("modify_by_id", self)
+            get_content_by_id = registry.create_tool("get_content_by_id", self)
+            add_content_to_section = registry.create_tool("add_content_to_section", self)
+            
+            # Set tools list
+            self.tools = [t for t in [modify_by_id, get_content_by_id, add_content_to_section] if t is not None]
+            
+            # Update instructions with generated notes (with IDs) and tool usage
+            # IMPORTANT: Ensure notes include IDs for modify_by_id tool to work
+            # If notes don't have IDs, regenerate them with IDs included
+            if self.sections and self.outline:
+                from backend.tools.utils import generate_markdown_from_agent
+                notes_with_ids = generate_markdown_from_agent(self, include_ids=True)
+                # Only update if notes changed (to avoid unnecessary updates)
+                if notes_with_ids != self.notes:
+                    self.notes = notes_with_ids
+            
+            tool_ids = ['modify_by_id', 'get_content_by_id', 'add_content_to_section']
+            # Ensure notes is passed as string (not None)
+            notes_value = self.notes if self.notes is not None else ""
+            instructions = load_prompt(
+                "notebook_agent",
+                variables={"notes": notes_value},
+                agent_instance=self,  # Pass agent instance to properly generate tools_usage
+                tool_ids=tool_ids
+            )
+            self.instructions = instructions
+            # Save updated instructions to database
+            self.save_to_db()
+    
+    def _to_state(self) -> Dict[str, Any]:
+        """
+        Persist outline and sections; notes and instructions are derived from them.
         
-        # Save to database after initialization
-        self.save_to_db()
+        notes is only stored for notebooks without outline/sections (legacy markdown notebooks).
+        """
+        state = super()._to_state()
+        has_structure = bool(self.outline and self.sections)
+        normalized = get_content_storage_mode() == NORMALIZED
+        state.update({
+            # Rendered from notes when the agent is bound (bind_for_run)
+            'instructions': None,
+            'notebook_title': self.notebook_title,
+            'notebook_description': self.notebook_description,
+            'outline': self.outline.model_dump(mode="json") if self.outline else None,
+            # Normalized storage keeps sections in the content tables (_save_related_rows)
+            'sections': None if normalized else {
+                title: section.model_dump(mode="json")
+                for title, section in (self.sections or {}).items()
+            },
+            'content_storage': NORMALIZED if normalized else INLINE,
+            'notes': None if has_structure else (self.notes or ""),
+            'modify_agent_id': getattr(self, 'modify_agent_id', None),
+        })
+        return state
+    
+    def _apply_state(self, state: Dict[str, Any]) -> None:
+        """Restore outline, sections and notebook metadata."""
+        self.notebook_title = state.get('notebook_title') or ""
+        self.notebook_description = state.get('notebook_description') or ""
+        self.outline = Outline.model_validate(state['outline']) if state.get('outline') else None
+        self._content_storage = state.get('content_storage', INLINE)
+        if self._content_storage == NORMALIZED:
+            self.sections = load_notebook_sections(self.id, self.DB_PATH)
+            # Rows as loaded: the base for merging with concurrent saves
+            self._base_content_rows = flatten_sections(self.id, self.sections)
+        else:
+            self.sections = {
+                title: Section.model_validate(section)
+                for title, section in (state.get('sections') or {}).items()
+            }
+        # Notes of structured notebooks are generated from the sections on first access
+        self.notes = None if (self.outline and self.sections) else (state.get('notes') or "")
+        if state.get('modify_agent_id'):
+            self.modify_agent_id = state['modify_agent_id']
+    
+    def _save_related_rows(self, db_path: Optional[str]) -> None:
+        """
+        Write sections to the normalized content tables when that storage mode is enabled.
         
-        # Create tools using registry
-        from backend.tools.tool_registry import get_tool_registry
-        registry = get_tool_registry()
-        
-        modify_by_id = registry.create_tool("modify_by_id", self)
-        get_content_by_id = registry.create_tool("get_content_by_id", self)
-        add_content_to_section = registry.create_tool("add_content_to_section", self)
-        
-        # Set tools list
-        self.tools = [t for t in [modify_by_id, get_content_by_id, add_content_to_section] if t is not None]
-        
-        # Update instructions with generated notes (with IDs) and tool usage
-        # IMPORTANT: Ensure notes include IDs for modify_by_id tool to work
-        # If notes don't have IDs, regenerate them with IDs included
-        if self.sections and self.outline:
-            from backend.tools.utils import generate_markdown_from_agent
-            notes_with_ids = generate_markdown_from_agent(self, include_ids=True)
-            # Only update if notes changed (to avoid unnecessary updates)
-            if notes_with_ids != self.notes:
-                self.notes = notes_with_ids
-        
-        tool_ids = ['modify_by_id', 'get_content_by_id', 'add_content_to_section']
-        # Ensure notes is passed as string (not None)
-        notes_value = self.notes if self.notes is not None else ""
-        instructions = load_prompt(
-            "notebook_agent",
-            variables={"notes": notes_value},
-            agent_instance=self,  # Pass agent instance to properly generate tools_usage
-            tool_ids=tool_ids
-        )
-        self.instructions = instructions
-        # Save updated instructions to database
-        self.save_to_db()
+        Only changed rows are written; rows changed by a concurrent save since this notebook
+        was loaded are kept. A notebook that was stored normalized and is saved with inline
+        storage has its content rows removed (sections are back in the agent row).
+        """
+        if get_content_storage_mode() == NORMALIZED:
+            from backend.utils.content_id_utils import ensure_ids
+            ensure_ids(self)
+            rows = flatten_sections(self.id, self.sections or {})
+            save_content_rows(self.id, rows, db_path, getattr(self, '_base_content_rows', None))
+            self._pending_content_rows = rows
+            self._content_storage = NORMALIZED
+        elif getattr(self, '_content_storage', INLINE) == NORMALIZED:
+            delete_notebook_content(self.id, db_path)
+            self._content_storage = INLINE
+    
+    def _mark_saved(self, version: int, state: Dict[str, Any], merged: bool) -> None:
+        """Record the saved version; the written content rows become the new merge base."""
+        rows, self._pending_content_rows = getattr(self, '_pending_content_rows', None), None
+        super()._mark_saved(version, state, merged)
+        # A merged save reloads sections (and their base rows) in _restore_state
+        if not merged:
+            self._base_content_rows = rows
+        # Notes follow the saved sections (regenerated on next access)
+        if self.outline and self.sections:
+            self.notes = None
+    
+    @property
+    def notes(self) -> str:
+        """Notes markdown with IDs (for modify_by_id), generated from outline and sections on first access."""
+        if self._notes is None:
+            if self.outline and self.sections:
+                # Ensure IDs exist (for backward compatibility)
+                from backend.utils.content_id_utils import ensure_ids
+                from backend.tools.utils import generate_markdown_from_agent
+                ensure_ids(self)
+                self._notes = generate_markdown_from_agent(self, include_ids=True)
+            else:
+                self._notes = ""
+        return self._notes
+    
+    @notes.setter
+    def notes(self, value: Optional[str]) -> None:
+        # None: generate from outline and sections on next access
+        self._notes = value
+    
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Legacy pickle rows keep the notes in the instance dict; move them behind the property."""
+        if 'notes' in state:
+            state['_notes'] = state.pop('notes')
+        self.__dict__.update(state)
+
+    DEFAULT_TOOL_IDS = ['modify_by_id', 'get_content_by_id', 'add_content_to_section']
+    PROMPT_NAME = "notebook_agent"
     
     def _recreate_tools(self):
         """Recreate tools after loading from database (tools cannot be pickled)."""
-        # Ensure IDs exist (for backward compatibility)
-        if self.sections:
-            from backend.utils.content_id_utils import ensure_ids
-            ensure_ids(self)
-        
-        # Regenerate notes with IDs included so AI can use modify_by_id tool
-        notes_regenerated = False
-        if self.sections and self.outline:
-            from backend.tools.utils import generate_markdown_from_agent
-            new_notes = generate_markdown_from_agent(self, include_ids=True)
-            # Only update if notes actually changed (to avoid unnecessary saves)
-            if new_notes != self.notes:
-                self.notes = new_notes
-                notes_regenerated = True
-        
-        # Ensure notes is not None (default to empty string)
-        if self.notes is None:
-            self.notes = ""
-        
-        # Always use the new default tool IDs (ignore old tool_ids from database)
-        # This ensures we don't try to create deprecated modify_notes tool
-        default_tool_ids = ['modify_by_id', 'get_content_by_id', 'add_content_to_section']
-        self._recreate_tools_from_db(default_tool_ids)
-        
-        # Update tool_ids in database to new defaults (fix old data that had modify_notes)
-        # This ensures next time we load, we won't try to create modify_notes
-        import json
-        import sqlite3
-        from backend.database.agent_db import get_db_path
-        db_path = get_db_path(self.DB_PATH if hasattr(self, 'DB_PATH') else None)
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        tool_ids_json = json.dumps(default_tool_ids, ensure_ascii=False)
-        cursor.execute(
-            "UPDATE agents SET tool_ids = ? WHERE id = ?",
-            (tool_ids_json, self.id)
-        )
-        conn.commit()
-        conn.close()
-        
-        # Update instructions with notes that include IDs
-        from backend.prompts.prompt_loader import load_prompt
-        # Ensure notes is passed as string (not None)
-        notes_value = self.notes if self.notes is not None else ""
-        print(f"[NoteBookAgent._recreate_tools] Updating instructions, notes length: {len(notes_value) if notes_value else 0}")
-        print(f"[NoteBookAgent._recreate_tools] Notes preview (first 200 chars): {notes_value[:200] if notes_value else 'EMPTY'}")
-        
-        instructions = load_prompt(
+        # Always use the default tool IDs (ignore old tool_ids such as the deprecated modify_notes)
+        self._recreate_tools_from_db(self.DEFAULT_TOOL_IDS)
+    
+    def _binding_fingerprint(self):
+        """The rendered instructions also embed the notes."""
+        return super()._binding_fingerprint() + (hash(self.notes or ""),)
+    
+    def _render_instructions(self) -> None:
+        """Render the prompt with the notes (with IDs, for modify_by_id) and the tools usage."""
+        self.instructions = load_prompt(
             "notebook_agent",
-            variables={"notes": notes_value},
+            variables={"notes": self.notes},
             agent_instance=self,  # Pass agent instance to properly generate tools_usage
-            tool_ids=default_tool_ids
+            tool_ids=self.DEFAULT_TOOL_IDS
         )
-        
-        # Verify instructions were updated
-        print(f"[NoteBookAgent._recreate_tools] Generated instructions length: {len(instructions)}")
-        if "{notes}" in instructions:
-            print(f"[NoteBookAgent._recreate_tools] ❌ ERROR: Instructions still contain {{notes}} placeholder after load_prompt!")
-            print(f"[NoteBookAgent._recreate_tools] Instructions preview (first 500 chars): {instructions[:500]}")
-        if "{tools_usage}" in instructions:
-            print(f"[NoteBookAgent._recreate_tools] ❌ ERROR: Instructions still contain {{tools_usage}} placeholder after load_prompt!")
-        if "{notes}" not in instructions and "{tools_usage}" not in instructions:
-            print(f"[NoteBookAgent._recreate_tools] ✅ Successfully replaced all placeholders in instructions")
-        
-        self.instructions = instructions
-        
-        # Always save to database after updating instructions (to persist updated instructions with notes and tools_usage)
-        print(f"[NoteBookAgent._recreate_tools] Saving updated instructions to database...")
-        self.save_to_db()
-        print(f"[NoteBookAgent._recreate_tools] ✅ Saved instructions to database (length: {len(self.instructions)})")
+        if "{notes}" in self.instructions or "{tools_usage}" in self.instructions:
+            print(f"[NoteBookAgent._render_instructions] ❌ ERROR: Instructions still contain placeholders after load_prompt!")
     
     def _get_word_count(self) -> int:
         """
@@ -276,7 +337,7 @@ class NoteBookAgent(BaseAgent):
         4. Update parent_master_agent's sub_agent_ids (remove self, add new master)
         5. Delete this agent from database
         """
-        from agents import Runner
+        from backend.utils.llm_scheduler import run_agent
         from backend.agent.specialized.NotebookSplitter import SplitPlanAgent
         from backend.agent.MasterAgent import MasterAgent
         from backend.models import Outline, SplitPlan
@@ -300,7 +361,7 @@ class NoteBookAgent(BaseAgent):
             sections_content=sections_content
         )
         
-        split_result = await Runner.run(
+        split_result = await run_agent(
             split_agent,
             "请分析这个笔记本的内容，生成一个合理的拆分计划，将章节分配到多个更小的笔记本中。"
         )
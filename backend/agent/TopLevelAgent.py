@@ -3,8 +3,9 @@
 from typing import Dict, Any, Optional
 
 from backend.agent.BaseAgent import BaseAgent, AgentType
+from backend.database.unit_of_work import unit_of_work
 from backend.agent.MasterAgent import MasterAgent
-from backend.tools.utils import get_all_agent_info
+from backend.tools.utils import get_agent_tree_info
 from backend.prompts.prompt_loader import load_prompt
 from agents import AgentOutputSchema
 from backend.api.models import StructuredMessageData
@@ -31,35 +32,33 @@ class TopLevelAgent(BaseAgent):
             output_type=output_type
         )
         
-        # Save to database after initialization
-        self.save_to_db()
-        
-        # Check if MasterAgent already exists before creating
-        from backend.database.agent_db import load_all_agents
-        existing_master_agent_id = None
-        all_agents = load_all_agents(self.DB_PATH)
-        for agent_id, agent in all_agents.items():
-            if isinstance(agent, MasterAgent):
-                parent_id = getattr(agent, 'parent_agent_id', None)
-                if parent_id == self.id:
-                    existing_master_agent_id = agent_id
-                    print(f"[TopLevelAgent.__init__] Found existing MasterAgent: {agent_id}")
-                    break
-        
-        if existing_master_agent_id:
-            # Use existing MasterAgent
-            self._add_sub_agents(existing_master_agent_id)
-            print(f"[TopLevelAgent.__init__] Using existing MasterAgent: {existing_master_agent_id}")
-        else:
-            # Create root MasterAgent after we have self.id
-            root_master = MasterAgent("Top Master Agent", parent_agent_id=self.id, DB_PATH=self.DB_PATH)
+        # Self and the root MasterAgent are written together at the end of the scope
+        with unit_of_work():
+            # Save to database after initialization
+            self.save_to_db()
+            
+            # Check if MasterAgent already exists before creating
+            from backend.database.agent_db import find_child_agents
+            existing_master_agent_id = None
+            master_headers = find_child_agents(self.id, AgentType.MASTER, self.DB_PATH)
+            if master_headers:
+                existing_master_agent_id = master_headers[0]['id']
+                print(f"[TopLevelAgent.__init__] Found existing MasterAgent: {existing_master_agent_id}")
+            
+            if existing_master_agent_id:
+                # Use existing MasterAgent
+                self._add_sub_agents(existing_master_agent_id)
+                print(f"[TopLevelAgent.__init__] Using existing MasterAgent: {existing_master_agent_id}")
+            else:
+                # Create root MasterAgent after we have self.id
+                root_master = MasterAgent("Top Master Agent", parent_agent_id=self.id, DB_PATH=self.DB_PATH)
             
-            # Save root master to database
-            root_master.save_to_db()
+                # Save root master to database
+                root_master.save_to_db()
             
-            # Add root master to sub_agent_ids
-            self._add_sub_agents(root_master.id)
-            print(f"[TopLevelAgent.__init__] Created new MasterAgent: {root_master.id}")
+                # Add root master to sub_agent_ids
+                self._add_sub_agents(root_master.id)
+                print(f"[TopLevelAgent.__init__] Created new MasterAgent: {root_master.id}")
         
         # Create tools using registry
         from backend.tools.tool_registry import get_tool_registry
@@ -72,49 +71,32 @@ class TopLevelAgent(BaseAgent):
         self.tools = [t for t in [send_message, generate_outline] if t is not None]
         
         # Update instructions with actual agent list and tool usage
-        agent_dict = self._load_sub_agents_dict()
-        tool_ids = ['send_message', 'generate_outline']
-        instructions = load_prompt(
-            "top_level_agent",
-            variables={"agents_list": get_all_agent_info(agent_dict)},
-            tool_ids=tool_ids
-        )
-        self.instructions = instructions
+        self._render_instructions()
+    
+    @classmethod
+    def _default_output_type(cls):
+        """TopLevelAgent returns StructuredMessageData (same as in __init__)."""
+        return AgentOutputSchema(StructuredMessageData, strict_json_schema=False)
+    
+    # TopLevelAgent only manages MasterAgent directly; the MasterAgent cards summarize its sub-agents
+    DEFAULT_TOOL_IDS = ['send_message', 'generate_outline']
+    PROMPT_NAME = "top_level_agent"
+    PROMPT_AGENT_DEPTH = 2
     
     def _recreate_tools(self):
         """Recreate tools after loading from database (tools cannot be pickled)."""
-        # Default tool IDs for TopLevelAgent
-        default_tool_ids = ['send_message', 'generate_outline']
-        self._recreate_tools_from_db(default_tool_ids)
-        
-        # Ensure tool_ids are saved to database (important for API to return correct tools)
-        import json
-        import sqlite3
-        from backend.database.agent_db import get_db_path
-        db_path = get_db_path(self.DB_PATH if hasattr(self, 'DB_PATH') else None)
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        tool_ids_json = json.dumps(default_tool_ids, ensure_ascii=False)
-        cursor.execute(
-            "UPDATE agents SET tool_ids = ? WHERE id = ?",
-            (tool_ids_json, self.id)
-        )
-        conn.commit()
-        conn.close()
-        print(f"[TopLevelAgent._recreate_tools] Saved tool_ids to database: {default_tool_ids}")
-        
-        # Update instructions after recreating tools (to ensure latest prompt is used)
-        agent_dict = self._load_sub_agents_dict()
-        from backend.tools.utils import get_all_agent_info
-        from backend.prompts.prompt_loader import load_prompt
+        self._recreate_tools_from_db(self.DEFAULT_TOOL_IDS)
+    
+    def _render_instructions(self) -> None:
+        """Render the prompt with the current agent list (see bind_for_run)."""
         # TopLevelAgent only manages MasterAgent directly, so max_depth=1 to avoid showing NotebookAgents
         instructions = load_prompt(
             "top_level_agent",
-            variables={"agents_list": get_all_agent_info(agent_dict, indent_level=0, max_depth=1)},
-            tool_ids=default_tool_ids
+            variables={"agents_list": get_agent_tree_info(self.id, max_depth=1, db_path=self.DB_PATH)},
+            tool_ids=self.DEFAULT_TOOL_IDS
         )
         self.instructions = instructions
-        print(f"[TopLevelAgent._recreate_tools] Updated instructions (length: {len(instructions)})")
+        print(f"[TopLevelAgent._render_instructions] Updated instructions (length: {len(instructions)})")
     
     def _load_sub_agents_dict(self) -> Dict[str, Any]:
         """
@@ -141,6 +123,5 @@ class TopLevelAgent(BaseAgent):
     
     def agent_card(self) -> str:
         """返回agent card信息"""
-        agent_dict = self._load_sub_agents_dict()
-        return get_all_agent_info(agent_dict)
+        return get_agent_tree_info(self.id, db_path=self.DB_PATH)
 
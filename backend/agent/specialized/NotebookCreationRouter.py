@@ -1,7 +1,8 @@
 """NotebookCreationRouter - 笔记本创建路由Agent，根据意图选择合适的创建策略"""
 
 from typing import Optional, Tuple
-from agents import Agent, Runner, function_tool
+from agents import Agent, function_tool
+from backend.utils.llm_scheduler import run_agent
 
 from backend.agent.NoteBookAgent import NoteBookAgent
 from backend.tools.agent_as_tools.IntentExtractionAgent import IntentExtractionAgent
@@ -48,7 +49,7 @@ class NotebookCreationRouter:
             file_path=file_path
         )
         
-        intent_result = await Runner.run(
+        intent_result = await run_agent(
             intent_agent,
             "请分析用户请求，提取笔记本创建意图"
         )
@@ -123,7 +124,7 @@ class NotebookCreationRouter:
                 model_settings=model_settings
             )
             
-            outline_result = await Runner.run(
+            outline_result = await run_agent(
                 outline_agent,
                 "请分析文档并生成知识库结构大纲"
             )
@@ -132,7 +133,7 @@ class NotebookCreationRouter:
             # 有文件：使用OutlineMakerAgent从文件生成大纲
             from backend.tools.agent_as_tools.NotebookCreator import OutlineMakerAgent
             outline_agent = OutlineMakerAgent(file_path)
-            outline_result = await Runner.run(
+            outline_result = await run_agent(
                 outline_agent, 
                 "请分析文档并生成学习大纲，包括笔记本描述（描述包含什么知识、不包含什么知识、知识边界和定位）"
             )
@@ -187,7 +188,7 @@ class NotebookCreationRouter:
                 model_settings=model_settings
             )
             
-            outline_result = await Runner.run(
+            outline_result = await run_agent(
                 outline_agent,
                 f"请为主题'{topic}'草拟一个学习大纲"
             )
@@ -242,7 +243,7 @@ class NotebookCreationRouter:
             file_path=file_path
         )
         
-        intent_result = await Runner.run(
+        intent_result = await run_agent(
             intent_agent,
             "请分析用户请求，提取笔记本创建意图"
         )
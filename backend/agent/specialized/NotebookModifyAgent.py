@@ -1,6 +1,6 @@
 """NotebookModifyAgent - specialized agent for coordinating notebook modifications."""
 
-from typing import Optional
+from typing import Optional, Dict, Any
 from agents import ModelSettings
 from backend.agent.BaseAgent import BaseAgent, AgentType
 from backend.tools.agent_as_tools.modify_agents import (
@@ -141,6 +141,16 @@ class NotebookModifyAgent(BaseAgent):
         # 保存notebook_agent_id到数据库
         self.save_to_db()
     
+    def _to_state(self) -> Dict[str, Any]:
+        """持久化关联的 notebook_agent_id（instructions 由 BaseAgent 保存）"""
+        state = super()._to_state()
+        state['notebook_agent_id'] = self.notebook_agent_id
+        return state
+    
+    def _apply_state(self, state: Dict[str, Any]) -> None:
+        """恢复 notebook_agent_id"""
+        self.notebook_agent_id = state.get('notebook_agent_id')
+    
     def _create_modify_by_id_tool(self, notebook_agent_id: str):
         """创建modify_by_id工具，包装以便在工具内部动态加载notebook_agent"""
         from agents import function_tool
@@ -415,11 +425,4 @@ class NotebookModifyAgent(BaseAgent):
         
         # 保存到数据库
         notebook_agent.save_to_db()
-        
-        # 清除AgentManager缓存，确保API获取最新数据
-        try:
-            from backend.utils.agent_manager import get_agent_manager
-            get_agent_manager().clear_cache(notebook_agent.id)
-        except Exception:
-            pass  # 如果AgentManager不可用，忽略错误
 
@@ -7,21 +7,9 @@ from backend.api.utils import get_top_level_agent
 import os
 from pathlib import Path
 
-# Load .env file if it exists
-try:
-    from dotenv import load_dotenv
-    # Load .env from project root
-    project_root = Path(__file__).parent.parent.parent
-    env_path = project_root / ".env"
-    if env_path.exists():
-        load_dotenv(env_path)
-        print(f"[Startup] Loaded .env file from {env_path}")
-    else:
-        print(f"[Startup] No .env file found at {env_path}, using system environment variables")
-except ImportError:
-    print("[Startup] python-dotenv not installed, using system environment variables")
-except Exception as e:
-    print(f"[Startup] Warning: Failed to load .env file: {e}")
+# Load .env and model configuration (snapshot, reloaded when the files change)
+from backend.config.runtime_config import get_config
+get_config()
 
 # Import all route modules
 from backend.api import (
@@ -31,6 +19,7 @@ from backend.api import (
     notebooks,
     tools,
     upload,
+    jobs,
 )
 
 # Create FastAPI app
@@ -58,30 +47,52 @@ async def startup_event():
         init_tool_system()
         print("[Startup] Tool system initialized successfully")
         
-        # Verify TopLevelAgent tools are correctly created
-        print("[Startup] Verifying TopLevelAgent tools...")
-        try:
-            agent = get_top_level_agent()
-            if agent.tools:
-                tool_names = [getattr(t, '_tool_id', 'unknown') for t in agent.tools]
-                print(f"[Startup] TopLevelAgent has {len(agent.tools)} tools: {tool_names}")
-                
-                # Check for required tools
-                required_tools = ['send_message', 'generate_outline']
-                missing = [t for t in required_tools if t not in tool_names]
-                if missing:
-                    print(f"[Startup] ⚠️  WARNING: Missing tools: {missing}")
-                else:
-                    print(f"[Startup] ✅ All required tools are present")
-            else:
-                print(f"[Startup] ⚠️  WARNING: TopLevelAgent has no tools!")
-        except Exception as e:
-            print(f"[Startup] ⚠️  Warning: Failed to verify TopLevelAgent tools: {e}")
-            import traceback
-            traceback.print_exc()
+        # Flush agents marked as modified in the background (final flush on shutdown)
+        from backend.utils.agent_manager import get_agent_manager
+        get_agent_manager().start_write_behind()
+        
+        # Jobs left unfinished by a previous server process (lease expired or released): resumable
+        # ones (notebook creation) continue from their checkpoints, the others can no longer complete
+        from backend.utils.job_engine import get_job_engine
+        job_engine = get_job_engine()
+        resumed, orphaned = job_engine.resume_orphaned_jobs()
+        if resumed:
+            print(f"[Startup] Resumed {resumed} interrupted job(s)")
+        if orphaned:
+            print(f"[Startup] Marked {orphaned} interrupted job(s) as failed")
+        # Keep the leases of this worker's jobs alive; take over jobs of workers that died
+        job_engine.start_lease_keeper()
+        
+        # Preload TopLevelAgent, MasterAgents and recent notebooks in the background (see GET /ready)
+        from backend.api.warmup import start_warmup
+        start_warmup()
+        print("[Startup] Warm-up started")
     except Exception as e:
         print(f"[Startup] Warning: Failed to initialize tool system: {e}")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop running jobs, flush modified agents and close pooled database connections on application shutdown."""
+    from backend.utils.job_engine import get_job_engine
+    stopped = await get_job_engine().shutdown()
+    if stopped:
+        print(f"[Shutdown] Stopped {stopped} running job(s); they resume at the next startup")
+    
+    from backend.utils.agent_manager import get_agent_manager
+    saved = get_agent_manager().stop_write_behind()
+    print(f"[Shutdown] Flushed {saved} modified agent(s)")
+    
+    from backend.utils.tracing_collector import flush_trace_writes
+    flush_trace_writes(timeout=10)
+    
+    from backend.database.async_db import shutdown_executor
+    shutdown_executor()
+    
+    from backend.database.connection import close_all_connections
+    close_all_connections()
+    print("[Shutdown] Closed database connections")
+
 # Register all route modules
 app.include_router(top_level_agent.router)
 app.include_router(sessions.router)
@@ -89,9 +100,27 @@ app.include_router(agents.router)
 app.include_router(notebooks.router)
 app.include_router(tools.router)
 app.include_router(upload.router)
+app.include_router(jobs.router)
 
 # Root endpoint
 @app.get("/")
 async def root():
     """Root endpoint."""
     return {"message": "AgentUniverse API", "version": "1.0.0"}
+
+
+# Readiness probe: 503 until the startup warm-up has finished
+@app.get("/ready")
+async def ready():
+    """Readiness endpoint (warm-up state)."""
+    from fastapi.responses import JSONResponse
+    from backend.api.warmup import get_warmup_state, is_ready
+    return JSONResponse(get_warmup_state(), status_code=200 if is_ready() else 503)
+
+
+# LLM scheduler state: per-model concurrency limit, queued requests by priority, token budget
+@app.get("/llm/stats")
+async def llm_stats():
+    """LLM scheduler statistics per model."""
+    from backend.utils.llm_scheduler import get_llm_scheduler
+    return get_llm_scheduler().stats()
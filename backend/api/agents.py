@@ -6,20 +6,22 @@ from backend.agent.TopLevelAgent import TopLevelAgent
 from backend.agent.MasterAgent import MasterAgent
 from backend.agent.NoteBookAgent import NoteBookAgent
 from backend.agent.BaseAgent import AgentType
-from backend.database.agent_db import load_agent, load_all_agents, delete_agent, get_db_path
+from backend.database.agent_db import load_agent, load_all_agents, delete_agent, get_db_path, find_agents_by_type, find_child_agents
 from backend.api.models import UpdateInstructionsRequest, ChatRequest, ChatResponse
 from backend.utils.default_instructions import get_default_instructions
 from backend.prompts.prompt_loader import load_prompt
 import json
-import sqlite3
-from backend.database.agent_db import get_db_path
+from backend.database.agent_db import get_db_path, get_manager, get_tool_ids, update_agent, AgentVersionConflict
 from backend.database.tools_db import get_tools_by_names
+from backend.database.agent_db import get_agent_tree
+from backend.tools.utils.agent_utils import tree_agent_card
+from backend.models import AgentCard
+from backend.database import async_db
 
 router = APIRouter(prefix="/api/agents", tags=["agents"])
 
 
-@router.get("")
-async def list_agents():
+def _list_agents():
     """List all agents."""
     try:
         # Ensure TopLevelAgent is initialized (this will create it if it doesn't exist)
@@ -33,29 +35,22 @@ async def list_agents():
         valid_master_agent_id = None
         
         # First pass: find TopLevelAgent and its MasterAgent
-        for agent_id, agent in agents.items():
-            if isinstance(agent, TopLevelAgent):
-                top_level_agent_id = agent_id
-                # Get the MasterAgent from TopLevelAgent's sub_agent_ids
-                sub_agent_ids = getattr(agent, 'sub_agent_ids', None) or []
-                for sub_id in sub_agent_ids:
-                    try:
-                        sub_agent = agent.load_agent_from_db_by_id(sub_id)
-                        if isinstance(sub_agent, MasterAgent):
-                            valid_master_agent_id = sub_id
-                            break
-                    except Exception:
-                        continue
-                break
+        top_level_headers = find_agents_by_type(AgentType.TOP_LEVEL)
+        if top_level_headers and top_level_headers[0]['id'] in agents:
+            top_level_agent_id = top_level_headers[0]['id']
+            agent = agents[top_level_agent_id]
+            # Get the MasterAgent from TopLevelAgent's sub_agent_ids
+            sub_agent_ids = getattr(agent, 'sub_agent_ids', None) or []
+            for sub_id in sub_agent_ids:
+                if isinstance(agents.get(sub_id), MasterAgent):
+                    valid_master_agent_id = sub_id
+                    break
         
         # If not found in sub_agent_ids, search database
         if top_level_agent_id and not valid_master_agent_id:
-            for agent_id, agent in agents.items():
-                if isinstance(agent, MasterAgent):
-                    parent_id = getattr(agent, 'parent_agent_id', None)
-                    if parent_id == top_level_agent_id:
-                        valid_master_agent_id = agent_id
-                        break
+            master_headers = find_child_agents(top_level_agent_id, AgentType.MASTER)
+            if master_headers:
+                valid_master_agent_id = master_headers[0]['id']
         
         # Second pass: collect agents, filtering duplicate MasterAgents
         for agent_id, agent in agents.items():
@@ -120,8 +115,20 @@ async def list_agents():
         raise HTTPException(status_code=500, detail=f"Error listing agents: {str(e)}")
 
 
-@router.get("/{agent_id}")
-async def get_agent(agent_id: str):
+@router.get("")
+async def list_agents():
+    """List all agents."""
+    return await async_db.run_db(_list_agents)
+
+
+@router.get("/cache/stats")
+async def get_agent_cache_stats():
+    """AgentManager cache counters (hits, misses, evictions, expirations) and estimated size."""
+    from backend.utils.agent_manager import get_agent_manager
+    return get_agent_manager().get_cache_stats()
+
+
+def _get_agent(agent_id: str):
     """Get agent by ID."""
     try:
         agent = load_agent(agent_id)
@@ -201,8 +208,13 @@ async def get_agent(agent_id: str):
         raise HTTPException(status_code=500, detail=f"Error getting agent: {str(e)}")
 
 
-@router.get("/{agent_id}/parent")
-async def get_agent_parent(agent_id: str):
+@router.get("/{agent_id}")
+async def get_agent(agent_id: str):
+    """Get agent by ID."""
+    return await async_db.run_db(_get_agent, agent_id)
+
+
+def _get_agent_parent(agent_id: str):
     """Get parent agent of an agent."""
     try:
         agent = load_agent(agent_id)
@@ -270,113 +282,89 @@ async def get_agent_parent(agent_id: str):
         raise HTTPException(status_code=500, detail=f"Error getting parent agent: {str(e)}")
 
 
-@router.get("/{agent_id}/hierarchy")
-async def get_agent_hierarchy(agent_id: str):
-    """Get agent hierarchy."""
+@router.get("/{agent_id}/parent")
+async def get_agent_parent(agent_id: str):
+    """Get parent agent of an agent."""
+    return await async_db.run_db(_get_agent_parent, agent_id)
+
+
+def _get_agent_hierarchy(agent_id: str):
+    """Get agent hierarchy (two levels, from the hierarchy index in one query; no agent is loaded)."""
     try:
-        agent = load_agent(agent_id)
-        if not agent:
+        # One level more than returned: MasterAgent cards summarize their children
+        tree = get_agent_tree(agent_id, 3)
+        if tree is None:
             raise HTTPException(status_code=404, detail="Agent not found")
         
-        # Build hierarchy
-        agent_type = getattr(agent, 'type', 'Unknown')
-        if isinstance(agent_type, AgentType):
-            agent_type_str = agent_type.value
-        else:
-            agent_type_str = str(agent_type)
-        
         hierarchy = {
-            "id": agent.id,
-            "type": agent_type_str,
-            "name": getattr(agent, 'name', 'Unknown'),
+            "id": tree['id'],
+            "type": tree['type'],
+            "name": tree['name'] or 'Unknown',
             "children": []
         }
         
-        # Load sub-agents
-        sub_agent_ids = getattr(agent, 'sub_agent_ids', None) or []
-        if sub_agent_ids:
-            for sub_id in sub_agent_ids:
-                try:
-                    sub_agent = agent.load_agent_from_db_by_id(sub_id)
-                except Exception:
-                    # Agent not found (may have been deleted), skip it
-                    # TODO: Clean up orphaned sub_agent_ids
-                    continue
-                if sub_agent:
-                    sub_type = getattr(sub_agent, 'type', 'Unknown')
-                    if isinstance(sub_type, AgentType):
-                        sub_type_str = sub_type.value
-                    else:
-                        sub_type_str = str(sub_type)
-                    
-                    # Determine agent type for frontend format
-                    is_master = isinstance(sub_agent, MasterAgent)
-                    is_notebook = isinstance(sub_agent, NoteBookAgent)
-                    is_top_level = isinstance(sub_agent, TopLevelAgent)
-                    
-                    # Convert to frontend format
-                    if is_top_level:
-                        agent_type_frontend = 'top_level_agent'
-                    elif is_master:
-                        agent_type_frontend = 'master'
-                    elif is_notebook:
-                        agent_type_frontend = 'notebook'
-                    else:
-                        agent_type_frontend = sub_type_str.lower().replace(' ', '_')
-                    
-                    child_data = {
-                        "id": sub_agent.id,
-                        "notebook_id": sub_agent.id,  # Frontend uses notebook_id
-                        "agent_name": getattr(sub_agent, 'name', 'Unknown'),
-                        "name": getattr(sub_agent, 'name', 'Unknown'),  # Keep for backward compatibility
-                        "type": sub_type_str,
-                        "agent_type": agent_type_frontend,
-                        "metadata": {
-                            "is_master_agent": is_master,
-                            "is_top_level_agent": is_top_level,
-                            "is_notebook_agent": is_notebook,
-                        },
-                        "agent_card": _serialize_agent_card(sub_agent.agent_card()) if hasattr(sub_agent, 'agent_card') and callable(getattr(sub_agent, 'agent_card')) else None,
-                    }
-                    
-                    # Add notebook-specific fields if it's a NoteBookAgent
-                    if is_notebook:
-                        child_data['notebook_title'] = getattr(sub_agent, 'notebook_title', '')
-                        child_data['description'] = getattr(sub_agent, 'notebook_description', '')
-                    elif is_master:
-                        # For MasterAgent, get description from agent_card or empty
-                        child_data['description'] = ''
-                        # Load children for MasterAgent
-                        child_sub_agent_ids = getattr(sub_agent, 'sub_agent_ids', None) or []
-                        if child_sub_agent_ids:
-                            child_data['children'] = []
-                            for child_id in child_sub_agent_ids:
-                                try:
-                                    child_agent = sub_agent.load_agent_from_db_by_id(child_id)
-                                except Exception:
-                                    # Agent not found (may have been deleted), skip it
-                                    continue
-                                if child_agent:
-                                    child_is_notebook = isinstance(child_agent, NoteBookAgent)
-                                    child_is_master = isinstance(child_agent, MasterAgent)
-                                    child_agent_type = 'notebook' if child_is_notebook else ('master' if child_is_master else 'unknown')
-                                    
-                                    child_info = {
-                                        "id": child_agent.id,
-                                        "notebook_id": child_agent.id,
-                                        "agent_name": getattr(child_agent, 'name', 'Unknown'),
-                                        "name": getattr(child_agent, 'name', 'Unknown'),
-                                        "agent_type": child_agent_type,
-                                        "agent_card": _serialize_agent_card(child_agent.agent_card()) if hasattr(child_agent, 'agent_card') and callable(getattr(child_agent, 'agent_card')) else None,
-                                    }
-                                    
-                                    if child_is_notebook:
-                                        child_info['notebook_title'] = getattr(child_agent, 'notebook_title', '')
-                                        child_info['description'] = getattr(child_agent, 'notebook_description', '')
-                                    
-                                    child_data['children'].append(child_info)
-                    
-                    hierarchy["children"].append(child_data)
+        for sub_node in tree['children']:
+            sub_type_str = sub_node['type']
+            is_master = sub_type_str == AgentType.MASTER.value
+            is_notebook = sub_type_str == AgentType.NOTEBOOK.value
+            is_top_level = sub_type_str == AgentType.TOP_LEVEL.value
+            
+            # Convert to frontend format
+            if is_top_level:
+                agent_type_frontend = 'top_level_agent'
+            elif is_master:
+                agent_type_frontend = 'master'
+            elif is_notebook:
+                agent_type_frontend = 'notebook'
+            else:
+                agent_type_frontend = sub_type_str.lower().replace(' ', '_')
+            
+            child_data = {
+                "id": sub_node['id'],
+                "notebook_id": sub_node['id'],  # Frontend uses notebook_id
+                "agent_name": sub_node['name'] or 'Unknown',
+                "name": sub_node['name'] or 'Unknown',  # Keep for backward compatibility
+                "type": sub_type_str,
+                "agent_type": agent_type_frontend,
+                "metadata": {
+                    "is_master_agent": is_master,
+                    "is_top_level_agent": is_top_level,
+                    "is_notebook_agent": is_notebook,
+                },
+                "agent_card": _serialize_tree_card(sub_node),
+            }
+            
+            # Add notebook-specific fields if it's a NoteBookAgent
+            if is_notebook:
+                child_data['notebook_title'] = sub_node['card']['title']
+                child_data['description'] = sub_node['card']['description']
+            elif is_master:
+                # For MasterAgent, get description from agent_card or empty
+                child_data['description'] = ''
+                # Children of the MasterAgent
+                if sub_node['children']:
+                    child_data['children'] = []
+                    for child_node in sub_node['children']:
+                        child_is_notebook = child_node['type'] == AgentType.NOTEBOOK.value
+                        child_is_master = child_node['type'] == AgentType.MASTER.value
+                        child_agent_type = 'notebook' if child_is_notebook else ('master' if child_is_master else 'unknown')
+                        
+                        child_info = {
+                            "id": child_node['id'],
+                            "notebook_id": child_node['id'],
+                            "agent_name": child_node['name'] or 'Unknown',
+                            "name": child_node['name'] or 'Unknown',
+                            "agent_type": child_agent_type,
+                            "agent_card": _serialize_tree_card(child_node),
+                        }
+                        
+                        if child_is_notebook:
+                            child_info['notebook_title'] = child_node['card']['title']
+                            child_info['description'] = child_node['card']['description']
+                        
+                        child_data['children'].append(child_info)
+            
+            hierarchy["children"].append(child_data)
         
         return hierarchy
     except HTTPException:
@@ -385,8 +373,19 @@ async def get_agent_hierarchy(agent_id: str):
         raise HTTPException(status_code=500, detail=f"Error getting hierarchy: {str(e)}")
 
 
-@router.get("/{agent_id}/instructions")
-async def get_agent_instructions(agent_id: str):
+def _serialize_tree_card(node):
+    """Serialized agent card of a hierarchy node (None for agents without a card)."""
+    card = tree_agent_card(node)
+    return _serialize_agent_card(card) if isinstance(card, AgentCard) else None
+
+
+@router.get("/{agent_id}/hierarchy")
+async def get_agent_hierarchy(agent_id: str):
+    """Get agent hierarchy."""
+    return await async_db.run_db(_get_agent_hierarchy, agent_id)
+
+
+def _get_agent_instructions(agent_id: str):
     """Get agent instructions (current and default)."""
     try:
         agent = load_agent(agent_id)
@@ -445,27 +444,36 @@ async def get_agent_instructions(agent_id: str):
         raise HTTPException(status_code=500, detail=f"Error getting instructions: {str(e)}")
 
 
-@router.put("/{agent_id}/instructions")
-async def update_agent_instructions(agent_id: str, request: UpdateInstructionsRequest):
+@router.get("/{agent_id}/instructions")
+async def get_agent_instructions(agent_id: str):
+    """Get agent instructions (current and default)."""
+    return await async_db.run_db(_get_agent_instructions, agent_id)
+
+
+def _update_agent_instructions(agent_id: str, request: UpdateInstructionsRequest):
     """Update agent instructions."""
     try:
-        agent = load_agent(agent_id)
+        # Reload and retry if another request saved the agent concurrently
+        agent = update_agent(agent_id, lambda agent: setattr(agent, 'instructions', request.instructions))
         if not agent:
             raise HTTPException(status_code=404, detail="Agent not found")
         
-        # Update instructions
-        agent.instructions = request.instructions
-        agent.save_to_db()
-        
         return {'message': 'Instructions updated successfully'}
     except HTTPException:
         raise
+    except AgentVersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating instructions: {str(e)}")
 
 
-@router.get("/{agent_id}/tools")
-async def get_agent_tools(agent_id: str):
+@router.put("/{agent_id}/instructions")
+async def update_agent_instructions(agent_id: str, request: UpdateInstructionsRequest):
+    """Update agent instructions."""
+    return await async_db.run_db(_update_agent_instructions, agent_id, request)
+
+
+def _get_agent_tools(agent_id: str):
     """Get agent tools information with full metadata from database."""
     try:
         # Load agent to verify it exists
@@ -474,31 +482,7 @@ async def get_agent_tools(agent_id: str):
             raise HTTPException(status_code=404, detail="Agent not found")
         
         # Get tool_ids directly from database
-        db_path = get_db_path(agent.DB_PATH if hasattr(agent, 'DB_PATH') else None)
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Get tool_ids column
-        tool_ids_json = None
-        try:
-            cursor.execute("SELECT tool_ids FROM agents WHERE id = ?", (agent_id,))
-            row = cursor.fetchone()
-            if row and row[0]:
-                tool_ids_json = row[0]
-        except sqlite3.OperationalError:
-            # Column doesn't exist, use empty list
-            tool_ids_json = '[]'
-        
-        conn.close()
-        
-        # Parse tool_ids
-        tool_ids = []
-        if tool_ids_json and tool_ids_json != '[]':
-            try:
-                tool_ids = json.loads(tool_ids_json)
-            except (json.JSONDecodeError, TypeError):
-                tool_ids = []
+        tool_ids = get_tool_ids(agent_id, agent.DB_PATH if hasattr(agent, 'DB_PATH') else None)
         
         # Get tools metadata from database by names
         if tool_ids:
@@ -513,105 +497,94 @@ async def get_agent_tools(agent_id: str):
         raise HTTPException(status_code=500, detail=f"Error getting tools: {str(e)}")
 
 
+@router.get("/{agent_id}/tools")
+async def get_agent_tools(agent_id: str):
+    """Get agent tools information with full metadata from database."""
+    return await async_db.run_db(_get_agent_tools, agent_id)
+
+
+async def _prepare_agent_chat(agent_id: str, request: ChatRequest):
+    """
+    Wake and bind the agent, create the session if needed and record the user message.
+    
+    Returns:
+        (agent, session_id, session)
+    """
+    # Use AgentManager to wake up the agent (ensures tools are restored)
+    from backend.utils.agent_manager import wake_agent
+    agent = await async_db.run_db(wake_agent, agent_id)
+    
+    if not agent:
+        raise HTTPException(status_code=404, detail=f"Agent not found: {agent_id}")
+    
+    # Bind tools and instructions before Runner.run (memoized; for NoteBookAgent the
+    # instructions embed the notes and tools usage, re-rendered when the notes change)
+    await async_db.run_db(agent.bind_for_run)
+    
+    # Create session if not provided
+    session_id = request.session_id
+    if not session_id:
+        session_data = await async_db.create_session()
+        session_id = session_data['id']
+    
+    # Session history (SDK items) and transcript live in the main database;
+    # the whole turn is written in one transaction when it ends
+    from backend.database.conversation_session import ConversationSession
+    
+    session = ConversationSession(session_id)
+    session.add_message("user", request.message)
+    
+    # DEBUG: Log agent instructions before running (especially for NoteBookAgent)
+    print(f"\n{'='*80}")
+    print(f"[chat_with_agent] DEBUG: About to run agent {agent_id}")
+    print(f"[chat_with_agent] Agent type: {type(agent).__name__}")
+    if hasattr(agent, 'instructions'):
+        instructions_preview = agent.instructions[:500] if agent.instructions else "NONE/EMPTY"
+        print(f"[chat_with_agent] Agent instructions (first 500 chars):\n{instructions_preview}")
+        if isinstance(agent, NoteBookAgent):
+            if "{notes}" in agent.instructions:
+                print(f"[chat_with_agent] ⚠️  WARNING: Instructions still contain {{notes}} placeholder!")
+            if "{tools_usage}" in agent.instructions:
+                print(f"[chat_with_agent] ⚠️  WARNING: Instructions still contain {{tools_usage}} placeholder!")
+            print(f"[chat_with_agent] Full instructions length: {len(agent.instructions) if agent.instructions else 0}")
+            # Also check notes
+            notes_preview = agent.notes[:200] if hasattr(agent, 'notes') and agent.notes else "NONE/EMPTY"
+            print(f"[chat_with_agent] Agent notes (first 200 chars):\n{notes_preview}")
+    else:
+        print(f"[chat_with_agent] Agent has no instructions attribute!")
+    print(f"{'='*80}\n")
+    
+    return agent, session_id, session
+
+
+def _agent_chat_response(result):
+    """(response_text, structured_data) of a finished agent run (agents other than TopLevelAgent answer in text)."""
+    if hasattr(result, 'final_output'):
+        return result.final_output, None
+    return str(result), None
+
+
 @router.post("/{agent_id}/chat", response_model=ChatResponse)
 async def chat_with_agent(agent_id: str, request: ChatRequest):
     """Chat with a specific agent (NotebookAgent, MasterAgent, etc.)."""
     try:
-        # Use AgentManager to wake up the agent (ensures tools are restored)
-        from backend.utils.agent_manager import wake_agent
-        agent = wake_agent(agent_id)
-        
-        if not agent:
-            raise HTTPException(status_code=404, detail=f"Agent not found: {agent_id}")
-        
-        # Ensure tools is not None (critical for Runner.run)
-        if not hasattr(agent, 'tools') or agent.tools is None:
-            # Try to recreate tools
-            if hasattr(agent, '_recreate_tools'):
-                try:
-                    agent._recreate_tools()
-                except Exception as e:
-                    print(f"Warning: Failed to recreate tools: {e}")
-                    agent.tools = []
-            else:
-                agent.tools = []
-        
-        # For NoteBookAgent, always ensure instructions are up-to-date (with notes and tools_usage replaced)
-        # This is critical because instructions may contain {notes} placeholder from database
-        if isinstance(agent, NoteBookAgent):
-            # Check if instructions contain placeholders that need to be replaced
-            if hasattr(agent, 'instructions') and ("{notes}" in agent.instructions or "{tools_usage}" in agent.instructions):
-                print(f"[chat_with_agent] NoteBookAgent {agent_id} has placeholders in instructions, updating...")
-                try:
-                    agent._recreate_tools()  # This will update instructions with notes and tools_usage
-                    print(f"[chat_with_agent] Updated NoteBookAgent instructions, length: {len(agent.instructions)}")
-                except Exception as e:
-                    print(f"[chat_with_agent] Warning: Failed to update NoteBookAgent instructions: {e}")
-                    import traceback
-                    traceback.print_exc()
-        
-        # Create session if not provided
-        session_id = request.session_id
-        if not session_id:
-            from backend.database.session_db import create_session
-            session_data = create_session()
-            session_id = session_data['id']
-        
-        # Create SQLiteSession for maintaining conversation context
-        from agents import SQLiteSession, Runner
-        from backend.database.agent_db import get_db_path
-        import os
-        
-        db_path = get_db_path(agent.DB_PATH if hasattr(agent, 'DB_PATH') else None)
-        db_dir = os.path.dirname(db_path)
-        session_db_path = os.path.join(db_dir, "session_history.db")
-        
-        # Ensure directory exists
-        os.makedirs(db_dir, exist_ok=True)
-        
-        # Create SQLiteSession instance - this will maintain conversation history
-        session = SQLiteSession(session_id, session_db_path)
-        
-        # Add user message to session (for our own tracking)
-        from backend.database.session_db import add_conversation
-        add_conversation(session_id, "user", request.message)
-        
-        # DEBUG: Log agent instructions before running (especially for NoteBookAgent)
-        print(f"\n{'='*80}")
-        print(f"[chat_with_agent] DEBUG: About to run agent {agent_id}")
-        print(f"[chat_with_agent] Agent type: {type(agent).__name__}")
-        if hasattr(agent, 'instructions'):
-            instructions_preview = agent.instructions[:500] if agent.instructions else "NONE/EMPTY"
-            print(f"[chat_with_agent] Agent instructions (first 500 chars):\n{instructions_preview}")
-            if isinstance(agent, NoteBookAgent):
-                if "{notes}" in agent.instructions:
-                    print(f"[chat_with_agent] ⚠️  WARNING: Instructions still contain {{notes}} placeholder!")
-                if "{tools_usage}" in agent.instructions:
-                    print(f"[chat_with_agent] ⚠️  WARNING: Instructions still contain {{tools_usage}} placeholder!")
-                print(f"[chat_with_agent] Full instructions length: {len(agent.instructions) if agent.instructions else 0}")
-                # Also check notes
-                notes_preview = agent.notes[:200] if hasattr(agent, 'notes') and agent.notes else "NONE/EMPTY"
-                print(f"[chat_with_agent] Agent notes (first 200 chars):\n{notes_preview}")
-        else:
-            print(f"[chat_with_agent] Agent has no instructions attribute!")
-        print(f"{'='*80}\n")
+        agent, session_id, session = await _prepare_agent_chat(agent_id, request)
         
         # Run agent with tracing and tool logging hooks
+        from backend.utils.llm_scheduler import run_agent
         from backend.utils.tracing_collector import track_agent_run
         from backend.utils.tool_logging_hooks import ToolLoggingHook
         
         tool_logging_hook = ToolLoggingHook()
-        with track_agent_run(session_id, agent, request.message):
-            result = await Runner.run(agent, request.message, session=session, hooks=tool_logging_hook)
-        
-        # Extract response
-        if hasattr(result, 'final_output'):
-            response_text = result.final_output
-        else:
-            response_text = str(result)
-        
-        # Add assistant response to session
-        add_conversation(session_id, "assistant", response_text)
+        async with session.turn():
+            with track_agent_run(session_id, agent, request.message):
+                result = await run_agent(agent, request.message, session=session, hooks=tool_logging_hook)
+            
+            # Extract response
+            response_text, _ = _agent_chat_response(result)
+            
+            # Add assistant response to session
+            session.add_message("assistant", response_text)
         
         return ChatResponse(response=response_text, session_id=session_id)
     except HTTPException:
@@ -624,8 +597,28 @@ async def chat_with_agent(agent_id: str, request: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Error in chat: {str(e)}\n\nTraceback: {error_trace}")
 
 
-@router.delete("/{agent_id}")
-async def delete_agent_endpoint(agent_id: str):
+@router.post("/{agent_id}/chat/stream")
+async def stream_chat_with_agent(agent_id: str, request: ChatRequest):
+    """Chat with a specific agent, streamed as Server-Sent Events (see utils/chat_stream.py)."""
+    from fastapi.responses import StreamingResponse
+    from backend.utils.chat_stream import SSE_HEADERS, stream_chat_run
+    
+    try:
+        agent, session_id, session = await _prepare_agent_chat(agent_id, request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in chat stream with agent {agent_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error in chat: {str(e)}")
+    
+    events = stream_chat_run(
+        agent, request.message, session, session_id, request.message,
+        extract_response=_agent_chat_response
+    )
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+def _delete_agent_endpoint(agent_id: str):
     """Delete an agent (MasterAgent or NoteBookAgent)."""
     try:
         agent = load_agent(agent_id)
@@ -647,7 +640,7 @@ async def delete_agent_endpoint(agent_id: str):
                         # Recursively delete sub-agent by calling this endpoint again
                         # This ensures proper cleanup (removing from parent's sub_agent_ids, etc.)
                         # Note: This will also remove sub_id from current agent's sub_agent_ids
-                        await delete_agent_endpoint(sub_id)
+                        _delete_agent_endpoint(sub_id)
                     else:
                         # Sub-agent doesn't exist, remove from sub_agent_ids
                         agent._remove_sub_agent_by_id(sub_id)
@@ -682,11 +675,15 @@ async def delete_agent_endpoint(agent_id: str):
         raise HTTPException(status_code=500, detail=f"Error deleting agent: {str(e)}")
 
 
-@router.post("/reset-database")
-async def reset_database():
+@router.delete("/{agent_id}")
+async def delete_agent_endpoint(agent_id: str):
+    """Delete an agent (MasterAgent or NoteBookAgent)."""
+    return await async_db.run_db(_delete_agent_endpoint, agent_id)
+
+
+def _reset_database():
     """Reset database to initial state: delete all agents and sessions, create TopLevelAgent and MasterAgent."""
     try:
-        import sqlite3
         from backend.database.session_db import delete_session, list_sessions
         from backend.utils.agent_manager import get_agent_manager
         
@@ -694,23 +691,17 @@ async def reset_database():
         
         # Step 1: Clear AgentManager cache
         agent_manager = get_agent_manager()
-        agent_manager._agent_cache.clear()
+        agent_manager.clear_cache()
         print("[reset_database] Cleared AgentManager cache")
         
         # Step 2: Delete all agents from database
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Get all agent IDs
-        cursor.execute("SELECT id FROM agents")
-        agent_ids = [row[0] for row in cursor.fetchall()]
-        print(f"[reset_database] Found {len(agent_ids)} agents to delete")
-        
-        # Delete all agents
-        cursor.execute("DELETE FROM agents")
-        deleted_agents_count = cursor.rowcount
-        conn.commit()
-        conn.close()
+        with get_manager(db_path).transaction() as conn:
+            # Get all agent IDs
+            agent_ids = [row[0] for row in conn.execute("SELECT id FROM agents").fetchall()]
+            print(f"[reset_database] Found {len(agent_ids)} agents to delete")
+            
+            # Delete all agents
+            deleted_agents_count = conn.execute("DELETE FROM agents").rowcount
         print(f"[reset_database] Deleted {deleted_agents_count} agents from database")
         
         # Step 3: Delete all sessions
@@ -762,3 +753,9 @@ async def reset_database():
         print(f"Error resetting database: {str(e)}")
         print(f"Traceback: {error_trace}")
         raise HTTPException(status_code=500, detail=f"Error resetting database: {str(e)}")
+
+
+@router.post("/reset-database")
+async def reset_database():
+    """Reset database to initial state: delete all agents and sessions, create TopLevelAgent and MasterAgent."""
+    return await async_db.run_db(_reset_database)
@@ -0,0 +1,57 @@
+"""Background job API routes (status, progress and result of e.g. notebook creation)."""
+
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from backend.database import async_db, job_db
+from backend.utils.job_engine import get_job_engine, is_resumable
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+@router.get("")
+async def list_jobs(session_id: Optional[str] = None, status: Optional[str] = None, limit: int = 50):
+    """List jobs, newest first (optionally of one session and/or with one status)."""
+    try:
+        jobs = await async_db.run_db(job_db.list_jobs, session_id=session_id, status=status, limit=limit)
+        return {"jobs": jobs}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing jobs: {str(e)}")
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Get a job: status (queued/running/succeeded/failed/cancelled), progress, result and error."""
+    job = await async_db.run_db(job_db.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job."""
+    job = await async_db.run_db(job_db.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job['status'] not in job_db.ACTIVE_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} has already finished ({job['status']})")
+    if not get_job_engine().cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is running in another worker process")
+    return {"id": job_id, "cancelled": True}
+
+
+@router.post("/{job_id}/resume")
+async def resume_job(job_id: str):
+    """Resume a failed or cancelled job; notebook creation only generates the sections still missing."""
+    job = await async_db.run_db(job_db.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job['status'] not in ('failed', 'cancelled'):
+        raise HTTPException(status_code=409, detail=f"Only failed or cancelled jobs can be resumed (status: {job['status']})")
+    if not is_resumable(job['kind']):
+        raise HTTPException(status_code=400, detail=f"Jobs of kind {job['kind']} cannot be resumed")
+    # Scheduled on this event loop (the claim is one short write)
+    resumed = get_job_engine().resume(job_id)
+    if resumed is None:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} has already been resumed")
+    return resumed
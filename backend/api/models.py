@@ -23,6 +23,7 @@ class MessageType(str, Enum):
     """消息类型枚举"""
     REGULAR = "regular"  # 普通消息
     OUTLINE = "outline"  # 大纲
+    NOTEBOOK_CREATING = "notebook_creating"  # 笔记本正在后台创建（后台任务）
     NOTEBOOK_CREATED = "notebook_created"  # 笔记本创建完成
     QUESTION = "question"  # 题目
     ADD_TO_NOTEBOOK = "add_to_notebook"  # 值得添加到笔记的内容
@@ -38,9 +39,10 @@ class StructuredMessageData(BaseModel):
     file_path: Optional[str] = Field(None, description="文件路径（当 message_type 为 outline 时）")
     user_request: Optional[str] = Field(None, description="用户请求（当 message_type 为 outline 时）")
     
-    # 笔记本创建相关字段（message_type = "notebook_created"）
+    # 笔记本创建相关字段（message_type = "notebook_created" / "notebook_creating"）
     notebook_id: Optional[str] = Field(None, description="笔记本ID（当 message_type 为 notebook_created 时）")
-    notebook_title: Optional[str] = Field(None, description="笔记本标题（当 message_type 为 notebook_created 时）")
+    notebook_title: Optional[str] = Field(None, description="笔记本标题（当 message_type 为 notebook_created 或 notebook_creating 时）")
+    job_id: Optional[str] = Field(None, description="后台创建任务ID（当 message_type 为 notebook_creating 时）")
     
     # 题目相关字段（message_type = "question"）
     question_text: Optional[str] = Field(None, description="题目文本（当 message_type 为 question 时）")
@@ -67,7 +69,10 @@ class SessionResponse(BaseModel):
 
 
 class ConversationsResponse(BaseModel):
-    conversations: List[Dict[str, str]]
+    conversations: List[Dict[str, Any]]
+    # Set when the request was paginated (limit/before/after)
+    has_more: bool = False
+    next_cursor: Optional[int] = None
 
 
 class TracingResponse(BaseModel):
@@ -2,19 +2,21 @@
 
 from fastapi import APIRouter, HTTPException
 from backend.database.agent_db import load_agent, delete_agent
+from backend.database.notebook_content_db import load_section
+from backend.database import async_db
 from backend.agent.NoteBookAgent import NoteBookAgent
 from backend.agent.BaseAgent import AgentType
 from backend.api.utils import _serialize_agent_card
 from backend.tools.utils import generate_markdown_from_agent
+from backend.utils.agent_manager import get_agent_manager
 
 router = APIRouter(prefix="/api/notebooks", tags=["notebooks"])
 
 
-@router.get("/{notebook_id}")
-async def get_notebook(notebook_id: str):
-    """Get notebook agent by ID."""
+def _get_notebook(notebook_id: str):
+    """Get notebook agent by ID (served from the AgentManager cache while current)."""
     try:
-        agent = load_agent(notebook_id)
+        agent = get_agent_manager().get_agent(notebook_id)
         if not agent:
             raise HTTPException(status_code=404, detail="Notebook not found")
         
@@ -58,25 +60,105 @@ async def get_notebook(notebook_id: str):
         raise HTTPException(status_code=500, detail=f"Error getting notebook: {str(e)}")
 
 
-@router.get("/{notebook_id}/content")
-async def get_notebook_content(notebook_id: str, format: str = None):
+@router.get("/{notebook_id}")
+async def get_notebook(notebook_id: str):
+    """Get notebook agent by ID."""
+    return await async_db.run_db(_get_notebook, notebook_id)
+
+
+def _serialize_section(section_data) -> dict:
+    """Convert a Section model into the JSON structure returned by the content endpoint."""
+    return {
+        "section_title": section_data.section_title,
+        "introduction": section_data.introduction,
+        "concept_blocks": [
+            {
+                "definition": block.definition,
+                "examples": [
+                    {
+                        "question": ex.question,
+                        "answer": ex.answer,
+                        "proof": ex.proof
+                    }
+                    for ex in block.examples
+                ],
+                "notes": block.notes,
+                "theorems": [
+                    {
+                        "theorem": th.theorem,
+                        "proof": th.proof,
+                        "examples": [
+                            {
+                                "question": ex.question,
+                                "answer": ex.answer,
+                                "proof": ex.proof
+                            }
+                            for ex in th.examples
+                        ]
+                    }
+                    for th in block.theorems
+                ]
+            }
+            for block in section_data.concept_blocks
+        ],
+        "standalone_examples": [
+            {
+                "question": ex.question,
+                "answer": ex.answer,
+                "proof": ex.proof
+            }
+            for ex in section_data.standalone_examples
+        ],
+        "standalone_notes": section_data.standalone_notes,
+        "summary": section_data.summary,
+        "exercises": [
+            {
+                "question": ex.question,
+                "answer": ex.answer,
+                "proof": ex.proof
+            }
+            for ex in section_data.exercises
+        ]
+    }
+
+
+def _get_notebook_content(notebook_id: str, format: str = None, section: str = None):
     """Get notebook content as structured data (JSON) or markdown fallback.
     
     Args:
         notebook_id: The notebook ID
         format: Optional format parameter. If set to 'markdown', always returns markdown format with XML tags.
                 Otherwise returns structured data if available, or markdown as fallback.
+        section: Optional section ID or title. If set, only that section is returned as structured data
+                 (read from the normalized content tables without loading the notebook when available).
     """
     try:
-        # Clear cache to ensure we get the latest data from database
-        try:
-            from backend.utils.agent_manager import get_agent_manager
-            get_agent_manager().clear_cache(notebook_id)
-        except Exception:
-            pass  # If AgentManager is not available, continue with load_agent
+        if section and not (format and format.lower() == 'markdown'):
+            section_data = (
+                load_section(notebook_id, section_id=section)
+                or load_section(notebook_id, section_title=section)
+            )
+            if section_data is None:
+                # Inline storage: fall back to loading the whole notebook
+                agent = get_agent_manager().get_agent(notebook_id)
+                if not agent:
+                    raise HTTPException(status_code=404, detail="Notebook not found")
+                section_data = next(
+                    (
+                        sec for title, sec in (getattr(agent, 'sections', None) or {}).items()
+                        if section in (title, sec.id)
+                    ),
+                    None
+                )
+            if section_data is None:
+                raise HTTPException(status_code=404, detail=f"Section not found: {section}")
+            return {
+                "format": "structured",
+                "section": _serialize_section(section_data)
+            }
         
-        # Force reload from database (bypass any potential caching)
-        agent = load_agent(notebook_id, db_path=None)
+        # Cached instance if its version matches the database, else reloaded
+        agent = get_agent_manager().get_agent(notebook_id)
         
         # Verify agent was loaded correctly
         if not agent:
@@ -116,58 +198,7 @@ async def get_notebook_content(notebook_id: str, format: str = None):
             
             sections_dict = {}
             for section_title, section_data in agent.sections.items():
-                sections_dict[section_title] = {
-                    "section_title": section_data.section_title,
-                    "introduction": section_data.introduction,
-                    "concept_blocks": [
-                        {
-                            "definition": block.definition,
-                            "examples": [
-                                {
-                                    "question": ex.question,
-                                    "answer": ex.answer,
-                                    "proof": ex.proof
-                                }
-                                for ex in block.examples
-                            ],
-                            "notes": block.notes,
-                            "theorems": [
-                                {
-                                    "theorem": th.theorem,
-                                    "proof": th.proof,
-                                    "examples": [
-                                        {
-                                            "question": ex.question,
-                                            "answer": ex.answer,
-                                            "proof": ex.proof
-                                        }
-                                        for ex in th.examples
-                                    ]
-                                }
-                                for th in block.theorems
-                            ]
-                        }
-                        for block in section_data.concept_blocks
-                    ],
-                    "standalone_examples": [
-                        {
-                            "question": ex.question,
-                            "answer": ex.answer,
-                            "proof": ex.proof
-                        }
-                        for ex in section_data.standalone_examples
-                    ],
-                    "standalone_notes": section_data.standalone_notes,
-                    "summary": section_data.summary,
-                    "exercises": [
-                        {
-                            "question": ex.question,
-                            "answer": ex.answer,
-                            "proof": ex.proof
-                        }
-                        for ex in section_data.exercises
-                    ]
-                }
+                sections_dict[section_title] = _serialize_section(section_data)
             
             return {
                 "format": "structured",
@@ -187,11 +218,17 @@ async def get_notebook_content(notebook_id: str, format: str = None):
         raise HTTPException(status_code=500, detail=f"Error getting notebook content: {str(e)}")
 
 
+@router.get("/{notebook_id}/content")
+async def get_notebook_content(notebook_id: str, format: str = None, section: str = None):
+    """Get notebook content as structured data (JSON) or markdown fallback (see _get_notebook_content)."""
+    return await async_db.run_db(_get_notebook_content, notebook_id, format, section)
+
+
 @router.post("/{notebook_id}/split")
 async def split_notebook(notebook_id: str):
     """Split a notebook into multiple smaller notebooks."""
     try:
-        agent = load_agent(notebook_id)
+        agent = await async_db.load_agent(notebook_id)
         if not agent:
             raise HTTPException(status_code=404, detail="Notebook not found")
         
@@ -223,8 +260,7 @@ async def split_notebook(notebook_id: str):
         raise HTTPException(status_code=500, detail=f"Error splitting notebook: {str(e)}")
 
 
-@router.delete("/{notebook_id}")
-async def delete_notebook(notebook_id: str):
+def _delete_notebook(notebook_id: str):
     """Delete a notebook agent."""
     try:
         agent = load_agent(notebook_id)
@@ -249,3 +285,9 @@ async def delete_notebook(notebook_id: str):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting notebook: {str(e)}")
+
+
+@router.delete("/{notebook_id}")
+async def delete_notebook(notebook_id: str):
+    """Delete a notebook agent."""
+    return await async_db.run_db(_delete_notebook, notebook_id)
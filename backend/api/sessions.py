@@ -1,13 +1,12 @@
 """Session management API routes."""
 
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from backend.api.models import SessionCreateRequest, SessionResponse, ConversationsResponse, TracingResponse
-from backend.database.session_db import (
-    create_session,
-    list_sessions,
-    delete_session,
-    get_conversations,
-)
+from backend.database import async_db
+from backend.utils.chat_stream import SSE_HEADERS, format_sse
+from backend.utils.trace_feed import get_trace_feed
 from backend.utils.tracing_collector import get_traces, get_current_activity, clear_traces
 
 router = APIRouter(prefix="/api/sessions", tags=["sessions"])
@@ -17,28 +16,43 @@ router = APIRouter(prefix="/api/sessions", tags=["sessions"])
 async def create_top_level_agent_session(request: SessionCreateRequest):
     """Create a new session."""
     try:
-        session_data = create_session(title=request.title)
+        session_data = await async_db.create_session(title=request.title)
         return SessionResponse(**session_data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating session: {str(e)}")
 
 
 @router.get("")
-async def list_top_level_agent_sessions():
-    """List all sessions."""
+async def list_top_level_agent_sessions(limit: Optional[int] = None, before: Optional[str] = None, after: Optional[str] = None):
+    """
+    List all sessions.
+    
+    Without parameters all sessions are returned; with limit/before/after one page
+    (newest first) plus has_more and next_cursor.
+    """
     try:
-        sessions = list_sessions()
-        return {"sessions": sessions}
+        if limit is None and before is None and after is None:
+            sessions = await async_db.list_sessions()
+            return {"sessions": sessions}
+        return await async_db.list_sessions_page(limit or 50, before, after)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing sessions: {str(e)}")
 
 
 @router.get("/{session_id}/conversations", response_model=ConversationsResponse)
-async def get_session_conversations(session_id: str):
-    """Get conversations for a session."""
+async def get_session_conversations(session_id: str, limit: Optional[int] = None, before: Optional[int] = None, after: Optional[int] = None):
+    """
+    Get conversations for a session.
+    
+    Without parameters the whole history is returned; with limit the latest messages,
+    and before/after (conversation IDs) page to older/newer messages.
+    """
     try:
-        conversations = get_conversations(session_id)
-        return ConversationsResponse(conversations=conversations)
+        if limit is None and before is None and after is None:
+            conversations = await async_db.get_conversations(session_id)
+            return ConversationsResponse(conversations=conversations)
+        page = await async_db.get_conversations_page(session_id, limit or 50, before, after)
+        return ConversationsResponse(**page)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting conversations: {str(e)}")
 
@@ -54,6 +68,29 @@ async def get_session_tracing(session_id: str, limit: int = 100):
         raise HTTPException(status_code=500, detail=f"Error getting tracing: {str(e)}")
 
 
+@router.get("/{session_id}/tracing/stream")
+async def stream_session_tracing(session_id: str, request: Request, last_event_id: Optional[int] = None):
+    """
+    Follow tracing information for a session as Server-Sent Events (see utils/trace_feed.py).
+    
+    Only changes are sent; a reconnecting client resumes after its Last-Event-ID header
+    (or last_event_id query parameter).
+    """
+    header = request.headers.get("last-event-id")
+    if header is not None and header.strip().isdigit():
+        last_event_id = int(header.strip())
+
+    async def events():
+        async for item in get_trace_feed().subscribe(session_id, last_event_id):
+            if item is None:
+                yield ": keep-alive\n\n"
+                continue
+            event_id, event, data = item
+            yield format_sse(event, data, event_id=event_id)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 @router.delete("/{session_id}/tracing")
 async def clear_session_tracing(session_id: str):
     """Clear tracing information for a session."""
@@ -68,7 +105,7 @@ async def clear_session_tracing(session_id: str):
 async def delete_session_endpoint(session_id: str):
     """Delete a session."""
     try:
-        deleted = delete_session(session_id)
+        deleted = await async_db.delete_session(session_id)
         if not deleted:
             raise HTTPException(status_code=404, detail="Session not found")
         return {"message": "Session deleted successfully"}
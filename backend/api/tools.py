@@ -4,11 +4,11 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
 import json
-from backend.database.tools_db import get_all_tools, get_tool as get_tool_from_db
 from backend.tools.tool_registry import get_tool_registry
 from backend.tools.tool_discovery import init_tool_system
 from backend.tools.utils import generate_tools_usage_for_agent
 from backend.tools.utils.tool_usage_generator import format_tool_usage
+from backend.database import async_db
 
 router = APIRouter(prefix="/api/tools", tags=["tools"])
 
@@ -29,14 +29,13 @@ class ExecuteToolResponse(BaseModel):
 async def sync_tools():
     """Force sync all tools from registry to database."""
     try:
-        init_tool_system()
+        await async_db.run_db(init_tool_system)
         return {'message': 'Tools synced successfully'}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error syncing tools: {str(e)}")
 
 
-@router.post("/cleanup")
-async def cleanup_old_tools():
+def _cleanup_old_tools():
     """Remove old tools from database that are no longer registered."""
     try:
         from backend.database.tools_db import get_all_tools, delete_tool
@@ -79,11 +78,17 @@ async def cleanup_old_tools():
         raise HTTPException(status_code=500, detail=f"Error cleaning up tools: {str(e)}\n\nTraceback: {error_trace}")
 
 
+@router.post("/cleanup")
+async def cleanup_old_tools():
+    """Remove old tools from database that are no longer registered."""
+    return await async_db.run_db(_cleanup_old_tools)
+
+
 @router.get("")
 async def list_tools():
     """List all tools."""
     try:
-        tools = get_all_tools()
+        tools = await async_db.get_all_tools()
         registry = get_tool_registry()
         
         # Add usage documentation for each tool
@@ -105,7 +110,7 @@ async def list_tools():
 async def get_tool(tool_id: str):
     """Get a tool by ID."""
     try:
-        tool = get_tool_from_db(tool_id)
+        tool = await async_db.get_tool(tool_id)
         if not tool:
             raise HTTPException(status_code=404, detail="Tool not found")
         return tool
@@ -126,7 +131,7 @@ async def get_agent_as_tool_details(tool_id: str):
         tool_type = None
         agent_class_name = None
         
-        tool = get_tool_from_db(tool_id)
+        tool = await async_db.get_tool(tool_id)
         if tool:
             tool_type = tool.get('tool_type', 'function')
             agent_class_name = tool.get('agent_class_name')
@@ -333,7 +338,7 @@ async def execute_tool(tool_id: str, request: ExecuteToolRequest):
             raise HTTPException(status_code=404, detail=f"Tool not found: {tool_id}")
         
         # Get tool from database to check tool_type
-        tool_db = get_tool_from_db(tool_id)
+        tool_db = await async_db.get_tool(tool_id)
         tool_type = tool_db.get('tool_type', 'function') if tool_db else 'function'
         
         # Create a dummy agent for function tools that require an agent
@@ -381,7 +386,7 @@ async def execute_tool(tool_id: str, request: ExecuteToolRequest):
                 # For agent_as_tool, the tool is already an agent instance wrapped as tool
                 # The parameters were used to initialize the agent instance
                 # Now we need to run the agent with a message
-                from agents import Runner
+                from backend.utils.llm_scheduler import run_agent
                 
                 # Get the agent instance from the tool
                 agent_instance = getattr(tool_instance, '_agent_instance', None)
@@ -417,7 +422,7 @@ async def execute_tool(tool_id: str, request: ExecuteToolRequest):
                     message = str(message)
                 
                 # Run the agent
-                result = await Runner.run(agent_instance, message)
+                result = await run_agent(agent_instance, message)
                 
                 # Extract final output if available
                 if hasattr(result, 'final_output'):
@@ -1,7 +1,9 @@
 """TopLevelAgent API routes."""
 
 from fastapi import APIRouter, HTTPException
-from agents import Runner, SQLiteSession, RunConfig
+from fastapi.responses import StreamingResponse
+from agents import RunConfig
+from backend.utils.llm_scheduler import run_agent
 from backend.api.models import (
     ChatRequest, SourceChatRequest, ChatResponse, SessionCreateRequest, SessionResponse,
     StructuredMessageData, MessageType, ConversationsResponse
@@ -11,12 +13,12 @@ from backend.agent.TopLevelAgent import TopLevelAgent
 from backend.agent.MasterAgent import MasterAgent
 from backend.agent.NoteBookAgent import NoteBookAgent
 from backend.agent.BaseAgent import AgentType
-from backend.tools.utils import get_all_agent_info
+from backend.tools.utils import get_agent_tree_info
 from backend.models import AgentCard
-from backend.database.session_db import create_session, list_sessions, delete_session, get_conversations
+from backend.database import async_db
+from backend.database.conversation_session import ConversationSession
 from backend.utils.tracing_collector import track_agent_run
-from backend.database.agent_db import get_db_path
-from backend.database.session_db import add_conversation
+from backend.utils.chat_stream import SSE_HEADERS, stream_chat_run
 from typing import Optional
 import os
 import base64
@@ -30,30 +32,17 @@ router = APIRouter(prefix="/api/top-level-agent", tags=["top-level-agent"])
 async def get_top_level_agent_info():
     """Get information about the TopLevelAgent."""
     try:
-        agent = get_top_level_agent()
+        agent = await async_db.run_db(get_top_level_agent)
         
         # Ensure sub_agent_ids is not None
         if not hasattr(agent, 'sub_agent_ids') or agent.sub_agent_ids is None:
             agent.sub_agent_ids = []
-            agent.save_to_db()
+            await async_db.run_db(agent.save_to_db)
         
-        # Ensure tools is not None (critical for Runner.run)
-        if not hasattr(agent, 'tools') or agent.tools is None:
-            # Try to recreate tools
-            if hasattr(agent, '_recreate_tools'):
-                try:
-                    agent._recreate_tools()
-                except Exception as e:
-                    print(f"Warning: Failed to recreate tools: {e}")
-                    agent.tools = []
-                else:
-                    agent.tools = []
-        
-        # Get agent card (this internally calls get_all_agent_info with agent_dict)
+        # Sub-agent overview from the hierarchy index (one query, no agent is loaded)
         # Note: TopLevelAgent.agent_card() returns a string, not an AgentCard object
         # So we need to create a proper agent card structure
-        agent_dict = agent._load_sub_agents_dict() if hasattr(agent, '_load_sub_agents_dict') else {}
-        all_agent_info = get_all_agent_info(agent_dict)
+        all_agent_info = await async_db.run_db(get_agent_tree_info, agent.id)
         
         # Create agent card structure for TopLevelAgent
         from backend.models import AgentCard
@@ -78,60 +67,43 @@ async def get_top_level_agent_info():
         raise HTTPException(status_code=500, detail=f"Error getting agent info: {str(e)}")
 
 
+async def _prepare_chat(request: ChatRequest):
+    """
+    准备普通聊天：加载并绑定 TopLevelAgent，创建会话（如需要），记录用户消息
+    
+    Returns:
+        (agent, session_id, session)
+    """
+    # .env 的修改由 runtime_config 快照检测（get_top_level_agent 中的 _update_model_settings）
+    agent = await async_db.run_db(get_top_level_agent)
+    
+    # Ensure sub_agent_ids is not None
+    if not hasattr(agent, 'sub_agent_ids') or agent.sub_agent_ids is None:
+        agent.sub_agent_ids = []
+        await async_db.run_db(agent.save_to_db)
+    
+    # Bind tools and instructions before Runner.run (memoized; rebound only when the agent list or prompt changed)
+    await async_db.run_db(agent.bind_for_run)
+    
+    # Create session if not provided
+    session_id = request.session_id
+    if not session_id:
+        session_data = await async_db.create_session()
+        session_id = session_data['id']
+    
+    # Session history (SDK items) and transcript live in the main database;
+    # the whole turn is written in one transaction when it ends
+    session = ConversationSession(session_id)
+    session.add_message("user", request.message)
+    
+    return agent, session_id, session
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_top_level_agent(request: ChatRequest):
     """普通聊天 - 只支持文本消息，使用session管理对话历史"""
     try:
-        # 确保使用最新的 .env 文件中的 API key
-        try:
-            from dotenv import load_dotenv
-            from pathlib import Path
-            project_root = Path(__file__).parent.parent.parent
-            env_path = project_root / ".env"
-            if env_path.exists():
-                load_dotenv(env_path, override=True)
-        except Exception:
-            pass  # 如果无法加载 .env，继续使用系统环境变量
-        
-        agent = get_top_level_agent()
-        
-        # Ensure sub_agent_ids is not None
-        if not hasattr(agent, 'sub_agent_ids') or agent.sub_agent_ids is None:
-            agent.sub_agent_ids = []
-            agent.save_to_db()
-        
-        # Ensure tools is not None (critical for Runner.run)
-        if not hasattr(agent, 'tools') or agent.tools is None:
-            # Try to recreate tools
-            if hasattr(agent, '_recreate_tools'):
-                try:
-                    agent._recreate_tools()
-                except Exception as e:
-                    print(f"Warning: Failed to recreate tools: {e}")
-                    agent.tools = []
-            else:
-                agent.tools = []
-        
-        # Create session if not provided
-        session_id = request.session_id
-        if not session_id:
-            session_data = create_session()
-            session_id = session_data['id']
-        
-        # Create SQLiteSession for maintaining conversation context
-        db_path = get_db_path()
-        db_dir = os.path.dirname(db_path)
-        session_db_path = os.path.join(db_dir, "session_history.db")
-        
-        # Ensure directory exists
-        os.makedirs(db_dir, exist_ok=True)
-        
-        # Create SQLiteSession instance - this will maintain conversation history
-        session = SQLiteSession(session_id, session_db_path)
-        
-        # Add user message to session (for our own tracking)
-        from backend.database.session_db import add_conversation
-        add_conversation(session_id, "user", request.message)
+        agent, session_id, session = await _prepare_chat(request)
         
         # Use simple string message with session (no images, no files)
         runner_message = request.message
@@ -141,14 +113,15 @@ async def chat_with_top_level_agent(request: ChatRequest):
         from backend.utils.tracing_collector import track_agent_run
         
         tool_logging_hook = ToolLoggingHook()
-        with track_agent_run(session_id, agent, request.message):
-            result = await Runner.run(agent, runner_message, session=session, hooks=tool_logging_hook)
-        
-        # Extract response and structured data
-        response_text, structured_data = _extract_response(result, user_message=request.message)
-        
-        # Add assistant response to session
-        add_conversation(session_id, "assistant", response_text)
+        async with session.turn():
+            with track_agent_run(session_id, agent, request.message):
+                result = await run_agent(agent, runner_message, session=session, hooks=tool_logging_hook)
+            
+            # Extract response and structured data
+            response_text, structured_data = _extract_response(result, user_message=request.message)
+            
+            # Add assistant response to session
+            session.add_message("assistant", response_text)
         
         return ChatResponse(response=response_text, session_id=session_id, structured_data=structured_data)
     except HTTPException:
@@ -161,202 +134,184 @@ async def chat_with_top_level_agent(request: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Error in chat: {str(e)}\n\nTraceback: {error_trace}")
 
 
-@router.post("/source-chat", response_model=ChatResponse)
-async def source_chat_with_top_level_agent(request: SourceChatRequest):
-    """带文件的聊天 - 支持文件上传和图片，手动管理对话历史"""
-    try:
-        # 检查环境变量中的 API key
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise HTTPException(
-                status_code=500, 
-                detail="OPENAI_API_KEY 环境变量未设置。请确保在启动服务器前设置了正确的 API key。"
-            )
-        if not api_key.startswith('sk-'):
-            raise HTTPException(
-                status_code=500,
-                detail=f"OPENAI_API_KEY 格式不正确。API key 应该以 'sk-' 开头，但当前值以 '{api_key[:10]}...' 开头。"
-            )
-        
-        agent = get_top_level_agent()
-        
-        # Ensure sub_agent_ids is not None
-        if not hasattr(agent, 'sub_agent_ids') or agent.sub_agent_ids is None:
-            agent.sub_agent_ids = []
-            agent.save_to_db()
-        
-        # Ensure tools is not None (critical for Runner.run)
-        if not hasattr(agent, 'tools') or agent.tools is None:
-            # Try to recreate tools
-            if hasattr(agent, '_recreate_tools'):
-                try:
-                    agent._recreate_tools()
-                except Exception as e:
-                    print(f"Warning: Failed to recreate tools: {e}")
-                    agent.tools = []
-            else:
-                agent.tools = []
-        
-        # Create session if not provided
-        session_id = request.session_id
-        if not session_id:
-            session_data = create_session()
-            session_id = session_data['id']
-        
-        # Build user message
-        user_message = request.message or ""
-        
-        # Prepare file content if file_path is provided
-        # OpenAI API 的 input_file 只支持 PDF，其他文件类型需要读取内容作为文本发送
-        file_content_item = None
-        file_text_content = None
-        if request.file_path:
-            # 解析文件路径（支持相对路径和仅文件名）
-            from backend.tools.agent_as_tools.section_creators.utils import _resolve_file_path
-            resolved_file_path = _resolve_file_path(request.file_path)
-            
-            file_name = os.path.basename(resolved_file_path)
-            file_ext = os.path.splitext(resolved_file_path)[1].lower()
-            
-            if file_ext == '.pdf':
-                # PDF 文件：使用 input_file 类型（OpenAI API 支持）
-                try:
-                    with open(resolved_file_path, "rb") as f:
-                        file_bytes = f.read()
-                        file_content_b64 = base64.b64encode(file_bytes).decode("utf-8")
-                    
-                    # 创建 input_file 类型的消息内容（参考 Pdf.md 示例）
-                    file_content_item = {
-                        "type": "input_file",
-                        "file_data": f"data:application/pdf;base64,{file_content_b64}",
-                        "filename": file_name,
-                    }
-                except Exception as e:
-                    print(f"Warning: Failed to read PDF file {request.file_path} (解析后: {resolved_file_path}): {e}")
-                    file_content_item = None
-            else:
-                # 非 PDF 文件（Markdown、Word 等）：读取内容作为文本
-                try:
-                    from backend.tools.agent_as_tools.section_creators.utils import get_file_content
-                    # get_file_content 内部会解析路径，但我们已经解析过了，直接使用解析后的路径
-                    file_text_content = get_file_content(resolved_file_path)
-                    
-                    # 将文件内容添加到用户消息中
-                    file_info = f"\n\n**上传的文件：{file_name}**\n\n文件内容：\n```\n{file_text_content}\n```"
-                    user_message = user_message + file_info if user_message.strip() else f"请根据以下文件内容创建笔记本。{file_info}"
-                except Exception as e:
-                    print(f"Warning: Failed to read file content {request.file_path}: {e}")
-                    # Fallback to old method if file reading fails
-                    file_info = f"\n\n我需要上传文件并创建笔记本。\n文件路径：{request.file_path}\n文件名：{file_name}\n\n请调用 generate_outline 工具，参数为：\n- file_path: \"{request.file_path}\"\n- user_request: \"{user_message.strip() or '请根据文件内容创建笔记本'}\""
-                    user_message = user_message + file_info if user_message.strip() else f"请处理上传的文件并创建笔记本。{file_info}"
-        
-        # Create SQLiteSession for maintaining conversation context
-        # This will automatically manage conversation history
-        db_path = get_db_path()
-        db_dir = os.path.dirname(db_path)
-        session_db_path = os.path.join(db_dir, "session_history.db")
-        os.makedirs(db_dir, exist_ok=True)
-        session = SQLiteSession(session_id, session_db_path)
-        
-        # Add user message to our own tracking database
-        from backend.database.session_db import add_conversation
-        add_conversation(session_id, "user", user_message if user_message.strip() else "[文件/图片消息]")
-        
-        # Build new messages for current request
-        # 参考示例代码，使用 session_input_callback 处理文件/图片上传
-        # Check if we have images or files that need special handling
-        has_file_or_image = (file_content_item is not None) or (request.images and len(request.images) > 0)
-        
-        if has_file_or_image:
-            # 如果有文件或图片，使用 session with session_input_callback
-            # 这样可以合并列表输入（文件/图片）与会话历史
-            
-            # Build message array: first message with file/images, then text message
-            # 参考示例代码的格式
-            content_items = []
-            
-            # 添加文件（如果有）
-            if file_content_item:
-                content_items.append(file_content_item)
-            
-            # 添加图片（如果有）
-            if request.images and len(request.images) > 0:
-                content_items.extend(request.images)
-            
-            # 构建消息数组
-            messages_for_runner = [
-                {
-                    "role": "user",
-                    "content": content_items,  # List of file/image objects
-                }
-            ]
-            
-            # Add text message if provided
-            if user_message and user_message.strip():
-                messages_for_runner.append({
-                    "role": "user",
-                    "content": user_message,
-                })
-            
-            # Define session_input_callback to merge list input with session history
-            # 参考示例代码中的实现
-            async def session_input_callback(new_input, history):
-                """
-                将新的列表输入（包含文件/图片）与已有的对话历史合并
+async def _prepare_source_chat(request: SourceChatRequest):
+    """
+    准备带文件的聊天：检查 API key，加载并绑定 TopLevelAgent，创建会话（如需要），
+    构建包含文件/图片的输入，记录用户消息
+    
+    Returns:
+        (agent, session_id, session, runner_message, user_message, run_config)
+    """
+    # 检查环境变量中的 API key
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise HTTPException(
+            status_code=500, 
+            detail="OPENAI_API_KEY 环境变量未设置。请确保在启动服务器前设置了正确的 API key。"
+        )
+    if not api_key.startswith('sk-'):
+        raise HTTPException(
+            status_code=500,
+            detail=f"OPENAI_API_KEY 格式不正确。API key 应该以 'sk-' 开头，但当前值以 '{api_key[:10]}...' 开头。"
+        )
+    
+    agent = await async_db.run_db(get_top_level_agent)
+    
+    # Ensure sub_agent_ids is not None
+    if not hasattr(agent, 'sub_agent_ids') or agent.sub_agent_ids is None:
+        agent.sub_agent_ids = []
+        await async_db.run_db(agent.save_to_db)
+    
+    # Bind tools and instructions before Runner.run (memoized; rebound only when the agent list or prompt changed)
+    await async_db.run_db(agent.bind_for_run)
+    
+    # Create session if not provided
+    session_id = request.session_id
+    if not session_id:
+        session_data = await async_db.create_session()
+        session_id = session_data['id']
+    
+    # Build user message
+    user_message = request.message or ""
+    
+    # Prepare file content if file_path is provided
+    # OpenAI API 的 input_file 只支持 PDF，其他文件类型需要读取内容作为文本发送
+    file_content_item = None
+    file_text_content = None
+    if request.file_path:
+        # 解析文件路径（支持相对路径和仅文件名）
+        from backend.tools.agent_as_tools.section_creators.utils import _resolve_file_path
+        resolved_file_path = _resolve_file_path(request.file_path)
+        
+        file_name = os.path.basename(resolved_file_path)
+        file_ext = os.path.splitext(resolved_file_path)[1].lower()
+        
+        if file_ext == '.pdf':
+            # PDF 文件：使用 input_file 类型（OpenAI API 支持）
+            try:
+                with open(resolved_file_path, "rb") as f:
+                    file_bytes = f.read()
+                    file_content_b64 = base64.b64encode(file_bytes).decode("utf-8")
                 
-                Args:
-                    new_input: 新的输入（列表格式，包含文件/图片）
-                    history: 已有的对话历史（从session获取）
+                # 创建 input_file 类型的消息内容（参考 Pdf.md 示例）
+                file_content_item = {
+                    "type": "input_file",
+                    "file_data": f"data:application/pdf;base64,{file_content_b64}",
+                    "filename": file_name,
+                }
+            except Exception as e:
+                print(f"Warning: Failed to read PDF file {request.file_path} (解析后: {resolved_file_path}): {e}")
+                file_content_item = None
+        else:
+            # 非 PDF 文件（Markdown、Word 等）：读取内容作为文本
+            try:
+                from backend.tools.agent_as_tools.section_creators.utils import get_file_content
+                # get_file_content 内部会解析路径，但我们已经解析过了，直接使用解析后的路径
+                file_text_content = get_file_content(resolved_file_path)
                 
-                Returns:
-                    合并后的输入列表
-                """
-                # 将历史记录和新的输入合并
-                return history + new_input
-            
-            runner_message = messages_for_runner
-            use_session = True
-            use_callback = True
+                # 将文件内容添加到用户消息中
+                file_info = f"\n\n**上传的文件：{file_name}**\n\n文件内容：\n```\n{file_text_content}\n```"
+                user_message = user_message + file_info if user_message.strip() else f"请根据以下文件内容创建笔记本。{file_info}"
+            except Exception as e:
+                print(f"Warning: Failed to read file content {request.file_path}: {e}")
+                # Fallback to old method if file reading fails
+                file_info = f"\n\n我需要上传文件并创建笔记本。\n文件路径：{request.file_path}\n文件名：{file_name}\n\n请调用 generate_outline 工具，参数为：\n- file_path: \"{request.file_path}\"\n- user_request: \"{user_message.strip() or '请根据文件内容创建笔记本'}\""
+                user_message = user_message + file_info if user_message.strip() else f"请处理上传的文件并创建笔记本。{file_info}"
+    
+    # Session history (SDK items) and transcript live in the main database;
+    # the whole turn is written in one transaction when it ends
+    session = ConversationSession(session_id)
+    
+    # Build new messages for current request
+    # 参考示例代码，使用 session_input_callback 处理文件/图片上传
+    # Check if we have images or files that need special handling
+    has_file_or_image = (file_content_item is not None) or (request.images and len(request.images) > 0)
+    
+    if has_file_or_image:
+        # 如果有文件或图片，使用 session with session_input_callback
+        # 这样可以合并列表输入（文件/图片）与会话历史
+        
+        # Build message array: first message with file/images, then text message
+        # 参考示例代码的格式
+        content_items = []
+        
+        # 添加文件（如果有）
+        if file_content_item:
+            content_items.append(file_content_item)
+        
+        # 添加图片（如果有）
+        if request.images and len(request.images) > 0:
+            content_items.extend(request.images)
+        
+        # 构建消息数组
+        messages_for_runner = [
+            {
+                "role": "user",
+                "content": content_items,  # List of file/image objects
+            }
+        ]
+        
+        # Add text message if provided
+        if user_message and user_message.strip():
+            messages_for_runner.append({
+                "role": "user",
+                "content": user_message,
+            })
+        
+        # Define session_input_callback to merge list input with session history
+        # 参考示例代码中的实现
+        async def session_input_callback(new_input, history):
+            """
+            将新的列表输入（包含文件/图片）与已有的对话历史合并
             
-            # Store user message (without file/images) to database for tracking
-            # 文件/图片内容不存储在数据库中，只存储文本消息
-            add_conversation(session_id, "user", user_message if user_message.strip() else "[文件/图片消息]")
-        else:
-            # No images, just text message - use session normally
-            runner_message = user_message
-            use_session = True
-            use_callback = False
+            Args:
+                new_input: 新的输入（列表格式，包含文件/图片）
+                history: 已有的对话历史（从session获取）
             
-            # Store user message to database for tracking
-            add_conversation(session_id, "user", user_message)
+            Returns:
+                合并后的输入列表
+            """
+            # 将历史记录和新的输入合并
+            return history + new_input
+        
+        runner_message = messages_for_runner
+        run_config = RunConfig(session_input_callback=session_input_callback)
+        
+        # Store user message (without file/images) to database for tracking
+        # 文件/图片内容不存储在数据库中，只存储文本消息
+        session.add_message("user", user_message if user_message.strip() else "[文件/图片消息]")
+    else:
+        # No images, just text message - use session normally
+        runner_message = user_message
+        run_config = None
+        
+        # Store user message to database for tracking
+        session.add_message("user", user_message)
+    
+    return agent, session_id, session, runner_message, user_message, run_config
+
+
+@router.post("/source-chat", response_model=ChatResponse)
+async def source_chat_with_top_level_agent(request: SourceChatRequest):
+    """带文件的聊天 - 支持文件上传和图片，手动管理对话历史"""
+    try:
+        agent, session_id, session, runner_message, user_message, run_config = await _prepare_source_chat(request)
         
         # Run agent with tracing and tool logging hooks
         from backend.utils.tool_logging_hooks import ToolLoggingHook
         from backend.utils.tracing_collector import track_agent_run
         
         tool_logging_hook = ToolLoggingHook()
-        with track_agent_run(session_id, agent, user_message):
-            if use_session and use_callback:
-                # Use session with callback for file/image inputs
-                result = await Runner.run(
-                    agent,
-                    runner_message,
-                    session=session,
-                    hooks=tool_logging_hook,
-                    run_config=RunConfig(session_input_callback=session_input_callback)
-                )
-            elif use_session:
-                # Use session normally for text-only messages
-                result = await Runner.run(agent, runner_message, session=session, hooks=tool_logging_hook)
-            else:
-                # Fallback: manual history management (should not happen now)
-                result = await Runner.run(agent, runner_message, session=None, hooks=tool_logging_hook)
-        
-        # Extract response and structured data
-        response_text, structured_data = _extract_response(result, user_message=user_message)
-        
-        # Add assistant response to session
-        add_conversation(session_id, "assistant", response_text)
+        async with session.turn():
+            with track_agent_run(session_id, agent, user_message):
+                # 有文件/图片时 run_config 带 session_input_callback（合并列表输入与会话历史）
+                result = await run_agent(agent, runner_message, session=session, hooks=tool_logging_hook, run_config=run_config)
+            
+            # Extract response and structured data
+            response_text, structured_data = _extract_response(result, user_message=user_message)
+            
+            # Add assistant response to session
+            session.add_message("assistant", response_text)
         
         return ChatResponse(response=response_text, session_id=session_id, structured_data=structured_data)
     except HTTPException:
@@ -369,6 +324,43 @@ async def source_chat_with_top_level_agent(request: SourceChatRequest):
         raise HTTPException(status_code=500, detail=f"Error in source-chat: {str(e)}\n\nTraceback: {error_trace}")
 
 
+@router.post("/chat/stream")
+async def stream_chat_with_top_level_agent(request: ChatRequest):
+    """普通聊天（流式）- 以 Server-Sent Events 推送回复文本、工具调用和子agent活动，最后一个事件是 ChatResponse"""
+    try:
+        agent, session_id, session = await _prepare_chat(request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in chat stream: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error in chat: {str(e)}")
+    
+    events = stream_chat_run(
+        agent, request.message, session, session_id, request.message,
+        extract_response=lambda result: _extract_response(result, user_message=request.message)
+    )
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/source-chat/stream")
+async def stream_source_chat_with_top_level_agent(request: SourceChatRequest):
+    """带文件的聊天（流式）- 事件同 /chat/stream"""
+    try:
+        agent, session_id, session, runner_message, user_message, run_config = await _prepare_source_chat(request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in source-chat stream: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error in source-chat: {str(e)}")
+    
+    events = stream_chat_run(
+        agent, runner_message, session, session_id, user_message,
+        extract_response=lambda result: _extract_response(result, user_message=user_message),
+        run_config=run_config
+    )
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 def _extract_response(result, user_message: str = None):
     """
     提取响应和结构化数据的辅助函数
@@ -447,6 +439,16 @@ def _handle_tool_output(final_output) -> tuple:
                         user_request=parsed.get('user_request')
                     )
                     return message_text, structured_data
+                elif 'job_id' in parsed and parsed.get('status') == 'queued':
+                    # 笔记本在后台任务中创建，前端轮询 /api/jobs/{job_id}
+                    message_text = parsed.get('message', '⏳ 笔记本正在后台创建，完成后会通知您。')
+                    structured_data = StructuredMessageData(
+                        message_type=MessageType.NOTEBOOK_CREATING,
+                        message=message_text,
+                        notebook_title=parsed.get('notebook_title'),
+                        job_id=parsed.get('job_id')
+                    )
+                    return message_text, structured_data
                 elif 'notebook_id' in parsed and 'notebook_title' in parsed:
                     # 工具返回的笔记本创建格式
                     notebook_title = parsed.get('notebook_title')
@@ -482,28 +484,43 @@ def _handle_tool_output(final_output) -> tuple:
 async def create_top_level_agent_session(request: SessionCreateRequest):
     """Create a new session for TopLevelAgent."""
     try:
-        session_data = create_session(title=request.title if hasattr(request, 'title') else None)
+        session_data = await async_db.create_session(title=request.title if hasattr(request, 'title') else None)
         return SessionResponse(**session_data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating session: {str(e)}")
 
 
 @router.get("/sessions")
-async def list_top_level_agent_sessions():
-    """List all sessions for TopLevelAgent."""
+async def list_top_level_agent_sessions(limit: Optional[int] = None, before: Optional[str] = None, after: Optional[str] = None):
+    """
+    List all sessions for TopLevelAgent.
+    
+    Without parameters all sessions are returned; with limit/before/after one page
+    (newest first) plus has_more and next_cursor.
+    """
     try:
-        sessions = list_sessions()
-        return {"sessions": sessions}
+        if limit is None and before is None and after is None:
+            sessions = await async_db.list_sessions()
+            return {"sessions": sessions}
+        return await async_db.list_sessions_page(limit or 50, before, after)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing sessions: {str(e)}")
 
 
 @router.get("/sessions/{session_id}/conversations", response_model=ConversationsResponse)
-async def get_top_level_agent_session_conversations(session_id: str):
-    """Get conversations for a specific session."""
+async def get_top_level_agent_session_conversations(session_id: str, limit: Optional[int] = None, before: Optional[int] = None, after: Optional[int] = None):
+    """
+    Get conversations for a specific session.
+    
+    Without parameters the whole history is returned; with limit the latest messages,
+    and before/after (conversation IDs) page to older/newer messages.
+    """
     try:
-        conversations = get_conversations(session_id)
-        return ConversationsResponse(conversations=conversations)
+        if limit is None and before is None and after is None:
+            conversations = await async_db.get_conversations(session_id)
+            return ConversationsResponse(conversations=conversations)
+        page = await async_db.get_conversations_page(session_id, limit or 50, before, after)
+        return ConversationsResponse(**page)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting conversations: {str(e)}")
 
@@ -512,7 +529,7 @@ async def get_top_level_agent_session_conversations(session_id: str):
 async def delete_top_level_agent_session(session_id: str):
     """Delete a session."""
     try:
-        success = delete_session(session_id)
+        success = await async_db.delete_session(session_id)
         if success:
             return {"message": "Session deleted successfully"}
         else:
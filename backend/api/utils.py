@@ -1,9 +1,11 @@
 """Utility functions for API routes."""
 
+import threading
 from typing import Optional
 from backend.agent.TopLevelAgent import TopLevelAgent
 from backend.agent.MasterAgent import MasterAgent
-from backend.database.agent_db import load_all_agents
+from backend.agent.BaseAgent import AgentType
+from backend.database.agent_db import find_agents_by_type, find_child_agents, get_manager, load_agent
 from backend.models import AgentCard
 
 
@@ -19,35 +21,39 @@ def _serialize_agent_card(agent_card_result):
 
 # Global TopLevelAgent instance (singleton pattern)
 _top_level_agent: Optional[TopLevelAgent] = None
+# Serializes the bootstrap between threads (e.g. startup warm-up and the first request)
+_bootstrap_lock = threading.Lock()
 
 
-def get_top_level_agent() -> TopLevelAgent:
-    """Get or create the TopLevelAgent instance."""
+def _bootstrap_top_level_agent() -> None:
+    """Find or create TopLevelAgent and its root MasterAgent (cleaning up duplicate MasterAgents)."""
     global _top_level_agent
-    if _top_level_agent is None:
-        # Use AgentManager to wake up TopLevelAgent
-        from backend.utils.agent_manager import get_agent_manager, wake_agent
+    # Only the existence checks and inserts hold the write lock: with several worker processes
+    # one at a time finds or creates TopLevelAgent and its MasterAgent; waking the agents and
+    # cleaning up duplicates run outside the transaction
+    from backend.utils.agent_manager import get_agent_manager, wake_agent
+    touched_ids = []
+    try:
+        created = None
+        with get_manager().transaction():
+            # Try to find TopLevelAgent in database (header query, no unpickling)
+            top_level_headers = find_agents_by_type(AgentType.TOP_LEVEL)
+            top_level_agent_id = top_level_headers[0]['id'] if top_level_headers else None
+            if not top_level_agent_id:
+                # Create new one
+                created = TopLevelAgent()
+                created.save_to_db()
         
-        # Try to find TopLevelAgent in database
-        agents = load_all_agents()
-        top_level_agent_id = None
-        for agent_id, agent in agents.items():
-            if isinstance(agent, TopLevelAgent):
-                top_level_agent_id = agent_id
-                break
-        
-        if top_level_agent_id:
+        if created is not None:
+            # Cached only once the insert is committed (its row version is then real)
+            _top_level_agent = created
+            get_agent_manager().cache_agent(_top_level_agent, pinned=True)
+        else:
             # Wake up existing TopLevelAgent
             _top_level_agent = wake_agent(top_level_agent_id)
             # Force update model settings for TopLevelAgent (important: may have old model from DB)
-            from backend.utils.agent_manager import get_agent_manager
             get_agent_manager()._update_model_settings(_top_level_agent)
-        else:
-            # Create new one
-            _top_level_agent = TopLevelAgent()
-            _top_level_agent.save_to_db()
-            # Cache it
-            get_agent_manager()._agent_cache[_top_level_agent.id] = _top_level_agent
+        touched_ids.append(_top_level_agent.id)
         
         # Ensure sub_agent_ids is not None after loading
         if not hasattr(_top_level_agent, 'sub_agent_ids') or _top_level_agent.sub_agent_ids is None:
@@ -64,7 +70,6 @@ def get_top_level_agent() -> TopLevelAgent:
         # Check if it has any MasterAgent in sub_agent_ids OR in database
         has_master_agent = False
         master_agent_id = None
-        # Note: load_all_agents is already imported at the top of the file
         
         # First check sub_agent_ids
         sub_agent_ids = getattr(_top_level_agent, 'sub_agent_ids', None) or []
@@ -82,41 +87,44 @@ def get_top_level_agent() -> TopLevelAgent:
         
         # If not found in sub_agent_ids, check database for MasterAgent with matching parent_agent_id
         if not has_master_agent:
-            all_agents = load_all_agents(_top_level_agent.DB_PATH)
-            for agent_id, agent in all_agents.items():
-                if isinstance(agent, MasterAgent):
-                    parent_id = getattr(agent, 'parent_agent_id', None)
-                    if parent_id == _top_level_agent.id:
-                        has_master_agent = True
-                        master_agent_id = agent_id
-                        print(f"[get_top_level_agent] Found MasterAgent in database: {agent_id}")
-                        # Add to sub_agent_ids if not already there
-                        if agent_id not in sub_agent_ids:
-                            _top_level_agent._add_sub_agents(agent_id)
-                            from backend.utils.agent_manager import get_agent_manager
-                            get_agent_manager().mark_modified(_top_level_agent.id)
-                        break
+            master_headers = find_child_agents(_top_level_agent.id, AgentType.MASTER, _top_level_agent.DB_PATH)
+            if master_headers:
+                agent_id = master_headers[0]['id']
+                has_master_agent = True
+                master_agent_id = agent_id
+                print(f"[get_top_level_agent] Found MasterAgent in database: {agent_id}")
+                # Add to sub_agent_ids if not already there
+                if agent_id not in sub_agent_ids:
+                    _top_level_agent._add_sub_agents(agent_id)
+                    from backend.utils.agent_manager import get_agent_manager
+                    get_agent_manager().mark_modified(_top_level_agent.id)
         
         # If still no MasterAgent found, create one (but only if we really don't have one)
         if not has_master_agent:
-            print(f"[get_top_level_agent] No MasterAgent found, creating new one...")
-            root_master = MasterAgent("Top Master Agent", parent_agent_id=_top_level_agent.id, DB_PATH=_top_level_agent.DB_PATH)
-            # New MasterAgent should be saved immediately (it doesn't exist in DB yet)
-            root_master.save_to_db()
-            # Cache it
-            from backend.utils.agent_manager import get_agent_manager
-            get_agent_manager()._agent_cache[root_master.id] = root_master
+            root_master = None
+            with get_manager().transaction():
+                # Another worker process may have created it since the check above
+                master_headers = find_child_agents(_top_level_agent.id, AgentType.MASTER, _top_level_agent.DB_PATH)
+                if master_headers:
+                    master_agent_id = master_headers[0]['id']
+                else:
+                    print(f"[get_top_level_agent] No MasterAgent found, creating new one...")
+                    root_master = MasterAgent("Top Master Agent", parent_agent_id=_top_level_agent.id, DB_PATH=_top_level_agent.DB_PATH)
+                    # New MasterAgent should be saved immediately (it doesn't exist in DB yet)
+                    root_master.save_to_db()
+                    master_agent_id = root_master.id
+                _top_level_agent._add_sub_agents(master_agent_id)
             
-            _top_level_agent._add_sub_agents(root_master.id)
-            master_agent_id = root_master.id
-            print(f"[get_top_level_agent] Created new MasterAgent: {master_agent_id}")
+            if root_master is not None:
+                # Cache it (once committed)
+                get_agent_manager().cache_agent(root_master, pinned=True)
+                print(f"[get_top_level_agent] Created new MasterAgent: {master_agent_id}")
             # Update instructions
-            agent_dict = _top_level_agent._load_sub_agents_dict()
-            from backend.tools.utils import get_all_agent_info
+            from backend.tools.utils import get_agent_tree_info
             from backend.prompts.prompt_loader import load_prompt
             instructions = load_prompt(
                 "top_level_agent",
-                variables={"agents_list": get_all_agent_info(agent_dict)}
+                variables={"agents_list": get_agent_tree_info(_top_level_agent.id, db_path=_top_level_agent.DB_PATH)}
             )
             _top_level_agent.instructions = instructions
             get_agent_manager().mark_modified(_top_level_agent.id)
@@ -175,20 +183,44 @@ def get_top_level_agent() -> TopLevelAgent:
                         print(f"[get_top_level_agent] Error cleaning up duplicate MasterAgent {dup_id}: {e}")
                 
                 # Also check database for other MasterAgents with same parent_agent_id
-                all_agents = load_all_agents(_top_level_agent.DB_PATH)
-                for agent_id, agent in all_agents.items():
-                    if isinstance(agent, MasterAgent) and agent_id != master_agent_id:
-                        parent_id = getattr(agent, 'parent_agent_id', None)
-                        if parent_id == _top_level_agent.id:
-                            # Found another duplicate MasterAgent
-                            dup_sub_agent_ids = getattr(agent, 'sub_agent_ids', None) or []
-                            if len(dup_sub_agent_ids) == 0:
-                                # No children, safe to delete
-                                from backend.database.agent_db import delete_agent
-                                if delete_agent(agent_id, _top_level_agent.DB_PATH):
-                                    print(f"[get_top_level_agent] Deleted duplicate MasterAgent from database: {agent_id}")
-                                else:
-                                    print(f"[get_top_level_agent] Failed to delete duplicate MasterAgent: {agent_id}")
+                for header in find_child_agents(_top_level_agent.id, AgentType.MASTER, _top_level_agent.DB_PATH):
+                    agent_id = header['id']
+                    if agent_id == master_agent_id:
+                        continue
+                    # Found another duplicate MasterAgent
+                    agent = load_agent(agent_id, _top_level_agent.DB_PATH)
+                    if agent is None:
+                        continue
+                    dup_sub_agent_ids = getattr(agent, 'sub_agent_ids', None) or []
+                    if len(dup_sub_agent_ids) == 0:
+                        # No children, safe to delete
+                        from backend.database.agent_db import delete_agent
+                        if delete_agent(agent_id, _top_level_agent.DB_PATH):
+                            print(f"[get_top_level_agent] Deleted duplicate MasterAgent from database: {agent_id}")
+                        else:
+                            print(f"[get_top_level_agent] Failed to delete duplicate MasterAgent: {agent_id}")
+        
+        get_agent_manager().save_if_modified(_top_level_agent)
+    except BaseException:
+        _top_level_agent = None
+        # Saves of a rolled-back transaction left versions that were never written on these agents
+        for agent_id in touched_ids:
+            get_agent_manager().clear_cache(agent_id)
+        raise
+
+
+def get_top_level_agent() -> TopLevelAgent:
+    """Get or create the TopLevelAgent instance."""
+    global _top_level_agent
+    if _top_level_agent is not None:
+        # Another worker process may have saved it since: wake_agent reloads it if the cached version is outdated
+        from backend.utils.agent_manager import wake_agent
+        _top_level_agent = wake_agent(_top_level_agent.id, db_path=_top_level_agent.DB_PATH) or _top_level_agent
+    
+    if _top_level_agent is None:
+        with _bootstrap_lock:
+            if _top_level_agent is None:
+                _bootstrap_top_level_agent()
     
     # Final safety check before returning
     if not hasattr(_top_level_agent, 'sub_agent_ids') or _top_level_agent.sub_agent_ids is None:
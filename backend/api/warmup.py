@@ -0,0 +1,116 @@
+"""Startup warm-up - 启动预热
+
+After the application starts, a background task preloads the agents the first
+requests need into AgentManager and binds them (tools + rendered instructions, see
+BaseAgent.bind_for_run):
+
+1. TopLevelAgent (bootstrapped with its root MasterAgent if needed)
+2. The MasterAgents directly under it
+3. The WARMUP_NOTEBOOKS (default 8) most recently updated NoteBookAgents
+
+GET /ready reports the warm-up state and answers 503 until it has finished, so a
+readiness probe holds traffic until then. A failed warm-up only means the first
+requests take the cold path, so it still reports ready. Set WARMUP_ENABLED=0 to skip it.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {
+    'status': 'pending',  # pending -> warming -> ready | failed
+    'started_at': None,
+    'finished_at': None,
+    'agents': 0,
+    'error': None,
+}
+_task: Optional[asyncio.Task] = None
+
+
+def _update_state(**fields: Any) -> None:
+    with _lock:
+        _state.update(fields)
+
+
+def get_warmup_state() -> Dict[str, Any]:
+    """Current warm-up state (status, started_at, finished_at, agents, error)."""
+    with _lock:
+        return dict(_state)
+
+
+def is_ready() -> bool:
+    """Whether the warm-up has finished (successfully or not)."""
+    with _lock:
+        return _state['status'] in ('ready', 'failed')
+
+
+def warm_up_agents(notebook_limit: int) -> int:
+    """
+    Preload and bind TopLevelAgent, its MasterAgents and the most recently updated notebooks (blocking).
+
+    Args:
+        notebook_limit: Number of notebooks to preload
+
+    Returns:
+        Number of agents preloaded
+    """
+    from backend.agent.BaseAgent import AgentType
+    from backend.api.utils import get_top_level_agent
+    from backend.database.agent_db import find_child_agents, find_recent_agents
+    from backend.utils.agent_manager import get_agent_manager
+
+    manager = get_agent_manager()
+    top_level_agent = get_top_level_agent()
+    top_level_agent.bind_for_run()
+    warmed = 1
+
+    tool_names = [getattr(t, '_tool_id', 'unknown') for t in top_level_agent.tools or []]
+    missing = [t for t in ('send_message', 'generate_outline') if t not in tool_names]
+    if missing:
+        print(f"[Warmup] ⚠️  WARNING: TopLevelAgent is missing tools: {missing}")
+    else:
+        print(f"[Warmup] TopLevelAgent has {len(tool_names)} tools: {tool_names}")
+
+    db_path = top_level_agent.DB_PATH
+    headers = find_child_agents(top_level_agent.id, AgentType.MASTER, db_path)
+    headers += find_recent_agents(AgentType.NOTEBOOK, notebook_limit, db_path)
+    for header in headers:
+        try:
+            agent = manager.wake_agent(header['id'], db_path=db_path)
+            if agent is not None:
+                agent.bind_for_run()
+                warmed += 1
+        except Exception as e:
+            print(f"[Warmup] Could not preload {header['type']} agent {header['id']}: {e}")
+    return warmed
+
+
+async def run_warmup() -> None:
+    """Run the warm-up on the database executor and record its outcome."""
+    from backend.database.async_db import run_db
+
+    started = time.monotonic()
+    _update_state(status='warming', started_at=datetime.now().isoformat())
+    try:
+        warmed = await run_db(warm_up_agents, int(os.getenv('WARMUP_NOTEBOOKS', '8')))
+        _update_state(status='ready', agents=warmed, finished_at=datetime.now().isoformat())
+        print(f"[Warmup] Ready: {warmed} agent(s) preloaded in {time.monotonic() - started:.2f}s")
+    except Exception as e:
+        _update_state(status='failed', error=str(e), finished_at=datetime.now().isoformat())
+        print(f"[Warmup] ⚠️  Warm-up failed, first requests will load agents on demand: {e}")
+        traceback.print_exc()
+
+
+def start_warmup() -> None:
+    """Start the warm-up in the background (call from the startup event)."""
+    global _task
+    if os.getenv('WARMUP_ENABLED', '1') == '0':
+        _update_state(status='ready', finished_at=datetime.now().isoformat())
+        return
+    if _task is None or _task.done():
+        _task = asyncio.get_running_loop().create_task(run_warmup())
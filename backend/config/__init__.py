@@ -10,6 +10,7 @@ from backend.config.model_config import (
     get_section_maker_model_settings,
     get_default_model
 )
+from backend.config.runtime_config import ConfigSnapshot, get_config, reload_config
 
 __all__ = [
     "DEFAULT_MODEL",
@@ -20,5 +21,8 @@ __all__ = [
     "get_model_name",
     "get_section_maker_model_settings",
     "get_default_model",
+    "ConfigSnapshot",
+    "get_config",
+    "reload_config",
 ]
 
@@ -0,0 +1,156 @@
+"""Runtime configuration snapshot - 运行时配置快照
+
+The .env file and backend/config/model_config.py are read once into an immutable
+ConfigSnapshot. get_config() returns the current snapshot; at most once per
+CONFIG_CHECK_INTERVAL_SECONDS (default 2, 0 checks on every call) it compares the
+modification times of both files and, if one changed, reloads it and publishes a new
+snapshot with the next generation number.
+
+Agents remember the generation they were configured with (agent._config_generation),
+so AgentManager re-applies model settings and the API key only when it changes:
+
+    config = get_config()
+    if getattr(agent, '_config_generation', None) != config.generation:
+        ...  # apply config.model_name / config.model_settings / config.api_key
+"""
+
+import copy
+import importlib
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from agents import ModelSettings
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+ENV_PATH = PROJECT_ROOT / ".env"
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Configuration as of one load of .env and model_config.py."""
+    generation: int
+    model_name: str
+    model_settings: ModelSettings
+    api_key: Optional[str]
+    # Values defined in the .env file (empty if there is none)
+    env: Mapping[str, Optional[str]]
+    env_mtime: Optional[float]
+    model_config_mtime: Optional[float]
+
+    def new_model_settings(self) -> ModelSettings:
+        """A copy of the model settings for one agent (agents may modify theirs)."""
+        return copy.deepcopy(self.model_settings)
+
+
+_lock = threading.Lock()
+_snapshot: Optional[ConfigSnapshot] = None
+_last_check = 0.0
+
+
+def _mtime(path: Path) -> Optional[float]:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+def _load_env_file(env_mtime: Optional[float]) -> Mapping[str, Optional[str]]:
+    """Load .env into os.environ (overriding earlier values) and return its values."""
+    if env_mtime is None:
+        return MappingProxyType({})
+    try:
+        from dotenv import dotenv_values
+    except ImportError:
+        print("[Config] python-dotenv not installed, using system environment variables")
+        return MappingProxyType({})
+    values = dotenv_values(ENV_PATH)
+    for key, value in values.items():
+        if value is not None:
+            os.environ[key] = value
+    return MappingProxyType(dict(values))
+
+
+def _build_snapshot(previous: Optional[ConfigSnapshot]) -> ConfigSnapshot:
+    """Reload the files that changed since the previous snapshot and build a new one."""
+    from backend.config import model_config
+
+    env_mtime = _mtime(ENV_PATH)
+    if previous is None or env_mtime != previous.env_mtime:
+        env = _load_env_file(env_mtime)
+        if previous is None:
+            if env_mtime is None:
+                print(f"[Config] No .env file found at {ENV_PATH}, using system environment variables")
+            else:
+                print(f"[Config] Loaded .env file from {ENV_PATH}")
+        else:
+            print("[Config] .env changed, reloaded")
+    else:
+        env = previous.env
+
+    config_mtime = _mtime(Path(model_config.__file__))
+    if previous is not None and config_mtime != previous.model_config_mtime:
+        # Functions imported from model_config read the reloaded module globals
+        importlib.reload(model_config)
+        print("[Config] model_config.py changed, reloaded")
+
+    return ConfigSnapshot(
+        generation=previous.generation + 1 if previous is not None else 1,
+        model_name=model_config.get_model_name(),
+        model_settings=model_config.get_model_settings(),
+        api_key=os.getenv('OPENAI_API_KEY'),
+        env=env,
+        env_mtime=env_mtime,
+        model_config_mtime=config_mtime,
+    )
+
+
+def _files_changed(snapshot: ConfigSnapshot) -> bool:
+    from backend.config import model_config
+    return (
+        _mtime(ENV_PATH) != snapshot.env_mtime
+        or _mtime(Path(model_config.__file__)) != snapshot.model_config_mtime
+    )
+
+
+def get_config() -> ConfigSnapshot:
+    """
+    Get the current configuration snapshot (reloaded if .env or model_config.py changed).
+
+    Returns:
+        The current ConfigSnapshot
+    """
+    global _snapshot, _last_check
+    snapshot = _snapshot
+    now = time.monotonic()
+    interval = float(os.getenv('CONFIG_CHECK_INTERVAL_SECONDS', '2'))
+    if snapshot is not None and now - _last_check < interval:
+        return snapshot
+
+    with _lock:
+        if _snapshot is None or _files_changed(_snapshot):
+            _snapshot = _build_snapshot(_snapshot)
+        _last_check = now
+        return _snapshot
+
+
+def reload_config() -> ConfigSnapshot:
+    """
+    Re-read .env and model_config.py now and publish a new snapshot generation.
+
+    Returns:
+        The new ConfigSnapshot
+    """
+    global _snapshot, _last_check
+    with _lock:
+        previous = _snapshot
+        if previous is not None:
+            # Force both files to be re-read
+            previous = replace(previous, env_mtime=-1.0, model_config_mtime=-1.0)
+        _snapshot = _build_snapshot(previous)
+        _last_check = time.monotonic()
+        return _snapshot
@@ -1,6 +1,7 @@
 """Database package - database models and operations."""
 
 from backend.database.agent_db_manager import AgentDBManager
+from backend.database.unit_of_work import UnitOfWork, unit_of_work, current_unit_of_work
 
-__all__ = ['AgentDBManager']
+__all__ = ['AgentDBManager', 'UnitOfWork', 'unit_of_work', 'current_unit_of_work']
 
@@ -1,12 +1,14 @@
 """Agent database operations using SQLite."""
 
 import sqlite3
-import pickle
 import json
 import os
-from typing import Optional, Dict, Any, List, TYPE_CHECKING
+from typing import Optional, Dict, Any, List, Tuple, Callable, TYPE_CHECKING
 from pathlib import Path
 
+from backend.database.connection import get_connection_manager, ConnectionManager
+from backend.database.agent_state import serialize_state, deserialize_agent, decode_state, merge_states, card_from_state
+
 # Import agent classes only for type checking to avoid circular imports
 if TYPE_CHECKING:
     from backend.agent.BaseAgent import BaseAgent, AgentType
@@ -29,139 +31,494 @@ def get_db_path(db_path: Optional[str] = None) -> str:
     return DEFAULT_DB_PATH
 
 
+def get_manager(db_path: Optional[str] = None) -> ConnectionManager:
+    """Get the shared ConnectionManager for a database path (default path if not provided)."""
+    return get_connection_manager(get_db_path(db_path))
+
+
 def init_db(db_path: Optional[str] = None) -> None:
-    """Initialize the database with agents table."""
-    db_path = get_db_path(db_path)
+    """
+    Initialize the database (agents, tools, sessions tables).
     
-    # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(db_path) if os.path.dirname(db_path) else '.', exist_ok=True)
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Create agents table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS agents (
-            id TEXT PRIMARY KEY,
-            type TEXT NOT NULL,
-            name TEXT NOT NULL,
-            parent_agent_id TEXT,
-            sub_agent_ids TEXT,
-            tool_ids TEXT,
-            data BLOB NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Add tool_ids column if it doesn't exist (migration)
-    try:
-        cursor.execute("ALTER TABLE agents ADD COLUMN tool_ids TEXT")
-    except sqlite3.OperationalError:
-        # Column already exists, ignore
-        pass
+    Schema setup and migrations run once per process inside the ConnectionManager,
+    so calling this repeatedly is cheap.
+    """
+    get_manager(db_path).connection()
+
+
+class AgentVersionConflict(Exception):
+    """Raised when an agent was modified concurrently and both edits change the same fields."""
+    
+    def __init__(self, agent_id: str, paths: List[str]):
+        self.agent_id = agent_id
+        self.paths = paths
+        super().__init__(f"Agent {agent_id} was modified concurrently; conflicting fields: {', '.join(paths)}")
+
+
+_UPSERT_AGENT_SQL = """
+    INSERT INTO agents (id, type, name, parent_agent_id, sub_agent_ids, tool_ids, data, card)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        type = excluded.type,
+        name = excluded.name,
+        parent_agent_id = excluded.parent_agent_id,
+        sub_agent_ids = excluded.sub_agent_ids,
+        tool_ids = excluded.tool_ids,
+        data = excluded.data,
+        card = excluded.card,
+        version = agents.version + 1,
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING version
+"""
+
+# Compare-and-swap update: only applies if nobody saved the row since it was loaded
+_CAS_UPDATE_AGENT_SQL = """
+    UPDATE agents SET
+        type = ?,
+        name = ?,
+        parent_agent_id = ?,
+        sub_agent_ids = ?,
+        tool_ids = ?,
+        data = ?,
+        card = ?,
+        version = version + 1,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = ? AND version = ?
+    RETURNING version
+"""
+
+
+def _serialize_agent_row(agent: Any, state: Optional[Dict[str, Any]] = None) -> Tuple[tuple, Dict[str, str], Dict[str, Any]]:
+    """
+    Serialize an agent into the parameter tuple of _UPSERT_AGENT_SQL.
     
-    conn.commit()
-    conn.close()
+    Args:
+        agent: The agent object to serialize
+        state: State to store instead of agent._to_state() (e.g. a merged state)
+        
+    Returns:
+        ((id, type, name, parent_agent_id, sub_agent_ids, tool_ids, data, card), blobs, state) where
+        blobs maps hash -> text for the large strings moved out of data
+    """
+    from backend.database.blob_store import compress_payload
+    
+    # Serialize the agent's authoritative state (tools and SDK objects are rebuilt on load);
+    # large strings go to the blob table and the payload is compressed
+    if state is None:
+        state = agent._to_state()
+    blobs: Dict[str, str] = {}
+    agent_data = compress_payload(serialize_state(type(agent), state, blobs))
+    original_tools = getattr(agent, 'tools', None)
+    
+    # Get sub_agent_ids as JSON string
+    sub_agent_ids_json = json.dumps(state.get('sub_agent_ids', getattr(agent, 'sub_agent_ids', [])))
+    
+    # Get tool_ids from tools (extract tool names/IDs before removing tools);
+    # an agent whose tools were not bound yet keeps the tool_ids it was loaded with
+    tool_ids = []
+    stored_tool_ids = getattr(agent, '_stored_tool_ids', None)
+    if stored_tool_ids is not None:
+        tool_ids = list(stored_tool_ids)
+    elif original_tools:
+        for tool in original_tools:
+            # Try to get tool name/ID
+            tool_name = getattr(tool, 'name', None)
+            if hasattr(tool, 'function') and tool.function:
+                if hasattr(tool.function, '__name__'):
+                    tool_name = tool.function.__name__
+            if tool_name:
+                tool_ids.append(tool_name)
+    tool_ids_json = json.dumps(tool_ids)
+    
+    # Get agent type - handle both AgentType enum and string (default: AgentType.BASE_AGENT)
+    agent_type = getattr(agent, 'type', None)
+    agent_type_str = _type_value(agent_type) if agent_type else "Base Agent"
+    
+    row = (
+        agent.id,
+        agent_type_str,
+        state.get('name', getattr(agent, 'name', '')),
+        state.get('parent_agent_id', getattr(agent, 'parent_agent_id', None)),
+        sub_agent_ids_json,
+        tool_ids_json,
+        agent_data,
+        # The agent's own card, read by get_agent_tree without loading the agent
+        json.dumps(card_from_state(type(agent).__name__, state), ensure_ascii=False)
+    )
+    return row, blobs, state
+
+
+def _save_related_rows(agent: Any, blobs: Dict[str, str], db_path: Optional[str]) -> None:
+    """Write rows stored outside agents.data: blobs and agent-specific rows (e.g. notebook content)."""
+    from backend.database.blob_store import store_blobs
+    store_blobs(agent.id, blobs, db_path)
+    
+    save_related = getattr(agent, '_save_related_rows', None)
+    if save_related is not None:
+        save_related(db_path)
+
+
+def _merge_with_stored(agent: Any, mine: Dict[str, Any], stored_data: bytes, db_path: Optional[str]) -> Dict[str, Any]:
+    """
+    Merge the state being saved with a row another writer saved since the agent was loaded.
+    
+    Raises:
+        AgentVersionConflict: If both sides changed the same fields
+    """
+    base = getattr(agent, '_base_state', None)
+    decoded = decode_state(stored_data, db_path)
+    if base is None or decoded is None:
+        # Legacy pickle on either side: no common ancestor, keep the previous last-writer-wins behavior
+        print(f"[agent_db] Agent {agent.id} was modified concurrently and cannot be merged; overwriting")
+        return mine
+    
+    merged, conflicts = merge_states(base, mine, decoded[1])
+    if conflicts:
+        raise AgentVersionConflict(agent.id, conflicts)
+    return merged
+
+
+def _write_agent(conn, agent: Any, prepared: tuple, db_path: Optional[str]) -> Tuple[int, Dict[str, Any], bool]:
+    """
+    Write one serialized agent inside the caller's transaction.
+    
+    Agents loaded from the database carry the row version they were loaded at
+    (agent._db_version); their row is only updated if it still has that version.
+    Otherwise the concurrent change is merged in (see agent_state.merge_states).
+    
+    Returns:
+        (new row version, state written, whether it was merged with a concurrent update)
+    """
+    row, blobs, state = prepared
+    expected_version = getattr(agent, '_db_version', None)
+    merged = False
+    result = None
+    
+    if expected_version is not None:
+        result = conn.execute(_CAS_UPDATE_AGENT_SQL, row[1:] + (row[0], expected_version)).fetchone()
+        if result is None:
+            current = conn.execute("SELECT version, data FROM agents WHERE id = ?", (agent.id,)).fetchone()
+            if current is not None:
+                # The write lock is held, so the retry against the current version cannot miss
+                state = _merge_with_stored(agent, state, current[1], db_path)
+                row, blobs, state = _serialize_agent_row(agent, state)
+                result = conn.execute(_CAS_UPDATE_AGENT_SQL, row[1:] + (row[0], current[0])).fetchone()
+                merged = True
+    
+    if result is None:
+        # New agent (or the row was deleted meanwhile): insert or update in one statement
+        result = conn.execute(_UPSERT_AGENT_SQL, row).fetchone()
+    
+    _save_related_rows(agent, blobs, db_path)
+    return result[0], state, merged
+
+
+def _mark_saved(agent: Any, version: int, state: Dict[str, Any], merged: bool) -> None:
+    """Remember the saved row version/state on the agent (and apply merged changes)."""
+    mark_saved = getattr(agent, '_mark_saved', None)
+    if mark_saved is not None:
+        mark_saved(version, state, merged)
+    else:
+        agent._db_version = version
+        agent._base_state = state
+
+
+def _save_prepared(prepared: List[Tuple[Any, tuple]], db_path: Optional[str]) -> int:
+    """
+    Write serialized agents in one transaction; raises on failure (nothing is saved then).
+    
+    Raises:
+        AgentVersionConflict: If a concurrent edit of an agent conflicts with the one being saved
+    """
+    results = []
+    with get_manager(db_path).transaction() as conn:
+        for agent, serialized in prepared:
+            results.append((agent,) + _write_agent(conn, agent, serialized, db_path))
+    
+    for agent, version, state, merged in results:
+        _mark_saved(agent, version, state, merged)
+    return len(results)
 
 
 def save_agent(agent: Any, db_path: Optional[str] = None) -> bool:
     """
     Save an agent to the database.
     
+    Agents loaded from the database are written with compare-and-swap on the row
+    version; edits made concurrently by others are merged if they touch other fields.
+    
     Args:
         agent: The agent object to save
         db_path: Optional database path
         
     Returns:
-        True if successful, False otherwise
+        True if successful, False otherwise (including unresolvable concurrent edits)
     """
     try:
-        # Import AgentType locally to avoid circular import
-        from backend.agent.BaseAgent import AgentType
+        _save_prepared([(agent, _serialize_agent_row(agent))], db_path)
+        return True
+    except Exception as e:
+        print(f"Error saving agent: {str(e)}")
+        return False
+
+
+def save_agents(agents: List[Any], db_path: Optional[str] = None) -> Tuple[int, List[str]]:
+    """
+    Save several agents in a single transaction (each agent is serialized once).
+    
+    Each agent is written under its own savepoint: an agent that fails to serialize,
+    or whose concurrent edit cannot be merged, is rolled back alone and the others
+    are still saved.
+    
+    Args:
+        agents: The agent objects to save
+        db_path: Optional database path
         
-        db_path = get_db_path(db_path)
-        init_db(db_path)
+    Returns:
+        (number of agents saved, IDs of the agents that were not saved)
+    """
+    prepared = []
+    failed_ids = []
+    for agent in agents:
+        try:
+            prepared.append((agent, _serialize_agent_row(agent)))
+        except Exception as e:
+            print(f"Error serializing agent {getattr(agent, 'id', '?')}: {str(e)}")
+            failed_ids.append(getattr(agent, 'id', None))
+    
+    if not prepared:
+        return 0, failed_ids
+    
+    results = []
+    try:
+        with get_manager(db_path).transaction() as conn:
+            for agent, serialized in prepared:
+                conn.execute("SAVEPOINT save_agent")
+                try:
+                    results.append((agent,) + _write_agent(conn, agent, serialized, db_path))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO save_agent")
+                    print(f"Error saving agent {agent.id}: {str(e)}")
+                    failed_ids.append(agent.id)
+                finally:
+                    conn.execute("RELEASE save_agent")
+    except Exception as e:
+        print(f"Error saving agents: {str(e)}")
+        return 0, failed_ids + [agent.id for agent, _, _, _ in results]
+    
+    for agent, version, state, merged in results:
+        _mark_saved(agent, version, state, merged)
+    return len(results), failed_ids
+
+
+def update_agent(
+    agent_id: str,
+    mutate: Callable[[Any], None],
+    db_path: Optional[str] = None,
+    retries: int = 3
+) -> Optional[Any]:
+    """
+    Load an agent, apply a change and save it, retrying on conflicting concurrent edits.
+    
+    Each attempt reloads the agent so mutate() is applied to the latest version.
+    
+    Args:
+        agent_id: The agent ID
+        mutate: Function that modifies the loaded agent in place
+        db_path: Optional database path
+        retries: Maximum number of attempts
+        
+    Returns:
+        The saved agent, or None if the agent does not exist
+        
+    Raises:
+        AgentVersionConflict: If every attempt conflicted
+    """
+    for attempt in range(1, retries + 1):
+        agent = load_agent(agent_id, db_path)
+        if agent is None:
+            return None
+        mutate(agent)
+        try:
+            _save_prepared([(agent, _serialize_agent_row(agent))], db_path)
+            return agent
+        except AgentVersionConflict as e:
+            print(f"[agent_db] {e} (attempt {attempt}/{retries})")
+            if attempt == retries:
+                raise
+    return None
+
+
+def get_agent_version(agent_id: str, db_path: Optional[str] = None) -> Optional[int]:
+    """
+    Get the current row version of an agent (primary-key lookup, data is not read).
+    
+    Args:
+        agent_id: The agent ID
+        db_path: Optional database path
         
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+    Returns:
+        The agents.version value, or None if the agent does not exist
+    """
+    db_path = get_db_path(db_path)
+    if not os.path.exists(db_path):
+        return None
+    row = get_manager(db_path).connection().execute(
+        "SELECT version FROM agents WHERE id = ?", (agent_id,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def get_agent_versions(agent_ids: List[str], db_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Get the current row versions of several agents in one query.
+    
+    Args:
+        agent_ids: The agent IDs
+        db_path: Optional database path
         
-        # Temporarily remove tools before serialization (function_tool cannot be pickled)
-        original_tools = getattr(agent, 'tools', None)
-        agent.tools = None
+    Returns:
+        Dict agent_id -> version (agents that do not exist are missing)
+    """
+    db_path = get_db_path(db_path)
+    if not agent_ids or not os.path.exists(db_path):
+        return {}
+    placeholders = ", ".join("?" for _ in agent_ids)
+    rows = get_manager(db_path).connection().execute(
+        f"SELECT id, version FROM agents WHERE id IN ({placeholders})", list(agent_ids)
+    ).fetchall()
+    return {agent_id: version for agent_id, version in rows}
+
+
+def get_agent_events(after_id: Optional[int], db_path: Optional[str] = None) -> Tuple[int, Dict[str, Optional[int]], bool]:
+    """
+    Read the agent change log (written by triggers on every save and delete, see migration 13).
+    
+    Args:
+        after_id: Last event ID already seen (None: just return the current position)
+        db_path: Optional database path
+        
+    Returns:
+        (last event ID, {agent_id: latest version or None if deleted}, complete).
+        complete is False if events after after_id were already pruned from the log.
+    """
+    conn = get_manager(db_path).connection()
+    if after_id is None:
+        row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM agent_events").fetchone()
+        return row[0], {}, True
+    rows = conn.execute(
+        "SELECT id, agent_id, version FROM agent_events WHERE id > ? ORDER BY id", (after_id,)
+    ).fetchall()
+    if not rows:
+        return after_id, {}, True
+    # Pruning removes the oldest events: nothing was lost while the last seen one is still there
+    complete = rows[0][0] == after_id + 1 or conn.execute(
+        "SELECT 1 FROM agent_events WHERE id = ?", (after_id,)
+    ).fetchone() is not None
+    changes = {agent_id: version for _, agent_id, version in rows}
+    return rows[-1][0], changes, complete
+
+
+# Walks sub_agent_ids (in list order) from the root; ids of deleted agents drop out in the join
+_AGENT_TREE_SQL = """
+    WITH RECURSIVE tree(id, parent_id, depth, position) AS (
+        SELECT ?, NULL, 0, 0
+        UNION ALL
+        SELECT CAST(child.value AS TEXT), tree.id, tree.depth + 1, child.key
+        FROM tree
+        JOIN agents parent ON parent.id = tree.id
+        JOIN json_each(CASE WHEN json_valid(parent.sub_agent_ids) THEN parent.sub_agent_ids ELSE '[]' END) child
+        WHERE tree.depth < ?
+    )
+    SELECT agents.id, agents.type, agents.name, agents.parent_agent_id, tree.parent_id, agents.card,
+           agents.version,
+           (SELECT COUNT(*) FROM json_each(CASE WHEN json_valid(agents.sub_agent_ids) THEN agents.sub_agent_ids ELSE '[]' END) sub
+            JOIN agents existing ON existing.id = sub.value),
+           tree.depth
+    FROM tree JOIN agents ON agents.id = tree.id
+    ORDER BY tree.depth, tree.position
+"""
+
+
+def get_agent_tree(agent_id: str, depth: int, db_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    An agent and its descendants down to `depth` levels, with their cards, in one query.
+    
+    Built from the header columns (sub_agent_ids, card) only; no agent is loaded.
+    
+    Args:
+        agent_id: The root agent ID
+        depth: Number of levels below the root to include
+        db_path: Optional database path
         
+    Returns:
+        Nested node dicts {id, type, name, parent_agent_id, card, version, sub_agent_count,
+        children}, or None if the agent does not exist. card is {title, description, outline}.
+    """
+    db_path = get_db_path(db_path)
+    if not os.path.exists(db_path):
+        return None
+    try:
+        rows = get_manager(db_path).connection().execute(_AGENT_TREE_SQL, (agent_id, max(depth, 0))).fetchall()
+    except sqlite3.Error as e:
+        print(f"Error reading the hierarchy of agent {agent_id}: {str(e)}")
+        return None
+    
+    nodes: Dict[str, Dict[str, Any]] = {}
+    root = None
+    for row_id, agent_type, name, parent_agent_id, tree_parent_id, card_json, version, sub_agent_count, row_depth in rows:
+        if row_id in nodes:
+            # Listed twice (inconsistent sub_agent_ids); keep the first occurrence
+            continue
         try:
-            # Serialize agent data using pickle
-            agent_data = pickle.dumps(agent)
-        finally:
-            # Restore tools after serialization
-            agent.tools = original_tools
-        
-        # Get sub_agent_ids as JSON string
-        sub_agent_ids_json = json.dumps(getattr(agent, 'sub_agent_ids', []))
-        
-        # Get tool_ids from tools (extract tool names/IDs before removing tools)
-        tool_ids = []
-        if original_tools:
-            for tool in original_tools:
-                # Try to get tool name/ID
-                tool_name = getattr(tool, 'name', None)
-                if hasattr(tool, 'function') and tool.function:
-                    if hasattr(tool.function, '__name__'):
-                        tool_name = tool.function.__name__
-                if tool_name:
-                    tool_ids.append(tool_name)
-        tool_ids_json = json.dumps(tool_ids)
-        
-        # Get agent type - handle both AgentType enum and string
-        agent_type = getattr(agent, 'type', AgentType.BASE_AGENT)
-        if isinstance(agent_type, AgentType):
-            agent_type_str = agent_type.value
-        else:
-            # Handle legacy string types or convert to string
-            agent_type_str = str(agent_type) if agent_type else AgentType.BASE_AGENT.value
-        
-        # Check if agent exists
-        cursor.execute("SELECT id FROM agents WHERE id = ?", (agent.id,))
-        exists = cursor.fetchone()
-        
-        if exists:
-            # Update existing agent
-            cursor.execute("""
-                UPDATE agents 
-                SET type = ?, name = ?, parent_agent_id = ?, sub_agent_ids = ?, tool_ids = ?,
-                    data = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (
-                agent_type_str,
-                getattr(agent, 'name', ''),
-                getattr(agent, 'parent_agent_id', None),
-                sub_agent_ids_json,
-                tool_ids_json,
-                agent_data,
-                agent.id
-            ))
-        else:
-            # Insert new agent
-            cursor.execute("""
-                INSERT INTO agents (id, type, name, parent_agent_id, sub_agent_ids, tool_ids, data)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                agent.id,
-                agent_type_str,
-                getattr(agent, 'name', ''),
-                getattr(agent, 'parent_agent_id', None),
-                sub_agent_ids_json,
-                tool_ids_json,
-                agent_data
-            ))
-        
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        print(f"Error saving agent: {str(e)}")
-        return False
+            card = json.loads(card_json) if card_json else None
+        except (json.JSONDecodeError, TypeError):
+            card = None
+        node = {
+            'id': row_id,
+            'type': agent_type,
+            'name': name,
+            'parent_agent_id': parent_agent_id,
+            # Rows saved before migration 12 could not always be filled
+            'card': card or {'title': name or "", 'description': "", 'outline': {}},
+            'version': version,
+            # Existing agents in sub_agent_ids (children beyond `depth` are not read)
+            'sub_agent_count': sub_agent_count,
+            'children': [],
+        }
+        nodes[row_id] = node
+        if row_depth == 0:
+            root = node
+        elif tree_parent_id in nodes:
+            nodes[tree_parent_id]['children'].append(node)
+    return root
+
+
+def iter_agent_tree(node: Dict[str, Any]):
+    """Yield the nodes of an agent tree (depth first, root first)."""
+    yield node
+    for child in node['children']:
+        yield from iter_agent_tree(child)
+
+
+def get_subtree_versions(agent_id: str, depth: int, db_path: Optional[str] = None) -> Tuple[Tuple[str, int], ...]:
+    """
+    Row versions of an agent's descendants down to `depth` levels (see get_agent_tree).
+    
+    Args:
+        agent_id: The root agent ID (not included)
+        depth: Number of levels below the root
+        db_path: Optional database path
+        
+    Returns:
+        ((agent_id, version), ...) tuple; changes whenever a descendant is saved, added or removed
+    """
+    if depth <= 0:
+        return ()
+    tree = get_agent_tree(agent_id, depth, db_path)
+    if tree is None:
+        return ()
+    return tuple((node['id'], node['version']) for node in iter_agent_tree(tree) if node is not tree)
 
 
 def load_agent(agent_id: str, db_path: Optional[str] = None) -> Optional[Any]:
@@ -187,32 +544,19 @@ def load_agent(agent_id: str, db_path: Optional[str] = None) -> Optional[Any]:
         if not os.path.exists(db_path):
             return None
         
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Get type, data, and tool_ids
-        # Handle both old schema (without tool_ids) and new schema (with tool_ids)
-        cursor.execute("SELECT type, data FROM agents WHERE id = ?", (agent_id,))
-        row = cursor.fetchone()
-        
-        # Try to get tool_ids separately (if column exists)
-        tool_ids_json = '[]'
-        try:
-            cursor.execute("SELECT tool_ids FROM agents WHERE id = ?", (agent_id,))
-            tool_ids_row = cursor.fetchone()
-            if tool_ids_row and tool_ids_row[0]:
-                tool_ids_json = tool_ids_row[0]
-        except sqlite3.OperationalError:
-            # Column doesn't exist yet, use empty list
-            tool_ids_json = '[]'
-        
-        conn.close()
+        conn = get_manager(db_path).connection()
+        row = conn.execute(
+            "SELECT type, data, tool_ids, version FROM agents WHERE id = ?", (agent_id,)
+        ).fetchone()
         
         if row:
             expected_type, agent_data = row[0], row[1]
+            tool_ids_json = row[2] or '[]'
             
-            # Deserialize agent data
-            agent = pickle.loads(agent_data)
+            # Deserialize agent data (versioned state, or pickle for legacy rows)
+            agent = deserialize_agent(agent_data, db_path)
+            # Row version the agent was loaded at (compare-and-swap on save)
+            agent._db_version = row[3]
             
             # Verify the loaded agent is a BaseAgent instance
             if not isinstance(agent, BaseAgent):
@@ -236,37 +580,16 @@ def load_agent(agent_id: str, db_path: Optional[str] = None) -> Optional[Any]:
             # Verify the agent is of the correct class type
             expected_class = type_to_class.get(expected_type, BaseAgent)
             
-            # Load tools from database based on tool_ids
+            # Tools are not created here: bind_for_run builds them from the stored
+            # tool_ids right before the agent runs (memoized by fingerprint)
             tool_ids = []
             if tool_ids_json and tool_ids_json != '[]':
                 try:
                     tool_ids = json.loads(tool_ids_json)
                 except (json.JSONDecodeError, TypeError):
                     tool_ids = []
-            
-            # Recreate tools from database
-            # Note: We restore tools but do NOT save to database here
-            # Saving should only happen when agent is actually modified
-            if tool_ids and hasattr(agent, '_recreate_tools_from_db'):
-                try:
-                    agent._recreate_tools_from_db(tool_ids, db_path=db_path)
-                except Exception as e:
-                    print(f"Error recreating tools from DB for agent {agent_id}: {str(e)}")
-                    # Fallback to default _recreate_tools if _recreate_tools_from_db fails
-                    if hasattr(agent, '_recreate_tools'):
-                        try:
-                            agent._recreate_tools()
-                            # Don't save here - let AgentManager handle it if needed
-                        except Exception:
-                            pass
-            elif hasattr(agent, '_recreate_tools'):
-                # If no tool_ids or _recreate_tools_from_db doesn't exist, use default
-                try:
-                    agent._recreate_tools()
-                    # Don't save here - tools restoration during load shouldn't trigger save
-                    # Only save when agent is actually modified (e.g., tools added/removed)
-                except Exception:
-                    pass
+            agent.tools = []
+            agent._stored_tool_ids = tool_ids
             
             # Ensure type is set as AgentType enum if it's a string
             if not isinstance(actual_type, AgentType) and actual_type_str:
@@ -280,11 +603,6 @@ def load_agent(agent_id: str, db_path: Optional[str] = None) -> Optional[Any]:
             if not hasattr(agent, 'sub_agent_ids') or agent.sub_agent_ids is None:
                 agent.sub_agent_ids = []
             
-            # Ensure tools is not None (safety check)
-            # Tools are recreated by _recreate_tools, but if that fails, ensure it's at least an empty list
-            if not hasattr(agent, 'tools') or agent.tools is None:
-                agent.tools = []
-            
             return agent
         
         return None
@@ -309,18 +627,14 @@ def load_all_agents(db_path: Optional[str] = None) -> Dict[str, Any]:
         if not os.path.exists(db_path):
             return {}
         
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id, data FROM agents")
-        rows = cursor.fetchall()
-        
-        conn.close()
+        conn = get_manager(db_path).connection()
+        rows = conn.execute("SELECT id, data, version FROM agents").fetchall()
         
         agents = {}
-        for agent_id, agent_data in rows:
+        for agent_id, agent_data, version in rows:
             try:
-                agent = pickle.loads(agent_data)
+                agent = deserialize_agent(agent_data, db_path)
+                agent._db_version = version
                 agents[agent_id] = agent
             except Exception as e:
                 print(f"Error deserializing agent {agent_id}: {str(e)}")
@@ -348,14 +662,14 @@ def delete_agent(agent_id: str, db_path: Optional[str] = None) -> bool:
         if not os.path.exists(db_path):
             return False
         
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM agents WHERE id = ?", (agent_id,))
-        conn.commit()
-        
-        deleted = cursor.rowcount > 0
-        conn.close()
+        with get_manager(db_path).transaction() as conn:
+            cursor = conn.execute("DELETE FROM agents WHERE id = ?", (agent_id,))
+            deleted = cursor.rowcount > 0
+            if deleted:
+                from backend.database.blob_store import release_blobs
+                from backend.database.notebook_content_db import delete_notebook_content
+                release_blobs(agent_id, db_path)
+                delete_notebook_content(agent_id, db_path)
         
         return deleted
     except Exception as e:
@@ -379,16 +693,11 @@ def get_agent_info_summary(db_path: Optional[str] = None) -> Dict[str, Dict[str,
         if not os.path.exists(db_path):
             return {}
         
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
+        conn = get_manager(db_path).connection()
+        rows = conn.execute("""
             SELECT id, type, name, parent_agent_id, sub_agent_ids 
             FROM agents
-        """)
-        rows = cursor.fetchall()
-        
-        conn.close()
+        """).fetchall()
         
         summary = {}
         for row in rows:
@@ -405,3 +714,211 @@ def get_agent_info_summary(db_path: Optional[str] = None) -> Dict[str, Dict[str,
     except Exception as e:
         print(f"Error getting agent info summary: {str(e)}")
         return {}
+
+
+# Header columns read by the find_* queries (never the serialized data column)
+_HEADER_COLUMNS = "id, type, name, parent_agent_id"
+
+
+def _type_value(agent_type: Any) -> str:
+    """Return the string stored in the type column for an AgentType or string."""
+    return agent_type.value if hasattr(agent_type, 'value') else str(agent_type)
+
+
+def _row_to_header(row) -> Dict[str, Any]:
+    """Convert a row selected with _HEADER_COLUMNS to a header dictionary."""
+    return {
+        'id': row[0],
+        'type': row[1],
+        'name': row[2],
+        'parent_agent_id': row[3],
+    }
+
+
+def find_agents_by_type(agent_type: Any, db_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Find agents of a given type without loading the agent objects.
+    
+    Args:
+        agent_type: AgentType enum or its string value
+        db_path: Optional database path
+        
+    Returns:
+        List of header dicts (id, type, name, parent_agent_id), in insertion order
+    """
+    try:
+        conn = get_manager(db_path).connection()
+        rows = conn.execute(
+            f"SELECT {_HEADER_COLUMNS} FROM agents WHERE type = ? ORDER BY rowid",
+            (_type_value(agent_type),)
+        ).fetchall()
+        return [_row_to_header(row) for row in rows]
+    except sqlite3.Error as e:
+        print(f"Error finding agents by type {agent_type}: {str(e)}")
+        return []
+
+
+def find_recent_agents(agent_type: Any, limit: int, db_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Find the most recently updated agents of a given type without loading the agent objects.
+    
+    Args:
+        agent_type: AgentType enum or its string value
+        limit: Maximum number of agents
+        db_path: Optional database path
+        
+    Returns:
+        List of header dicts (id, type, name, parent_agent_id), most recently updated first
+    """
+    try:
+        conn = get_manager(db_path).connection()
+        rows = conn.execute(
+            f"SELECT {_HEADER_COLUMNS} FROM agents WHERE type = ? ORDER BY updated_at DESC, rowid DESC LIMIT ?",
+            (_type_value(agent_type), limit)
+        ).fetchall()
+        return [_row_to_header(row) for row in rows]
+    except sqlite3.Error as e:
+        print(f"Error finding recent agents of type {agent_type}: {str(e)}")
+        return []
+
+
+def find_child_agents(
+    parent_agent_id: str,
+    agent_type: Optional[Any] = None,
+    db_path: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Find agents whose parent_agent_id is the given ID, optionally filtered by type.
+    
+    Args:
+        parent_agent_id: The parent agent ID
+        agent_type: Optional AgentType enum or string value to filter by
+        db_path: Optional database path
+        
+    Returns:
+        List of header dicts (id, type, name, parent_agent_id), in insertion order
+    """
+    try:
+        conn = get_manager(db_path).connection()
+        if agent_type is None:
+            rows = conn.execute(
+                f"SELECT {_HEADER_COLUMNS} FROM agents WHERE parent_agent_id = ? ORDER BY rowid",
+                (parent_agent_id,)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f"SELECT {_HEADER_COLUMNS} FROM agents WHERE parent_agent_id = ? AND type = ? ORDER BY rowid",
+                (parent_agent_id, _type_value(agent_type))
+            ).fetchall()
+        return [_row_to_header(row) for row in rows]
+    except sqlite3.Error as e:
+        print(f"Error finding children of agent {parent_agent_id}: {str(e)}")
+        return []
+
+
+def find_agents_by_id_prefix(
+    prefix: str,
+    limit: Optional[int] = None,
+    db_path: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Find agents whose ID starts with the given prefix (e.g. to resolve a truncated ID).
+    
+    Args:
+        prefix: ID prefix (must be non-empty)
+        limit: Optional maximum number of results
+        db_path: Optional database path
+        
+    Returns:
+        List of header dicts (id, type, name, parent_agent_id), ordered by ID
+    """
+    if not prefix:
+        return []
+    
+    # Range scan on the primary key: prefix <= id < prefix with last char incremented
+    # (LIKE would not use the index and treats % and _ as wildcards)
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    query = f"SELECT {_HEADER_COLUMNS} FROM agents WHERE id >= ? AND id < ? ORDER BY id"
+    params: tuple = (prefix, upper)
+    if limit is not None:
+        query += " LIMIT ?"
+        params += (int(limit),)
+    
+    try:
+        conn = get_manager(db_path).connection()
+        rows = conn.execute(query, params).fetchall()
+        return [_row_to_header(row) for row in rows]
+    except sqlite3.Error as e:
+        print(f"Error finding agents by ID prefix {prefix}: {str(e)}")
+        return []
+
+
+def count_agents_by_type(db_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Count agents grouped by type.
+    
+    Args:
+        db_path: Optional database path
+        
+    Returns:
+        Dictionary mapping type value (e.g. "NoteBook") to number of agents
+    """
+    try:
+        conn = get_manager(db_path).connection()
+        rows = conn.execute("SELECT type, COUNT(*) FROM agents GROUP BY type").fetchall()
+        return {agent_type: count for agent_type, count in rows}
+    except sqlite3.Error as e:
+        print(f"Error counting agents by type: {str(e)}")
+        return {}
+
+
+def get_tool_ids(agent_id: str, db_path: Optional[str] = None) -> List[str]:
+    """
+    Get the stored tool_ids of an agent.
+    
+    Args:
+        agent_id: The agent ID
+        db_path: Optional database path
+        
+    Returns:
+        List of tool IDs (empty if the agent or column value does not exist)
+    """
+    try:
+        conn = get_manager(db_path).connection()
+        row = conn.execute("SELECT tool_ids FROM agents WHERE id = ?", (agent_id,)).fetchone()
+    except sqlite3.Error as e:
+        print(f"Error getting tool_ids for agent {agent_id}: {str(e)}")
+        return []
+    
+    if row and row[0] and row[0] != '[]':
+        try:
+            return json.loads(row[0])
+        except (json.JSONDecodeError, TypeError):
+            return []
+    return []
+
+
+def update_tool_ids(agent_id: str, tool_ids: List[str], db_path: Optional[str] = None) -> bool:
+    """
+    Update only the tool_ids column of an agent (does not re-serialize the agent).
+    The row is left untouched if it already stores the same tool_ids.
+    
+    Args:
+        agent_id: The agent ID
+        tool_ids: List of tool IDs to store
+        db_path: Optional database path
+        
+    Returns:
+        True if the stored value changed, False otherwise
+    """
+    try:
+        tool_ids_json = json.dumps(tool_ids, ensure_ascii=False)
+        with get_manager(db_path).transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE agents SET tool_ids = ? WHERE id = ? AND IFNULL(tool_ids, '') != ?",
+                (tool_ids_json, agent_id, tool_ids_json)
+            )
+            return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        print(f"Error updating tool_ids for agent {agent_id}: {str(e)}")
+        return False
@@ -1,6 +1,5 @@
 """Agent Database Manager - provides high-level API for agent database operations."""
 
-import os
 from typing import Optional, TYPE_CHECKING
 from pathlib import Path
 
@@ -31,18 +30,8 @@ class AgentDBManager:
             db_path: Optional database path. If not provided, uses default path
                     in backend/database/db/ directory.
         """
-        if db_path is None:
-            # Use default path in backend/database/db/ directory
-            db_dir = os.path.join(
-                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-                "backend",
-                "database",
-                "db"
-            )
-            os.makedirs(db_dir, exist_ok=True)
-            db_path = os.path.join(db_dir, "agent_data.db")
-        
-        self.db_path = db_path
+        # Default path in backend/database/db/ directory (agent_db.DEFAULT_DB_PATH)
+        self.db_path = get_db_path(db_path)
         # Initialize database if it doesn't exist
         init_db(self.db_path)
     
@@ -118,6 +107,20 @@ class AgentDBManager:
             print(f"Error updating agent: {str(e)}")
             return False
     
+    def save(self, agent: 'BaseAgent') -> bool:
+        """
+        Create or update an agent in the database (single upsert, no existence check).
+        
+        Args:
+            agent: The agent object to save
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        # Set the agent's DB_PATH to match this manager's path
+        agent.DB_PATH = self.db_path
+        return save_agent(agent, self.db_path)
+    
     def delete_agent(self, agent_id: str) -> bool:
         """
         Delete an agent from the database.
@@ -0,0 +1,222 @@
+"""Versioned agent state serialization.
+
+Agents used to be stored as a pickle of the whole agents.Agent subclass, which
+dragged along SDK objects (model settings, output schemas), the rendered
+instructions and, for NoteBookAgent, the notes twice. A pickle also breaks as soon
+as the SDK classes change.
+
+Now each agent class declares the state it owns (BaseAgent._to_state and the
+subclass overrides) and rebuilds derived fields on load (_rebuild_derived_state).
+The stored payload is a JSON envelope:
+
+    {"format": "agent_state", "class": "NoteBookAgent", "v": 1, "state": {...}}
+
+Rows written before this change still start with the pickle protocol byte
+(0x80) and are loaded with pickle; migration 5 converts them.
+
+Stored payloads may additionally be compressed and reference large strings in the
+blob table (see blob_store.py); deserialize_agent undoes both.
+"""
+
+import json
+import pickle
+from typing import Any, Dict, List, Optional, Tuple
+
+STATE_FORMAT = "agent_state"
+
+# First byte of pickle protocol >= 2 payloads (legacy rows)
+_PICKLE_PREFIX = b"\x80"
+
+
+def _agent_classes() -> Dict[str, type]:
+    """Map of class name -> agent class that can be restored from state."""
+    # Import agent classes locally to avoid circular import
+    from backend.agent.BaseAgent import BaseAgent
+    from backend.agent.MasterAgent import MasterAgent
+    from backend.agent.NoteBookAgent import NoteBookAgent
+    from backend.agent.TopLevelAgent import TopLevelAgent
+    from backend.agent.specialized.NotebookModifyAgent import NotebookModifyAgent
+
+    return {
+        cls.__name__: cls
+        for cls in (BaseAgent, MasterAgent, NoteBookAgent, TopLevelAgent, NotebookModifyAgent)
+    }
+
+
+def is_pickled(data: bytes) -> bool:
+    """Whether a stored payload is a legacy pickle."""
+    return bytes(data[:1]) == _PICKLE_PREFIX
+
+
+def serialize_state(agent_class: type, state: Dict[str, Any], blobs: Optional[Dict[str, str]] = None) -> bytes:
+    """
+    Serialize a state dictionary of the given agent class.
+
+    Args:
+        agent_class: Class the state belongs to (its name and STATE_VERSION are recorded)
+        state: State dictionary (as returned by _to_state)
+        blobs: If given, large strings are replaced by blob references and collected
+               here (hash -> text); the caller must store them with blob_store.store_blobs
+
+    Returns:
+        UTF-8 encoded JSON envelope
+    """
+    if blobs is not None:
+        from backend.database.blob_store import extract_blobs
+        state = extract_blobs(state, blobs)
+    envelope = {
+        'format': STATE_FORMAT,
+        'class': agent_class.__name__,
+        'v': agent_class.STATE_VERSION,
+        'state': state,
+    }
+    return json.dumps(envelope, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def serialize_agent(agent: Any, blobs: Optional[Dict[str, str]] = None) -> bytes:
+    """
+    Serialize an agent's authoritative state.
+
+    Args:
+        agent: BaseAgent (or subclass) instance
+        blobs: See serialize_state
+
+    Returns:
+        UTF-8 encoded JSON envelope
+    """
+    return serialize_state(type(agent), agent._to_state(), blobs)
+
+
+def decode_state(data: bytes, db_path: Optional[str] = None) -> Optional[Tuple[type, Dict[str, Any]]]:
+    """
+    Decode a stored payload into its agent class and (upgraded, blob-resolved) state.
+
+    Args:
+        data: Payload from the agents.data column (possibly compressed)
+        db_path: Database path the row was read from
+
+    Returns:
+        (agent class, state dictionary), or None for legacy pickle payloads
+    """
+    from backend.database.blob_store import decompress_payload, resolve_blobs
+
+    data = decompress_payload(data)
+    if is_pickled(data):
+        return None
+
+    envelope = json.loads(data.decode('utf-8'))
+    if envelope.get('format') != STATE_FORMAT:
+        raise ValueError(f"Unknown agent payload format: {envelope.get('format')!r}")
+
+    classes = _agent_classes()
+    cls = classes.get(envelope.get('class'), classes['BaseAgent'])
+    state = resolve_blobs(envelope['state'], db_path)
+    version = envelope.get('v', 1)
+    if version < cls.STATE_VERSION:
+        state = cls._upgrade_state(state, version)
+    return cls, state
+
+
+def deserialize_agent(data: bytes, db_path: Optional[str] = None) -> Any:
+    """
+    Rebuild an agent from a stored payload (state envelope or legacy pickle).
+
+    The state the agent was built from is kept as agent._base_state (None for
+    pickles); save_agent uses it as the common ancestor when merging concurrent edits.
+
+    Args:
+        data: Payload from the agents.data column (possibly compressed)
+        db_path: Database path the row was read from (set as the agent's DB_PATH)
+
+    Returns:
+        The agent object (tools are not restored here)
+    """
+    decoded = decode_state(data, db_path)
+    if decoded is None:
+        from backend.database.blob_store import decompress_payload
+        agent = pickle.loads(decompress_payload(data))
+        agent._base_state = None
+        return agent
+
+    cls, state = decoded
+    agent = cls._from_state(state, DB_PATH=db_path)
+    agent._base_state = state
+    return agent
+
+
+def card_from_state(class_name: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The agent's own card fields (stored in agents.card for the hierarchy index).
+
+    Mirrors NoteBookAgent.agent_card; other agents only have a title (a MasterAgent's
+    description is built from its children when the hierarchy is read).
+
+    Args:
+        class_name: Agent class name (the envelope's "class")
+        state: State dictionary
+
+    Returns:
+        {"title", "description", "outline"}
+    """
+    outline = state.get('outline') or {}
+    if class_name == 'NoteBookAgent':
+        return {
+            'title': state.get('notebook_title') or outline.get('notebook_title') or "未命名笔记本",
+            'description': state.get('notebook_description') or outline.get('notebook_description') or "",
+            'outline': outline.get('outlines') or {},
+        }
+    return {'title': state.get('name') or "", 'description': "", 'outline': {}}
+
+
+# Marks a key that is absent on one side of a merge
+_MISSING = object()
+
+
+def _is_scalar_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(item, (str, int, float, bool)) for item in value)
+
+
+def merge_states(base: Any, mine: Any, theirs: Any, path: str = "") -> Tuple[Any, List[str]]:
+    """
+    Three-way merge of agent states.
+
+    Dictionaries are merged key by key (so edits to different sections, or to different
+    fields of one section, combine). Lists of scalars (e.g. sub_agent_ids) are merged as
+    ordered sets. Any other value changed differently on both sides is a conflict.
+
+    Args:
+        base: State both sides started from
+        mine: State being saved
+        theirs: State currently stored
+        path: Location of these values (used in conflict reports)
+
+    Returns:
+        (merged state, list of conflicting paths); the merge is only valid if no paths
+    """
+    if mine == theirs or theirs == base:
+        return mine, []
+    if mine == base:
+        return theirs, []
+
+    if isinstance(mine, dict) and isinstance(theirs, dict):
+        base_dict = base if isinstance(base, dict) else {}
+        merged: Dict[str, Any] = {}
+        conflicts: List[str] = []
+        for key in list(theirs) + [k for k in mine if k not in theirs]:
+            value, key_conflicts = merge_states(
+                base_dict.get(key, _MISSING), mine.get(key, _MISSING), theirs.get(key, _MISSING),
+                f"{path}.{key}" if path else str(key)
+            )
+            conflicts += key_conflicts
+            if value is not _MISSING:
+                merged[key] = value
+        return merged, conflicts
+
+    if _is_scalar_list(mine) and _is_scalar_list(theirs) and (base is _MISSING or _is_scalar_list(base)):
+        base_items = base if isinstance(base, list) else []
+        removed = [item for item in base_items if item not in mine or item not in theirs]
+        merged_list = [item for item in theirs if item not in removed]
+        merged_list += [item for item in mine if item not in merged_list and item not in removed]
+        return merged_list, []
+
+    return mine, [path or "<root>"]
@@ -0,0 +1,105 @@
+"""Async facade over agent_db, session_db and tools_db.
+
+sqlite3 and agent (de)serialization are blocking, so calling them from an
+`async def` route stalls the event loop for every other request (including the
+frontend's tracing polls). The functions here run the same synchronous code on a
+dedicated, bounded thread pool and can be awaited from routes:
+
+    agent = await async_db.load_agent(agent_id)
+    summary = await async_db.run_db(build_summary, agent)   # any other blocking work
+
+Each worker thread gets its own pooled connection from ConnectionManager. The
+caller's contextvars (e.g. an active unit_of_work) are carried into the worker.
+The pool size is DB_EXECUTOR_WORKERS (default 4); SQLite allows one writer at a
+time, so a small pool is enough and keeps connection count bounded.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from backend.database import agent_db, session_db, tools_db
+
+T = TypeVar('T')
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Get (or lazily create) the database executor."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = int(os.getenv('DB_EXECUTOR_WORKERS', '4'))
+                _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="db")
+    return _executor
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking database function on the database executor.
+
+    Args:
+        func: Synchronous function to run
+        *args, **kwargs: Arguments passed to func
+
+    Returns:
+        The function's return value (exceptions are re-raised in the caller)
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_get_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """Shut down the database executor (a new one is created on next use)."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def _async(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    """Wrap a synchronous database function as an awaitable running on the executor."""
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+
+# agent_db
+load_agent = _async(agent_db.load_agent)
+load_all_agents = _async(agent_db.load_all_agents)
+save_agent = _async(agent_db.save_agent)
+update_agent = _async(agent_db.update_agent)
+delete_agent = _async(agent_db.delete_agent)
+get_agent_info_summary = _async(agent_db.get_agent_info_summary)
+find_agents_by_type = _async(agent_db.find_agents_by_type)
+find_child_agents = _async(agent_db.find_child_agents)
+find_agents_by_id_prefix = _async(agent_db.find_agents_by_id_prefix)
+count_agents_by_type = _async(agent_db.count_agents_by_type)
+get_tool_ids = _async(agent_db.get_tool_ids)
+
+# session_db
+create_session = _async(session_db.create_session)
+get_session = _async(session_db.get_session)
+list_sessions = _async(session_db.list_sessions)
+list_sessions_page = _async(session_db.list_sessions_page)
+delete_session = _async(session_db.delete_session)
+add_conversation = _async(session_db.add_conversation)
+get_conversations = _async(session_db.get_conversations)
+get_conversations_page = _async(session_db.get_conversations_page)
+
+# tools_db
+get_tool = _async(tools_db.get_tool)
+get_all_tools = _async(tools_db.get_all_tools)
+get_tools_by_names = _async(tools_db.get_tools_by_names)
+get_tools_by_ids = _async(tools_db.get_tools_by_ids)
+delete_tool = _async(tools_db.delete_tool)
@@ -0,0 +1,308 @@
+"""Compression and content-addressed storage for agent payloads.
+
+Two layers are applied when an agent row is written:
+
+1. Large strings in the agent state (long instructions, proofs, legacy notes) are
+   moved to the blobs table, keyed by their SHA-256, and replaced in the state by
+   {"$blob": "<sha256>"}. Identical strings (e.g. the same prompt used by every
+   MasterAgent) are stored once; blob_refs records which agent references which
+   blob so unreferenced blobs can be removed.
+2. The resulting payload is zlib-compressed when that makes it smaller. Compressed
+   payloads start with the header byte b"Z"; JSON state (b"{") and legacy pickles
+   (b"\\x80") never do, so old rows load unchanged.
+
+Reads stay lazy: header queries never touch data, payloads are only decompressed in
+load_agent, and blob texts are cached by hash (they are immutable).
+"""
+
+import hashlib
+import zlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from backend.database.agent_db import get_manager
+
+# Header byte of zlib-compressed payloads
+COMPRESSED_PREFIX = b"Z"
+
+# Payloads smaller than this are stored as-is (compression overhead isn't worth it)
+COMPRESS_MIN_BYTES = 512
+
+# Strings at least this long are moved to the blobs table
+BLOB_MIN_CHARS = 2048
+
+# Key marking a blob reference inside agent state
+BLOB_REF_KEY = "$blob"
+
+# Decoded blob texts by (db_path, hash); content-addressed, so entries never go stale
+_BLOB_CACHE_SIZE = 256
+_blob_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+_blob_cache_lock = Lock()
+
+
+def compress_payload(data: bytes) -> bytes:
+    """
+    Compress a payload if it is large enough and compression helps.
+
+    Args:
+        data: Raw payload
+
+    Returns:
+        COMPRESSED_PREFIX + zlib data, or the payload unchanged
+    """
+    if len(data) < COMPRESS_MIN_BYTES:
+        return data
+    compressed = COMPRESSED_PREFIX + zlib.compress(data, 6)
+    return compressed if len(compressed) < len(data) else data
+
+
+def decompress_payload(data: bytes) -> bytes:
+    """Return the raw payload of a stored value (compressed or not)."""
+    data = bytes(data)
+    if data[:1] == COMPRESSED_PREFIX:
+        return zlib.decompress(data[1:])
+    return data
+
+
+def is_compressed(data: bytes) -> bool:
+    """Whether a stored payload is zlib-compressed."""
+    return bytes(data[:1]) == COMPRESSED_PREFIX
+
+
+def _blob_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def extract_blobs(value: Any, blobs: Dict[str, str]) -> Any:
+    """
+    Replace large strings in a JSON-compatible value with blob references.
+
+    Args:
+        value: State dictionary (or nested value)
+        blobs: Filled with hash -> text for every extracted string
+
+    Returns:
+        A copy of value with large strings replaced by {"$blob": hash}
+    """
+    if isinstance(value, str):
+        if len(value) < BLOB_MIN_CHARS:
+            return value
+        blob_hash = _blob_hash(value)
+        blobs[blob_hash] = value
+        return {BLOB_REF_KEY: blob_hash}
+    if isinstance(value, dict):
+        return {key: extract_blobs(item, blobs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [extract_blobs(item, blobs) for item in value]
+    return value
+
+
+def _is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and BLOB_REF_KEY in value
+
+
+def _collect_refs(value: Any, refs: Set[str]) -> None:
+    if _is_blob_ref(value):
+        refs.add(value[BLOB_REF_KEY])
+    elif isinstance(value, dict):
+        for item in value.values():
+            _collect_refs(item, refs)
+    elif isinstance(value, list):
+        for item in value:
+            _collect_refs(item, refs)
+
+
+def _substitute(value: Any, texts: Dict[str, str]) -> Any:
+    if _is_blob_ref(value):
+        return texts[value[BLOB_REF_KEY]]
+    if isinstance(value, dict):
+        return {key: _substitute(item, texts) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_substitute(item, texts) for item in value]
+    return value
+
+
+def load_blobs(hashes: Iterable[str], db_path: Optional[str] = None) -> Dict[str, str]:
+    """
+    Load blob texts by hash (cached; missing hashes are read in one query).
+
+    Args:
+        hashes: Blob hashes to load
+        db_path: Optional database path
+
+    Returns:
+        Dictionary hash -> text for the blobs that exist
+    """
+    manager = get_manager(db_path)
+    texts: Dict[str, str] = {}
+    missing: List[str] = []
+    with _blob_cache_lock:
+        for blob_hash in set(hashes):
+            key = (manager.db_path, blob_hash)
+            if key in _blob_cache:
+                _blob_cache.move_to_end(key)
+                texts[blob_hash] = _blob_cache[key]
+            else:
+                missing.append(blob_hash)
+
+    if missing:
+        placeholders = ",".join("?" * len(missing))
+        rows = manager.connection().execute(
+            f"SELECT hash, data FROM blobs WHERE hash IN ({placeholders})", missing
+        ).fetchall()
+        with _blob_cache_lock:
+            for blob_hash, data in rows:
+                text = decompress_payload(data).decode('utf-8')
+                texts[blob_hash] = text
+                _blob_cache[(manager.db_path, blob_hash)] = text
+            while len(_blob_cache) > _BLOB_CACHE_SIZE:
+                _blob_cache.popitem(last=False)
+    return texts
+
+
+def resolve_blobs(state: Any, db_path: Optional[str] = None) -> Any:
+    """
+    Replace blob references in a state value with their texts.
+
+    Args:
+        state: State dictionary possibly containing {"$blob": hash} references
+        db_path: Database path the state was read from
+
+    Returns:
+        The state with all references resolved (unchanged if it has none)
+    """
+    refs: Set[str] = set()
+    _collect_refs(state, refs)
+    if not refs:
+        return state
+    texts = load_blobs(refs, db_path)
+    missing = refs - texts.keys()
+    if missing:
+        raise ValueError(f"Missing blobs referenced by agent state: {sorted(missing)}")
+    return _substitute(state, texts)
+
+
+def store_blobs(owner_id: str, blobs: Dict[str, str], db_path: Optional[str] = None) -> None:
+    """
+    Store an agent's blobs and replace its blob references.
+
+    Blobs no longer referenced by any agent are deleted. Joins the caller's transaction.
+
+    Args:
+        owner_id: The agent ID referencing the blobs
+        blobs: Dictionary hash -> text (from extract_blobs)
+        db_path: Optional database path
+    """
+    with get_manager(db_path).transaction() as conn:
+        old_refs = {row[0] for row in conn.execute(
+            "SELECT hash FROM blob_refs WHERE owner_id = ?", (owner_id,)
+        )}
+        new_refs = set(blobs)
+        if old_refs == new_refs:
+            return
+
+        conn.executemany(
+            "INSERT OR IGNORE INTO blobs (hash, size, data) VALUES (?, ?, ?)",
+            [
+                (blob_hash, len(text.encode('utf-8')), compress_payload(text.encode('utf-8')))
+                for blob_hash, text in blobs.items() if blob_hash not in old_refs
+            ]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO blob_refs (owner_id, hash) VALUES (?, ?)",
+            [(owner_id, blob_hash) for blob_hash in new_refs - old_refs]
+        )
+        released = old_refs - new_refs
+        conn.executemany(
+            "DELETE FROM blob_refs WHERE owner_id = ? AND hash = ?",
+            [(owner_id, blob_hash) for blob_hash in released]
+        )
+        _delete_orphans(conn, released)
+
+
+def release_blobs(owner_id: str, db_path: Optional[str] = None) -> None:
+    """Drop all blob references of a deleted agent (and blobs nobody references anymore)."""
+    with get_manager(db_path).transaction() as conn:
+        released = {row[0] for row in conn.execute(
+            "SELECT hash FROM blob_refs WHERE owner_id = ?", (owner_id,)
+        )}
+        conn.execute("DELETE FROM blob_refs WHERE owner_id = ?", (owner_id,))
+        _delete_orphans(conn, released)
+
+
+def _delete_orphans(conn, hashes: Iterable[str]) -> None:
+    conn.executemany(
+        "DELETE FROM blobs WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM blob_refs WHERE hash = blobs.hash)",
+        [(blob_hash,) for blob_hash in hashes]
+    )
+
+
+def get_storage_report(db_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Report how much space agent payloads take and how much compression/dedup saves.
+
+    Decompresses every agent row, so this is meant for maintenance, not request paths.
+
+    Args:
+        db_path: Optional database path
+
+    Returns:
+        Dictionary with per-type agent sizes, blob sizes and the total saving
+    """
+    conn = get_manager(db_path).connection()
+
+    agents: Dict[str, Dict[str, int]] = {}
+    for agent_type, data in conn.execute("SELECT type, data FROM agents"):
+        entry = agents.setdefault(agent_type, {'rows': 0, 'compressed_rows': 0, 'stored_bytes': 0, 'raw_bytes': 0})
+        entry['rows'] += 1
+        entry['compressed_rows'] += int(is_compressed(data))
+        entry['stored_bytes'] += len(data)
+        entry['raw_bytes'] += len(decompress_payload(data))
+
+    blob_count, blob_stored, blob_raw = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(length(data)), 0), COALESCE(SUM(size), 0) FROM blobs"
+    ).fetchone()
+    # Bytes the blobs would take if every reference stored its own copy
+    referenced_raw = conn.execute(
+        "SELECT COALESCE(SUM(b.size), 0) FROM blob_refs r JOIN blobs b ON b.hash = r.hash"
+    ).fetchone()[0]
+
+    stored_total = sum(entry['stored_bytes'] for entry in agents.values()) + blob_stored
+    raw_total = sum(entry['raw_bytes'] for entry in agents.values()) + referenced_raw
+    return {
+        'agents': agents,
+        'blobs': {
+            'count': blob_count,
+            'stored_bytes': blob_stored,
+            'raw_bytes': blob_raw,
+            'referenced_raw_bytes': referenced_raw,
+        },
+        'stored_bytes': stored_total,
+        'raw_bytes': raw_total,
+        'saved_bytes': raw_total - stored_total,
+    }
+
+
+def format_storage_report(report: Dict[str, Any]) -> str:
+    """Render get_storage_report() output as a plain-text table."""
+    lines = [f"{'type':<16}{'rows':>8}{'compressed':>12}{'stored':>14}{'raw':>14}"]
+    for agent_type, entry in sorted(report['agents'].items()):
+        lines.append(
+            f"{agent_type:<16}{entry['rows']:>8}{entry['compressed_rows']:>12}"
+            f"{entry['stored_bytes']:>14,}{entry['raw_bytes']:>14,}"
+        )
+    blobs = report['blobs']
+    lines.append(
+        f"{'blobs':<16}{blobs['count']:>8}{'':>12}"
+        f"{blobs['stored_bytes']:>14,}{blobs['referenced_raw_bytes']:>14,}"
+    )
+    raw = report['raw_bytes']
+    saved_pct = (report['saved_bytes'] / raw * 100) if raw else 0.0
+    lines.append(f"total: {report['stored_bytes']:,} bytes stored, {raw:,} bytes raw, saved {saved_pct:.1f}%")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+    print(format_storage_report(get_storage_report(sys.argv[1] if len(sys.argv) > 1 else None)))
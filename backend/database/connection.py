@@ -0,0 +1,198 @@
+"""SQLite connection manager shared by agent_db, session_db and tools_db.
+
+One ConnectionManager exists per database path. It:
+1. Opens one connection per thread (sqlite3 connections must not be shared across threads)
+2. Enables WAL and tuned pragmas on every new connection
+3. Runs schema setup and migrations once per process, tracked with PRAGMA user_version
+4. Provides nestable write transactions (only the outermost scope commits)
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+
+# Pragmas applied to every new connection
+# - WAL lets readers proceed while a writer is active
+# - synchronous=NORMAL is durable enough in WAL mode and avoids an fsync per commit
+# - busy_timeout makes concurrent writers wait instead of failing with "database is locked"
+# foreign_keys stays off: chat endpoints may log conversations for session ids that were never created
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",  # ~16MB page cache per connection
+]
+
+
+class ConnectionManager:
+    """Hands out per-thread SQLite connections for a single database path."""
+
+    def __init__(self, db_path: str):
+        """
+        Initialize the ConnectionManager.
+
+        Args:
+            db_path: Path of the SQLite database file
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # All connections opened by this manager (so they can be closed on shutdown)
+        self._connections: List[sqlite3.Connection] = []
+        # Bumped whenever the database file is replaced or removed, invalidating per-thread connections
+        self._generation = 0
+        self._file_id: Optional[tuple] = None
+        self._migrated = False
+
+    def _current_file_id(self) -> Optional[tuple]:
+        """Return (device, inode) of the database file, or None if it does not exist."""
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (stat.st_dev, stat.st_ino)
+
+    def _check_file(self) -> None:
+        """Invalidate connections if the database file was deleted or replaced (e.g. test DB reset)."""
+        if self._file_id is None:
+            return
+        if self._current_file_id() != self._file_id:
+            with self._lock:
+                if self._file_id is not None and self._current_file_id() != self._file_id:
+                    self._reset_locked()
+
+    def _reset_locked(self) -> None:
+        """Close all connections and force migrations to run again. Caller must hold self._lock."""
+        for conn in self._connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._connections = []
+        self._generation += 1
+        self._file_id = None
+        self._migrated = False
+
+    def _open(self) -> sqlite3.Connection:
+        """Open and configure a new connection."""
+        db_dir = os.path.dirname(self.db_path)
+        os.makedirs(db_dir if db_dir else '.', exist_ok=True)
+
+        # isolation_level=None: we manage transactions explicitly in transaction()
+        # check_same_thread=False only so close_all() can close it; each connection is used by one thread
+        conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=5.0, check_same_thread=False)
+        for pragma in CONNECTION_PRAGMAS:
+            try:
+                conn.execute(pragma)
+            except sqlite3.OperationalError as e:
+                print(f"[ConnectionManager] Warning: {pragma} failed for {self.db_path}: {e}")
+        return conn
+
+    def _ensure_migrated(self, conn: sqlite3.Connection) -> None:
+        """Run schema setup and migrations once per process."""
+        if self._migrated:
+            return
+        with self._lock:
+            if self._migrated:
+                return
+            from backend.database.migrations import run_migrations
+            run_migrations(conn)
+            self._file_id = self._current_file_id()
+            self._migrated = True
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Get the connection for the current thread, opening it if needed.
+
+        Returns:
+            A configured sqlite3.Connection in autocommit mode
+        """
+        self._check_file()
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'generation', None) != self._generation:
+            conn = self._open()
+            with self._lock:
+                self._connections.append(conn)
+                generation = self._generation
+            self._local.conn = conn
+            self._local.generation = generation
+            self._local.depth = 0
+
+        self._ensure_migrated(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Open a write transaction on the current thread's connection.
+
+        Nested calls join the outer transaction; only the outermost scope commits
+        (or rolls back on exception).
+
+        Yields:
+            The sqlite3.Connection to execute statements on
+        """
+        conn = self.connection()
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth = depth
+            if depth == 0:
+                conn.execute("ROLLBACK")
+            raise
+        else:
+            self._local.depth = depth
+            if depth == 0:
+                conn.execute("COMMIT")
+
+    def in_transaction(self) -> bool:
+        """Whether the current thread is inside transaction()."""
+        return getattr(self._local, 'depth', 0) > 0
+
+    def close_all(self) -> None:
+        """Close every connection opened by this manager."""
+        with self._lock:
+            self._reset_locked()
+
+
+# Global registry: one manager per absolute database path
+_managers: Dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(db_path: str) -> ConnectionManager:
+    """
+    Get the ConnectionManager for a database path (created on first use).
+
+    Args:
+        db_path: Path of the SQLite database file
+
+    Returns:
+        The ConnectionManager for this path
+    """
+    key = os.path.abspath(db_path)
+    manager = _managers.get(key)
+    if manager is None:
+        with _managers_lock:
+            manager = _managers.get(key)
+            if manager is None:
+                manager = ConnectionManager(key)
+                _managers[key] = manager
+    return manager
+
+
+def close_all_connections() -> None:
+    """Close all connections of all managers (call on application shutdown)."""
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        manager.close_all()
@@ -0,0 +1,123 @@
+"""agents SDK Session backed by session_db.
+
+Runner.run(session=...) reads the session history with get_items and appends the
+turn's input and output items with add_items. ConversationSession keeps those items
+(and the transcript messages shown by the sessions API) in memory until the turn
+ends, then writes everything with session_db.record_turn in one transaction:
+
+    session = ConversationSession(session_id)
+    async with session.turn():
+        session.add_message("user", message)
+        result = await Runner.run(agent, message, session=session)
+        session.add_message("assistant", response_text)
+
+If the turn fails, the transcript messages are still recorded but the partial SDK
+items are dropped, so the next run does not replay an incomplete exchange.
+
+The history returned to the Runner is bounded by the CHAT_HISTORY_* policy (see
+utils/conversation_history.py): the last N turns, a token budget, or a rolling
+summary of older turns plus the recent ones.
+"""
+
+import copy
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from agents.memory import SessionABC
+
+from backend.database import session_db
+from backend.database.async_db import run_db
+from backend.utils.conversation_history import (
+    FULL, SUMMARY, HistoryPolicy, split_turns, bound_turns, strip_payloads, summary_item, summarize
+)
+
+
+class ConversationSession(SessionABC):
+    """Session protocol implementation over the sessions/conversations/session_items tables."""
+
+    def __init__(self, session_id: str, db_path: Optional[str] = None):
+        self.session_id = session_id
+        self.db_path = db_path
+        self._pending_items: List[Dict[str, Any]] = []
+        self._pending_messages: List[Tuple[str, str]] = []
+
+    async def get_items(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        History plus items added during the current turn.
+
+        Without limit (the history replayed to the model) the history policy applies;
+        with limit the latest `limit` raw items are returned.
+        """
+        policy = HistoryPolicy.from_env()
+        if limit is not None or policy.mode == FULL:
+            items = await run_db(session_db.get_session_items, self.session_id, limit, self.db_path)
+        else:
+            items = await self._bounded_history(policy)
+        items += copy.deepcopy(self._pending_items)
+        return items[-limit:] if limit is not None else items
+
+    async def _bounded_history(self, policy: HistoryPolicy) -> List[Dict[str, Any]]:
+        """Stored history reduced by the policy (summary mode compacts old turns first)."""
+        if policy.mode != SUMMARY:
+            rows = await run_db(session_db.get_session_item_rows, self.session_id, 0, self.db_path)
+            turns = bound_turns(split_turns(rows), policy)
+            return [item for turn in turns for _, item in turn]
+
+        summary, summary_item_id = await run_db(session_db.get_session_summary, self.session_id, self.db_path)
+        # Items already folded into the summary are not read again
+        rows = await run_db(session_db.get_session_item_rows, self.session_id, summary_item_id, self.db_path)
+        turns = split_turns(rows)
+        if len(turns) > policy.max_turns:
+            old, turns = turns[:-policy.keep_turns], turns[-policy.keep_turns:]
+            try:
+                summary = await summarize(summary, [item for turn in old for _, item in turn])
+                await run_db(session_db.save_session_summary, self.session_id, summary, old[-1][-1][0], self.db_path)
+            except Exception as e:
+                # Use the recent turns only this time; compaction is retried on the next turn
+                print(f"[ConversationSession] Failed to summarize session {self.session_id}: {e}")
+
+        history = [summary_item(summary)] if summary else []
+        return history + [item for turn in turns for _, item in turn]
+
+    async def add_items(self, items: List[Dict[str, Any]]) -> None:
+        """Buffer items until the turn is flushed."""
+        self._pending_items.extend(copy.deepcopy(items))
+
+    async def pop_item(self) -> Optional[Dict[str, Any]]:
+        """Remove and return the most recent item (buffered items first)."""
+        if self._pending_items:
+            return self._pending_items.pop()
+        return await run_db(session_db.pop_session_item, self.session_id, self.db_path)
+
+    async def clear_session(self) -> None:
+        """Clear the SDK history of this session (the transcript is kept)."""
+        self._pending_items.clear()
+        await run_db(session_db.clear_session_items, self.session_id, self.db_path)
+
+    def add_message(self, role: str, content: str) -> None:
+        """Buffer a transcript message (conversations table) until the turn is flushed."""
+        self._pending_messages.append((role, content))
+
+    async def flush(self, include_items: bool = True) -> None:
+        """
+        Write buffered messages and items in one transaction.
+
+        Args:
+            include_items: Write the buffered SDK items too (False drops them)
+        """
+        messages, self._pending_messages = self._pending_messages, []
+        items, self._pending_items = self._pending_items, []
+        # Images/files are stored as short references
+        items = [strip_payloads(item) for item in items] if include_items else []
+        if messages or items:
+            await run_db(session_db.record_turn, self.session_id, messages, items, self.db_path)
+
+    @asynccontextmanager
+    async def turn(self) -> AsyncIterator['ConversationSession']:
+        """Flush the turn on exit; on error only the transcript messages are kept."""
+        try:
+            yield self
+        except BaseException:
+            await self.flush(include_items=False)
+            raise
+        await self.flush()
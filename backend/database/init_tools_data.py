@@ -28,6 +28,19 @@ def init_default_tools():
             'output_type': 'str',
             'output_description': '返回目标agent处理消息后的完整响应文本。如果agent执行成功，返回agent的执行结果；如果加载agent失败，返回"Error: Failed to load agent with ID {id} from database"；如果执行过程中出现异常，返回"Error sending message: {error_message}"',
         },
+        {
+            'id': 'broadcast_message',
+            'name': 'broadcast_message',
+            'description': '同时向多个agent发送同一条消息，并汇总它们的回复',
+            'task': '当问题涉及多个notebook时，MasterAgent用它并发询问这些NoteBookAgent；总耗时取决于最慢的一个，而不是所有回复时间之和',
+            'agent_type': 'MasterAgent',
+            'input_params': {
+                'ids': {'type': 'list[str]', 'description': '目标Agent ID列表（完整的UUID）', 'required': True},
+                'message': {'type': 'str', 'description': '要发送给每个agent的消息', 'required': True},
+            },
+            'output_type': 'str',
+            'output_description': 'JSON字符串：{"results": [{"id", "name", "status", "response"}]}，按ids的顺序排列；status为ok、error或timeout，失败时response为错误信息',
+        },
         {
             'id': 'create_notebook',
             'name': 'create_notebook',
@@ -0,0 +1,316 @@
+"""Background job records using SQLite.
+
+A job (e.g. notebook creation) goes queued -> running -> succeeded | failed | cancelled.
+Records are kept in the jobs table, so any API worker process can report the
+status, progress and result of a job; see utils/job_engine.py for execution.
+A job belongs to the process that created or claimed it, identified by BOOT_TOKEN (a
+restarted server often gets the same PID, e.g. PID 1 in a container). The owner holds a
+lease on its unfinished jobs by renewing heartbeat_at (see renew_job_leases); a job of
+another process whose lease is older than JOB_LEASE_SECONDS (default 120) is orphaned,
+while the jobs of sibling worker processes that are alive are left alone.
+Section checkpoints (section_checkpoints table) keep the sections a notebook creation
+job has finished, so a resumed job only generates the missing ones.
+"""
+
+import json
+import os
+import uuid
+from typing import Optional, List, Dict, Any
+from backend.database.agent_db import get_manager
+
+JOB_COLUMNS = "id, kind, status, title, session_id, params, progress, result, error, worker_pid, worker_token, heartbeat_at, created_at, started_at, finished_at, updated_at"
+
+# Identifies this process run; stored with the jobs it owns
+BOOT_TOKEN = uuid.uuid4().hex
+
+# Statuses of jobs that have not finished
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+def get_lease_seconds() -> float:
+    """Seconds without a heartbeat after which another process may take over a job."""
+    return float(os.getenv('JOB_LEASE_SECONDS', '120'))
+
+
+# Condition on an expired lease (parameter: _lease_cutoff()); heartbeat_at is NULL for
+# released leases and rows written before leases existed
+_LEASE_EXPIRED = "(heartbeat_at IS NULL OR heartbeat_at < datetime('now', ?))"
+
+
+def _lease_cutoff() -> str:
+    return f"-{get_lease_seconds()} seconds"
+
+
+def _job_dict(row: tuple) -> Dict[str, Any]:
+    job = dict(zip([column.strip() for column in JOB_COLUMNS.split(",")], row))
+    for key in ('params', 'result'):
+        if job[key] is not None:
+            job[key] = json.loads(job[key])
+    return job
+
+
+def create_job(
+    kind: str,
+    title: Optional[str] = None,
+    session_id: Optional[str] = None,
+    params: Optional[Dict[str, Any]] = None,
+    db_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Create a queued job owned by the current process.
+
+    Args:
+        kind: Job kind (e.g. "create_notebook")
+        title: Short description shown to the user
+        session_id: Session the job was started from
+        params: JSON-serializable job parameters
+        db_path: Optional database path
+
+    Returns:
+        The job dict
+    """
+    job_id = str(uuid.uuid4())
+    with get_manager(db_path).transaction() as conn:
+        conn.execute(
+            """INSERT INTO jobs (id, kind, status, title, session_id, params, worker_pid, worker_token, heartbeat_at)
+               VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)""",
+            (job_id, kind, title, session_id, json.dumps(params or {}, ensure_ascii=False), os.getpid(), BOOT_TOKEN)
+        )
+    return get_job(job_id, db_path)
+
+
+def update_job(
+    job_id: str,
+    status: Optional[str] = None,
+    progress: Optional[str] = None,
+    result: Optional[Any] = None,
+    error: Optional[str] = None,
+    db_path: Optional[str] = None
+) -> bool:
+    """
+    Update a job (only the given fields); started_at/finished_at follow the status.
+
+    Args:
+        job_id: The job ID
+        status: New status
+        progress: Latest progress message
+        result: JSON-serializable result
+        error: Error message
+        db_path: Optional database path
+
+    Returns:
+        True if the job exists
+    """
+    assignments = ["updated_at = CURRENT_TIMESTAMP"]
+    params: List[Any] = []
+    if status is not None:
+        assignments.append("status = ?")
+        params.append(status)
+        if status == 'running':
+            assignments.append("started_at = CURRENT_TIMESTAMP")
+        elif status not in ACTIVE_STATUSES:
+            assignments.append("finished_at = CURRENT_TIMESTAMP")
+    if progress is not None:
+        assignments.append("progress = ?")
+        params.append(progress)
+    if result is not None:
+        assignments.append("result = ?")
+        params.append(json.dumps(result, ensure_ascii=False))
+    if error is not None:
+        assignments.append("error = ?")
+        params.append(error)
+    with get_manager(db_path).transaction() as conn:
+        cursor = conn.execute(f"UPDATE jobs SET {', '.join(assignments)} WHERE id = ?", (*params, job_id))
+        return cursor.rowcount > 0
+
+
+def get_job(job_id: str, db_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Get a job by ID.
+
+    Args:
+        job_id: The job ID
+        db_path: Optional database path
+
+    Returns:
+        The job dict, or None if not found
+    """
+    row = get_manager(db_path).connection().execute(
+        f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    return _job_dict(row) if row else None
+
+
+def list_jobs(
+    session_id: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 50,
+    db_path: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    List jobs, newest first.
+
+    Args:
+        session_id: Only jobs of this session
+        status: Only jobs with this status
+        limit: Maximum number of jobs
+        db_path: Optional database path
+
+    Returns:
+        List of job dicts
+    """
+    conditions, params = [], []
+    if session_id is not None:
+        conditions.append("session_id = ?")
+        params.append(session_id)
+    if status is not None:
+        conditions.append("status = ?")
+        params.append(status)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = get_manager(db_path).connection().execute(
+        f"SELECT {JOB_COLUMNS} FROM jobs {where} ORDER BY created_at DESC, rowid DESC LIMIT ?",
+        (*params, limit)
+    ).fetchall()
+    return [_job_dict(row) for row in rows]
+
+
+def claim_job(job_id: str, status: str, worker_token: Optional[str], db_path: Optional[str] = None) -> bool:
+    """
+    Take over a job for the current process and queue it again (to resume it).
+
+    The job is only claimed if it still has the given status and worker, so of several
+    processes trying to resume the same job exactly one succeeds, and an unfinished job
+    only once its owner's lease has expired.
+
+    Args:
+        job_id: The job ID
+        status: Status the job was seen with
+        worker_token: Boot token of the worker process the job was seen with
+        db_path: Optional database path
+
+    Returns:
+        True if the current process now owns the job
+    """
+    placeholders = ", ".join("?" for _ in ACTIVE_STATUSES)
+    with get_manager(db_path).transaction() as conn:
+        cursor = conn.execute(
+            f"""UPDATE jobs SET status = 'queued', worker_pid = ?, worker_token = ?, error = NULL, finished_at = NULL,
+                   heartbeat_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+               WHERE id = ? AND status = ? AND worker_token IS ?
+                   AND (status NOT IN ({placeholders}) OR {_LEASE_EXPIRED})""",
+            (os.getpid(), BOOT_TOKEN, job_id, status, worker_token, *ACTIVE_STATUSES, _lease_cutoff())
+        )
+        return cursor.rowcount > 0
+
+
+def find_orphaned_jobs(db_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Get unfinished jobs of other processes whose lease has expired (e.g. after a restart).
+
+    Args:
+        db_path: Optional database path
+
+    Returns:
+        List of job dicts
+    """
+    placeholders = ", ".join("?" for _ in ACTIVE_STATUSES)
+    rows = get_manager(db_path).connection().execute(
+        f"""SELECT {JOB_COLUMNS} FROM jobs
+            WHERE status IN ({placeholders}) AND worker_token IS NOT ? AND {_LEASE_EXPIRED}
+            ORDER BY created_at, rowid""",
+        (*ACTIVE_STATUSES, BOOT_TOKEN, _lease_cutoff())
+    ).fetchall()
+    return [_job_dict(row) for row in rows]
+
+
+def renew_job_leases(db_path: Optional[str] = None) -> int:
+    """
+    Renew the lease of the unfinished jobs owned by the current process.
+
+    Args:
+        db_path: Optional database path
+
+    Returns:
+        Number of jobs renewed
+    """
+    placeholders = ", ".join("?" for _ in ACTIVE_STATUSES)
+    with get_manager(db_path).transaction() as conn:
+        return conn.execute(
+            f"UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE worker_token = ? AND status IN ({placeholders})",
+            (BOOT_TOKEN, *ACTIVE_STATUSES)
+        ).rowcount
+
+
+def release_job_leases(db_path: Optional[str] = None) -> int:
+    """
+    Give up the lease of the unfinished jobs owned by the current process (on shutdown),
+    so another process resumes them without waiting for the lease to expire.
+
+    Args:
+        db_path: Optional database path
+
+    Returns:
+        Number of jobs released
+    """
+    placeholders = ", ".join("?" for _ in ACTIVE_STATUSES)
+    with get_manager(db_path).transaction() as conn:
+        return conn.execute(
+            f"UPDATE jobs SET heartbeat_at = NULL WHERE worker_token = ? AND status IN ({placeholders})",
+            (BOOT_TOKEN, *ACTIVE_STATUSES)
+        ).rowcount
+
+
+def save_section_checkpoint(
+    job_id: str,
+    section_title: str,
+    section_index: int,
+    data: Dict[str, Any],
+    db_path: Optional[str] = None
+) -> None:
+    """
+    Store a finished section of a job (replaces an earlier checkpoint of the same section).
+
+    Args:
+        job_id: The job ID
+        section_title: Section title (key in the outline)
+        section_index: 1-based position of the section in the outline
+        data: The section as a JSON-serializable dict
+        db_path: Optional database path
+    """
+    with get_manager(db_path).transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO section_checkpoints (job_id, section_title, section_index, data) VALUES (?, ?, ?, ?)",
+            (job_id, section_title, section_index, json.dumps(data, ensure_ascii=False))
+        )
+
+
+def get_section_checkpoints(job_id: str, db_path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Get the finished sections of a job.
+
+    Args:
+        job_id: The job ID
+        db_path: Optional database path
+
+    Returns:
+        Dict mapping section title to the section dict
+    """
+    rows = get_manager(db_path).connection().execute(
+        "SELECT section_title, data FROM section_checkpoints WHERE job_id = ? ORDER BY section_index", (job_id,)
+    ).fetchall()
+    return {title: json.loads(data) for title, data in rows}
+
+
+def clear_section_checkpoints(job_id: str, db_path: Optional[str] = None) -> int:
+    """
+    Delete the section checkpoints of a job (once its notebook has been saved).
+
+    Args:
+        job_id: The job ID
+        db_path: Optional database path
+
+    Returns:
+        Number of checkpoints deleted
+    """
+    with get_manager(db_path).transaction() as conn:
+        return conn.execute("DELETE FROM section_checkpoints WHERE job_id = ?", (job_id,)).rowcount
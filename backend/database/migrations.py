@@ -0,0 +1,429 @@
+"""Schema setup and migrations for the shared agent database.
+
+agents, tools, sessions and conversations all live in the same SQLite file, so
+there is one ordered list of migrations for the whole file. The applied version is
+stored in PRAGMA user_version; ConnectionManager runs pending migrations once per
+process.
+
+Every migration must be safe on databases created before versioning existed
+(user_version = 0 but tables already present), so use IF NOT EXISTS and
+_add_column_if_missing instead of bare CREATE/ALTER statements.
+"""
+
+import sqlite3
+from typing import Callable, List, Tuple
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    """Return the column names of a table (empty list if the table does not exist)."""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def _add_column_if_missing(conn: sqlite3.Connection, table: str, column: str, definition: str) -> None:
+    """Add a column to a table unless it already exists."""
+    if column not in _table_columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _migration_1_agents(conn: sqlite3.Connection) -> None:
+    """Create agents table (with tool_ids column)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agents (
+            id TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            name TEXT NOT NULL,
+            parent_agent_id TEXT,
+            sub_agent_ids TEXT,
+            tool_ids TEXT,
+            data BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    _add_column_if_missing(conn, "agents", "tool_ids", "TEXT")
+
+
+def _migration_2_tools(conn: sqlite3.Connection) -> None:
+    """Create tools table (with output_description, tool_type, agent_class_name columns)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tools (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT,
+            task TEXT,
+            agent_type TEXT,
+            input_params TEXT,
+            output_type TEXT,
+            output_description TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    _add_column_if_missing(conn, "tools", "output_description", "TEXT")
+    _add_column_if_missing(conn, "tools", "tool_type", "TEXT DEFAULT 'function'")
+    _add_column_if_missing(conn, "tools", "agent_class_name", "TEXT")
+
+
+def _migration_3_sessions(conn: sqlite3.Connection) -> None:
+    """Create sessions and conversations tables."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            title TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversations_session_id
+        ON conversations(session_id)
+    """)
+
+
+def _migration_4_agent_header_indexes(conn: sqlite3.Connection) -> None:
+    """Index agents header columns so type/parent lookups don't scan (and unpickle) the table."""
+    # Covering indexes: header queries on type or parent are answered from the index alone
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_agents_type
+        ON agents(type, parent_agent_id, name)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_agents_parent
+        ON agents(parent_agent_id, type, name)
+    """)
+
+
+def _migration_5_agent_state(conn: sqlite3.Connection) -> None:
+    """Convert pickled agent rows to the versioned state format (see agent_state.py)."""
+    rows = conn.execute("SELECT id, data FROM agents WHERE substr(data, 1, 1) = X'80'").fetchall()
+    if not rows:
+        return
+
+    import pickle
+    from backend.database.agent_state import serialize_agent
+    from backend.database.notebook_content_db import force_inline_storage
+
+    converted = 0
+    for agent_id, data in rows:
+        try:
+            agent = pickle.loads(data)
+            # Content tables can't be written from here; the next save moves sections if configured
+            with force_inline_storage():
+                payload = serialize_agent(agent)
+            conn.execute("UPDATE agents SET data = ? WHERE id = ?", (payload, agent_id))
+            converted += 1
+        except Exception as e:
+            # Left as pickle: load_agent still reads it, and the next save rewrites it as state
+            print(f"[migrations] Could not convert agent {agent_id} to state format: {e}")
+    print(f"[migrations] Converted {converted}/{len(rows)} pickled agents to state format")
+
+
+def _migration_6_notebook_content(conn: sqlite3.Connection) -> None:
+    """Create normalized notebook content tables (see notebook_content_db.py)."""
+    for table in ("notebook_sections", "notebook_concept_blocks", "notebook_theorems", "notebook_examples"):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                notebook_id TEXT NOT NULL,
+                id TEXT NOT NULL,
+                parent_id TEXT,
+                parent_field TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (notebook_id, id)
+            )
+        """)
+        # Children of one parent, in order (also serves section lookup by title)
+        conn.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{table}_parent
+            ON {table}(notebook_id, parent_id, parent_field, position)
+        """)
+
+
+def _migration_7_blobs(conn: sqlite3.Connection) -> None:
+    """Create the content-addressed blob table and its reference table (see blob_store.py)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS blob_refs (
+            owner_id TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            PRIMARY KEY (owner_id, hash)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_blob_refs_hash ON blob_refs(hash)")
+
+
+def _migration_8_agent_version(conn: sqlite3.Connection) -> None:
+    """Add the agents.version column used for compare-and-swap saves."""
+    _add_column_if_missing(conn, "agents", "version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _migration_9_history_indexes(conn: sqlite3.Connection) -> None:
+    """Composite indexes matching the keyset-paginated conversation and session queries."""
+    # Serves WHERE session_id = ? ORDER BY created_at, id in both directions (replaces the session_id index)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversations_session_created
+        ON conversations(session_id, created_at, id)
+    """)
+    conn.execute("DROP INDEX IF EXISTS idx_conversations_session_id")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at, id)")
+
+
+def _migration_10_session_items(conn: sqlite3.Connection) -> None:
+    """Store agents SDK session items next to the conversation transcript (replaces session_history.db)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS session_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            item TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_session_items_session ON session_items(session_id, id)")
+    # Existing sessions keep their context: seed the history from the transcript,
+    # with payloads stripped like the items of new turns
+    import json
+    from backend.utils.conversation_history import strip_payloads
+
+    rows = conn.execute("""
+        SELECT session_id, role, content, created_at
+        FROM conversations
+        ORDER BY session_id, created_at, id
+    """).fetchall()
+    conn.executemany(
+        "INSERT INTO session_items (session_id, item, created_at) VALUES (?, ?, ?)",
+        [
+            (session_id, json.dumps(strip_payloads({'role': role, 'content': content}), ensure_ascii=False), created_at)
+            for session_id, role, content, created_at in rows
+        ]
+    )
+
+
+def _migration_11_session_summary(conn: sqlite3.Connection) -> None:
+    """Rolling conversation summary of a session and the last session item it covers."""
+    _add_column_if_missing(conn, "sessions", "summary", "TEXT")
+    _add_column_if_missing(conn, "sessions", "summary_item_id", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _migration_12_agent_cards(conn: sqlite3.Connection) -> None:
+    """Add agents.card (the agent's own card, read by the hierarchy query) and fill it from the stored state."""
+    _add_column_if_missing(conn, "agents", "card", "TEXT")
+
+    import json
+    from backend.database.agent_state import STATE_FORMAT, card_from_state, is_pickled
+    from backend.database.blob_store import BLOB_REF_KEY, decompress_payload
+
+    filled = 0
+    rows = conn.execute("SELECT id, data FROM agents WHERE card IS NULL").fetchall()
+    for agent_id, data in rows:
+        try:
+            data = decompress_payload(data)
+            if is_pickled(data):
+                continue
+            envelope = json.loads(data.decode('utf-8'))
+            if envelope.get('format') != STATE_FORMAT:
+                continue
+            card = card_from_state(envelope.get('class'), envelope['state'])
+            # Blob references can't be resolved here; such cards are written by the next save
+            if BLOB_REF_KEY in json.dumps(card):
+                continue
+            conn.execute(
+                "UPDATE agents SET card = ? WHERE id = ?",
+                (json.dumps(card, ensure_ascii=False), agent_id)
+            )
+            filled += 1
+        except Exception as e:
+            print(f"[migrations] Could not build the card of agent {agent_id}: {e}")
+    if rows:
+        print(f"[migrations] Filled cards for {filled}/{len(rows)} agents")
+
+
+def _migration_13_shared_state(conn: sqlite3.Connection) -> None:
+    """Agent change log (cache invalidation across worker processes) and the shared trace store."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agent_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_id TEXT NOT NULL,
+            version INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Every version bump or delete is logged; only the newest 10000 events are kept
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS agents_version_event AFTER UPDATE OF version ON agents
+        BEGIN
+            INSERT INTO agent_events (agent_id, version) VALUES (NEW.id, NEW.version);
+            DELETE FROM agent_events WHERE id <= (SELECT MAX(id) FROM agent_events) - 10000;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS agents_delete_event AFTER DELETE ON agents
+        BEGIN
+            INSERT INTO agent_events (agent_id, version) VALUES (OLD.id, NULL);
+            DELETE FROM agent_events WHERE id <= (SELECT MAX(id) FROM agent_events) - 10000;
+        END
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS traces (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            session_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_traces_session ON traces(session_id, seq)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_traces_created ON traces(created_at)")
+
+
+def _migration_14_jobs(conn: sqlite3.Connection) -> None:
+    """Background jobs (notebook creation) with their status, progress and result."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            title TEXT,
+            session_id TEXT,
+            params TEXT,
+            progress TEXT,
+            result TEXT,
+            error TEXT,
+            worker_pid INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_session ON jobs(session_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+
+
+def _migration_15_section_checkpoints(conn: sqlite3.Connection) -> None:
+    """Sections finished by a notebook creation job, so an interrupted job can resume."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS section_checkpoints (
+            job_id TEXT NOT NULL,
+            section_title TEXT NOT NULL,
+            section_index INTEGER,
+            data TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (job_id, section_title)
+        )
+    """)
+
+
+def _migration_16_job_worker_token(conn: sqlite3.Connection) -> None:
+    """Add jobs.worker_token, the boot token of the process running a job (PIDs are reused across restarts)."""
+    _add_column_if_missing(conn, "jobs", "worker_token", "TEXT")
+
+
+def _migration_17_job_heartbeat(conn: sqlite3.Connection) -> None:
+    """Add jobs.heartbeat_at, the lease the owning process renews while it runs a job."""
+    _add_column_if_missing(conn, "jobs", "heartbeat_at", "TIMESTAMP")
+
+
+def _migration_18_trace_events(conn: sqlite3.Connection) -> None:
+    """Trace change log: the shared trace feed follows it by ID across worker processes."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS trace_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            event TEXT NOT NULL,
+            data TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trace_events_session ON trace_events(session_id, id)")
+    # Every new or changed activity is logged with all its fields; only the newest 10000 events are kept
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS traces_insert_event AFTER INSERT ON traces
+        BEGIN
+            INSERT INTO trace_events (session_id, event, data) VALUES (NEW.session_id, 'activity', NEW.data);
+            DELETE FROM trace_events WHERE id <= (SELECT MAX(id) FROM trace_events) - 10000;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS traces_update_event AFTER UPDATE OF data ON traces
+        BEGIN
+            INSERT INTO trace_events (session_id, event, data) VALUES (NEW.session_id, 'update', NEW.data);
+            DELETE FROM trace_events WHERE id <= (SELECT MAX(id) FROM trace_events) - 10000;
+        END
+    """)
+
+
+# Ordered list of (version, migration). Append new migrations with the next version number.
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _migration_1_agents),
+    (2, _migration_2_tools),
+    (3, _migration_3_sessions),
+    (4, _migration_4_agent_header_indexes),
+    (5, _migration_5_agent_state),
+    (6, _migration_6_notebook_content),
+    (7, _migration_7_blobs),
+    (8, _migration_8_agent_version),
+    (9, _migration_9_history_indexes),
+    (10, _migration_10_session_items),
+    (11, _migration_11_session_summary),
+    (12, _migration_12_agent_cards),
+    (13, _migration_13_shared_state),
+    (14, _migration_14_jobs),
+    (15, _migration_15_section_checkpoints),
+    (16, _migration_16_job_worker_token),
+    (17, _migration_17_job_heartbeat),
+    (18, _migration_18_trace_events),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the schema version stored in PRAGMA user_version."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn: sqlite3.Connection) -> int:
+    """
+    Apply all pending migrations in a single transaction.
+
+    Args:
+        conn: Connection in autocommit mode (isolation_level=None)
+
+    Returns:
+        The schema version after migrating
+    """
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return SCHEMA_VERSION
+
+    # BEGIN IMMEDIATE takes the write lock, so concurrent processes migrate one at a time;
+    # re-read the version inside the transaction in case another process already migrated.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = get_schema_version(conn)
+        for version, migration in MIGRATIONS:
+            if version > current:
+                migration(conn)
+                current = version
+        # PRAGMA does not accept bound parameters
+        conn.execute(f"PRAGMA user_version = {int(current)}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return current
@@ -0,0 +1,350 @@
+"""Normalized notebook content storage.
+
+By default a NoteBookAgent's sections are stored inside its agents.data row, so a
+one-field edit rewrites the whole notebook and reading one section loads all of
+them. With NOTEBOOK_CONTENT_STORAGE=normalized, Section, ConceptBlock, Theorem and
+Example objects are stored one row each, keyed by the content IDs generated by
+content_id_utils:
+
+    notebook_sections        parent_id NULL,             parent_field = section title (dict key)
+    notebook_concept_blocks  parent_id = section id,     parent_field = "concept_blocks"
+    notebook_theorems        parent_id = concept block,  parent_field = "theorems"
+    notebook_examples        parent_id = section / concept block / theorem,
+                             parent_field = "examples" | "standalone_examples" | "exercises"
+
+Each row's data column holds the object's own fields as JSON (nested lists live in
+their own tables). Saving diffs the in-memory sections against the stored rows and
+only writes rows that changed, so updating one field or appending one exercise
+touches one row. The in-memory NoteBookAgent API is unchanged.
+
+Saves of a notebook that was loaded from the database are merged row by row with
+concurrent saves (base_rows = the rows as loaded): rows the other writer added or
+changed are kept, and only a row changed or deleted by both raises
+AgentVersionConflict.
+"""
+
+import contextvars
+import json
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from backend.database.agent_db import get_manager, AgentVersionConflict
+
+INLINE = "inline"
+NORMALIZED = "normalized"
+
+SECTIONS_TABLE = "notebook_sections"
+CONCEPT_BLOCKS_TABLE = "notebook_concept_blocks"
+THEOREMS_TABLE = "notebook_theorems"
+EXAMPLES_TABLE = "notebook_examples"
+CONTENT_TABLES = (SECTIONS_TABLE, CONCEPT_BLOCKS_TABLE, THEOREMS_TABLE, EXAMPLES_TABLE)
+
+# Nested list fields that are stored as child rows instead of inside data
+_CHILD_FIELDS = {
+    SECTIONS_TABLE: {'concept_blocks', 'standalone_examples', 'exercises'},
+    CONCEPT_BLOCKS_TABLE: {'examples', 'theorems'},
+    THEOREMS_TABLE: {'examples'},
+    EXAMPLES_TABLE: set(),
+}
+
+# Content type passed to generate_content_id when a duplicate ID must be replaced
+_CONTENT_TYPES = {
+    SECTIONS_TABLE: "section",
+    CONCEPT_BLOCKS_TABLE: "concept_block",
+    THEOREMS_TABLE: "theorem",
+    EXAMPLES_TABLE: "example",
+}
+
+# (table, content_id) -> (parent_id, parent_field, position, data)
+ContentRows = Dict[Tuple[str, str], Tuple[Optional[str], str, int, str]]
+
+
+# Set by force_inline_storage() for code paths that cannot write content rows
+_force_inline: contextvars.ContextVar[bool] = contextvars.ContextVar("force_inline_content_storage", default=False)
+
+
+def get_content_storage_mode() -> str:
+    """Configured storage mode for notebook content ("inline" or "normalized")."""
+    if _force_inline.get():
+        return INLINE
+    mode = os.getenv('NOTEBOOK_CONTENT_STORAGE', INLINE).strip().lower()
+    return NORMALIZED if mode == NORMALIZED else INLINE
+
+
+@contextmanager
+def force_inline_storage() -> Iterator[None]:
+    """Serialize notebooks with inline sections inside this scope (used by migrations)."""
+    token = _force_inline.set(True)
+    try:
+        yield
+    finally:
+        _force_inline.reset(token)
+
+
+def _dump_data(table: str, obj: Any) -> str:
+    """Serialize an object's own fields (without child lists) as compact JSON."""
+    data = obj.model_dump(mode="json", exclude=_CHILD_FIELDS[table])
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def flatten_sections(notebook_id: str, sections: Dict[str, Any]) -> ContentRows:
+    """
+    Flatten sections into content rows.
+
+    Objects must already have IDs (content_id_utils.ensure_ids). An ID that appears
+    twice in the same notebook (e.g. copied content) is replaced with a new one.
+    """
+    from backend.utils.content_id_utils import generate_content_id
+
+    rows: ContentRows = {}
+
+    def add(table: str, obj: Any, parent_id: Optional[str], parent_field: str, position: int) -> str:
+        if not obj.id or (table, obj.id) in rows:
+            new_id = generate_content_id(_CONTENT_TYPES[table], parent_id or notebook_id)
+            if obj.id:
+                print(f"[NotebookContentDB] Duplicate content ID {obj.id} in notebook {notebook_id}, reassigned to {new_id}")
+            obj.id = new_id
+        rows[(table, obj.id)] = (parent_id, parent_field, position, _dump_data(table, obj))
+        return obj.id
+
+    def add_examples(examples: Iterable[Any], parent_id: str, parent_field: str) -> None:
+        for position, example in enumerate(examples):
+            add(EXAMPLES_TABLE, example, parent_id, parent_field, position)
+
+    for section_position, (section_key, section) in enumerate(sections.items()):
+        section_id = add(SECTIONS_TABLE, section, None, section_key, section_position)
+        for block_position, block in enumerate(section.concept_blocks):
+            block_id = add(CONCEPT_BLOCKS_TABLE, block, section_id, 'concept_blocks', block_position)
+            add_examples(block.examples, block_id, 'examples')
+            for theorem_position, theorem in enumerate(block.theorems):
+                theorem_id = add(THEOREMS_TABLE, theorem, block_id, 'theorems', theorem_position)
+                add_examples(theorem.examples, theorem_id, 'examples')
+        add_examples(section.standalone_examples, section_id, 'standalone_examples')
+        add_examples(section.exercises, section_id, 'exercises')
+
+    return rows
+
+
+def _read_rows(
+    conn,
+    notebook_id: str,
+    tables: Tuple[str, ...] = CONTENT_TABLES,
+    where: str = "",
+    params: tuple = ()
+) -> ContentRows:
+    """Read stored content rows of a notebook (optionally filtered) from the given content tables."""
+    rows: ContentRows = {}
+    for table in tables:
+        cursor = conn.execute(
+            f"SELECT id, parent_id, parent_field, position, data FROM {table} WHERE notebook_id = ? {where}",
+            (notebook_id,) + params
+        )
+        for content_id, parent_id, parent_field, position, data in cursor:
+            rows[(table, content_id)] = (parent_id, parent_field, position, data)
+    return rows
+
+
+def _assemble_sections(rows: ContentRows) -> Dict[str, Any]:
+    """Rebuild {section_key: Section} from content rows."""
+    from backend.models import Section, ConceptBlock, Theorem, Example
+
+    # (parent_id, parent_field) -> [(position, table, content_id, data)]
+    children: Dict[Tuple[Optional[str], str], List[Tuple[int, str, str, str]]] = {}
+    for (table, content_id), (parent_id, parent_field, position, data) in rows.items():
+        children.setdefault((parent_id, parent_field), []).append((position, table, content_id, data))
+    for entries in children.values():
+        entries.sort(key=lambda entry: entry[0])
+
+    def child_data(parent_id: str, parent_field: str) -> List[Tuple[str, Dict[str, Any]]]:
+        return [(content_id, json.loads(data)) for _, _, content_id, data in children.get((parent_id, parent_field), [])]
+
+    def examples(parent_id: str, parent_field: str) -> List[Any]:
+        return [Example.model_validate(data) for _, data in child_data(parent_id, parent_field)]
+
+    def theorems(block_id: str) -> List[Any]:
+        return [
+            Theorem.model_validate({**data, 'examples': examples(theorem_id, 'examples')})
+            for theorem_id, data in child_data(block_id, 'theorems')
+        ]
+
+    def concept_blocks(section_id: str) -> List[Any]:
+        return [
+            ConceptBlock.model_validate({
+                **data,
+                'examples': examples(block_id, 'examples'),
+                'theorems': theorems(block_id),
+            })
+            for block_id, data in child_data(section_id, 'concept_blocks')
+        ]
+
+    section_rows = sorted(
+        (position, parent_field, content_id, data)
+        for (table, content_id), (_, parent_field, position, data) in rows.items()
+        if table == SECTIONS_TABLE
+    )
+    sections = {}
+    for _, section_key, section_id, data in section_rows:
+        sections[section_key] = Section.model_validate({
+            **json.loads(data),
+            'concept_blocks': concept_blocks(section_id),
+            'standalone_examples': examples(section_id, 'standalone_examples'),
+            'exercises': examples(section_id, 'exercises'),
+        })
+    return sections
+
+
+def save_notebook_content(notebook_id: str, sections: Dict[str, Any], db_path: Optional[str] = None) -> int:
+    """
+    Store a notebook's sections as content rows, writing only rows that changed.
+
+    Joins the caller's transaction if one is active (e.g. save_agent).
+
+    Args:
+        notebook_id: The notebook agent ID
+        sections: Dictionary mapping section titles to Section objects (with content IDs)
+        db_path: Optional database path
+
+    Returns:
+        Number of rows inserted, updated or deleted
+    """
+    return save_content_rows(notebook_id, flatten_sections(notebook_id, sections or {}), db_path)
+
+
+def save_content_rows(
+    notebook_id: str,
+    new_rows: ContentRows,
+    db_path: Optional[str] = None,
+    base_rows: Optional[ContentRows] = None
+) -> int:
+    """
+    Store flattened content rows, writing only rows that changed.
+
+    Without base_rows the stored rows are replaced by new_rows. With base_rows (the
+    rows the notebook was loaded with), only this writer's changes relative to
+    base_rows are applied, so rows changed by a concurrent save are preserved.
+
+    Args:
+        notebook_id: The notebook agent ID
+        new_rows: Rows from flatten_sections
+        db_path: Optional database path
+        base_rows: Rows as they were when the notebook was loaded
+
+    Returns:
+        Number of rows inserted, updated or deleted
+
+    Raises:
+        AgentVersionConflict: If a row was changed (or deleted) both here and concurrently
+    """
+    with get_manager(db_path).transaction() as conn:
+        old_rows = _read_rows(conn, notebook_id)
+
+        if base_rows is None:
+            written = [key for key, values in new_rows.items() if old_rows.get(key) != values]
+            deleted = list(old_rows.keys() - new_rows.keys())
+        else:
+            written = [key for key, values in new_rows.items() if base_rows.get(key) != values]
+            deleted = [key for key in base_rows.keys() - new_rows.keys() if key in old_rows]
+            conflicts = [
+                f"{table}.{content_id}"
+                for table, content_id in written + deleted
+                if old_rows.get((table, content_id)) not in (base_rows.get((table, content_id)), new_rows.get((table, content_id)))
+            ]
+            if conflicts:
+                raise AgentVersionConflict(notebook_id, conflicts)
+            written = [key for key in written if old_rows.get(key) != new_rows[key]]
+
+        changed: Dict[str, List[tuple]] = {}
+        for table, content_id in written:
+            changed.setdefault(table, []).append((notebook_id, content_id) + new_rows[(table, content_id)])
+        for table, params in changed.items():
+            conn.executemany(f"""
+                INSERT INTO {table} (notebook_id, id, parent_id, parent_field, position, data)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(notebook_id, id) DO UPDATE SET
+                    parent_id = excluded.parent_id,
+                    parent_field = excluded.parent_field,
+                    position = excluded.position,
+                    data = excluded.data
+            """, params)
+
+        removed: Dict[str, List[tuple]] = {}
+        for table, content_id in deleted:
+            removed.setdefault(table, []).append((notebook_id, content_id))
+        for table, params in removed.items():
+            conn.executemany(f"DELETE FROM {table} WHERE notebook_id = ? AND id = ?", params)
+
+    return sum(len(params) for params in changed.values()) + sum(len(params) for params in removed.values())
+
+
+def load_notebook_sections(notebook_id: str, db_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load all sections of a notebook from the content tables.
+
+    Args:
+        notebook_id: The notebook agent ID
+        db_path: Optional database path
+
+    Returns:
+        Dictionary mapping section titles to Section objects (empty if none are stored)
+    """
+    rows = _read_rows(get_manager(db_path).connection(), notebook_id)
+    return _assemble_sections(rows)
+
+
+def load_section(
+    notebook_id: str,
+    section_id: Optional[str] = None,
+    section_title: Optional[str] = None,
+    db_path: Optional[str] = None
+) -> Optional[Any]:
+    """
+    Load a single section (with its blocks, theorems and examples) without loading the notebook.
+
+    Args:
+        notebook_id: The notebook agent ID
+        section_id: Section content ID (checked first)
+        section_title: Section title, used when section_id is not given
+        db_path: Optional database path
+
+    Returns:
+        The Section object, or None if it is not stored in the content tables
+    """
+    conn = get_manager(db_path).connection()
+    if section_id:
+        rows = _read_rows(conn, notebook_id, (SECTIONS_TABLE,), "AND id = ?", (section_id,))
+    elif section_title:
+        rows = _read_rows(conn, notebook_id, (SECTIONS_TABLE,), "AND parent_id IS NULL AND parent_field = ?", (section_title,))
+    else:
+        return None
+    if not rows:
+        return None
+
+    # Walk down one level at a time: section -> concept blocks -> theorems, then examples of all of them
+    parent_ids = [content_id for _, content_id in rows]
+    for table in (CONCEPT_BLOCKS_TABLE, THEOREMS_TABLE, EXAMPLES_TABLE):
+        placeholders = ",".join("?" * len(parent_ids))
+        level = _read_rows(conn, notebook_id, (table,), f"AND parent_id IN ({placeholders})", tuple(parent_ids))
+        rows.update(level)
+        parent_ids += [content_id for _, content_id in level]
+
+    sections = _assemble_sections(rows)
+    return next(iter(sections.values()), None)
+
+
+def delete_notebook_content(notebook_id: str, db_path: Optional[str] = None) -> int:
+    """
+    Delete all content rows of a notebook.
+
+    Args:
+        notebook_id: The notebook agent ID
+        db_path: Optional database path
+
+    Returns:
+        Number of rows deleted
+    """
+    deleted = 0
+    with get_manager(db_path).transaction() as conn:
+        for table in CONTENT_TABLES:
+            deleted += conn.execute(f"DELETE FROM {table} WHERE notebook_id = ?", (notebook_id,)).rowcount
+    return deleted
@@ -1,53 +1,25 @@
-"""Session database operations using SQLite."""
+"""Session database operations using SQLite.
+
+A session has two histories in the same database file:
+- conversations: the user-facing transcript (role/content) served by the sessions API
+- session_items: the agents SDK input items replayed to Runner.run (see
+  conversation_session.ConversationSession); record_turn writes both in one transaction
+"""
 
-import sqlite3
-import json
 import os
-from typing import Optional, List, Dict, Any
+import json
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
-from backend.database.agent_db import get_db_path, init_db
+from backend.database.agent_db import get_db_path, get_manager
 
 
 def init_session_db(db_path: Optional[str] = None) -> None:
-    """Initialize the database with sessions and conversations tables."""
-    db_path = get_db_path(db_path)
+    """Initialize the database with sessions and conversations tables.
     
-    # Initialize agent DB first (creates directory if needed)
-    init_db(db_path)
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Create sessions table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS sessions (
-            id TEXT PRIMARY KEY,
-            title TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Create conversations table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT NOT NULL,
-            role TEXT NOT NULL,
-            content TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE
-        )
-    """)
-    
-    # Create index for faster queries
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_conversations_session_id 
-        ON conversations(session_id)
-    """)
-    
-    conn.commit()
-    conn.close()
+    Tables are created by the schema migrations (see migrations.py), which the
+    connection manager runs once per process; this only opens the connection.
+    """
+    get_manager(db_path).connection()
 
 
 def create_session(title: Optional[str] = None, db_path: Optional[str] = None) -> Dict[str, Any]:
@@ -64,19 +36,12 @@ def create_session(title: Optional[str] = None, db_path: Optional[str] = None) -
     import uuid
     
     session_id = str(uuid.uuid4())
-    db_path = get_db_path(db_path)
-    init_session_db(db_path)
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
     
-    cursor.execute("""
-        INSERT INTO sessions (id, title)
-        VALUES (?, ?)
-    """, (session_id, title))
-    
-    conn.commit()
-    conn.close()
+    with get_manager(db_path).transaction() as conn:
+        conn.execute("""
+            INSERT INTO sessions (id, title)
+            VALUES (?, ?)
+        """, (session_id, title))
     
     return {
         'id': session_id,
@@ -102,13 +67,10 @@ def get_session(session_id: str, db_path: Optional[str] = None) -> Optional[Dict
     if not os.path.exists(db_path):
         return None
     
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id, title, created_at, updated_at FROM sessions WHERE id = ?", (session_id,))
-    row = cursor.fetchone()
-    
-    conn.close()
+    conn = get_manager(db_path).connection()
+    row = conn.execute(
+        "SELECT id, title, created_at, updated_at FROM sessions WHERE id = ?", (session_id,)
+    ).fetchone()
     
     if row:
         return {
@@ -121,56 +83,82 @@ def get_session(session_id: str, db_path: Optional[str] = None) -> Optional[Dict
     return None
 
 
-def list_sessions(db_path: Optional[str] = None) -> List[Dict[str, Any]]:
+def _session_dict(row: tuple) -> Dict[str, Any]:
+    return {
+        'id': row[0],
+        'title': row[1],
+        'created_at': row[2],
+        'updated_at': row[3]
+    }
+
+
+def session_cursor(session: Dict[str, Any]) -> str:
+    """Cursor for list_sessions pointing at a session (its sort key: updated_at and id)."""
+    return f"{session['updated_at']}|{session['id']}"
+
+
+def list_sessions(
+    db_path: Optional[str] = None,
+    limit: Optional[int] = None,
+    before: Optional[str] = None,
+    after: Optional[str] = None
+) -> List[Dict[str, Any]]:
     """
-    List all sessions.
+    List sessions, most recently updated first (keyset-paginated).
     
     Args:
         db_path: Optional database path
+        limit: Maximum number of sessions (None = all)
+        before: Cursor (see session_cursor); only sessions updated before it are returned
+        after: Cursor; only sessions updated after it are returned (the ones closest to it)
         
     Returns:
         List of session dictionaries
     """
-    db_path = get_db_path(db_path)
-    
-    # Initialize session DB (creates tables if they don't exist)
-    init_session_db(db_path)
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Check if sessions table exists (in case of older database)
-    cursor.execute("""
-        SELECT name FROM sqlite_master 
-        WHERE type='table' AND name='sessions'
-    """)
-    if not cursor.fetchone():
-        # Table doesn't exist, create it
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sessions (
-                id TEXT PRIMARY KEY,
-                title TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        conn.commit()
-    
-    cursor.execute("SELECT id, title, created_at, updated_at FROM sessions ORDER BY updated_at DESC")
-    rows = cursor.fetchall()
-    
-    conn.close()
-    
-    sessions = []
-    for row in rows:
-        sessions.append({
-            'id': row[0],
-            'title': row[1],
-            'created_at': row[2],
-            'updated_at': row[3]
-        })
+    where, params, order = "", [], "DESC"
+    cursor = after or before
+    if cursor:
+        updated_at, _, session_id = cursor.partition("|")
+        where = "WHERE (updated_at, id) > (?, ?)" if after else "WHERE (updated_at, id) < (?, ?)"
+        params = [updated_at, session_id]
+        # Walk up from the cursor so the limit keeps the sessions next to it
+        order = "ASC" if after else "DESC"
+    
+    sql = f"SELECT id, title, created_at, updated_at FROM sessions {where} ORDER BY updated_at {order}, id {order}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    
+    rows = get_manager(db_path).connection().execute(sql, params).fetchall()
+    if order == "ASC":
+        rows.reverse()
+    return [_session_dict(row) for row in rows]
+
+
+def list_sessions_page(
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    db_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    One page of list_sessions with the cursor to continue from.
     
-    return sessions
+    Returns:
+        {'sessions': [...], 'has_more': bool, 'next_cursor': str | None}; pass next_cursor
+        as the same parameter (before, or after when paging with after) to get the next page
+    """
+    sessions = list_sessions(db_path, limit + 1, before, after)
+    has_more = len(sessions) > limit
+    if has_more:
+        # The extra row is the one farthest from the cursor
+        sessions = sessions[1:] if after else sessions[:limit]
+    edge = (sessions[0] if after else sessions[-1]) if sessions else None
+    return {
+        'sessions': sessions,
+        'has_more': has_more,
+        'next_cursor': session_cursor(edge) if edge and has_more else None,
+    }
 
 
 def delete_session(session_id: str, db_path: Optional[str] = None) -> bool:
@@ -189,14 +177,12 @@ def delete_session(session_id: str, db_path: Optional[str] = None) -> bool:
     if not os.path.exists(db_path):
         return False
     
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
-    deleted = cursor.rowcount > 0
-    
-    conn.commit()
-    conn.close()
+    with get_manager(db_path).transaction() as conn:
+        cursor = conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        deleted = cursor.rowcount > 0
+        # foreign_keys is off, so ON DELETE CASCADE does not fire
+        conn.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM session_items WHERE session_id = ?", (session_id,))
     
     return deleted
 
@@ -216,62 +202,234 @@ def add_conversation(
         content: Message content
         db_path: Optional database path
     """
-    db_path = get_db_path(db_path)
-    init_session_db(db_path)
+    record_turn(session_id, [(role, content)], db_path=db_path)
+
+
+def record_turn(
+    session_id: str,
+    messages: List[Tuple[str, str]],
+    items: Optional[List[Dict[str, Any]]] = None,
+    db_path: Optional[str] = None
+) -> None:
+    """
+    Write one chat turn in a single transaction: transcript messages and SDK session items.
+    
+    Args:
+        session_id: Session ID
+        messages: (role, content) pairs for the conversations transcript
+        items: agents SDK input items to append to the session history
+        db_path: Optional database path
+    """
+    with get_manager(db_path).transaction() as conn:
+        if messages:
+            conn.executemany("""
+                INSERT INTO conversations (session_id, role, content)
+                VALUES (?, ?, ?)
+            """, [(session_id, role, content) for role, content in messages])
+        if items:
+            conn.executemany(
+                "INSERT INTO session_items (session_id, item) VALUES (?, ?)",
+                [(session_id, json.dumps(item, ensure_ascii=False)) for item in items]
+            )
+        
+        # Update session updated_at timestamp
+        conn.execute("""
+            UPDATE sessions 
+            SET updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (session_id,))
+
+
+def get_session_items(
+    session_id: str,
+    limit: Optional[int] = None,
+    db_path: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Get the SDK session items of a session in chronological order.
     
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    Args:
+        session_id: Session ID
+        limit: Only the latest N items (None = all)
+        db_path: Optional database path
+        
+    Returns:
+        List of input items
+    """
+    conn = get_manager(db_path).connection()
+    if limit is None:
+        rows = conn.execute(
+            "SELECT item FROM session_items WHERE session_id = ? ORDER BY id", (session_id,)
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT item FROM session_items WHERE session_id = ? ORDER BY id DESC LIMIT ?", (session_id, limit)
+        ).fetchall()
+        rows.reverse()
+    return [json.loads(row[0]) for row in rows]
+
+
+def get_session_item_rows(
+    session_id: str,
+    after_id: int = 0,
+    db_path: Optional[str] = None
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Get (id, item) rows of a session's SDK items stored after a given item ID.
     
-    cursor.execute("""
-        INSERT INTO conversations (session_id, role, content)
-        VALUES (?, ?, ?)
-    """, (session_id, role, content))
+    Args:
+        session_id: Session ID
+        after_id: Only items with a larger ID (e.g. sessions.summary_item_id)
+        db_path: Optional database path
+        
+    Returns:
+        List of (id, item) tuples in chronological order
+    """
+    rows = get_manager(db_path).connection().execute(
+        "SELECT id, item FROM session_items WHERE session_id = ? AND id > ? ORDER BY id", (session_id, after_id)
+    ).fetchall()
+    return [(row[0], json.loads(row[1])) for row in rows]
+
+
+def get_session_summary(session_id: str, db_path: Optional[str] = None) -> Tuple[Optional[str], int]:
+    """
+    Get the rolling summary of a session.
     
-    # Update session updated_at timestamp
-    cursor.execute("""
-        UPDATE sessions 
-        SET updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    """, (session_id,))
+    Returns:
+        (summary text or None, ID of the last session item the summary covers)
+    """
+    row = get_manager(db_path).connection().execute(
+        "SELECT summary, summary_item_id FROM sessions WHERE id = ?", (session_id,)
+    ).fetchone()
+    return (row[0], row[1]) if row else (None, 0)
+
+
+def save_session_summary(
+    session_id: str,
+    summary: str,
+    summary_item_id: int,
+    db_path: Optional[str] = None
+) -> None:
+    """
+    Store the rolling summary of a session.
     
-    conn.commit()
-    conn.close()
+    Args:
+        session_id: Session ID
+        summary: Summary text
+        summary_item_id: ID of the last session item included in the summary
+        db_path: Optional database path
+    """
+    with get_manager(db_path).transaction() as conn:
+        # Never move backwards if two requests summarized the same session concurrently
+        conn.execute("""
+            UPDATE sessions SET summary = ?, summary_item_id = ?
+            WHERE id = ? AND summary_item_id < ?
+        """, (summary, summary_item_id, session_id, summary_item_id))
+
+
+def pop_session_item(session_id: str, db_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Remove and return the latest SDK session item of a session (None if there is none)."""
+    with get_manager(db_path).transaction() as conn:
+        row = conn.execute("""
+            DELETE FROM session_items
+            WHERE id = (SELECT MAX(id) FROM session_items WHERE session_id = ?)
+            RETURNING item
+        """, (session_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
 
+def clear_session_items(session_id: str, db_path: Optional[str] = None) -> None:
+    """Delete the SDK session items and summary of a session (the transcript is kept)."""
+    with get_manager(db_path).transaction() as conn:
+        conn.execute("DELETE FROM session_items WHERE session_id = ?", (session_id,))
+        conn.execute("UPDATE sessions SET summary = NULL, summary_item_id = 0 WHERE id = ?", (session_id,))
 
-def get_conversations(session_id: str, db_path: Optional[str] = None) -> List[Dict[str, str]]:
+
+def get_conversations(
+    session_id: str,
+    db_path: Optional[str] = None,
+    limit: Optional[int] = None,
+    before: Optional[int] = None,
+    after: Optional[int] = None
+) -> List[Dict[str, Any]]:
     """
-    Get all conversations for a session.
+    Get conversations for a session in chronological order (keyset-paginated).
+    
+    Without a cursor, limit returns the latest messages. Cursors are conversation IDs.
     
     Args:
         session_id: Session ID
         db_path: Optional database path
+        limit: Maximum number of messages (None = all)
+        before: Only messages older than this conversation ID (the ones closest to it)
+        after: Only messages newer than this conversation ID (the ones closest to it)
         
     Returns:
-        List of conversation dictionaries
+        List of conversation dictionaries (id, role, content, created_at)
     """
     db_path = get_db_path(db_path)
     
     if not os.path.exists(db_path):
         return []
     
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT role, content 
-        FROM conversations 
-        WHERE session_id = ? 
-        ORDER BY created_at ASC
-    """, (session_id,))
+    where, params = "", [session_id]
+    if after is not None:
+        where = "AND (created_at, id) > (SELECT created_at, id FROM conversations WHERE id = ?)"
+        params.append(after)
+    elif before is not None:
+        where = "AND (created_at, id) < (SELECT created_at, id FROM conversations WHERE id = ?)"
+        params.append(before)
+    # Pages without an after cursor are taken from the newest end and reversed
+    order = "ASC" if after is not None or limit is None else "DESC"
+    
+    sql = f"""
+        SELECT id, role, content, created_at
+        FROM conversations
+        WHERE session_id = ? {where}
+        ORDER BY created_at {order}, id {order}
+    """
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
     
-    rows = cursor.fetchall()
-    conn.close()
+    rows = get_manager(db_path).connection().execute(sql, params).fetchall()
+    if order == "DESC":
+        rows.reverse()
     
     conversations = []
     for row in rows:
         conversations.append({
-            'role': row[0],
-            'content': row[1]
+            'id': row[0],
+            'role': row[1],
+            'content': row[2],
+            'created_at': row[3]
         })
     
     return conversations
+
+
+def get_conversations_page(
+    session_id: str,
+    limit: int = 50,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    db_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    One page of get_conversations with the cursor to continue from.
+    
+    Returns:
+        {'conversations': [...], 'has_more': bool, 'next_cursor': int | None}; pass
+        next_cursor as before (or as after when paging with after) for the next page
+    """
+    conversations = get_conversations(session_id, db_path, limit + 1, before, after)
+    has_more = len(conversations) > limit
+    if has_more:
+        # The extra row is the one farthest from the cursor
+        conversations = conversations[:limit] if after is not None else conversations[1:]
+    edge = (conversations[-1] if after is not None else conversations[0]) if conversations else None
+    return {
+        'conversations': conversations,
+        'has_more': has_more,
+        'next_cursor': edge['id'] if edge and has_more else None,
+    }
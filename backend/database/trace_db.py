@@ -0,0 +1,171 @@
+"""Trace store shared by all worker processes (used by tracing_collector when SHARED_STATE_BACKEND=sqlite).
+
+Each activity is one row of the traces table; its fields are kept as a JSON object
+and updated in place with json_set. Rows older than TRACE_RETENTION_HOURS
+(default 24) are removed when new activities are added.
+
+Triggers log every new or changed activity in trace_events (migration 18) under an
+increasing ID; the trace feed follows that log with get_trace_events and uses the IDs
+as SSE event IDs, so a client can resume on any worker process.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.database.agent_db import get_manager
+
+
+def add_trace(activity: Dict[str, Any], db_path: Optional[str] = None) -> None:
+    """
+    Store a new activity.
+
+    Args:
+        activity: Activity dict (must contain id, session_id and status)
+        db_path: Optional database path
+    """
+    hours = float(os.getenv('TRACE_RETENTION_HOURS', '24'))
+    with get_manager(db_path).transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO traces (id, session_id, status, data) VALUES (?, ?, ?, ?)",
+            (activity['id'], activity['session_id'], activity['status'], json.dumps(activity, ensure_ascii=False))
+        )
+        conn.execute("DELETE FROM traces WHERE created_at < datetime('now', ?)", (f"-{hours} hours",))
+
+
+def _set_fields_sql(fields: Dict[str, Any]) -> tuple:
+    """SET clause and parameters updating the given activity fields (and the status column)."""
+    paths = ", ".join(f"'$.{key}', ?" for key in fields)
+    params = list(fields.values())
+    clause = f"data = json_set(data, {paths})"
+    if 'status' in fields:
+        clause += ", status = ?"
+        params.append(fields['status'])
+    return clause, params
+
+
+def update_trace(activity_id: str, fields: Dict[str, Any], db_path: Optional[str] = None) -> bool:
+    """
+    Update fields of an activity.
+
+    Args:
+        activity_id: The activity ID
+        fields: Fields to set (keys are activity field names)
+        db_path: Optional database path
+
+    Returns:
+        True if the activity exists
+    """
+    clause, params = _set_fields_sql(fields)
+    with get_manager(db_path).transaction() as conn:
+        cursor = conn.execute(f"UPDATE traces SET {clause} WHERE id = ?", (*params, activity_id))
+        return cursor.rowcount > 0
+
+
+def update_running_trace(session_id: str, fields: Dict[str, Any], db_path: Optional[str] = None) -> bool:
+    """
+    Update fields of the most recent running activity of a session.
+
+    Args:
+        session_id: Session ID
+        fields: Fields to set
+        db_path: Optional database path
+
+    Returns:
+        True if the session has a running activity
+    """
+    clause, params = _set_fields_sql(fields)
+    with get_manager(db_path).transaction() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE traces SET {clause}
+            WHERE seq = (
+                SELECT seq FROM traces WHERE session_id = ? AND status = 'running'
+                ORDER BY seq DESC LIMIT 1
+            )
+            """,
+            (*params, session_id)
+        )
+        return cursor.rowcount > 0
+
+
+def get_traces(session_id: str, limit: int = 100, db_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Get the most recent activities of a session, oldest first.
+
+    Args:
+        session_id: Session ID
+        limit: Maximum number of activities
+        db_path: Optional database path
+
+    Returns:
+        List of activity dicts
+    """
+    rows = get_manager(db_path).connection().execute(
+        """
+        SELECT data FROM (
+            SELECT seq, data FROM traces WHERE session_id = ? ORDER BY seq DESC LIMIT ?
+        ) ORDER BY seq
+        """,
+        (session_id, limit)
+    ).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+
+def get_running_trace(session_id: str, db_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Get the most recent running activity of a session (None if nothing is running)."""
+    row = get_manager(db_path).connection().execute(
+        "SELECT data FROM traces WHERE session_id = ? AND status = 'running' ORDER BY seq DESC LIMIT 1",
+        (session_id,)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def get_traces_snapshot(session_id: str, limit: int = 100, db_path: Optional[str] = None) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Get the most recent activities of a session and the trace event ID they include.
+
+    The event ID is read first, so the activities include at least every event up to it
+    (events after it may be included too; sending them again is harmless).
+
+    Returns:
+        (last trace event ID, list of activity dicts)
+    """
+    row = get_manager(db_path).connection().execute("SELECT MAX(id) FROM trace_events").fetchone()
+    return row[0] or 0, get_traces(session_id, limit, db_path)
+
+
+def can_resume_trace_events(after_id: int, db_path: Optional[str] = None) -> bool:
+    """Whether every trace event after after_id is still in the log (none were pruned)."""
+    row = get_manager(db_path).connection().execute("SELECT MIN(id), MAX(id) FROM trace_events").fetchone()
+    oldest, newest = row
+    if oldest is None:
+        return True
+    return oldest <= after_id + 1 and after_id <= newest
+
+
+def get_trace_events(session_id: str, after_id: int, limit: int = 500, db_path: Optional[str] = None) -> List[Tuple[int, str, Dict[str, Any]]]:
+    """
+    Get the trace events of a session logged after an event ID, oldest first.
+
+    Args:
+        session_id: Session ID
+        after_id: ID of the last event already seen
+        limit: Maximum number of events
+        db_path: Optional database path
+
+    Returns:
+        List of (event ID, "activity" or "update", activity dict with all fields)
+    """
+    rows = get_manager(db_path).connection().execute(
+        "SELECT id, event, data FROM trace_events WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+        (session_id, after_id, limit)
+    ).fetchall()
+    return [(row[0], row[1], json.loads(row[2])) for row in rows]
+
+
+def clear_traces(session_id: str, db_path: Optional[str] = None) -> None:
+    """Delete all activities of a session (and their logged events)."""
+    with get_manager(db_path).transaction() as conn:
+        conn.execute("DELETE FROM traces WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM trace_events WHERE session_id = ?", (session_id,))
@@ -0,0 +1,135 @@
+"""Unit of work for agent saves.
+
+Creating or modifying agents usually saves the same row several times (e.g.
+NoteBookAgent.__init__ saves twice, _add_sub_agents saves the parent again).
+Inside a unit_of_work() scope, BaseAgent.save_to_db() only marks the agent as
+dirty; at scope exit every dirty agent is serialized once and all rows are
+written in a single transaction.
+
+Usage:
+    with unit_of_work():
+        notebook = NoteBookAgent(...)
+        master._add_sub_agents(notebook.id)
+    # both agents are written here, once each
+
+Scopes nest: inner scopes join the outermost one, which does the commit. If the
+scope exits with an exception, pending saves are discarded.
+"""
+
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from backend.database.agent_db import get_db_path, save_agents
+
+
+class UnitOfWork:
+    """Tracks dirty agents and writes them in one transaction per database on commit."""
+
+    def __init__(self):
+        # (db_path, agent_id) -> agent, in registration order
+        self._dirty: Dict[Tuple[str, str], Any] = {}
+        # Agents the last commit could not save (see agent_db.save_agents)
+        self.failed_ids: List[str] = []
+
+    def register(self, agent: Any) -> None:
+        """
+        Mark an agent as dirty (it will be saved on commit).
+
+        Args:
+            agent: The agent object to save
+        """
+        db_path = get_db_path(getattr(agent, 'DB_PATH', None))
+        self._dirty[(db_path, agent.id)] = agent
+
+    def get(self, agent_id: str) -> Optional[Any]:
+        """
+        Get a pending (not yet written) agent by ID, so reads inside the scope see its own writes.
+
+        Args:
+            agent_id: The agent ID
+
+        Returns:
+            The pending agent object, or None if it is not pending
+        """
+        for (_, dirty_id), agent in self._dirty.items():
+            if dirty_id == agent_id:
+                return agent
+        return None
+
+    def pending_ids(self) -> List[str]:
+        """IDs of agents waiting to be written."""
+        return [agent_id for (_, agent_id) in self._dirty]
+
+    def commit(self) -> int:
+        """
+        Serialize and write all dirty agents (one transaction per database path).
+
+        An agent that cannot be saved does not stop the others; its ID is kept in failed_ids.
+
+        Returns:
+            Number of agents saved
+        """
+        by_db: Dict[str, List[Any]] = {}
+        for (db_path, _), agent in self._dirty.items():
+            by_db.setdefault(db_path, []).append(agent)
+        self._dirty = {}
+        self.failed_ids = []
+
+        saved_count = 0
+        for db_path, agents in by_db.items():
+            saved, failed_ids = save_agents(agents, db_path)
+            saved_count += saved
+            self.failed_ids.extend(failed_ids)
+        return saved_count
+
+    def discard(self) -> None:
+        """Drop all pending saves."""
+        self._dirty = {}
+
+
+# The active unit of work for the current context (thread / asyncio task)
+_current_uow: contextvars.ContextVar[Optional[UnitOfWork]] = contextvars.ContextVar(
+    "current_unit_of_work", default=None
+)
+
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    """Return the active unit of work, or None if saves should be written immediately."""
+    return _current_uow.get()
+
+
+def detach_unit_of_work() -> None:
+    """Leave the unit of work inherited by this context (for background tasks that outlive the caller's scope)."""
+    _current_uow.set(None)
+
+
+@contextmanager
+def unit_of_work() -> Iterator[UnitOfWork]:
+    """
+    Defer agent saves until the end of the scope.
+
+    Yields:
+        The active UnitOfWork (the outer one if scopes are nested)
+    """
+    existing = _current_uow.get()
+    if existing is not None:
+        # Nested scope: join the outer unit of work, which commits at its own exit
+        yield existing
+        return
+
+    uow = UnitOfWork()
+    token = _current_uow.set(uow)
+    try:
+        yield uow
+    except BaseException:
+        uow.discard()
+        raise
+    else:
+        # Reset before committing so save_to_db() calls made while committing write directly
+        _current_uow.reset(token)
+        token = None
+        uow.commit()
+    finally:
+        if token is not None:
+            _current_uow.reset(token)
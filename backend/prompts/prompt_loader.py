@@ -111,3 +111,21 @@ def load_prompt(
     
     return template
 
+
+
+def get_prompt_version(prompt_name: str) -> Optional[float]:
+    """
+    Version of a prompt template (modification time of its file), used to tell when
+    instructions rendered from it are outdated.
+    
+    Args:
+        prompt_name: Name of the prompt file (without .md extension)
+        
+    Returns:
+        The file's mtime, or None if the template does not exist
+    """
+    prompt_path = Path(__file__).parent / f"{prompt_name}.md"
+    try:
+        return prompt_path.stat().st_mtime
+    except OSError:
+        return None
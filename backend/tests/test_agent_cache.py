@@ -0,0 +1,164 @@
+"""
+Test the bounded agent cache: LRU/size limits, idle TTL, pinning, counters, dirty flush on eviction
+and version-checked reads.
+"""
+import sys
+import os
+import time
+import tempfile
+import threading
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+from backend.utils.agent_cache import AgentCache, estimate_agent_size
+
+
+class _FakeAgent:
+    """Stand-in with the attributes the cache and AgentManager read."""
+
+    def __init__(self, agent_id: str, notes: str = "", agent_type: str = "NoteBook", parent_agent_id=None):
+        self.id = agent_id
+        self.type = agent_type
+        self.parent_agent_id = parent_agent_id
+        self.instructions = ""
+        self.notes = notes
+        self.tools = []
+        self.saved = 0
+
+    def save_to_db(self):
+        self.saved += 1
+
+
+def test_lru_and_size_limits_skip_pinned_entries():
+    """The least recently used unpinned entries go first, by count and by estimated bytes."""
+    evicted = []
+    cache = AgentCache(max_entries=3, max_bytes=10 ** 9, ttl=0, on_evict=lambda agent_id, agent: evicted.append(agent_id))
+    cache.put("top", _FakeAgent("top"), pinned=True)
+    cache.put("a", _FakeAgent("a"))
+    cache.put("b", _FakeAgent("b"))
+    assert cache.get("a") is not None
+    cache.put("c", _FakeAgent("c"))
+    assert evicted == ["b"] and "top" in cache and "a" in cache
+
+    big = _FakeAgent("big", notes="x" * 50_000)
+    cache.max_bytes = estimate_agent_size(big) + estimate_agent_size(_FakeAgent("top"))
+    cache.put("big", big)
+    assert evicted == ["b", "a", "c"] and list(cache) == ["top", "big"]
+
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['pinned']) == (1, 1, 3, 1)
+
+
+def test_idle_entries_expire():
+    """Entries idle longer than the TTL are dropped on lookup and by sweep()."""
+    cache = AgentCache(max_entries=10, max_bytes=10 ** 9, ttl=0.05)
+    cache.put("a", _FakeAgent("a"))
+    cache.put("b", _FakeAgent("b"))
+    cache.put("top", _FakeAgent("top"), pinned=True)
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.sweep() == 1
+    assert list(cache) == ["top"] and cache.stats()['expirations'] == 2
+
+
+def test_manager_saves_dirty_agents_before_eviction():
+    """AgentManager pins TopLevel and root Master agents and saves modified agents it evicts."""
+    import backend.api  # noqa: F401  (import order avoids a circular import)
+    from backend.utils.agent_manager import AgentManager
+
+    manager = AgentManager()
+    manager._agent_cache.max_entries = 3
+    top = _FakeAgent("top", agent_type="TopLevel")
+    master = _FakeAgent("master", agent_type="Master", parent_agent_id="top")
+    for agent in (top, master):
+        manager.cache_agent(agent)
+    dirty = _FakeAgent("dirty")
+    manager.cache_agent(dirty)
+    manager.mark_modified("dirty")
+    manager.cache_agent(_FakeAgent("other"))
+
+    assert manager.get_cached_agent("dirty") is None and dirty.saved == 1
+    stats = manager.get_cache_stats()
+    assert stats['pinned'] == 2 and stats['modified'] == 0
+
+
+def test_eviction_waits_for_a_write_behind_flush_of_the_same_agent():
+    """An agent evicted while the flush is saving it is saved again afterwards, never concurrently."""
+    import backend.api  # noqa: F401  (import order avoids a circular import)
+    from backend.utils.agent_manager import AgentManager
+
+    class SlowAgent(_FakeAgent):
+        active = 0
+        overlapped = False
+        saving = threading.Event()
+
+        def save_to_db(self):
+            SlowAgent.active += 1
+            SlowAgent.overlapped = SlowAgent.overlapped or SlowAgent.active > 1
+            self.saving.set()
+            time.sleep(0.1)
+            self.saved += 1
+            SlowAgent.active -= 1
+
+    manager = AgentManager()
+    manager._agent_cache.max_entries = 1
+    slow = SlowAgent("slow")
+    manager.cache_agent(slow)
+    manager.mark_modified("slow")
+    flush = threading.Thread(target=manager.save_all_modified)
+    flush.start()
+    assert SlowAgent.saving.wait(2)
+    # Edited again and evicted while the flush is writing it
+    manager.mark_modified("slow")
+    manager.cache_agent(_FakeAgent("other"))
+    flush.join()
+
+    assert slow.saved == 2 and not SlowAgent.overlapped
+    assert manager.get_cache_stats()['modified'] == 0
+
+
+def test_reads_are_served_from_cache_while_version_matches():
+    """Saves update the cached instance in place; a row changed behind the cache is reloaded."""
+    import backend.api  # noqa: F401  (import order avoids a circular import)
+    from backend.agent.MasterAgent import MasterAgent
+    from backend.database.agent_db import get_manager, load_agent, save_agent
+    from backend.utils.agent_manager import get_agent_manager
+
+    db_path = os.path.join(tempfile.mkdtemp(), "test_agent_cache.db")
+    manager = get_agent_manager()
+    try:
+        master = MasterAgent("Master", DB_PATH=db_path)
+        cached = manager.get_agent(master.id, db_path)
+        assert manager.get_agent(master.id, db_path) is cached
+
+        # Saved through another instance: the cached one is updated, not dropped
+        copy = load_agent(master.id, db_path)
+        copy.instructions = "Edited elsewhere"
+        assert save_agent(copy, db_path)
+        assert manager.get_agent(master.id, db_path) is cached
+        assert cached.instructions == "Edited elsewhere" and cached._db_version == copy._db_version
+
+        # Changed without the manager seeing the save: the version check reloads it
+        with get_manager(db_path).transaction() as conn:
+            conn.execute("UPDATE agents SET version = version + 1 WHERE id = ?", (master.id,))
+        stale_reloads = manager.get_cache_stats()['stale_reloads']
+        reloaded = manager.get_agent(master.id, db_path)
+        assert reloaded is not cached and reloaded._db_version == cached._db_version + 1
+        assert manager.get_cache_stats()['stale_reloads'] == stale_reloads + 1
+    finally:
+        manager.clear_cache()
+        get_manager(db_path).close_all()
+
+
+if __name__ == "__main__":
+    test_lru_and_size_limits_skip_pinned_entries()
+    test_idle_entries_expire()
+    test_manager_saves_dirty_agents_before_eviction()
+    test_eviction_waits_for_a_write_behind_flush_of_the_same_agent()
+    test_reads_are_served_from_cache_while_version_matches()
+    print("✅ All agent cache tests passed")
@@ -0,0 +1,319 @@
+"""
+Test versioned agent state serialization: round-trip per agent type and legacy pickle rows,
+and the memoized tool/instruction binding of loaded agents.
+"""
+import sys
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+from backend.database.agent_db import get_manager, load_agent, save_agent, update_agent, AgentVersionConflict
+from backend.database.agent_state import is_pickled, serialize_agent
+from backend.database.notebook_content_db import load_section, EXAMPLES_TABLE
+from backend.database.blob_store import decompress_payload, get_storage_report, BLOB_MIN_CHARS
+from backend.models import Outline, Section, ConceptBlock, Example
+
+
+def _agent_classes():
+    """Import agent classes (the API package must be imported first to avoid a circular import)."""
+    import backend.api  # noqa: F401
+    from backend.agent.MasterAgent import MasterAgent
+    from backend.agent.NoteBookAgent import NoteBookAgent
+    return MasterAgent, NoteBookAgent
+
+
+def _make_notebook(db_path: str, parent_agent_id=None):
+    _, NoteBookAgent = _agent_classes()
+    outline = Outline(
+        notebook_title="Linear Algebra",
+        notebook_description="Vectors and matrices",
+        outlines={"Vectors": "vector basics", "Matrices": "matrix basics"},
+    )
+    sections = {
+        title: Section(
+            section_title=title,
+            introduction=f"Introduction to {title}",
+            concept_blocks=[ConceptBlock(definition=f"{title} definition", examples=[Example(question="q", answer="a")])],
+            summary=f"{title} summary",
+        )
+        for title in outline.outlines
+    }
+    return NoteBookAgent(outline=outline, sections=sections, parent_agent_id=parent_agent_id, DB_PATH=db_path)
+
+
+def test_notebook_state_roundtrip():
+    """Notebooks persist outline/sections only; notes are generated on first access, instructions when bound."""
+    _, NoteBookAgent = _agent_classes()
+    db_path = os.path.join(tempfile.mkdtemp(), "test_agent_state.db")
+    notebook = _make_notebook(db_path)
+
+    data = decompress_payload(get_manager(db_path).connection().execute(
+        "SELECT data FROM agents WHERE id = ?", (notebook.id,)
+    ).fetchone()[0])
+    assert not is_pickled(data)
+    assert b'"instructions":null' in data
+
+    loaded = load_agent(notebook.id, db_path)
+    assert isinstance(loaded, NoteBookAgent)
+    assert loaded._notes is None and not loaded.instructions  # nothing rendered on load
+    assert loaded.sections == notebook.sections
+    assert loaded.outline == notebook.outline
+    assert loaded.notes == notebook.notes
+    assert loaded.bind_for_run()
+    assert loaded.instructions == notebook.instructions
+    get_manager(db_path).close_all()
+
+
+def test_legacy_pickle_rows_still_load():
+    """Rows written as pickle before the state format load unchanged."""
+    MasterAgent, _ = _agent_classes()
+    db_path = os.path.join(tempfile.mkdtemp(), "test_agent_state.db")
+    master = MasterAgent("Legacy Master", DB_PATH=db_path)
+
+    tools, master.tools = master.tools, None
+    legacy_blob = pickle.dumps(master)
+    master.tools = tools
+    with get_manager(db_path).transaction() as conn:
+        conn.execute("UPDATE agents SET data = ? WHERE id = ?", (legacy_blob, master.id))
+
+    loaded = load_agent(master.id, db_path)
+    assert isinstance(loaded, MasterAgent)
+    assert loaded.name == "Legacy Master"
+    assert not is_pickled(serialize_agent(loaded))
+    get_manager(db_path).close_all()
+
+
+def test_normalized_content_storage():
+    """With normalized storage, sections live in content tables and saves only write changed rows."""
+    _, NoteBookAgent = _agent_classes()
+    db_path = os.path.join(tempfile.mkdtemp(), "test_agent_state.db")
+    previous = os.environ.get('NOTEBOOK_CONTENT_STORAGE')
+    os.environ['NOTEBOOK_CONTENT_STORAGE'] = 'normalized'
+    try:
+        notebook = _make_notebook(db_path)
+        conn = get_manager(db_path).connection()
+        data = conn.execute("SELECT data FROM agents WHERE id = ?", (notebook.id,)).fetchone()[0]
+        assert b'"sections":null' in decompress_payload(data)
+
+        loaded = load_agent(notebook.id, db_path)
+        assert loaded.sections == notebook.sections
+        assert loaded.notes == notebook.notes
+
+        # One field edit plus one appended exercise -> two content rows written
+        content_writes = []
+        conn.set_trace_callback(
+            lambda sql: content_writes.append(sql)
+            if sql.lstrip().startswith(("INSERT INTO notebook_", "DELETE FROM notebook_")) else None
+        )
+        vectors = loaded.sections["Vectors"]
+        vectors.concept_blocks[0].definition = "A vector is an element of a vector space"
+        vectors.exercises.append(Example(question="Add two vectors"))
+        loaded.save_to_db()
+        conn.set_trace_callback(None)
+        assert len(content_writes) == 2
+
+        section = load_section(notebook.id, section_title="Vectors", db_path=db_path)
+        assert section == vectors
+        assert load_section(notebook.id, section_id=vectors.id, db_path=db_path) == vectors
+        exercise_rows = conn.execute(
+            f"SELECT COUNT(*) FROM {EXAMPLES_TABLE} WHERE notebook_id = ? AND parent_field = 'exercises'",
+            (notebook.id,)
+        ).fetchone()[0]
+        assert exercise_rows == 1
+    finally:
+        if previous is None:
+            os.environ.pop('NOTEBOOK_CONTENT_STORAGE', None)
+        else:
+            os.environ['NOTEBOOK_CONTENT_STORAGE'] = previous
+    get_manager(db_path).close_all()
+
+
+def test_large_strings_are_deduplicated_and_compressed():
+    """Identical long strings are stored once in the blob table and rows load back unchanged."""
+    MasterAgent, _ = _agent_classes()
+    db_path = os.path.join(tempfile.mkdtemp(), "test_agent_state.db")
+    long_prompt = "You manage notebooks. " * (BLOB_MIN_CHARS // 10)
+    masters = [MasterAgent(f"Master {i}", DB_PATH=db_path) for i in range(2)]
+    for master in masters:
+        master.instructions = long_prompt
+        master.save_to_db()
+
+    conn = get_manager(db_path).connection()
+    assert conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM blob_refs").fetchone()[0] == 2
+    assert load_agent(masters[0].id, db_path).instructions == long_prompt
+
+    report = get_storage_report(db_path)
+    assert report['blobs']['referenced_raw_bytes'] == 2 * len(long_prompt)
+    assert report['saved_bytes'] > len(long_prompt)
+    get_manager(db_path).close_all()
+
+
+def test_concurrent_edits_are_merged_or_rejected():
+    """Saves of stale copies merge edits to different fields and reject edits to the same field."""
+    MasterAgent, _ = _agent_classes()
+    db_path = os.path.join(tempfile.mkdtemp(), "test_agent_state.db")
+    previous = os.environ.get('NOTEBOOK_CONTENT_STORAGE')
+    os.environ['NOTEBOOK_CONTENT_STORAGE'] = 'normalized'
+    try:
+        notebook = _make_notebook(db_path)
+        first, second = load_agent(notebook.id, db_path), load_agent(notebook.id, db_path)
+        first.sections["Vectors"].summary = "edited by first"
+        second.sections["Matrices"].summary = "edited by second"
+        assert save_agent(first, db_path)
+        assert save_agent(second, db_path)
+        # The stale copy picked up the other edit when it merged
+        assert second.sections["Vectors"].summary == "edited by first"
+        loaded = load_agent(notebook.id, db_path)
+        assert loaded.sections["Vectors"].summary == "edited by first"
+        assert loaded.sections["Matrices"].summary == "edited by second"
+
+        first.sections["Matrices"].summary = "conflicting edit"
+        second.sections["Matrices"].summary = "edited again by second"
+        assert save_agent(second, db_path)
+        assert not save_agent(first, db_path)
+        assert load_agent(notebook.id, db_path).sections["Matrices"].summary == "edited again by second"
+    finally:
+        if previous is None:
+            os.environ.pop('NOTEBOOK_CONTENT_STORAGE', None)
+        else:
+            os.environ['NOTEBOOK_CONTENT_STORAGE'] = previous
+
+    master = MasterAgent("Master", DB_PATH=db_path)
+    first, second = load_agent(master.id, db_path), load_agent(master.id, db_path)
+    first.name, second.instructions = "Renamed Master", "New instructions"
+    assert save_agent(first, db_path) and save_agent(second, db_path)
+    loaded = load_agent(master.id, db_path)
+    assert (loaded.name, loaded.instructions) == ("Renamed Master", "New instructions")
+
+    first, second = load_agent(master.id, db_path), load_agent(master.id, db_path)
+    first.instructions, second.instructions = "A", "B"
+    assert save_agent(first, db_path)
+    try:
+        from backend.database.agent_db import _save_prepared, _serialize_agent_row
+        _save_prepared([(second, _serialize_agent_row(second))], db_path)
+        assert False, "expected a conflict"
+    except AgentVersionConflict as e:
+        assert e.paths == ["instructions"]
+    assert update_agent(master.id, lambda agent: setattr(agent, 'instructions', "B"), db_path).instructions == "B"
+    get_manager(db_path).close_all()
+
+
+def test_conflicting_agent_does_not_abort_a_batch_save():
+    """An unresolvable conflict in a write-behind batch skips only that agent, which stays marked."""
+    MasterAgent, _ = _agent_classes()
+    from backend.utils.agent_manager import AgentManager
+    db_path = os.path.join(tempfile.mkdtemp(), "test_agent_state.db")
+    conflicting, other = MasterAgent("Conflicting", DB_PATH=db_path), MasterAgent("Other", DB_PATH=db_path)
+    stale = load_agent(conflicting.id, db_path)
+    conflicting.instructions = "A"
+    assert save_agent(conflicting, db_path)
+    stale.instructions, other.instructions = "B", "Saved anyway"
+
+    manager = AgentManager()
+    for agent in (stale, other):
+        manager.cache_agent(agent)
+        manager.mark_modified(agent.id)
+    assert manager.save_all_modified() == 1
+    assert load_agent(other.id, db_path).instructions == "Saved anyway"
+    assert load_agent(conflicting.id, db_path).instructions == "A"
+    assert manager.get_cache_stats()['modified'] == 1
+    get_manager(db_path).close_all()
+
+
+def test_binding_is_memoized_and_read_only():
+    """bind_for_run renders once, rebinds when a sub-agent changes, and never writes."""
+    MasterAgent, _ = _agent_classes()
+    db_path = os.path.join(tempfile.mkdtemp(), "test_agent_state.db")
+    master = MasterAgent("Master", DB_PATH=db_path)
+    loaded = load_agent(master.id, db_path)
+    conn = get_manager(db_path).connection()
+    writes = conn.total_changes
+    assert loaded.bind_for_run()
+    assert not loaded.bind_for_run()
+    assert conn.total_changes == writes
+
+    notebook = _make_notebook(db_path, parent_agent_id=master.id)
+    master._add_sub_agents(notebook.id)
+    loaded = load_agent(master.id, db_path)
+    assert loaded.bind_for_run() and "Linear Algebra" in loaded.instructions
+    assert not loaded.bind_for_run()
+
+    # A sub-agent saved elsewhere changes the fingerprint
+    notebook.notebook_title = "Linear Algebra II"
+    notebook.save_to_db()
+    assert loaded.bind_for_run() and "Linear Algebra II" in loaded.instructions
+    get_manager(db_path).close_all()
+
+
+def test_tools_are_created_when_the_agent_is_bound():
+    """load_agent keeps only the stored tool_ids; bind_for_run creates the tools, and saves keep the IDs."""
+    _agent_classes()
+    from backend.agent.BaseAgent import BaseAgent
+    from backend.database.agent_db import get_tool_ids
+    db_path = os.path.join(tempfile.mkdtemp(), "test_agent_state.db")
+    agent = BaseAgent("Helper", "Help", DB_PATH=db_path)
+    agent.save_to_db()
+    assert agent.add_tool("send_message")
+
+    loaded = load_agent(agent.id, db_path)
+    assert loaded.tools == [] and loaded._stored_tool_ids == ["send_message"]
+    loaded.instructions = "Edited before binding"
+    assert save_agent(loaded, db_path)
+    assert get_tool_ids(agent.id, db_path) == ["send_message"]
+
+    assert loaded.bind_for_run()
+    assert loaded._current_tool_ids() == ["send_message"] and loaded._stored_tool_ids is None
+    get_manager(db_path).close_all()
+
+
+def test_hierarchy_index_matches_loaded_agents():
+    """get_agent_tree_info renders the same agent list as loading every sub-agent, and follows saves and deletes."""
+    MasterAgent, _ = _agent_classes()
+    from backend.database.agent_db import get_agent_tree, delete_agent
+    from backend.tools.utils import get_all_agent_info, get_agent_tree_info
+
+    db_path = os.path.join(tempfile.mkdtemp(), "test_agent_state.db")
+    root = MasterAgent("Root", DB_PATH=db_path)
+    child_master = MasterAgent("Child Master", parent_agent_id=root.id, DB_PATH=db_path)
+    nested = _make_notebook(db_path, parent_agent_id=child_master.id)
+    child_master._add_sub_agents(nested.id)
+    notebook = _make_notebook(db_path, parent_agent_id=root.id)
+    root._add_sub_agents(child_master.id)
+    root._add_sub_agents(notebook.id)
+
+    conn = get_manager(db_path).connection()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    tree_info = get_agent_tree_info(root.id, db_path=db_path)
+    conn.set_trace_callback(None)
+    assert len(statements) == 1
+    assert tree_info == get_all_agent_info(root._load_sub_agents_dict())
+    assert root.agent_card().description == "- Child Master (管理 1 个子Agent)\n- Linear Algebra: Vectors and matrices"
+
+    notebook.notebook_title = "Renamed"
+    notebook.save_to_db()
+    delete_agent(nested.id, db_path)
+    tree = get_agent_tree(root.id, 2, db_path)
+    assert [child['card']['title'] for child in tree['children']] == ["Child Master", "Renamed"]
+    assert tree['children'][0]['children'] == [] and tree['children'][0]['sub_agent_count'] == 0
+    get_manager(db_path).close_all()
+
+
+if __name__ == "__main__":
+    test_notebook_state_roundtrip()
+    test_legacy_pickle_rows_still_load()
+    test_normalized_content_storage()
+    test_large_strings_are_deduplicated_and_compressed()
+    test_concurrent_edits_are_merged_or_rejected()
+    test_conflicting_agent_does_not_abort_a_batch_save()
+    test_binding_is_memoized_and_read_only()
+    test_tools_are_created_when_the_agent_is_bound()
+    test_hierarchy_index_matches_loaded_agents()
+    print("✅ All agent state tests passed")
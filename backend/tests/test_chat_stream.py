@@ -0,0 +1,101 @@
+"""
+Test streamed chat runs: text deltas, events of delegated runs and the final ChatResponse
+are sent as Server-Sent Events, and the turn is persisted like a non-streamed chat.
+"""
+import sys
+import os
+import asyncio
+import json
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+
+def _fake_streaming_model(chunks):
+    """A Model streaming `chunks` as output text (no provider call); it also emits a delegated-agent event."""
+    from agents.models.interface import Model
+    from openai.types.responses import (
+        Response, ResponseCompletedEvent, ResponseOutputMessage, ResponseOutputText, ResponseTextDeltaEvent
+    )
+    from backend.utils.chat_stream import emit_stream_event
+
+    class FakeStreamingModel(Model):
+        async def get_response(self, *args, **kwargs):
+            raise NotImplementedError
+
+        async def stream_response(self, *args, **kwargs):
+            # Stands in for a send_message delegation running in the same context
+            emit_stream_event("agent_start", agent="Notebook", agent_id="nb-1", message="question")
+            for i, chunk in enumerate(chunks):
+                yield ResponseTextDeltaEvent(
+                    type="response.output_text.delta", delta=chunk, content_index=0, item_id="msg-1",
+                    output_index=0, sequence_number=i, logprobs=[]
+                )
+            message = ResponseOutputMessage(
+                id="msg-1", type="message", role="assistant", status="completed",
+                content=[ResponseOutputText(type="output_text", text="".join(chunks), annotations=[])]
+            )
+            response = Response(
+                id="resp-1", created_at=0, model="fake", object="response", output=[message],
+                parallel_tool_calls=False, tool_choice="auto", tools=[]
+            )
+            yield ResponseCompletedEvent(type="response.completed", response=response, sequence_number=len(chunks))
+
+    return FakeStreamingModel()
+
+
+def _parse(events):
+    parsed = []
+    for event in events:
+        name, data = event.strip().split("\n")
+        parsed.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return parsed
+
+
+def test_streamed_chat_sends_deltas_events_and_final_response():
+    """Deltas arrive before the final ChatResponse, which is the last event; the transcript is saved."""
+    import backend.api  # noqa: F401  (import order avoids a circular import)
+    from agents import Agent
+    from backend.database import async_db
+    from backend.database.conversation_session import ConversationSession
+    from backend.utils.chat_stream import emit_stream_event, stream_chat_run
+
+    emit_stream_event("delta", text="nobody listens")  # no-op outside streamed chats
+    agent = Agent(name="Echo", instructions="Echo", model=_fake_streaming_model(["Hel", "lo ", "world"]))
+
+    async def main():
+        session_id = (await async_db.create_session())['id']
+        session = ConversationSession(session_id)
+        session.add_message("user", "hi")
+        events = [event async for event in stream_chat_run(
+            agent, "hi", session, session_id, "hi", extract_response=lambda result: (result.final_output, None)
+        )]
+        return session_id, _parse(events)
+
+    session_id, events = asyncio.run(main())
+    names = [name for name, _ in events]
+    assert names[0] == "session" and names[-1] == "final"
+    assert ("agent_start", {"agent": "Notebook", "agent_id": "nb-1", "message": "question"}) in events
+    assert "".join(data["text"] for name, data in events if name == "delta") == "Hello world"
+    assert events[-1][1] == {"response": "Hello world", "session_id": session_id, "structured_data": None}
+    transcript = asyncio.run(async_db.get_conversations(session_id))
+    assert [(c['role'], c['content']) for c in transcript] == [("user", "hi"), ("assistant", "Hello world")]
+
+
+def test_message_field_of_structured_output_is_streamed():
+    """Only the "message" field of streamed JSON is shown, including escapes split across chunks."""
+    from backend.utils.chat_stream import JsonFieldStream
+
+    field = JsonFieldStream("message")
+    document = json.dumps({"message_type": "regular", "message": "第一行\n\"引用\" done", "outline": None}, ensure_ascii=True)
+    chunks = [document[i:i + 5] for i in range(0, len(document), 5)]
+    assert "".join(field.feed(chunk) for chunk in chunks) == "第一行\n\"引用\" done"
+
+
+if __name__ == "__main__":
+    test_streamed_chat_sends_deltas_events_and_final_response()
+    test_message_field_of_structured_output_is_streamed()
+    print("✅ All chat stream tests passed")
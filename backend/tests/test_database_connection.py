@@ -0,0 +1,368 @@
+"""
+Test the pooled SQLite connection manager: pragmas, migrations and nested transactions.
+"""
+import sys
+import os
+import asyncio
+import tempfile
+import threading
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+from backend.database.connection import get_connection_manager
+from backend.database.migrations import SCHEMA_VERSION, get_schema_version
+from backend.database.session_db import (
+    create_session, add_conversation, get_conversations, get_conversations_page, list_sessions_page
+)
+from backend.database.agent_db import (
+    find_agents_by_type, find_child_agents, find_agents_by_id_prefix, count_agents_by_type
+)
+from backend.database.unit_of_work import unit_of_work, current_unit_of_work
+from backend.database import async_db, session_db
+from backend.database.conversation_session import ConversationSession
+
+
+def _temp_db_path() -> str:
+    return os.path.join(tempfile.mkdtemp(), "test_connection.db")
+
+
+class _FakeAgent:
+    """Minimal picklable stand-in for an agent (only the attributes save_agent reads)."""
+
+    def __init__(self, agent_id: str, db_path: str):
+        self.id = agent_id
+        self.type = "Master"
+        self.name = agent_id
+        self.parent_agent_id = None
+        self.sub_agent_ids = []
+        self.tools = None
+        self.DB_PATH = db_path
+
+    STATE_VERSION = 1
+
+    def _to_state(self):
+        return {'id': self.id, 'sub_agent_ids': self.sub_agent_ids}
+
+    def save_to_db(self):
+        uow = current_unit_of_work()
+        assert uow is not None
+        uow.register(self)
+
+
+def test_connection_setup():
+    """New connections use WAL and the schema is migrated to the latest version."""
+    manager = get_connection_manager(_temp_db_path())
+    conn = manager.connection()
+
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert get_schema_version(conn) == SCHEMA_VERSION
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    assert {"agents", "tools", "sessions", "conversations"} <= tables
+
+    # Same thread gets the same connection back
+    assert manager.connection() is conn
+    manager.close_all()
+
+
+def test_nested_transaction_rolls_back_as_a_whole():
+    """Only the outermost transaction commits; an error anywhere rolls back everything."""
+    db_path = _temp_db_path()
+    manager = get_connection_manager(db_path)
+
+    try:
+        with manager.transaction() as conn:
+            conn.execute("INSERT INTO sessions (id, title) VALUES ('s1', 'outer')")
+            with manager.transaction() as inner:
+                inner.execute("INSERT INTO sessions (id, title) VALUES ('s2', 'inner')")
+            raise RuntimeError("abort")
+    except RuntimeError:
+        pass
+
+    assert not manager.in_transaction()
+    count = manager.connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+    assert count == 0
+    manager.close_all()
+
+
+def test_session_db_roundtrip():
+    """session_db functions work through the manager."""
+    db_path = _temp_db_path()
+    session = create_session("test", db_path=db_path)
+    add_conversation(session['id'], "user", "hello", db_path=db_path)
+    add_conversation(session['id'], "assistant", "hi", db_path=db_path)
+
+    conversations = get_conversations(session['id'], db_path=db_path)
+    assert [c['role'] for c in conversations] == ["user", "assistant"]
+    get_connection_manager(db_path).close_all()
+
+
+def test_keyset_pagination():
+    """Conversation and session pages follow their cursors and use the composite indexes."""
+    db_path = _temp_db_path()
+    manager = get_connection_manager(db_path)
+    session = create_session("long", db_path=db_path)
+    for i in range(7):
+        add_conversation(session['id'], "user", f"m{i}", db_path=db_path)
+
+    page = get_conversations_page(session['id'], limit=3, db_path=db_path)
+    assert [c['content'] for c in page['conversations']] == ["m4", "m5", "m6"] and page['has_more']
+    page = get_conversations_page(session['id'], limit=3, before=page['next_cursor'], db_path=db_path)
+    assert [c['content'] for c in page['conversations']] == ["m1", "m2", "m3"]
+    page = get_conversations_page(session['id'], limit=3, before=page['next_cursor'], db_path=db_path)
+    assert [c['content'] for c in page['conversations']] == ["m0"] and not page['has_more']
+    first_id = page['conversations'][0]['id']
+    page = get_conversations_page(session['id'], limit=4, after=first_id, db_path=db_path)
+    assert [c['content'] for c in page['conversations']] == ["m1", "m2", "m3", "m4"] and page['has_more']
+
+    with manager.transaction() as conn:
+        for i in range(4):
+            conn.execute(
+                "INSERT INTO sessions (id, title, updated_at) VALUES (?, ?, ?)",
+                (f"s{i}", f"Session {i}", f"2024-01-0{i + 1} 00:00:00")
+            )
+    page = list_sessions_page(limit=2, db_path=db_path)
+    assert [s['id'] for s in page['sessions']] == [session['id'], "s3"]
+    page = list_sessions_page(limit=2, before=page['next_cursor'], db_path=db_path)
+    assert [s['id'] for s in page['sessions']] == ["s2", "s1"] and page['has_more']
+    page = list_sessions_page(limit=2, after=page['next_cursor'], db_path=db_path)
+    assert [s['id'] for s in page['sessions']] == ["s3", "s2"]
+
+    conn = manager.connection()
+    plan = " ".join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM conversations WHERE session_id = ? ORDER BY created_at DESC, id DESC LIMIT 3",
+        (session['id'],)
+    ))
+    assert "idx_conversations_session_created" in plan and "TEMP B-TREE" not in plan
+    plan = " ".join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM sessions ORDER BY updated_at DESC, id DESC LIMIT 3"
+    ))
+    assert "idx_sessions_updated" in plan
+    manager.close_all()
+
+
+def test_agent_header_queries():
+    """Header queries read type/parent/id columns and use the indexes."""
+    db_path = _temp_db_path()
+    manager = get_connection_manager(db_path)
+    rows = [
+        ("top-1", "TopLevel", "TopLevelAgent", None),
+        ("master-1", "Master", "Top Master Agent", "top-1"),
+        ("nb-aaa1", "NoteBook", "Notebook A", "master-1"),
+        ("nb-aab2", "NoteBook", "Notebook B", "master-1"),
+    ]
+    with manager.transaction() as conn:
+        for agent_id, agent_type, name, parent_id in rows:
+            conn.execute(
+                "INSERT INTO agents (id, type, name, parent_agent_id, data) VALUES (?, ?, ?, ?, ?)",
+                (agent_id, agent_type, name, parent_id, b"")
+            )
+
+    assert [h['id'] for h in find_agents_by_type("TopLevel", db_path)] == ["top-1"]
+    assert [h['id'] for h in find_child_agents("master-1", db_path=db_path)] == ["nb-aaa1", "nb-aab2"]
+    assert find_child_agents("top-1", "NoteBook", db_path) == []
+    assert [h['id'] for h in find_agents_by_id_prefix("nb-aa", db_path=db_path)] == ["nb-aaa1", "nb-aab2"]
+    assert [h['id'] for h in find_agents_by_id_prefix("nb-aab", db_path=db_path)] == ["nb-aab2"]
+    assert len(find_agents_by_id_prefix("nb-", limit=1, db_path=db_path)) == 1
+    assert count_agents_by_type(db_path) == {"TopLevel": 1, "Master": 1, "NoteBook": 2}
+
+    plan = " ".join(
+        row[3] for row in manager.connection().execute(
+            "EXPLAIN QUERY PLAN SELECT id, type, name, parent_agent_id FROM agents WHERE parent_agent_id = ?",
+            ("master-1",)
+        )
+    )
+    assert "idx_agents_parent" in plan
+    manager.close_all()
+
+
+def test_unit_of_work_coalesces_and_discards():
+    """Repeated saves in a scope become one row write at exit; an exception discards them."""
+    db_path = _temp_db_path()
+    manager = get_connection_manager(db_path)
+    conn = manager.connection()
+    inserts = []
+    conn.set_trace_callback(lambda sql: inserts.append(sql) if sql.lstrip().startswith("INSERT") else None)
+
+    agent = _FakeAgent("a1", db_path)
+    with unit_of_work() as uow:
+        agent.save_to_db()
+        agent.sub_agent_ids.append("child")
+        with unit_of_work() as inner:
+            assert inner is uow
+            agent.save_to_db()
+        assert uow.get("a1") is agent
+        assert inserts == []
+    assert len(inserts) == 1
+    assert conn.execute("SELECT sub_agent_ids FROM agents WHERE id = 'a1'").fetchone()[0] == '["child"]'
+
+    try:
+        with unit_of_work():
+            _FakeAgent("a2", db_path).save_to_db()
+            raise RuntimeError("abort")
+    except RuntimeError:
+        pass
+    assert current_unit_of_work() is None
+    assert conn.execute("SELECT COUNT(*) FROM agents WHERE id = 'a2'").fetchone()[0] == 0
+    conn.set_trace_callback(None)
+    manager.close_all()
+
+
+def test_async_db_runs_off_the_event_loop():
+    """async_db calls run on the database executor and keep the caller's context."""
+    db_path = _temp_db_path()
+
+    async def scenario():
+        loop_thread = threading.current_thread().name
+        session = await async_db.create_session("async", db_path=db_path)
+        await async_db.add_conversation(session['id'], "user", "hello", db_path=db_path)
+        conversations = await async_db.get_conversations(session['id'], db_path=db_path)
+
+        with unit_of_work() as uow:
+            seen_uow, worker_thread = await async_db.run_db(
+                lambda: (current_unit_of_work(), threading.current_thread().name)
+            )
+        return loop_thread, worker_thread, seen_uow is uow, conversations
+
+    loop_thread, worker_thread, same_uow, conversations = asyncio.run(scenario())
+    assert worker_thread != loop_thread and worker_thread.startswith("db")
+    assert same_uow
+    assert [c['content'] for c in conversations] == ["hello"]
+    async_db.shutdown_executor()
+    get_connection_manager(db_path).close_all()
+
+
+def test_conversation_session_writes_one_transaction_per_turn():
+    """Runner session items and transcript messages of a turn are written together at its end."""
+    db_path = _temp_db_path()
+    manager = get_connection_manager(db_path)
+    session_id = create_session("chat", db_path=db_path)['id']
+    user_item = {"role": "user", "content": "hello"}
+    reply_item = {"role": "assistant", "content": "hi"}
+
+    async def scenario():
+        session = ConversationSession(session_id, db_path)
+        async with session.turn():
+            session.add_message("user", "hello")
+            await session.add_items([user_item, reply_item])
+            assert await session.get_items(limit=1) == [reply_item]
+            assert get_conversations(session_id, db_path=db_path) == []
+            session.add_message("assistant", "hi")
+        assert len(turns) == 1
+
+        try:
+            async with session.turn():
+                session.add_message("user", "again")
+                await session.add_items([{"role": "user", "content": "again"}])
+                raise RuntimeError("model error")
+        except RuntimeError:
+            pass
+        return await session.get_items(), await session.pop_item()
+
+    # Record record_turn calls (each one is a single transaction)
+    turns = []
+    record_turn = session_db.record_turn
+    session_db.record_turn = lambda *args: (turns.append(args), record_turn(*args))[1]
+    try:
+        items, popped = asyncio.run(scenario())
+    finally:
+        session_db.record_turn = record_turn
+    _, messages, turn_items, _ = turns[0]
+    assert len(messages) == 2 and turn_items == [user_item, reply_item]
+    assert len(turns) == 2 and turns[1][2] == []
+    assert items == [user_item, reply_item] and popped == reply_item
+    assert [c['content'] for c in get_conversations(session_id, db_path=db_path)] == ["hello", "hi", "again"]
+    async_db.shutdown_executor()
+    manager.close_all()
+
+
+def test_history_policy_bounds_replayed_items():
+    """last_turns keeps recent turns; summary folds older turns into a stored rolling summary."""
+    from backend.database import conversation_session
+    db_path = _temp_db_path()
+    session_id = create_session("long", db_path=db_path)['id']
+    items = []
+    for i in range(5):
+        items += [{"role": "user", "content": f"q{i}"}, {"type": "function_call", "name": "tool", "call_id": str(i)},
+                  {"type": "function_call_output", "call_id": str(i), "output": "ok"}, {"role": "assistant", "content": f"a{i}"}]
+    session_db.record_turn(session_id, [], items, db_path=db_path)
+
+    summarized = []
+
+    async def fake_summarize(previous, old_items):
+        summarized.append([item['content'] for item in old_items if item.get('role') == 'user'])
+        return f"{previous or ''}+{len(old_items)}"
+
+    previous_env = {key: os.environ.get(key) for key in ('CHAT_HISTORY_POLICY', 'CHAT_HISTORY_MAX_TURNS', 'CHAT_HISTORY_KEEP_TURNS')}
+    original_summarize = conversation_session.summarize
+    conversation_session.summarize = fake_summarize
+    try:
+        os.environ.update({'CHAT_HISTORY_POLICY': 'last_turns', 'CHAT_HISTORY_MAX_TURNS': '2', 'CHAT_HISTORY_KEEP_TURNS': '1'})
+        session = ConversationSession(session_id, db_path)
+        history = asyncio.run(session.get_items())
+        assert [item.get('content') for item in history if item.get('role') == 'user'] == ["q3", "q4"]
+        assert len(history) == 8
+
+        os.environ['CHAT_HISTORY_POLICY'] = 'summary'
+        history = asyncio.run(session.get_items())
+        assert summarized == [["q0", "q1", "q2", "q3"]]
+        assert history[0]['role'] == 'system' and history[0]['content'].endswith("+16")
+        assert history[1]['content'] == "q4" and len(history) == 5
+        # The summary is reused until the uncompacted tail grows past max_turns again
+        asyncio.run(session.get_items())
+        assert len(summarized) == 1
+    finally:
+        conversation_session.summarize = original_summarize
+        for key, value in previous_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    # Summaries cost a model call, so they are opt-in
+    assert conversation_session.HistoryPolicy().mode == 'last_turns'
+
+    image = {"role": "user", "content": [{"type": "input_image", "image_url": "data:image/png;base64,AAAA"},
+                                         {"type": "input_file", "file_data": "data:...", "filename": "notes.pdf"}]}
+    assert [part['text'] for part in conversation_session.strip_payloads(image)['content']] == ["[image]", "[file: notes.pdf]"]
+    async_db.shutdown_executor()
+    get_connection_manager(db_path).close_all()
+
+
+def test_migrated_session_history_strips_payloads():
+    """Session items seeded from a legacy transcript are stripped like the items of new turns."""
+    import json
+    import sqlite3
+    from backend.database.migrations import MIGRATIONS
+    from backend.utils.conversation_history import MAX_STORED_TEXT_CHARS
+
+    conn = sqlite3.connect(_temp_db_path(), isolation_level=None)
+    for version, migrate in MIGRATIONS:
+        if version == 10:
+            conn.execute("INSERT INTO sessions (id, title) VALUES ('legacy', 'Legacy')")
+            conn.executemany(
+                "INSERT INTO conversations (session_id, role, content) VALUES ('legacy', ?, ?)",
+                [("user", "x" * (MAX_STORED_TEXT_CHARS * 3)), ("assistant", "short answer")]
+            )
+        migrate(conn)
+    items = [json.loads(row[0]) for row in conn.execute("SELECT item FROM session_items ORDER BY id")]
+    assert len(items[0]['content']) < MAX_STORED_TEXT_CHARS + 100 and "characters omitted" in items[0]['content']
+    assert items[1] == {"role": "assistant", "content": "short answer"}
+    conn.close()
+
+
+if __name__ == "__main__":
+    test_connection_setup()
+    test_nested_transaction_rolls_back_as_a_whole()
+    test_session_db_roundtrip()
+    test_keyset_pagination()
+    test_agent_header_queries()
+    test_unit_of_work_coalesces_and_discards()
+    test_async_db_runs_off_the_event_loop()
+    test_conversation_session_writes_one_transaction_per_turn()
+    test_history_policy_bounds_replayed_items()
+    test_migrated_session_history_strips_payloads()
+    print("✅ All connection manager tests passed")
@@ -0,0 +1,169 @@
+"""
+Test the background job engine: jobs return an ID immediately, run with bounded
+concurrency, record progress and results, and can be cancelled.
+"""
+import sys
+import os
+import asyncio
+import tempfile
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+
+def test_jobs_run_in_the_background_with_bounded_concurrency():
+    """The second job waits for the only worker slot; progress, result, failure and cancellation are recorded."""
+    from backend.database import job_db
+    from backend.utils.job_engine import JobEngine
+    from backend.utils.tracing_collector import _current_session, update_current_activity_message
+
+    db_path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    engine = JobEngine(max_workers=1, db_path=db_path)
+    release = None
+
+    async def slow():
+        update_current_activity_message("job-test-session", "halfway")
+        await release.wait()
+        return {"notebook_id": "nb-1"}
+
+    async def broken():
+        raise ValueError("outline is empty")
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        _current_session.set("job-test-session")
+        first = engine.submit("create_notebook", slow, title="First", session_id="job-test-session")
+        second = engine.submit("create_notebook", broken, title="Second")
+        third = engine.submit("create_notebook", slow, title="Third")
+        assert first['status'] == 'queued' and engine.active_jobs() == 3
+
+        await asyncio.sleep(0.2)
+        running = job_db.get_job(first['id'], db_path)
+        assert running['status'] == 'running' and running['progress'] == "halfway"
+        assert job_db.get_job(second['id'], db_path)['status'] == 'queued'  # only one worker slot
+
+        assert engine.cancel(third['id'])
+        release.set()
+        while engine.active_jobs():
+            await asyncio.sleep(0.05)
+        return first, second, third
+
+    first, second, third = asyncio.run(main())
+    done = job_db.get_job(first['id'], db_path)
+    assert done['status'] == 'succeeded' and done['result'] == {"notebook_id": "nb-1"} and done['finished_at']
+    failed = job_db.get_job(second['id'], db_path)
+    assert failed['status'] == 'failed' and failed['error'] == "outline is empty"
+    assert job_db.get_job(third['id'], db_path)['status'] == 'cancelled'
+    assert [job['id'] for job in job_db.list_jobs(session_id="job-test-session", limit=1, db_path=db_path)] == [first['id']]
+
+
+def test_jobs_of_other_processes_are_orphaned_only_once_their_lease_expires():
+    """Jobs are matched to the process run by its boot token (PIDs are reused); a live sibling worker keeps its jobs."""
+    from backend.database import job_db
+    from backend.database.agent_db import get_manager
+
+    db_path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    current = job_db.create_job("create_notebook", title="Current", db_path=db_path)
+    sibling = job_db.create_job("create_notebook", title="Sibling", db_path=db_path)
+    dead = job_db.create_job("create_notebook", title="Dead", db_path=db_path)
+    with get_manager(db_path).transaction() as conn:
+        conn.execute("UPDATE jobs SET worker_token = 'sibling-run' WHERE id = ?", (sibling['id'],))
+        conn.execute(
+            "UPDATE jobs SET worker_token = 'dead-run', heartbeat_at = datetime('now', '-1 hour') WHERE id = ?", (dead['id'],)
+        )
+    assert dead['worker_pid'] == os.getpid()
+
+    assert [job['id'] for job in job_db.find_orphaned_jobs(db_path)] == [dead['id']]
+    assert not job_db.claim_job(sibling['id'], 'queued', 'sibling-run', db_path)  # lease still held
+    assert not job_db.claim_job(dead['id'], 'queued', job_db.BOOT_TOKEN, db_path)
+    assert job_db.claim_job(dead['id'], 'queued', 'dead-run', db_path)
+    assert job_db.get_job(dead['id'], db_path)['worker_token'] == job_db.BOOT_TOKEN
+    assert job_db.find_orphaned_jobs(db_path) == [] and current['worker_token'] == job_db.BOOT_TOKEN
+
+    # Only this process's leases are renewed; the sibling's lease runs out once it stops renewing
+    with get_manager(db_path).transaction() as conn:
+        conn.execute("UPDATE jobs SET heartbeat_at = datetime('now', '-1 hour')")
+    assert job_db.renew_job_leases(db_path) == 2
+    assert [job['id'] for job in job_db.find_orphaned_jobs(db_path)] == [sibling['id']]
+    get_manager(db_path).close_all()
+
+
+def test_shutdown_leaves_jobs_to_be_resumed_by_the_next_process():
+    """Jobs stopped by shutdown keep their status and release their lease, so the next server process resumes them."""
+    from backend.database import job_db
+    from backend.database.agent_db import get_manager
+    from backend.utils.job_engine import JobEngine
+
+    db_path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    engine = JobEngine(max_workers=1, db_path=db_path)
+
+    async def forever():
+        await asyncio.Event().wait()
+
+    async def main():
+        running = engine.submit("create_notebook", forever, title="Running")
+        queued = engine.submit("create_notebook", forever, title="Queued")
+        await asyncio.sleep(0.2)
+        assert await engine.shutdown() == 2
+        return running, queued
+
+    running, queued = asyncio.run(main())
+    assert job_db.get_job(running['id'], db_path)['status'] == 'running'
+    assert job_db.get_job(queued['id'], db_path)['status'] == 'queued'
+    assert job_db.get_job(running['id'], db_path)['heartbeat_at'] is None
+    assert job_db.find_orphaned_jobs(db_path) == []
+    # The next server process has its own boot token, so it finds both jobs orphaned right away
+    boot_token, job_db.BOOT_TOKEN = job_db.BOOT_TOKEN, "next-run"
+    try:
+        assert {job['id'] for job in job_db.find_orphaned_jobs(db_path)} == {running['id'], queued['id']}
+    finally:
+        job_db.BOOT_TOKEN = boot_token
+        get_manager(db_path).close_all()
+
+
+def test_lease_keeper_resumes_jobs_of_a_worker_that_died():
+    """A running server takes over a resumable job once the lease of its (dead) worker expires."""
+    from backend.database import job_db
+    from backend.database.agent_db import get_manager
+    from backend.utils.job_engine import JobEngine, register_job_handler
+
+    db_path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    engine = JobEngine(max_workers=1, db_path=db_path)
+
+    async def handler(job):
+        return {"resumed": job['title']}
+
+    register_job_handler("test_lease", handler)
+    job = job_db.create_job("test_lease", title="Orphan", db_path=db_path)
+    with get_manager(db_path).transaction() as conn:
+        conn.execute("UPDATE jobs SET worker_token = 'dead-run', heartbeat_at = datetime('now', '-1 hour') WHERE id = ?", (job['id'],))
+
+    async def main():
+        engine.start_lease_keeper()
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            if job_db.get_job(job['id'], db_path)['status'] == 'succeeded':
+                break
+        await engine.shutdown()
+
+    os.environ['JOB_LEASE_SECONDS'] = '0.2'
+    try:
+        asyncio.run(main())
+    finally:
+        os.environ.pop('JOB_LEASE_SECONDS', None)
+    done = job_db.get_job(job['id'], db_path)
+    assert done['status'] == 'succeeded' and done['result'] == {"resumed": "Orphan"}
+    assert done['worker_token'] == job_db.BOOT_TOKEN
+    get_manager(db_path).close_all()
+
+
+if __name__ == "__main__":
+    test_jobs_run_in_the_background_with_bounded_concurrency()
+    test_jobs_of_other_processes_are_orphaned_only_once_their_lease_expires()
+    test_shutdown_leaves_jobs_to_be_resumed_by_the_next_process()
+    test_lease_keeper_resumes_jobs_of_a_worker_that_died()
+    print("✅ All job engine tests passed")
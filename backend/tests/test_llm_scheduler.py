@@ -0,0 +1,130 @@
+"""
+Test the LLM scheduler: per-model concurrency with interactive requests served before
+bulk ones, token rate limiting, AIMD on 429s, and the provider injected by run_agent.
+"""
+import sys
+import os
+import asyncio
+import json
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+
+class RateLimited(Exception):
+    status_code = 429
+    response = SimpleNamespace(headers={"retry-after": "0"})
+
+
+def _fake_model(behaviour):
+    """A Model whose get_response runs `behaviour(input)` instead of calling a provider."""
+    from agents.models.interface import Model
+
+    class FakeModel(Model):
+        async def get_response(self, system_instructions, input, model_settings, *args, **kwargs):
+            await behaviour(input)
+            return SimpleNamespace(usage=SimpleNamespace(total_tokens=10))
+
+        def stream_response(self, *args, **kwargs):
+            raise NotImplementedError
+
+    return FakeModel()
+
+
+def test_interactive_requests_overtake_bulk_and_limits_adapt():
+    """Bulk uses its share of the slots, interactive gets the rest; a 429 halves the limit and is retried."""
+    from agents import ModelSettings
+    from backend.utils.llm_scheduler import (
+        BULK, INTERACTIVE, LLMScheduler, ScheduledModel, llm_priority
+    )
+
+    os.environ['LLM_MODEL_LIMITS'] = json.dumps({"fake": {"max_concurrency": 4}, "throttled": {"max_concurrency": 4}})
+    try:
+        scheduler = LLMScheduler()
+        running, started = set(), []
+        release = None
+
+        async def hold(name):
+            running.add(name)
+            started.append(name)
+            await release.wait()
+            running.discard(name)
+
+        model = ScheduledModel(_fake_model(hold), "fake", scheduler)
+
+        async def request(name, priority):
+            with llm_priority(priority):
+                await model.get_response(None, name, ModelSettings(), [], None, [], None)
+
+        async def main():
+            nonlocal release
+            release = asyncio.Event()
+            bulk = [asyncio.create_task(request(f"bulk-{i}", BULK)) for i in range(5)]
+            await asyncio.sleep(0.05)
+            assert running == {"bulk-0", "bulk-1", "bulk-2"}  # 75% of 4 slots
+            chat = asyncio.create_task(request("chat", INTERACTIVE))
+            await asyncio.sleep(0.05)
+            assert "chat" in running  # not queued behind the waiting bulk requests
+            stats = scheduler.stats()["fake"]
+            assert stats["active"] == {"interactive": 1, "bulk": 3} and stats["waiting"]["bulk"] == 2
+            release.set()
+            await asyncio.gather(chat, *bulk)
+
+        asyncio.run(main())
+        assert started[:4] == ["bulk-0", "bulk-1", "bulk-2", "chat"]
+
+        calls = []
+
+        async def throttled(input):
+            calls.append(input)
+            if len(calls) == 1:
+                raise RateLimited("429 Too Many Requests")
+
+        model = ScheduledModel(_fake_model(throttled), "throttled", scheduler)
+        asyncio.run(model.get_response(None, "x", ModelSettings(), [], None, [], None))
+        stats = scheduler.stats()["throttled"]
+        assert len(calls) == 2 and stats["rate_limited"] == 1
+        assert 2 <= stats["limit"] < 4  # halved, then grown additively by the successful retry
+    finally:
+        os.environ.pop('LLM_MODEL_LIMITS', None)
+
+
+def test_token_rate_limit_delays_requests():
+    """A request waits until the token bucket has refilled enough for it."""
+    from backend.utils.llm_scheduler import INTERACTIVE, _ModelLane
+
+    lane = _ModelLane("fake", max_concurrency=4, min_concurrency=1, tokens_per_minute=600)  # 10 tokens/s
+
+    async def main():
+        await lane.acquire(INTERACTIVE, 600)
+        lane.release(INTERACTIVE)
+        started = time.monotonic()
+        await lane.acquire(INTERACTIVE, 3)
+        lane.release(INTERACTIVE)
+        return time.monotonic() - started
+
+    assert 0.2 < asyncio.run(main()) < 1.0
+
+
+def test_run_agent_uses_the_scheduled_provider():
+    """Runs get the shared scheduled provider; a caller's RunConfig keeps its other settings."""
+    from agents import RunConfig
+    from backend.utils.llm_scheduler import ScheduledModelProvider, _scheduled_run_config
+
+    default = _scheduled_run_config(None)
+    assert isinstance(default.model_provider, ScheduledModelProvider)
+    custom = _scheduled_run_config(RunConfig(workflow_name="chat"))
+    assert custom.model_provider is default.model_provider and custom.workflow_name == "chat"
+    assert _scheduled_run_config(custom) is custom
+
+
+if __name__ == "__main__":
+    test_interactive_requests_overtake_bulk_and_limits_adapt()
+    test_token_rate_limit_delays_requests()
+    test_run_agent_uses_the_scheduled_provider()
+    print("✅ All LLM scheduler tests passed")
@@ -0,0 +1,65 @@
+"""
+Test the runtime configuration snapshot: .env is read once, reloaded when it changes,
+and agents re-apply settings only when the snapshot generation changes.
+"""
+import sys
+import os
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+from backend.config import runtime_config
+
+
+def test_snapshot_reloads_only_when_env_file_changes():
+    """get_config() keeps one snapshot until .env changes; AgentManager skips agents already configured."""
+    import backend.api  # noqa: F401  (import order avoids a circular import)
+    from backend.utils.agent_manager import AgentManager
+
+    env_path = Path(tempfile.mkdtemp()) / ".env"
+    env_path.write_text("RUNTIME_CONFIG_TEST=one\n")
+    saved = (runtime_config.ENV_PATH, runtime_config._snapshot, os.environ.get('CONFIG_CHECK_INTERVAL_SECONDS'))
+    runtime_config.ENV_PATH = env_path
+    os.environ['CONFIG_CHECK_INTERVAL_SECONDS'] = '0'
+    try:
+        first = runtime_config.reload_config()
+        assert runtime_config.get_config() is first
+        assert first.env['RUNTIME_CONFIG_TEST'] == "one" and os.environ['RUNTIME_CONFIG_TEST'] == "one"
+
+        class _Agent:
+            id = "agent-under-test"
+            model = "stale-model"
+            model_settings = None
+
+        manager = AgentManager()
+        agent = _Agent()
+        manager._update_model_settings(agent)
+        assert agent.model == first.model_name and agent._config_generation == first.generation
+        agent.model = "edited"
+        manager._update_model_settings(agent)
+        assert agent.model == "edited"  # same generation: nothing re-applied
+
+        env_path.write_text("RUNTIME_CONFIG_TEST=two\n")
+        os.utime(env_path, (time.time() + 5, time.time() + 5))
+        second = runtime_config.get_config()
+        assert second.generation == first.generation + 1 and os.environ['RUNTIME_CONFIG_TEST'] == "two"
+        manager._update_model_settings(agent)
+        assert agent.model == second.model_name
+        assert not manager._modified_agents  # model settings are not persisted: nothing to save
+    finally:
+        runtime_config.ENV_PATH, runtime_config._snapshot, interval = saved
+        if interval is None:
+            os.environ.pop('CONFIG_CHECK_INTERVAL_SECONDS', None)
+        else:
+            os.environ['CONFIG_CHECK_INTERVAL_SECONDS'] = interval
+        os.environ.pop('RUNTIME_CONFIG_TEST', None)
+
+
+if __name__ == "__main__":
+    test_snapshot_reloads_only_when_env_file_changes()
+    print("✅ All runtime config tests passed")
@@ -0,0 +1,90 @@
+"""
+Test checkpointed section generation: finished sections are saved under the job ID,
+failing sections are retried, and a resumed job only generates the missing sections.
+"""
+import sys
+import os
+import asyncio
+import tempfile
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+
+class FakeCreator:
+    """Section creator without LLM calls; `failures` maps a section title to the number of failing attempts."""
+
+    def __init__(self, failures):
+        self.failures = dict(failures)
+        self.calls = []
+
+    def get_creator_type(self):
+        return "fake"
+
+    async def create_section(self, section_title, section_description, section_index, total_sections):
+        from backend.models import Section
+        self.calls.append(section_title)
+        if self.failures.get(section_title, 0) > 0:
+            self.failures[section_title] -= 1
+            raise RuntimeError(f"model error on {section_title}")
+        return Section(section_title=section_title, introduction=section_description, concept_blocks=[], summary="...")
+
+
+def test_resumed_job_only_generates_missing_sections():
+    """A job with a section that keeps failing fails with its other sections checkpointed; resuming completes it."""
+    from backend.database import job_db
+    from backend.database.agent_db import get_manager
+    from backend.models import Outline
+    from backend.tools.agent_as_tools.NotebookCreator import NotebookCreator
+    from backend.utils.job_engine import JobEngine, register_job_handler
+
+    outline = Outline(notebook_title="Checkpoints", notebook_description="", outlines={"A": "a", "B": "b", "C": "c"})
+    # B fails on all 3 attempts of the first run, C once (retried); the resumed run succeeds
+    creator = FakeCreator({"B": 3, "C": 1})
+
+    async def build(job=None):
+        notebook_creator = NotebookCreator(outline)
+        notebook_creator.router._creator = creator
+        sections = await notebook_creator.create_all_sections()
+        return list(sections)
+
+    register_job_handler("test_sections", build)
+    db_path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    engine = JobEngine(max_workers=1, db_path=db_path)
+    os.environ['SECTION_RETRY_BASE_SECONDS'] = '0.01'
+
+    async def run_until_done(job_id):
+        await asyncio.sleep(0)
+        while engine.active_jobs():
+            await asyncio.sleep(0.02)
+        return job_db.get_job(job_id, db_path)
+
+    async def main():
+        job = engine.submit("test_sections", build, title="Checkpoints")
+        failed = await run_until_done(job['id'])
+        assert failed['status'] == 'failed' and "B" in failed['error']
+        assert sorted(job_db.get_section_checkpoints(job['id'], db_path)) == ["A", "C"]
+        assert creator.calls.count("C") == 2 and creator.calls.count("B") == 3
+
+        creator.calls.clear()
+        assert engine.resume(job['id'])['status'] == 'queued'
+        assert engine.resume(job['id']) is None  # already claimed
+        done = await run_until_done(job['id'])
+        return done
+
+    try:
+        done = asyncio.run(main())
+    finally:
+        os.environ.pop('SECTION_RETRY_BASE_SECONDS', None)
+    assert creator.calls == ["B"]
+    assert done['status'] == 'succeeded' and done['result'] == ["A", "B", "C"]  # outline order
+    assert job_db.clear_section_checkpoints(done['id'], db_path) == 3
+    get_manager(db_path).close_all()
+
+
+if __name__ == "__main__":
+    test_resumed_job_only_generates_missing_sections()
+    print("✅ All section checkpoint tests passed")
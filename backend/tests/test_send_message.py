@@ -0,0 +1,130 @@
+"""
+Test the async send_message tool: the target agent runs on the caller's event loop and
+thread with the caller's tracing context, and slow targets time out. broadcast_message
+asks several targets concurrently and merges their answers.
+"""
+import sys
+import os
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+
+def test_send_message_awaits_target_on_the_callers_loop():
+    """No thread or event loop hop per delegation; contextvars carry over; timeouts return an error."""
+    import backend.api  # noqa: F401  (import order avoids a circular import)
+    from agents.tool_context import ToolContext
+    from backend.agent.MasterAgent import MasterAgent
+    from backend.database.agent_db import get_manager
+    from backend.tools.tool_registry import get_tool_registry
+    from backend.utils.agent_manager import get_agent_manager
+    from backend.utils.tracing_collector import get_current_session_id, _current_session
+
+    db_path = os.path.join(tempfile.mkdtemp(), "test_send_message.db")
+    manager = get_agent_manager()
+    try:
+        sender = MasterAgent("Sender", DB_PATH=db_path)
+        target = MasterAgent("Target", parent_agent_id=sender.id, DB_PATH=db_path)
+        manager.cache_agent(target)
+        seen = {}
+
+        async def receive(message):
+            seen.update(
+                loop=asyncio.get_running_loop(),
+                thread=threading.get_ident(),
+                session=get_current_session_id(),
+            )
+            await asyncio.sleep(float(message))
+            return f"done {message}"
+
+        # The LLM run is replaced; send_message only needs an awaitable receive_messgae
+        target.receive_messgae = receive
+        tool = get_tool_registry().create_tool("send_message", sender)
+
+        async def call(message):
+            arguments = json.dumps({"id": target.id, "message": message})
+            context = ToolContext(context=None, tool_name="send_message", tool_call_id="call-1", tool_arguments=arguments)
+            return await tool.on_invoke_tool(context, arguments)
+
+        async def main():
+            _current_session.set("send-message-session")
+            output = await call("0")
+            assert output == "done 0"
+            assert seen['loop'] is asyncio.get_running_loop() and seen['thread'] == threading.get_ident()
+            assert seen['session'] == "send-message-session"
+
+            os.environ['SEND_MESSAGE_TIMEOUT_SECONDS'] = '0.05'
+            try:
+                output = await call("5")
+            finally:
+                os.environ.pop('SEND_MESSAGE_TIMEOUT_SECONDS', None)
+            assert "did not respond within 0.05 seconds" in output
+
+        asyncio.run(main())
+    finally:
+        manager.clear_cache()
+        get_manager(db_path).close_all()
+
+
+def test_broadcast_message_runs_targets_concurrently():
+    """Wall-clock time is the slowest target, not the sum; timeouts and unknown IDs are reported per target."""
+    import backend.api  # noqa: F401  (import order avoids a circular import)
+    from agents.tool_context import ToolContext
+    from backend.agent.MasterAgent import MasterAgent
+    from backend.database.agent_db import get_manager
+    from backend.tools.tool_registry import get_tool_registry
+    from backend.utils.agent_manager import get_agent_manager
+
+    db_path = os.path.join(tempfile.mkdtemp(), "test_broadcast_message.db")
+    manager = get_agent_manager()
+    try:
+        sender = MasterAgent("Sender", DB_PATH=db_path)
+        delays = {"Fast": 0.6, "Slow": 0.6, "Stuck": 5}
+        targets = []
+        for name, delay in delays.items():
+            target = MasterAgent(name, parent_agent_id=sender.id, DB_PATH=db_path)
+            manager.cache_agent(target)
+
+            async def receive(message, name=name, delay=delay):
+                await asyncio.sleep(delay)
+                return f"{name}: {message}"
+
+            target.receive_messgae = receive
+            targets.append(target)
+
+        tool = get_tool_registry().create_tool("broadcast_message", sender)
+        missing_id = "00000000-0000-0000-0000-000000000000"
+        ids = [t.id for t in targets] + [targets[0].id, missing_id]
+        arguments = json.dumps({"ids": ids, "message": "hi"})
+        context = ToolContext(context=None, tool_name="broadcast_message", tool_call_id="call-1", tool_arguments=arguments)
+
+        os.environ['BROADCAST_TIMEOUT_SECONDS'] = '1'
+        try:
+            started = time.monotonic()
+            output = asyncio.run(tool.on_invoke_tool(context, arguments))
+            elapsed = time.monotonic() - started
+        finally:
+            os.environ.pop('BROADCAST_TIMEOUT_SECONDS', None)
+
+        results = json.loads(output)["results"]
+        assert [r['id'] for r in results] == [t.id for t in targets] + [missing_id]  # duplicates dropped, order kept
+        assert [r['status'] for r in results] == ["ok", "ok", "timeout", "error"]
+        assert results[0]['name'] == "Fast" and results[0]['response'] == "Fast: hi"
+        assert elapsed < 1.8, f"targets ran one after another ({elapsed:.2f}s)"
+    finally:
+        manager.clear_cache()
+        get_manager(db_path).close_all()
+
+
+if __name__ == "__main__":
+    test_send_message_awaits_target_on_the_callers_loop()
+    test_broadcast_message_runs_targets_concurrently()
+    print("✅ All send_message tests passed")
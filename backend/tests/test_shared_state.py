@@ -0,0 +1,145 @@
+"""
+Test the shared state backend (SHARED_STATE_BACKEND=sqlite): cached agents are invalidated
+through the agent change log, and traces are stored in the database.
+"""
+import sys
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+
+def test_change_log_invalidates_agents_saved_by_other_processes():
+    """Saves through the manager keep the cached instance; rows changed on another connection are dropped."""
+    import backend.api  # noqa: F401  (import order avoids a circular import)
+    from backend.agent.MasterAgent import MasterAgent
+    from backend.database.agent_db import get_manager, load_agent, save_agent
+    from backend.utils.agent_manager import AgentManager
+
+    db_path = os.path.join(tempfile.mkdtemp(), "test_shared_state.db")
+    os.environ['SHARED_STATE_BACKEND'] = 'sqlite'
+    try:
+        manager = AgentManager()
+        manager._invalidation_bus.interval = 0
+        first = MasterAgent("First", DB_PATH=db_path)
+        second = MasterAgent("Second", DB_PATH=db_path)
+        cached_first = manager.get_agent(first.id, db_path)
+        cached_second = manager.get_agent(second.id, db_path)
+
+        # Saved in this process: the event matches the cached version, nothing is dropped
+        cached_first.instructions = "Edited here"
+        assert save_agent(cached_first, db_path)
+        assert manager.get_agent(first.id, db_path) is cached_first
+
+        # Saved and deleted by "another worker" (a separate connection): both are dropped
+        other = sqlite3.connect(db_path)
+        other.execute("UPDATE agents SET version = version + 1 WHERE id = ?", (first.id,))
+        other.execute("DELETE FROM agents WHERE id = ?", (second.id,))
+        other.commit()
+        other.close()
+        reloaded = manager.get_agent(first.id, db_path)
+        assert reloaded is not cached_first and reloaded._db_version == cached_first._db_version + 1
+        assert manager.get_agent(second.id, db_path) is None
+        assert manager.get_cache_stats()['stale_reloads'] == 2
+        assert load_agent(first.id, db_path) is not None
+    finally:
+        os.environ.pop('SHARED_STATE_BACKEND', None)
+        get_manager(db_path).close_all()
+
+
+def test_traces_are_stored_in_the_database():
+    """Tracing reads and writes go through the traces table, visible to every process."""
+    from backend.database import trace_db
+    from backend.utils import tracing_collector
+
+    class _Agent:
+        name = "Tracer"
+        id = "agent-1"
+        type = "Master"
+
+    session_id = "shared-trace-session"
+    os.environ['SHARED_STATE_BACKEND'] = 'sqlite'
+    try:
+        tracing_collector.clear_traces(session_id)
+        with tracing_collector.track_agent_run(session_id, _Agent(), "hello"):
+            tracing_collector.update_current_activity_message(session_id, "halfway")
+            tracing_collector.flush_trace_writes()  # writes are queued off the caller's thread
+            current = tracing_collector.get_current_activity(session_id)
+            assert current['message'] == "halfway" and current['status'] == 'running'
+        tracing_collector.flush_trace_writes()
+        traces = tracing_collector.get_traces(session_id)
+        assert len(traces) == 1 and traces[0]['status'] == 'completed' and traces[0]['error'] is None
+        assert tracing_collector.get_current_activity(session_id) is None
+        assert tracing_collector._traces.get(session_id) is None  # nothing kept in this process
+        assert trace_db.get_traces(session_id) == traces
+        tracing_collector.clear_traces(session_id)
+        tracing_collector.flush_trace_writes()
+        assert tracing_collector.get_traces(session_id) == []
+    finally:
+        os.environ.pop('SHARED_STATE_BACKEND', None)
+
+
+def test_trace_feed_follows_the_change_log_and_resumes_by_event_id():
+    """The shared feed sends logged trace events with their log IDs; Last-Event-ID resumes from them."""
+    import asyncio
+    from backend.utils import tracing_collector
+    from backend.utils.trace_feed import TraceFeed
+
+    class _Agent:
+        name = "Tracer"
+        id = "agent-1"
+        type = "Master"
+
+    session_id = "shared-trace-feed-session"
+    os.environ['SHARED_STATE_BACKEND'] = 'sqlite'
+    os.environ['TRACE_FEED_POLL_SECONDS'] = '0.01'
+
+    async def run():
+        feed = TraceFeed()
+        follower = feed.subscribe(session_id)
+        first = await follower.__anext__()
+        assert first[1] == "snapshot" and first[2] == {"activities": []}
+
+        # Written as if by another worker: the feed only sees the database
+        with tracing_collector.track_agent_run(session_id, _Agent(), "hello"):
+            tracing_collector.update_current_activity_message(session_id, "halfway")
+        tracing_collector.flush_trace_writes()
+        events = [await follower.__anext__() for _ in range(3)]
+        await follower.aclose()
+        assert [event for _, event, _ in events] == ["activity", "update", "update"]
+        assert first[0] < events[0][0] < events[1][0] < events[2][0]
+        assert events[1][2]['message'] == "halfway" and events[2][2]['status'] == 'completed'
+
+        # A reconnecting client (on any worker) gets only the events after its last ID
+        resumed = feed.subscribe(session_id, events[0][0])
+        assert [await resumed.__anext__() for _ in range(2)] == events[1:]
+        await resumed.aclose()
+
+        # Without a last ID the snapshot's ID covers the logged events
+        fresh = feed.subscribe(session_id)
+        snapshot = await fresh.__anext__()
+        await fresh.aclose()
+        assert snapshot[1] == "snapshot" and snapshot[0] >= events[-1][0]
+        assert snapshot[2]['activities'][0]['status'] == 'completed'
+
+    try:
+        tracing_collector.clear_traces(session_id)
+        tracing_collector.flush_trace_writes()
+        asyncio.run(run())
+    finally:
+        tracing_collector.clear_traces(session_id)
+        tracing_collector.flush_trace_writes()
+        os.environ.pop('SHARED_STATE_BACKEND', None)
+        os.environ.pop('TRACE_FEED_POLL_SECONDS', None)
+
+
+if __name__ == "__main__":
+    test_change_log_invalidates_agents_saved_by_other_processes()
+    test_traces_are_stored_in_the_database()
+    test_trace_feed_follows_the_change_log_and_resumes_by_event_id()
+    print("✅ All shared state tests passed")
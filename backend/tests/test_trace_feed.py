@@ -0,0 +1,174 @@
+"""
+Test the trace feed: tracing changes are pushed to subscribers as deltas, a client resuming
+from its last event ID gets only the events it missed, a stale ID gets a snapshot, and the
+feed of a session is dropped when nothing runs and nobody follows it.
+"""
+import sys
+import os
+import asyncio
+import uuid
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+
+class FakeAgent:
+    name = "Tracer"
+    id = "agent-1"
+    type = "top_level"
+
+
+async def _next(events):
+    return await asyncio.wait_for(events.__anext__(), timeout=2)
+
+
+def test_subscribers_receive_deltas_and_resume_from_event_id():
+    """Start, progress and end of an activity arrive as events; resuming replays only later events."""
+    import backend.api  # noqa: F401  (import order avoids a circular import)
+    from backend.utils.trace_feed import get_trace_feed
+    from backend.utils.tracing_collector import track_agent_run, update_current_activity_message
+
+    session_id = f"feed-{uuid.uuid4()}"
+    feed = get_trace_feed()
+
+    async def main():
+        events = feed.subscribe(session_id)
+        event_id, event, data = await _next(events)
+        assert (event_id, event, data) == (0, "snapshot", {"activities": []})
+
+        with track_agent_run(session_id, FakeAgent(), "hello") as context:
+            update_current_activity_message(session_id, "step 1")
+            update_current_activity_message(session_id, "step 2")
+            started = await _next(events)
+            assert started[1] == "activity" and started[2]['id'] == context.activity_id
+            assert started[2]['message'] == "hello" and started[2]['status'] == "running"
+            progress = await _next(events)
+            assert progress[1] == "update" and set(progress[2]) == {"id", "message", "timestamp"}
+            assert progress[2]['message'] == "step 1"
+            await events.aclose()
+            assert not feed._feeds[session_id].subscribers
+
+            # Reconnect after the first progress event: only the later events are replayed
+            resumed = feed.subscribe(session_id, last_event_id=progress[0])
+            assert (await _next(resumed))[2]['message'] == "step 2"
+        ended = await _next(resumed)
+        assert ended[1] == "update" and ended[2]['status'] == "completed" and 'message' not in ended[2]
+        assert ended[0] - started[0] == 3
+
+        # An ID older than the buffer cannot be resumed: the client gets a snapshot
+        feed._feeds[session_id].events.popleft()
+        stale = feed.subscribe(session_id, last_event_id=started[0] - 1)
+        event_id, event, data = await _next(stale)
+        assert (event_id, event) == (ended[0], "snapshot")
+        assert [(a['id'], a['status']) for a in data['activities']] == [(context.activity_id, "completed")]
+        await stale.aclose()
+        await resumed.aclose()
+
+        # No running activity and no subscriber left: the feed is dropped
+        assert session_id not in feed._feeds
+
+    asyncio.run(main())
+
+
+def test_snapshot_is_followed_only_by_later_events():
+    """The snapshot's event ID is the last event it includes, so the events after it are not sent twice."""
+    import backend.api  # noqa: F401  (import order avoids a circular import)
+    from backend.utils.trace_feed import get_trace_feed
+    from backend.utils.tracing_collector import track_agent_run, update_current_activity_message
+
+    session_id = f"feed-{uuid.uuid4()}"
+    feed = get_trace_feed()
+
+    async def main():
+        with track_agent_run(session_id, FakeAgent(), "hello"):
+            update_current_activity_message(session_id, "step 1")
+            events = feed.subscribe(session_id)
+            event_id, event, data = await _next(events)
+            assert (event_id, event) == (feed.last_event_id(session_id), "snapshot")
+            assert [a['message'] for a in data['activities']] == ["step 1"]
+            update_current_activity_message(session_id, "step 2")
+            following = await _next(events)
+            assert following[0] == event_id + 1 and following[2]['message'] == "step 2"
+        await events.aclose()
+        assert session_id not in feed._feeds
+
+    asyncio.run(main())
+
+
+def test_events_from_worker_threads_reach_the_subscriber_loop():
+    """Progress reported from a run_db thread is delivered on the subscriber's event loop."""
+    import backend.api  # noqa: F401  (import order avoids a circular import)
+    from backend.database.async_db import run_db
+    from backend.utils.trace_feed import get_trace_feed
+    from backend.utils.tracing_collector import track_tool_call, update_current_activity_message
+
+    session_id = f"feed-{uuid.uuid4()}"
+
+    async def main():
+        events = get_trace_feed().subscribe(session_id)
+        await _next(events)  # snapshot
+        with track_tool_call(session_id, FakeAgent(), "create_notebook"):
+            await run_db(update_current_activity_message, session_id, "section 1/3")
+        names = [(await _next(events))[1] for _ in range(3)]
+        await events.aclose()
+        return names
+
+    assert asyncio.run(main()) == ["activity", "update", "update"]
+
+
+def test_events_keep_their_order_across_threads():
+    """An event published on the subscriber's loop does not overtake one published from a thread just before."""
+    import threading
+    from backend.utils.trace_feed import TraceFeed
+
+    feed = TraceFeed()
+    session_id = f"feed-{uuid.uuid4()}"
+
+    async def main():
+        events = feed.subscribe(session_id)
+        await _next(events)  # snapshot
+        # The thread's event is handed to the loop before the loop publishes its own
+        worker = threading.Thread(target=feed.publish, args=(session_id, "update", {"id": "a", "message": "from thread"}))
+        worker.start()
+        worker.join()
+        feed.publish(session_id, "update", {"id": "a", "message": "from loop"})
+        received = [(await _next(events))[2]['message'] for _ in range(2)]
+        await events.aclose()
+        return received
+
+    assert asyncio.run(main()) == ["from thread", "from loop"]
+
+
+def test_events_are_handed_to_subscribers_outside_the_traces_lock():
+    """Writers of other sessions never wait for the fan-out: _traces_lock is released before publishing."""
+    import backend.api  # noqa: F401  (import order avoids a circular import)
+    from backend.utils import tracing_collector
+    from backend.utils.trace_feed import get_trace_feed
+
+    session_id = f"feed-{uuid.uuid4()}"
+    feed = get_trace_feed()
+    held = []
+
+    class Probe:
+        def deliver(self, item):
+            held.append(tracing_collector._traces_lock.locked())
+
+    with feed.session_lock(session_id):
+        feed._feed(session_id).subscribers.add(Probe())
+    with tracing_collector.track_agent_run(session_id, FakeAgent(), "hello"):
+        tracing_collector.update_current_activity_message(session_id, "step 1")
+    assert held == [False, False, False]
+    tracing_collector.clear_traces(session_id)
+    feed._feeds.pop(session_id, None)  # drop the probe
+
+
+if __name__ == "__main__":
+    test_subscribers_receive_deltas_and_resume_from_event_id()
+    test_snapshot_is_followed_only_by_later_events()
+    test_events_from_worker_threads_reach_the_subscriber_loop()
+    test_events_keep_their_order_across_threads()
+    test_events_are_handed_to_subscribers_outside_the_traces_lock()
+    print("✅ All trace feed tests passed")
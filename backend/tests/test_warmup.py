@@ -0,0 +1,57 @@
+"""
+Test the startup warm-up: agents are preloaded and bound in the background, and the
+readiness endpoint answers 503 until the warm-up has finished.
+"""
+import sys
+import os
+import asyncio
+import tempfile
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+
+def test_readiness_waits_for_warm_up():
+    """GET /ready is 503 before the warm-up and 200 after it; TopLevelAgent is then cached and bound."""
+    import backend.api
+    from backend.api import utils as api_utils, warmup
+    from backend.agent.BaseAgent import AgentType
+    from backend.api.utils import get_top_level_agent
+    from backend.database import agent_db, tools_db
+    from backend.utils.agent_manager import get_agent_manager
+
+    # The bootstrap uses the default database: point it at a temporary one
+    db_path = os.path.join(tempfile.mkdtemp(), "test_warmup.db")
+    defaults = (agent_db.DEFAULT_DB_PATH, tools_db.DEFAULT_DB_PATH, api_utils._top_level_agent)
+    agent_db.DEFAULT_DB_PATH = tools_db.DEFAULT_DB_PATH = db_path
+    api_utils._top_level_agent = None
+    get_agent_manager().clear_cache()
+
+    saved = warmup.get_warmup_state()
+    warmup._update_state(status='pending', started_at=None, finished_at=None, agents=0, error=None)
+    try:
+        assert asyncio.run(backend.api.ready()).status_code == 503
+
+        asyncio.run(warmup.run_warmup())
+        state = warmup.get_warmup_state()
+        assert state['status'] == 'ready' and state['agents'] >= 2 and state['error'] is None
+        assert asyncio.run(backend.api.ready()).status_code == 200
+
+        top_level_agent = get_top_level_agent()
+        assert get_agent_manager().get_cached_agent(top_level_agent.id) is top_level_agent
+        # Already bound by the warm-up: nothing left to do before the first run
+        assert top_level_agent.bind_for_run() is False
+        assert [header['id'] for header in agent_db.find_agents_by_type(AgentType.TOP_LEVEL, db_path)] == [top_level_agent.id]
+    finally:
+        warmup._update_state(**saved)
+        agent_db.DEFAULT_DB_PATH, tools_db.DEFAULT_DB_PATH, api_utils._top_level_agent = defaults
+        get_agent_manager().clear_cache()
+        agent_db.get_manager(db_path).close_all()
+
+
+if __name__ == "__main__":
+    test_readiness_waits_for_warm_up()
+    print("✅ All warm-up tests passed")
@@ -1,6 +1,11 @@
 """NotebookCreator - 笔记本创建器（新架构）
 
 使用 SectionCreatorRouter 根据文件类型和质量自动选择合适的章节创建器。
+
+在后台任务中运行时，每个完成的章节立即按任务ID保存为检查点（section_checkpoints 表），
+任务中断后恢复时只生成缺少的章节。失败的章节按指数退避重试：
+    SECTION_MAX_ATTEMPTS: 每个章节最多尝试次数（默认 3）
+    SECTION_RETRY_BASE_SECONDS: 第一次重试前的等待秒数，之后每次翻倍（默认 2）
 """
 
 from __future__ import annotations
@@ -23,7 +28,8 @@ class NotebookCreator:
         outline: Outline,
         file_path: Optional[str] = None,
         output_path: Optional[str] = None,
-        force_creator_type: Optional[str] = None
+        force_creator_type: Optional[str] = None,
+        checkpoint_id: Optional[str] = None
     ):
         """初始化笔记本创建器
         
@@ -32,10 +38,16 @@ class NotebookCreator:
             file_path: 文件路径（如果有）
             output_path: 输出路径（可选）
             force_creator_type: 强制使用指定的创建器类型（用于测试或特殊场景）
+            checkpoint_id: 章节检查点的键（默认使用当前后台任务的ID；不在任务中时不保存检查点）
         """
+        from backend.utils.job_engine import get_current_job_db_path, get_current_job_id
+        
         self.outline = outline
         self.file_path = file_path
         self.output_path = output_path
+        self.checkpoint_id = checkpoint_id or get_current_job_id()
+        # 检查点与任务记录在同一个数据库中
+        self.checkpoint_db_path = get_current_job_db_path()
         self.sections: Dict[str, Section] = {}
         
         # 创建路由器
@@ -54,18 +66,31 @@ class NotebookCreator:
         all_sections = list(self.outline.outlines.items())
         total = len(all_sections)
         
+        # 从检查点恢复已完成的章节（恢复中断的任务时）
+        checkpointed = await self._load_checkpoints()
+        pending = [
+            (idx + 1, section_title, section_desc)
+            for idx, (section_title, section_desc) in enumerate(all_sections)
+            if section_title not in checkpointed
+        ]
+        
         # 获取创建器
         creator = self.router.get_creator()
         creator_type = creator.get_creator_type()
         
         print(f"\n[NotebookCreator] 使用创建器类型: {creator_type}")
-        print(f"[NotebookCreator] 开始创建 {total} 个章节...\n")
+        if checkpointed:
+            print(f"[NotebookCreator] 从检查点恢复 {len(checkpointed)} 个章节")
+        print(f"[NotebookCreator] 开始创建 {len(pending)} 个章节...\n")
         
         # 更新tracing系统显示进度
         from backend.utils.tracing_collector import get_current_session_id, update_current_activity_message
         session_id = get_current_session_id()
         if session_id:
-            update_current_activity_message(session_id, f"NotebookCreator: 开始创建 {total} 个章节...")
+            update_current_activity_message(session_id, f"NotebookCreator: 开始创建 {len(pending)}/{total} 个章节...")
+        
+        max_attempts = max(1, int(os.getenv('SECTION_MAX_ATTEMPTS', '3')))
+        retry_base = float(os.getenv('SECTION_RETRY_BASE_SECONDS', '2'))
         
         # 并行创建所有章节
         async def create_section_with_logging(
@@ -84,12 +109,27 @@ class NotebookCreator:
                 if current_session_id:
                     update_current_activity_message(current_session_id, progress_msg)
                 
-                section_data = await creator.create_section(
-                    section_title=section_title,
-                    section_description=section_desc,
-                    section_index=idx,
-                    total_sections=total
-                )
+                for attempt in range(1, max_attempts + 1):
+                    try:
+                        section_data = await creator.create_section(
+                            section_title=section_title,
+                            section_description=section_desc,
+                            section_index=idx,
+                            total_sections=total
+                        )
+                        break
+                    except Exception as e:
+                        if attempt == max_attempts:
+                            raise
+                        delay = retry_base * 2 ** (attempt - 1)
+                        retry_msg = f"[{idx}/{total}] 章节 '{section_title}' 第 {attempt} 次创建失败（{e}），{delay:g} 秒后重试"
+                        print(retry_msg)
+                        if current_session_id:
+                            update_current_activity_message(current_session_id, retry_msg)
+                        await asyncio.sleep(delay)
+                
+                # 立即保存检查点，进程中断也不会丢失已完成的章节
+                await self._save_checkpoint(section_title, idx, section_data)
                 
                 success_msg = f"[{idx}/{total}] ✓ 章节 '{section_title}' 创建完成"
                 print(f"{success_msg}\n")
@@ -111,20 +151,30 @@ class NotebookCreator:
                 
                 return (section_title, None, e)
         
-        # 并行生成所有章节
+        # 并行生成缺少的章节
         section_tasks = [
-            create_section_with_logging(section_title, section_desc, idx + 1)
-            for idx, (section_title, section_desc) in enumerate(all_sections)
+            create_section_with_logging(section_title, section_desc, idx)
+            for idx, section_title, section_desc in pending
         ]
         
         results = await asyncio.gather(*section_tasks, return_exceptions=False)
+        created = {section_title: section_data for section_title, section_data, error in results if error is None and section_data is not None}
         
-        # 处理结果
-        for section_title, section_data, error in results:
-            if error is None and section_data is not None:
+        # 处理结果（保持大纲顺序）
+        missing = []
+        for section_title, _ in all_sections:
+            section_data = checkpointed.get(section_title) or created.get(section_title)
+            if section_data is not None:
                 self.sections[section_title] = section_data
             else:
-                print(f"  警告: 章节 '{section_title}' 未能成功生成，将被跳过")
+                missing.append(section_title)
+                print(f"  警告: 章节 '{section_title}' 未能成功生成" + ("" if self.checkpoint_id else "，将被跳过"))
+        
+        if missing and self.checkpoint_id:
+            # 在后台任务中不跳过章节：任务失败，已完成的章节保留在检查点中，恢复任务时只生成缺少的章节
+            raise RuntimeError(
+                f"{len(missing)} 个章节创建失败（{', '.join(missing)}），已完成的 {len(self.sections)} 个章节已保存，恢复任务即可继续"
+            )
         
         completion_msg = f"[NotebookCreator] 章节创建完成，成功: {len(self.sections)}/{total}"
         print(f"\n{completion_msg}")
@@ -135,6 +185,35 @@ class NotebookCreator:
         
         return self.sections
     
+    async def _load_checkpoints(self) -> Dict[str, Section]:
+        """读取当前任务已完成的章节（只保留仍在大纲中的章节）"""
+        if not self.checkpoint_id:
+            return {}
+        from backend.database import job_db
+        from backend.database.async_db import run_db
+        
+        sections = {}
+        for section_title, data in (await run_db(job_db.get_section_checkpoints, self.checkpoint_id, self.checkpoint_db_path)).items():
+            if section_title not in self.outline.outlines:
+                continue
+            try:
+                sections[section_title] = Section.model_validate(data)
+            except Exception as e:
+                print(f"[NotebookCreator] 检查点中的章节 '{section_title}' 无法读取，将重新生成: {e}")
+        return sections
+    
+    async def _save_checkpoint(self, section_title: str, section_index: int, section: Section) -> None:
+        """保存一个完成的章节（保存失败只记录日志，不影响创建）"""
+        if not self.checkpoint_id:
+            return
+        from backend.database import job_db
+        from backend.database.async_db import run_db
+        
+        try:
+            await run_db(job_db.save_section_checkpoint, self.checkpoint_id, section_title, section_index, section.model_dump(), self.checkpoint_db_path)
+        except Exception as e:
+            print(f"[NotebookCreator] 章节 '{section_title}' 的检查点保存失败: {e}")
+    
     def write_to_file(self) -> str:
         """将生成的章节内容写入文件
         
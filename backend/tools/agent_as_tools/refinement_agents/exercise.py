@@ -1,7 +1,8 @@
 """Exercise Refinement Agent - 优化练习题和例子"""
 
 from typing import List
-from agents import Agent, Runner, AgentOutputSchema
+from agents import Agent, AgentOutputSchema
+from backend.utils.llm_scheduler import run_agent
 from backend.models import Section, Example, ConceptBlock
 from backend.config.model_config import get_model_settings, get_model_name
 from .base import BaseRefinementAgent
@@ -110,7 +111,7 @@ class ExerciseRefinementAgent(BaseRefinementAgent):
 返回优化后的完整Section对象。
 """
         
-        response = await Runner.run(exercise_agent, prompt)
+        response = await run_agent(exercise_agent, prompt)
         return response.final_output
     
     def _format_exercises(self, exercises: List[Example]) -> str:
@@ -1,7 +1,8 @@
 """Proof Refinement Agent - 优化证明"""
 
 from typing import List
-from agents import Agent, Runner, AgentOutputSchema
+from agents import Agent, AgentOutputSchema
+from backend.utils.llm_scheduler import run_agent
 from backend.models import Section, ConceptBlock
 from backend.config.model_config import get_model_settings, get_model_name
 from .base import BaseRefinementAgent
@@ -128,7 +129,7 @@ class ProofRefinementAgent(BaseRefinementAgent):
 返回优化后的完整Section对象。
 """
         
-        response = await Runner.run(proof_agent, prompt)
+        response = await run_agent(proof_agent, prompt)
         return response.final_output
     
     def _format_theorems(self, concept_blocks: List[ConceptBlock]) -> str:
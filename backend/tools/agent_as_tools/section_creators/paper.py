@@ -1,7 +1,8 @@
 """Paper Section Creator - 处理论文"""
 
 from typing import Optional
-from agents import Agent, Runner, AgentOutputSchema
+from agents import Agent, AgentOutputSchema
+from backend.utils.llm_scheduler import run_agent
 from backend.models import Outline, Section
 from backend.config.model_config import get_section_maker_model_settings, get_model_name
 from .base import BaseSectionCreator
@@ -130,7 +131,7 @@ class PaperSectionCreator(BaseSectionCreator):
         )
         
         # 生成章节
-        response = await Runner.run(
+        response = await run_agent(
             section_agent,
             f"请从论文中提取章节 '{section_title}' 的知识点"
         )
@@ -1,7 +1,8 @@
 """Well Formed Note Section Creator - 处理完善的笔记"""
 
 from typing import Optional
-from agents import Agent, Runner, AgentOutputSchema
+from agents import Agent, AgentOutputSchema
+from backend.utils.llm_scheduler import run_agent
 from backend.models import Outline, Section
 from backend.config.model_config import get_section_maker_model_settings, get_model_name
 from .base import BaseSectionCreator
@@ -144,7 +145,7 @@ class WellFormedNoteSectionCreator(BaseSectionCreator):
         )
         
         # 生成章节
-        response = await Runner.run(
+        response = await run_agent(
             section_agent,
             f"请为章节 '{section_title}' 提取并优化内容"
         )
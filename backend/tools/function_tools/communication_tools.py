@@ -1,6 +1,9 @@
 """Communication tools - agent间通信工具"""
 
-from typing import TYPE_CHECKING
+import asyncio
+import json
+import os
+from typing import TYPE_CHECKING, List
 from agents import function_tool
 from backend.tools.tool_registry import register_function_tool
 
@@ -20,7 +23,7 @@ if TYPE_CHECKING:
     },
     output_type="str",
     output_description="返回目标agent处理消息后的完整响应文本。如果agent执行成功，返回agent的执行结果；如果加载agent失败，返回错误信息；如果执行过程中出现异常，返回错误信息",
-    required_agent_attrs=["load_agent_from_db_by_id", "run_async_safely"],
+    required_agent_attrs=["load_agent_from_db_by_id"],
 )
 def create_send_message_tool(agent: 'BaseAgent'):
     """
@@ -33,7 +36,7 @@ def create_send_message_tool(agent: 'BaseAgent'):
         A function_tool decorated function for sending messages
     """
     @function_tool
-    def send_message(id: str, message: str) -> str:
+    async def send_message(id: str, message: str) -> str:
         """向指定ID的agent发送消息
 
         Args:
@@ -47,19 +50,22 @@ def create_send_message_tool(agent: 'BaseAgent'):
         if len(id) < 8:
             return f"Error: Agent ID '{id}' is too short. Please use the complete agent ID from the agents list."
         
-        # Use AgentManager to wake up the agent (ensures tools are restored)
+        # Use AgentManager to wake up the agent (ensures tools are restored); database work runs on the DB executor
+        from backend.database.async_db import run_db
         from backend.utils.agent_manager import wake_agent
-        target_agent = wake_agent(id, db_path=getattr(agent, 'DB_PATH', None))
+        db_path = getattr(agent, 'DB_PATH', None)
+        target_agent = await run_db(wake_agent, id, db_path)
         
         if target_agent is None:
             # Try to find agent by partial ID match
             try:
-                from backend.database.agent_db import load_all_agents
-                all_agents = load_all_agents(getattr(agent, 'DB_PATH', None))
-                matching_ids = [aid for aid in all_agents.keys() if aid.startswith(id)]
+                from backend.database.agent_db import find_agents_by_id_prefix
+                # Two results are enough to tell "unique" from "ambiguous"
+                matches = await run_db(find_agents_by_id_prefix, id, limit=2, db_path=db_path)
+                matching_ids = [header['id'] for header in matches]
                 if matching_ids:
                     if len(matching_ids) == 1:
-                        target_agent = wake_agent(matching_ids[0], db_path=getattr(agent, 'DB_PATH', None))
+                        target_agent = await run_db(wake_agent, matching_ids[0], db_path)
                         if target_agent:
                             return f"Error: Agent ID '{id}' is incomplete. Use the complete ID: {matching_ids[0]}"
                     else:
@@ -69,15 +75,82 @@ def create_send_message_tool(agent: 'BaseAgent'):
             
             return f"Error: Failed to load agent with ID {id} from database. Please check:\n1. The agent ID is correct and complete\n2. The agent exists in the database\n3. For notebook creation, use 'generate_outline' to generate outline, then use 'send_message' to send action='create_notebook' message to MasterAgent"
 
-        # Ensure tools are restored (AgentManager should do this, but double-check)
-        if not hasattr(target_agent, 'tools') or target_agent.tools is None:
-            from backend.utils.agent_manager import get_agent_manager
-            get_agent_manager()._ensure_tools_restored(target_agent)
-
+        # 直接在调用方的事件循环上等待子agent（不再新建线程和事件循环）：
+        # contextvars（如 tracing 的 session）随之传递，取消调用方的运行也会取消子agent的运行
+        timeout = float(os.getenv('SEND_MESSAGE_TIMEOUT_SECONDS', '0'))
         try:
-            output = agent.run_async_safely(target_agent.receive_messgae(message))
+            output = await asyncio.wait_for(target_agent.receive_messgae(message), timeout=timeout or None)
             return str(output)
+        except asyncio.TimeoutError:
+            return f"Error sending message: agent {id} did not respond within {timeout:g} seconds"
         except Exception as e:
             return f"Error sending message: {str(e)}"
     
     return send_message
+
+
+@register_function_tool(
+    tool_id="broadcast_message",
+    name="broadcast_message",
+    description="同时向多个agent发送同一条消息，并汇总它们的回复",
+    task="当问题涉及多个notebook时，MasterAgent用它并发询问这些NoteBookAgent；总耗时取决于最慢的一个，而不是所有回复时间之和",
+    agent_types=["MasterAgent"],
+    input_params={
+        "ids": {"type": "list[str]", "description": "目标Agent ID列表（完整的UUID）", "required": True},
+        "message": {"type": "str", "description": "要发送给每个agent的消息", "required": True},
+    },
+    output_type="str",
+    output_description="JSON字符串：{\"results\": [{\"id\", \"name\", \"status\", \"response\"}]}，按ids的顺序排列；status为ok、error或timeout，失败时response为错误信息",
+    required_agent_attrs=["load_agent_from_db_by_id"],
+)
+def create_broadcast_message_tool(agent: 'BaseAgent'):
+    """
+    Create a broadcast_message tool function for asking several sub-agents at once.
+    
+    Args:
+        agent: The agent instance that will use this tool
+        
+    Returns:
+        A function_tool decorated function for broadcasting messages
+    """
+    @function_tool
+    async def broadcast_message(ids: List[str], message: str) -> str:
+        """同时向多个agent发送同一条消息，并汇总它们的回复
+
+        Args:
+            ids: Agent ID列表（完整的UUID，不是部分ID）
+            message: Message to send to every agent
+
+        Returns:
+            JSON with one result (id, name, status, response) per agent
+        """
+        from backend.database.async_db import run_db
+        from backend.utils.agent_manager import wake_agent
+        db_path = getattr(agent, 'DB_PATH', None)
+        timeout = float(os.getenv('BROADCAST_TIMEOUT_SECONDS', os.getenv('SEND_MESSAGE_TIMEOUT_SECONDS', '0')))
+        
+        async def ask(target_id: str) -> dict:
+            result = {"id": target_id, "name": None, "status": "error", "response": None}
+            target_agent = await run_db(wake_agent, target_id, db_path) if len(target_id) >= 8 else None
+            if target_agent is None:
+                result["response"] = f"Error: Failed to load agent with ID {target_id} from database. Use the complete agent ID from the agents list."
+                return result
+            result["name"] = getattr(target_agent, 'name', None)
+            try:
+                # 每个目标单独计时：一个慢notebook超时不影响其他notebook的回复
+                output = await asyncio.wait_for(target_agent.receive_messgae(message), timeout=timeout or None)
+                result.update(status="ok", response=str(output))
+            except asyncio.TimeoutError:
+                result.update(status="timeout", response=f"Agent did not respond within {timeout:g} seconds")
+            except Exception as e:
+                result["response"] = f"Error sending message: {str(e)}"
+            return result
+        
+        # 去重但保持顺序；所有目标在调用方的事件循环上并发运行
+        unique_ids = list(dict.fromkeys(target_id.strip() for target_id in ids if target_id and target_id.strip()))
+        if not unique_ids:
+            return json.dumps({"results": [], "error": "No agent IDs given"}, ensure_ascii=False)
+        results = await asyncio.gather(*(ask(target_id) for target_id in unique_ids))
+        return json.dumps({"results": results}, ensure_ascii=False)
+    
+    return broadcast_message
@@ -190,13 +190,6 @@ def create_modify_by_id_tool(notebook_agent: 'BaseAgent'):
         
         # 保存到数据库
         notebook_agent.save_to_db()
-        
-        # 清除AgentManager缓存，确保API获取最新数据
-        try:
-            from backend.utils.agent_manager import get_agent_manager
-            get_agent_manager().clear_cache(notebook_agent.id)
-        except Exception:
-            pass
     
     @function_tool
     def modify_by_id(
@@ -443,13 +436,6 @@ def create_add_content_to_section_tool(notebook_agent: 'BaseAgent'):
         
         # 保存到数据库
         notebook_agent.save_to_db()
-        
-        # 清除AgentManager缓存，确保API获取最新数据
-        try:
-            from backend.utils.agent_manager import get_agent_manager
-            get_agent_manager().clear_cache(notebook_agent.id)
-        except Exception:
-            pass
     
     @function_tool
     def add_content_to_section(
@@ -1,12 +1,98 @@
 """Notebook creation tools - Notebook创建相关工具"""
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Dict, Optional
 from agents import function_tool
 from backend.tools.tool_registry import register_function_tool
+from backend.utils.job_engine import register_job_handler
 
 if TYPE_CHECKING:
     from backend.agent.BaseAgent import BaseAgent
     from backend.agent.MasterAgent import MasterAgent
+    from backend.models import Outline
+
+
+async def _create_notebook_job(
+    master_agent: 'MasterAgent',
+    outline_obj: 'Outline',
+    user_request: str,
+    file_path: Optional[str],
+    session_id: Optional[str]
+) -> Dict[str, Any]:
+    """后台任务：创建notebook，返回结构化结果（失败时抛出异常，记录在任务上）"""
+    from backend.agent.specialized.NotebookCreationRouter import NotebookCreationRouter
+    from backend.database import job_db
+    from backend.database.async_db import run_db
+    from backend.database.unit_of_work import unit_of_work
+    from backend.utils.job_engine import get_current_job_db_path, get_current_job_id
+    from backend.utils.tracing_collector import track_agent_run
+    
+    async def _create():
+        # 新 notebook 和 MasterAgent 在作用域结束时一次性写入数据库（同一事务）
+        with unit_of_work():
+            # 使用 NotebookCreationRouter 创建笔记本（已完成的章节按任务ID保存为检查点）
+            router = NotebookCreationRouter()
+            notebook, message = await router.route_and_create(
+                user_request=user_request,
+                confirmed_outline=outline_obj,
+                file_path=file_path,
+                parent_agent_id=master_agent.id,
+                DB_PATH=master_agent.DB_PATH
+            )
+            
+            # 添加到 MasterAgent 的子 agents 列表
+            master_agent._add_sub_agents(notebook.id)
+        
+        # notebook 已保存，检查点不再需要
+        job_id = get_current_job_id()
+        if job_id:
+            await run_db(job_db.clear_section_checkpoints, job_id, get_current_job_db_path())
+        
+        return {
+            "status": "success",
+            "message": message,
+            "notebook_id": notebook.id,
+            "notebook_title": notebook.notebook_title or outline_obj.notebook_title,
+        }
+    
+    if session_id:
+        # 后台任务也记录在会话的 tracing 中（进度消息同时写入任务记录）
+        with track_agent_run(session_id, master_agent, f"后台创建笔记本：{outline_obj.notebook_title}"):
+            return await _create()
+    return await _create()
+
+
+async def resume_create_notebook_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Re-run an interrupted or failed create_notebook job from its parameters.
+    
+    Sections checkpointed under the job ID are reused; only the missing ones are generated.
+    
+    Args:
+        job: The job dict (params hold outline, user_request, file_path, master_agent_id, db_path)
+        
+    Returns:
+        The job result (notebook_id etc.)
+    """
+    from backend.database.async_db import run_db
+    from backend.models import Outline
+    from backend.utils.agent_manager import wake_agent
+    
+    params = job.get('params') or {}
+    if not params.get('outline'):
+        raise RuntimeError("This job was created without its outline and cannot be resumed")
+    master_agent = await run_db(wake_agent, params['master_agent_id'], params.get('db_path'))
+    if master_agent is None:
+        raise RuntimeError(f"MasterAgent {params['master_agent_id']} no longer exists")
+    return await _create_notebook_job(
+        master_agent,
+        Outline(**params['outline']),
+        params.get('user_request', ''),
+        params.get('file_path'),
+        job.get('session_id')
+    )
+
+
+register_job_handler("create_notebook", resume_create_notebook_job)
 
 
 @register_function_tool(
@@ -21,8 +107,8 @@ if TYPE_CHECKING:
         "user_request": {"type": "str", "description": "用户的原始请求内容", "required": True},
     },
     output_type="str",
-    output_description="返回创建结果字符串。成功时返回notebook信息（ID、标题等），失败时返回错误信息。",
-    required_agent_attrs=["id", "DB_PATH", "_add_sub_agents", "run_async_safely"],
+    output_description="立即返回后台任务信息（JSON字符串，包含job_id）；笔记本在后台创建，完成后可通过 /api/jobs/{job_id} 获取结果（notebook_id、标题等）。参数错误时返回错误信息。",
+    required_agent_attrs=["id", "DB_PATH", "_add_sub_agents"],
 )
 def create_create_notebook_tool(master_agent: 'MasterAgent'):
     """
@@ -37,7 +123,7 @@ def create_create_notebook_tool(master_agent: 'MasterAgent'):
         A function_tool decorated function for creating notebook
     """
     @function_tool
-    def create_notebook(
+    async def create_notebook(
         outline: str,
         file_path: str = None,
         user_request: str = ""
@@ -45,6 +131,7 @@ def create_create_notebook_tool(master_agent: 'MasterAgent'):
         """根据确认的大纲创建notebook agent
         
         使用NotebookCreationRouter内部判断意图并选择策略，创建所有章节内容。
+        创建在后台任务中进行，本工具立即返回任务ID。
         
         Args:
             outline: 确认的大纲对象（JSON字符串格式，包含notebook_title、notebook_description和outlines字典）
@@ -52,11 +139,12 @@ def create_create_notebook_tool(master_agent: 'MasterAgent'):
             user_request: 用户的原始请求内容
         
         Returns:
-            创建结果信息
+            后台任务信息（JSON字符串，包含job_id）
         """
         import json
         from backend.models import Outline
-        from backend.agent.specialized.NotebookCreationRouter import NotebookCreationRouter
+        from backend.utils.job_engine import get_job_engine
+        from backend.utils.tracing_collector import get_current_session_id
         
         # 解析 JSON 字符串
         try:
@@ -69,49 +157,36 @@ def create_create_notebook_tool(master_agent: 'MasterAgent'):
         except json.JSONDecodeError as e:
             return f"错误：大纲JSON格式不正确：{str(e)}"
         
-        async def _create_notebook():
-            """内部异步函数，创建notebook"""
-            try:
-                # 将字典转换为 Outline 对象
-                outline_obj = Outline(
-                    notebook_title=outline_dict.get("notebook_title", ""),
-                    notebook_description=outline_dict.get("notebook_description", ""),
-                    outlines=outline_dict.get("outlines", {})
-                )
-                
-                # 使用 NotebookCreationRouter 创建笔记本
-                router = NotebookCreationRouter()
-                notebook, message = await router.route_and_create(
-                    user_request=user_request,
-                    confirmed_outline=outline_obj,
-                    file_path=file_path,
-                    parent_agent_id=master_agent.id,
-                    DB_PATH=master_agent.DB_PATH
-                )
-                
-                # 添加到 MasterAgent 的子 agents 列表
-                master_agent._add_sub_agents(notebook.id)
-                
-                # 返回包含结构化数据的 JSON 字符串，方便前端解析
-                result_data = {
-                    "status": "success",
-                    "message": message,
-                    "notebook_id": notebook.id,
-                    "notebook_title": notebook.notebook_title or outline_obj.notebook_title,
-                }
-                return json.dumps(result_data, ensure_ascii=False)
-                
-            except Exception as e:
-                import traceback
-                error_trace = traceback.format_exc()
-                return f"创建notebook失败: {str(e)}\n\n错误详情:\n{error_trace}"
+        # 将字典转换为 Outline 对象
+        outline_obj = Outline(
+            notebook_title=outline_dict.get("notebook_title", ""),
+            notebook_description=outline_dict.get("notebook_description", ""),
+            outlines=outline_dict.get("outlines", {})
+        )
+        session_id = get_current_session_id()
         
-        # 执行异步函数
-        try:
-            result = master_agent.run_async_safely(_create_notebook())
-            return result
-        except Exception as e:
-            return f"执行失败: {str(e)}"
+        # 提交后台任务，立即返回任务ID（前端轮询 /api/jobs/{job_id} 获取进度和结果）
+        # 参数中保存完整大纲，中断后可据此恢复任务（见 resume_create_notebook_job）
+        job = get_job_engine().submit(
+            "create_notebook",
+            lambda: _create_notebook_job(master_agent, outline_obj, user_request, file_path, session_id),
+            title=outline_obj.notebook_title,
+            session_id=session_id,
+            params={
+                "outline": outline_obj.model_dump(),
+                "user_request": user_request,
+                "file_path": file_path,
+                "master_agent_id": master_agent.id,
+                "db_path": master_agent.DB_PATH,
+            },
+        )
+        result_data = {
+            "status": "queued",
+            "job_id": job['id'],
+            "notebook_title": outline_obj.notebook_title,
+            "message": f"笔记本《{outline_obj.notebook_title}》正在后台创建，完成后会通知您（任务ID：{job['id']}）。",
+        }
+        return json.dumps(result_data, ensure_ascii=False)
     
     return create_notebook
 
@@ -128,7 +203,7 @@ def create_create_notebook_tool(master_agent: 'MasterAgent'):
     },
     output_type="str",
     output_description="返回包含大纲信息的markdown格式字符串。格式包含大纲的markdown展示和JSON格式的大纲数据。该输出用于前端展示给用户确认。",
-    required_agent_attrs=["run_async_safely"],
+    required_agent_attrs=[],
 )
 def create_generate_outline_tool(top_level_agent: 'BaseAgent'):
     """
@@ -144,7 +219,7 @@ def create_generate_outline_tool(top_level_agent: 'BaseAgent'):
     import json
     
     @function_tool
-    def generate_outline(user_request: str, file_path: str = None) -> str:
+    async def generate_outline(user_request: str, file_path: str = None) -> str:
         """生成学习大纲供用户确认（无文件场景）
         
         Args:
@@ -215,11 +290,7 @@ def create_generate_outline_tool(top_level_agent: 'BaseAgent'):
                 error_trace = traceback.format_exc()
                 return f"生成大纲失败: {str(e)}\n\n错误详情:\n{error_trace}"
         
-        # 执行异步函数
-        try:
-            result = top_level_agent.run_async_safely(_generate_outline())
-            return result
-        except Exception as e:
-            return f"生成大纲失败: {str(e)}"
+        # 大纲需要用户在对话中确认，因此直接在调用方的事件循环上等待（不新建线程和事件循环）
+        return await _generate_outline()
     
     return generate_outline
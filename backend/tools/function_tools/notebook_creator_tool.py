@@ -3,7 +3,7 @@
 import asyncio
 import os
 from typing import Optional, Tuple
-from agents import Runner
+from backend.utils.llm_scheduler import run_agent
 
 from backend.agent.NoteBookAgent import NoteBookAgent
 from backend.tools.agent_as_tools.NotebookCreator import (
@@ -171,7 +171,7 @@ async def create_notebook_agent_from_file_legacy(
     outline_agent = OutlineMakerAgent(file_path)
     
     # 生成大纲（包含 notebook_description）
-    outline_result = await Runner.run(outline_agent, "请分析文档并生成学习大纲，包括笔记本描述（描述包含什么知识、不包含什么知识、知识边界和定位）")
+    outline_result = await run_agent(outline_agent, "请分析文档并生成学习大纲，包括笔记本描述（描述包含什么知识、不包含什么知识、知识边界和定位）")
     
     if not outline_result or not outline_result.final_output:
         raise ValueError("无法生成大纲")
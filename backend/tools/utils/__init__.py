@@ -1,6 +1,6 @@
 """Utility functions and helper modules for tools."""
 
-from backend.tools.utils.agent_utils import get_all_agent_info, generate_markdown_from_agent
+from backend.tools.utils.agent_utils import get_all_agent_info, get_agent_tree_info, generate_markdown_from_agent
 from backend.tools.utils.file_storage import (
     save_uploaded_file,
     ensure_upload_dir,
@@ -14,6 +14,7 @@ from backend.tools.utils.tool_usage_generator import (
 
 __all__ = [
     "get_all_agent_info",
+    "get_agent_tree_info",
     "generate_markdown_from_agent",
     "save_uploaded_file",
     "ensure_upload_dir",
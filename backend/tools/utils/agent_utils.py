@@ -1,6 +1,6 @@
 """Agent utility functions for information display and markdown generation."""
 
-from typing import Dict, Any, TYPE_CHECKING
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
 
 # Import only for type checking to avoid circular import
 if TYPE_CHECKING:
@@ -73,6 +73,85 @@ def get_all_agent_info(agent_dict: Dict[str, Any], indent_level: int = 0, max_de
     return "\n".join(agent_info_list) if agent_info_list else ""
 
 
+def get_agent_tree_info(agent_id: str, max_depth: int = 3, db_path: Optional[str] = None) -> str:
+    """
+    Same text as get_all_agent_info for an agent's sub-agents, read from the hierarchy
+    index (agents.sub_agent_ids and agents.card) in one query instead of loading every agent.
+    
+    Args:
+        agent_id: The agent whose sub-agents are listed
+        max_depth: Levels shown (as in get_all_agent_info)
+        db_path: Optional database path
+    """
+    from backend.database.agent_db import get_agent_tree
+    # One level more than shown: MasterAgent cards summarize their children
+    tree = get_agent_tree(agent_id, max_depth + 1, db_path)
+    return render_agent_tree(tree['children'] if tree else [], max_depth=max_depth)
+
+
+def render_agent_tree(nodes: List[Dict[str, Any]], indent_level: int = 0, max_depth: int = 3) -> str:
+    """Format hierarchy nodes (see agent_db.get_agent_tree) like get_all_agent_info."""
+    if not nodes:
+        return "暂无Agent" if indent_level == 0 else ""
+    if indent_level >= max_depth:
+        return ""
+    
+    indent = "  " * indent_level
+    agent_info_list = []
+    for node in nodes:
+        agent_info_list.append(f"{indent}- ID: {node['id']}\n{_format_agent_card(tree_agent_card(node), indent + '  ')}")
+        
+        children = node['children'] if node['type'] == "Master" else []
+        if children and indent_level < max_depth - 1:
+            child_info = render_agent_tree(children, indent_level + 1, max_depth)
+            if child_info:
+                agent_info_list.append(child_info)
+        elif children:
+            # 达到最大深度，只显示数量
+            agent_info_list.append(f"{indent}  ... (还有 {len(children)} 个子 Agent，已到达最大深度)")
+    
+    return "\n".join(agent_info_list)
+
+
+def tree_agent_card(node: Dict[str, Any]) -> Any:
+    """
+    Agent card of a hierarchy node, matching the agent's agent_card() without loading it.
+    
+    A MasterAgent's description summarizes its children (node['children'] must be read).
+    """
+    from backend.models import AgentCard
+    
+    if node['type'] == "Master":
+        descriptions = []
+        for child in node['children']:
+            if child['type'] == "NoteBook":
+                title = child['card']['title']
+                desc = child['card']['description']
+                if desc:
+                    descriptions.append(f"- {title}: {desc[:100]}..." if len(desc) > 100 else f"- {title}: {desc}")
+                else:
+                    descriptions.append(f"- {title}")
+            elif child['type'] == "Master":
+                descriptions.append(f"- {child['name']} (管理 {child['sub_agent_count']} 个子Agent)")
+        return AgentCard(
+            title=node['name'],
+            agent_id=node['id'],
+            parent_agent_id=node['parent_agent_id'],
+            description="\n".join(descriptions) if descriptions else "暂无子Agent",
+            outline={}
+        )
+    if node['type'] == "NoteBook":
+        card = node['card']
+        return AgentCard(
+            title=card['title'],
+            agent_id=node['id'],
+            parent_agent_id=node['parent_agent_id'],
+            description=card['description'],
+            outline=card['outline']
+        )
+    return f"Agent type: {node['type']}, ID: {node['id'][:8]}"
+
+
 def _format_agent_card(card_content: Any, indent: str) -> str:
     """
     Format agent card content with proper indentation.
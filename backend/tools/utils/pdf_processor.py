@@ -4,7 +4,8 @@ import os
 import base64
 import asyncio
 from typing import Optional
-from agents import Agent, Runner
+from agents import Agent
+from backend.utils.llm_scheduler import run_agent
 from backend.config.model_config import get_model_name, get_model_settings
 
 
@@ -69,7 +70,7 @@ async def extract_pdf_content(file_path: str) -> str:
         )
         
         # 使用input_file功能处理PDF
-        result = await Runner.run(
+        result = await run_agent(
             pdf_agent,
             [
                 {
@@ -0,0 +1,216 @@
+"""Bounded in-memory cache of woken agents (used by AgentManager).
+
+Entries are kept in LRU order and bounded by count and by an estimated memory
+cost. Entries idle longer than the TTL expire. Pinned entries (TopLevelAgent and
+the root MasterAgent) are never evicted. Before an entry is dropped the eviction
+hook runs, which lets AgentManager flush agents that still have unsaved changes.
+
+Limits come from the environment:
+
+    AGENT_CACHE_MAX_ENTRIES   default 64
+    AGENT_CACHE_MAX_MB        default 256 (estimated, see estimate_agent_size)
+    AGENT_CACHE_TTL_SECONDS   default 1800 (0 disables expiry)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class _Entry:
+    agent: Any
+    size: int
+    last_access: float
+    pinned: bool = False
+
+
+def estimate_agent_size(agent: Any) -> int:
+    """
+    Rough memory cost of a materialized agent in bytes.
+
+    Notes are rendered from the sections, so their length stands in for the
+    section objects as well (x2 for the parallel pydantic/str copies); every tool
+    closure adds a fixed overhead.
+    """
+    text = len(getattr(agent, 'instructions', None) or '') + 2 * len(getattr(agent, 'notes', None) or '')
+    tools = len(getattr(agent, 'tools', None) or [])
+    # str storage is 1-4 bytes per character; assume 2 for mixed English/Chinese content
+    return 4096 + 2 * text + 2048 * tools
+
+
+class AgentCache:
+    """Size-aware LRU cache with idle TTL, pinning and hit/miss/eviction counters."""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        on_evict: Optional[Callable[[str, Any], None]] = None
+    ):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('AGENT_CACHE_MAX_ENTRIES', '64'))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('AGENT_CACHE_MAX_MB', '256')) * 1024 * 1024
+        self.ttl = ttl if ttl is not None else float(os.getenv('AGENT_CACHE_TTL_SECONDS', '1800'))
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, agent_id: str, default: Any = None) -> Any:
+        """Get an agent and mark it as recently used (counts a hit or a miss)."""
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is not None and self._expired(entry, time.monotonic()):
+                expired = [self._remove(agent_id)]
+                self._stats['expirations'] += 1
+                entry = None
+            else:
+                expired = []
+            if entry is None:
+                self._stats['misses'] += 1
+            else:
+                self._stats['hits'] += 1
+                entry.last_access = time.monotonic()
+                self._entries.move_to_end(agent_id)
+        self._run_hooks(expired)
+        return entry.agent if entry is not None else default
+
+    def peek(self, agent_id: str) -> Any:
+        """Get an agent without touching LRU order or counters."""
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            return entry.agent if entry is not None else None
+
+    def put(self, agent_id: str, agent: Any, pinned: Optional[bool] = None) -> None:
+        """
+        Insert or replace an agent, then evict entries beyond the limits.
+
+        Args:
+            agent_id: The agent ID
+            agent: The agent instance
+            pinned: Pin the entry (None keeps the previous pin state)
+        """
+        with self._lock:
+            previous = self._entries.pop(agent_id, None)
+            if previous is not None:
+                self._bytes -= previous.size
+                if pinned is None:
+                    pinned = previous.pinned
+            entry = _Entry(agent, estimate_agent_size(agent), time.monotonic(), bool(pinned))
+            self._entries[agent_id] = entry
+            self._bytes += entry.size
+            evicted = self._evict_over_limits(keep=agent_id)
+        self._run_hooks(evicted)
+
+    def pin(self, agent_id: str, pinned: bool = True) -> None:
+        """Pin (or unpin) a cached agent."""
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is not None:
+                entry.pinned = pinned
+
+    def is_pinned(self, agent_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            return entry is not None and entry.pinned
+
+    def resize(self, agent_id: str) -> None:
+        """Re-estimate the memory cost of an entry (e.g. after its notes grew)."""
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is None:
+                return
+            new_size = estimate_agent_size(entry.agent)
+            self._bytes += new_size - entry.size
+            entry.size = new_size
+            evicted = self._evict_over_limits(keep=agent_id)
+        self._run_hooks(evicted)
+
+    def pop(self, agent_id: str, default: Any = None) -> Any:
+        """Remove an agent without running the eviction hook."""
+        with self._lock:
+            if agent_id not in self._entries:
+                return default
+            return self._remove(agent_id)[1]
+
+    def clear(self) -> None:
+        """Remove all agents (pinned ones too) without running the eviction hook."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def sweep(self) -> int:
+        """
+        Expire idle entries.
+
+        Returns:
+            Number of entries expired
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                self._remove(agent_id)
+                for agent_id, entry in list(self._entries.items())
+                if self._expired(entry, now)
+            ]
+            self._stats['expirations'] += len(expired)
+        self._run_hooks(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and current size, for monitoring."""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': self._stats['hits'] / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'pinned': sum(1 for entry in self._entries.values() if entry.pinned),
+                'estimated_bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+            }
+
+    def __contains__(self, agent_id: str) -> bool:
+        with self._lock:
+            return agent_id in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._entries))
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return not entry.pinned and self.ttl > 0 and now - entry.last_access > self.ttl
+
+    def _remove(self, agent_id: str) -> Tuple[str, Any]:
+        entry = self._entries.pop(agent_id)
+        self._bytes -= entry.size
+        return agent_id, entry.agent
+
+    def _evict_over_limits(self, keep: str) -> List[Tuple[str, Any]]:
+        """Evict least recently used unpinned entries until within limits (never `keep`)."""
+        evicted = []
+        candidates = [agent_id for agent_id, entry in self._entries.items() if not entry.pinned and agent_id != keep]
+        while candidates and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            evicted.append(self._remove(candidates.pop(0)))
+        self._stats['evictions'] += len(evicted)
+        return evicted
+
+    def _run_hooks(self, removed: List[Tuple[str, Any]]) -> None:
+        if self.on_evict is None:
+            return
+        for agent_id, agent in removed:
+            try:
+                self.on_evict(agent_id, agent)
+            except Exception as e:
+                print(f"[AgentCache] Eviction hook failed for {agent_id}: {e}")
@@ -3,23 +3,45 @@
 This module provides a centralized way to:
 1. Wake up agents from database without unnecessary writes
 2. Ensure tools are properly restored when agents are loaded
-3. Cache agents in memory to avoid repeated database reads
+3. Cache agents in memory to avoid repeated database reads (bounded LRU/TTL, see agent_cache.py);
+   a cached agent is served while its row version matches the database, and saves
+   update the cached instance in place instead of invalidating it
+4. Optionally flush modified agents in the background (write-behind)
+5. With SHARED_STATE_BACKEND=sqlite, follow the agent change log instead of checking
+   versions on every hit, so several worker processes can share one database (see shared_state.py)
 """
 
+import os
+import threading
 from typing import Optional, Dict, Any
-from backend.agent.BaseAgent import BaseAgent
-from backend.database.agent_db import load_agent, save_agent
+from backend.agent.BaseAgent import BaseAgent, AgentType
+from backend.database.agent_db import load_agent, get_agent_version, get_agent_versions, get_db_path
+from backend.database.unit_of_work import current_unit_of_work, unit_of_work
 from backend.tools.tool_registry import get_tool_registry
+from backend.utils.agent_cache import AgentCache
+from backend.utils.shared_state import AgentInvalidationBus, shared_state_enabled
 
 
 class AgentManager:
     """Manages agent wake-up, caching, and tools restoration."""
     
     def __init__(self):
-        # In-memory cache: agent_id -> agent instance
-        self._agent_cache: Dict[str, BaseAgent] = {}
+        # In-memory cache: agent_id -> agent instance (dirty agents are saved before eviction)
+        self._agent_cache = AgentCache(on_evict=self._on_evict)
         # Track which agents have been modified (need to save)
         self._modified_agents: set = set()
+        # Guards _modified_agents (the write-behind thread flushes it concurrently)
+        self._modified_lock = threading.Lock()
+        # One lock per agent being saved by the write-behind flush or an eviction, so the
+        # same instance is never written twice at once (both would CAS from the same version)
+        self._save_locks: Dict[str, threading.RLock] = {}
+        # Cached agents found outdated by the version check (reloaded from the database)
+        self._stale_reloads = 0
+        # Change log follower when worker processes share the database (None: check versions on every hit)
+        self._invalidation_bus: Optional[AgentInvalidationBus] = AgentInvalidationBus() if shared_state_enabled() else None
+        # Write-behind flusher (see start_write_behind)
+        self._write_behind_thread: Optional[threading.Thread] = None
+        self._write_behind_stop = threading.Event()
     
     def wake_agent(
         self, 
@@ -44,9 +66,15 @@ class AgentManager:
         Returns:
             The agent instance, or None if not found
         """
+        # Agents saved inside the current unit of work are not in the database yet
+        uow = current_unit_of_work()
+        pending = uow.get(agent_id) if uow is not None else None
+        if pending is not None and (force_reload or agent_id not in self._agent_cache):
+            self.cache_agent(pending)
+        
         # Check cache first (unless force_reload)
-        if not force_reload and agent_id in self._agent_cache:
-            agent = self._agent_cache[agent_id]
+        agent = None if force_reload else self._get_current(agent_id, db_path)
+        if agent is not None:
             # Update model settings (config may have changed)
             self._update_model_settings(agent)
             # Ensure tools are still valid (they might have been cleared)
@@ -66,53 +94,210 @@ class AgentManager:
         self._ensure_tools_restored(agent)
         
         # Cache the agent
-        self._agent_cache[agent_id] = agent
+        self.cache_agent(agent)
         
         return agent
     
+    def get_agent(self, agent_id: str, db_path: Optional[str] = None) -> Optional[BaseAgent]:
+        """
+        Get an agent for reading: the cached instance if it is current, else load and cache it.
+        
+        Unlike wake_agent, model settings and instructions are not refreshed.
+        
+        Args:
+            agent_id: The agent ID
+            db_path: Optional database path
+            
+        Returns:
+            The agent instance, or None if not found
+        """
+        agent = self._get_current(agent_id, db_path)
+        if agent is None:
+            agent = load_agent(agent_id, db_path=db_path)
+            if agent is not None:
+                self.cache_agent(agent)
+        return agent
+    
+    def _get_current(self, agent_id: str, db_path: Optional[str] = None) -> Optional[BaseAgent]:
+        """
+        Cached agent if its row version still matches the database (None otherwise).
+        
+        Agents with unsaved changes (or never saved) are returned without the check. With
+        the shared state backend the change log is followed instead (see apply_invalidations).
+        """
+        agent = self._agent_cache.get(agent_id)
+        if agent is None:
+            return None
+        if self._invalidation_bus is not None:
+            self.apply_invalidations(db_path or getattr(agent, 'DB_PATH', None))
+            return self._agent_cache.peek(agent_id)
+        cached_version = getattr(agent, '_db_version', None)
+        with self._modified_lock:
+            dirty = agent_id in self._modified_agents
+        if cached_version is None or dirty:
+            return agent
+        
+        current_version = get_agent_version(agent_id, db_path or getattr(agent, 'DB_PATH', None))
+        if current_version == cached_version:
+            return agent
+        
+        # Saved elsewhere (another instance or process) since it was cached
+        self._stale_reloads += 1
+        self._agent_cache.pop(agent_id)
+        print(f"[AgentManager] Cached agent {agent_id[:8]}... is outdated (version {cached_version} -> {current_version}), reloading")
+        return None
+    
+    def apply_invalidations(self, db_path: Optional[str] = None, force: bool = False) -> int:
+        """
+        Drop cached agents that the change log shows were saved or deleted elsewhere.
+        
+        Only used with the shared state backend; agents with unsaved changes are kept
+        (their next save merges, see save_agent).
+        
+        Args:
+            db_path: Optional database path
+            force: Poll the log even if it was polled less than SHARED_STATE_POLL_SECONDS ago
+            
+        Returns:
+            Number of cached agents dropped
+        """
+        if self._invalidation_bus is None:
+            return 0
+        changes = self._invalidation_bus.poll(db_path, force)
+        if changes == {}:
+            return 0
+        
+        db_key = os.path.abspath(get_db_path(db_path))
+        with self._modified_lock:
+            dirty = set(self._modified_agents)
+        candidates = {}
+        for agent_id in (changes if changes is not None else list(self._agent_cache)):
+            agent = self._agent_cache.peek(agent_id)
+            if agent is None or agent_id in dirty or getattr(agent, '_db_version', None) is None:
+                continue
+            if os.path.abspath(get_db_path(getattr(agent, 'DB_PATH', None))) != db_key:
+                continue
+            candidates[agent_id] = agent
+        if not candidates:
+            return 0
+        
+        # The log could not be followed: compare every cached agent with the database
+        versions = changes if changes is not None else get_agent_versions(list(candidates), db_path)
+        dropped = 0
+        for agent_id, agent in candidates.items():
+            current_version = versions.get(agent_id)
+            if current_version is not None and current_version <= agent._db_version:
+                continue
+            self._stale_reloads += 1
+            self._agent_cache.pop(agent_id)
+            dropped += 1
+            print(f"[AgentManager] Cached agent {agent_id[:8]}... was changed by another process (version {agent._db_version} -> {current_version}), dropped")
+        return dropped
+    
+    def agent_saved(self, agent: BaseAgent) -> None:
+        """
+        Keep the cache coherent after an agent was saved (called from BaseAgent._mark_saved).
+        
+        If a different instance of a cached agent was saved, the saved state is applied
+        to the cached instance in place, so references to it (e.g. tool closures) stay valid.
+        Callers that save an agent therefore never need to clear its cache entry.
+        """
+        cached = self._agent_cache.peek(agent.id)
+        if cached is None:
+            return
+        if cached is not agent:
+            with self._modified_lock:
+                dirty = agent.id in self._modified_agents
+            state = getattr(agent, '_base_state', None)
+            if dirty:
+                # The cached instance has its own unsaved edits; its next save merges (see save_agent)
+                return
+            if state is None or not hasattr(cached, '_restore_state'):
+                self._agent_cache.pop(agent.id)
+                return
+            cached._restore_state(state)
+            cached._db_version = agent._db_version
+            cached._base_state = state
+        self._agent_cache.resize(agent.id)
+    
+    def cache_agent(self, agent: BaseAgent, pinned: Optional[bool] = None) -> None:
+        """
+        Put an agent into the cache.
+        
+        Args:
+            agent: The agent instance
+            pinned: Never evict it; by default TopLevelAgent and the root MasterAgent are pinned
+        """
+        if pinned is None:
+            pinned = self._agent_cache.is_pinned(agent.id) or self._should_pin(agent)
+        self._agent_cache.put(agent.id, agent, pinned=pinned)
+    
+    def _should_pin(self, agent: BaseAgent) -> bool:
+        """TopLevelAgent and the MasterAgent directly under it stay cached."""
+        agent_type = str(getattr(agent, 'type', ''))
+        if agent_type == AgentType.TOP_LEVEL.value:
+            return True
+        if agent_type == AgentType.MASTER.value and getattr(agent, 'parent_agent_id', None):
+            parent = self._agent_cache.peek(agent.parent_agent_id)
+            return parent is not None and str(getattr(parent, 'type', '')) == AgentType.TOP_LEVEL.value
+        return False
+    
+    def _save_lock(self, agent_id: str) -> threading.RLock:
+        """The save lock of an agent (see _save_locks)."""
+        with self._modified_lock:
+            return self._save_locks.setdefault(agent_id, threading.RLock())
+    
+    def _on_evict(self, agent_id: str, agent: BaseAgent) -> None:
+        """Eviction hook: save the agent first if it has unsaved changes."""
+        # Waits for a write-behind flush that is saving this agent right now
+        with self._save_lock(agent_id):
+            with self._modified_lock:
+                dirty = agent_id in self._modified_agents
+                self._modified_agents.discard(agent_id)
+            if dirty:
+                agent.save_to_db()
+                print(f"[AgentManager] Saved modified agent {agent_id[:8]}... before evicting it from the cache")
+        with self._modified_lock:
+            self._save_locks.pop(agent_id, None)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Cache counters (hits, misses, evictions, expirations) and size, for monitoring."""
+        stats = self._agent_cache.stats()
+        stats['stale_reloads'] = self._stale_reloads
+        with self._modified_lock:
+            stats['modified'] = len(self._modified_agents)
+        return stats
+    
     def _update_model_settings(self, agent: BaseAgent) -> None:
         """
         更新 Agent 的模型设置（从数据库加载的 Agent 可能使用旧的模型设置）
         同时确保 API key 从环境变量读取（而不是使用序列化时保存的旧 key）
         
+        配置来自 runtime_config 的快照；只有快照的 generation 变化时（.env 或
+        model_config.py 被修改）才重新应用，缓存命中时不再读取文件。
+        
         Args:
             agent: The agent instance
         """
         try:
-            # 首先，确保 API key 从环境变量读取
-            # 重新加载 .env 文件以确保使用最新的 API key
-            try:
-                from dotenv import load_dotenv
-                from pathlib import Path
-                project_root = Path(__file__).parent.parent.parent
-                env_path = project_root / ".env"
-                if env_path.exists():
-                    load_dotenv(env_path, override=True)
-            except Exception:
-                pass  # 如果无法加载 .env，继续使用系统环境变量
+            from backend.config.runtime_config import get_config
+            config = get_config()
+            if getattr(agent, '_config_generation', None) == config.generation:
+                return
             
-            # 从环境变量获取 API key
-            import os
-            api_key = os.getenv('OPENAI_API_KEY')
+            api_key = config.api_key
             if api_key:
-                # 强制设置环境变量，确保 agents 库使用最新的 API key
-                os.environ['OPENAI_API_KEY'] = api_key
-                
                 try:
                     # 尝试更新 Agent 内部的 client API key
                     # agents 库可能将 client 存储在不同的位置
-                    if hasattr(agent, '_client'):
-                        if hasattr(agent._client, 'api_key'):
-                            agent._client.api_key = api_key
-                        elif hasattr(agent._client, '_client') and hasattr(agent._client._client, 'api_key'):
-                            agent._client._client.api_key = api_key
-                    
-                    # 也检查是否有 model_client 属性
-                    if hasattr(agent, '_model_client'):
-                        if hasattr(agent._model_client, 'api_key'):
-                            agent._model_client.api_key = api_key
-                        elif hasattr(agent._model_client, '_client') and hasattr(agent._model_client._client, 'api_key'):
-                            agent._model_client._client.api_key = api_key
+                    for client_attr in ('_client', '_model_client'):
+                        client = getattr(agent, client_attr, None)
+                        if client is None:
+                            continue
+                        if hasattr(client, 'api_key'):
+                            client.api_key = api_key
+                        elif hasattr(client, '_client') and hasattr(client._client, 'api_key'):
+                            client._client.api_key = api_key
                 except Exception as e:
                     # 如果无法更新，记录警告但不中断流程
                     # agents 库应该会在实际调用时从环境变量读取
@@ -121,66 +306,28 @@ class AgentManager:
             else:
                 print(f"[AgentManager] 警告: OPENAI_API_KEY 环境变量未设置")
             
-            from backend.config.model_config import get_model_name
-            model_name = get_model_name()
-            
-            # 检查当前模型是否与配置一致
-            current_model = None
-            if hasattr(agent, 'model') and agent.model:
-                current_model = agent.model
-            elif hasattr(agent, 'model_settings') and agent.model_settings:
-                if hasattr(agent.model_settings, 'model'):
-                    current_model = agent.model_settings.model
+            model_name = config.model_name
+            current_model = getattr(agent, 'model', None) or None
             
             # 如果模型不一致，更新它
             if current_model != model_name:
                 print(f"[AgentManager] 更新 Agent {agent.id[:8]}... 的模型: {current_model} -> {model_name}")
-                
-                # 尝试直接设置 model 属性（Agent 类可能支持这个）
                 if hasattr(agent, 'model'):
                     agent.model = model_name
-                
-                # 如果 Agent 有 model_settings 属性，也更新它
                 if hasattr(agent, 'model_settings'):
-                    from backend.config.model_config import get_model_settings
-                    agent.model_settings = get_model_settings()
-                
-                # 标记为已修改，以便保存到数据库
-                self._modified_agents.add(agent.id)
-            else:
+                    agent.model_settings = config.new_model_settings()
+                # model/model_settings 不保存在数据库中（见 BaseAgent._to_state），无需标记为已修改
+            elif hasattr(agent, 'model_settings'):
                 # 即使模型一致，也确保 model_settings 是最新的（可能包含 reasoning、verbosity 等设置）
-                if hasattr(agent, 'model_settings'):
-                    from backend.config.model_config import get_model_settings
-                    new_settings = get_model_settings()
-                    
-                    # 检查是否需要更新
-                    needs_update = False
-                    
-                    # 检查 reasoning 设置
-                    if hasattr(new_settings, 'reasoning') and hasattr(agent.model_settings, 'reasoning'):
-                        if agent.model_settings.reasoning != new_settings.reasoning:
-                            needs_update = True
-                    elif hasattr(new_settings, 'reasoning') and not hasattr(agent.model_settings, 'reasoning'):
-                        needs_update = True
-                    elif not hasattr(new_settings, 'reasoning') and hasattr(agent.model_settings, 'reasoning'):
-                        needs_update = True
-                    
-                    # 检查 verbosity 设置
-                    if hasattr(new_settings, 'verbosity') and hasattr(agent.model_settings, 'verbosity'):
-                        if agent.model_settings.verbosity != new_settings.verbosity:
-                            needs_update = True
-                    elif hasattr(new_settings, 'verbosity') and not hasattr(agent.model_settings, 'verbosity'):
-                        needs_update = True
-                    
-                    # 如果模型名称不同，也需要更新
-                    if hasattr(new_settings, 'model') and hasattr(agent.model_settings, 'model'):
-                        if agent.model_settings.model != new_settings.model:
-                            needs_update = True
-                    
-                    if needs_update:
-                        print(f"[AgentManager] 更新 Agent {agent.id[:8]}... 的 model_settings（模型: {current_model or 'N/A'}）")
-                        agent.model_settings = new_settings
-                        self._modified_agents.add(agent.id)
+                current = agent.model_settings
+                if (
+                    getattr(current, 'reasoning', None) != getattr(config.model_settings, 'reasoning', None)
+                    or getattr(current, 'verbosity', None) != getattr(config.model_settings, 'verbosity', None)
+                ):
+                    print(f"[AgentManager] 更新 Agent {agent.id[:8]}... 的 model_settings（模型: {current_model or 'N/A'}）")
+                    agent.model_settings = config.new_model_settings()
+            
+            agent._config_generation = config.generation
         except Exception as e:
             print(f"[AgentManager] 更新模型设置失败: {e}")
             import traceback
@@ -188,88 +335,22 @@ class AgentManager:
     
     def _ensure_tools_restored(self, agent: BaseAgent) -> None:
         """
-        Ensure agent's tools are properly restored.
+        Ensure agent.tools is a list.
         
-        This method checks if tools exist and are valid, and restores them if needed.
-        It does NOT save to database unless tools were actually recreated.
+        load_agent only keeps the stored tool_ids; the tools are created and the
+        instructions rendered right before the agent runs (BaseAgent.bind_for_run,
+        memoized), so waking an agent does no extra work and never writes to the database.
         
         Args:
             agent: The agent instance
         """
-        # If tools already exist and are valid, no need to restore
-        if hasattr(agent, 'tools') and agent.tools is not None and len(agent.tools) > 0:
-            # But for TopLevelAgent, MasterAgent and NoteBookAgent, we should still update instructions to ensure latest prompt
-            from backend.agent.TopLevelAgent import TopLevelAgent
-            from backend.agent.MasterAgent import MasterAgent
-            from backend.agent.NoteBookAgent import NoteBookAgent
-            
-            if isinstance(agent, TopLevelAgent):
-                # TopLevelAgent's _recreate_tools already updates instructions, but let's ensure it's called
-                if hasattr(agent, '_recreate_tools'):
-                    try:
-                        agent._recreate_tools()
-                    except Exception as e:
-                        print(f"[AgentManager] Error updating TopLevelAgent instructions: {e}")
-            elif isinstance(agent, MasterAgent):
-                # For MasterAgent, always ensure instructions are updated (to refresh agents_list with current sub-agents)
-                # This ensures the "你管理的 Agent" section shows the latest NotebookAgents (skills)
-                if hasattr(agent, '_recreate_tools'):
-                    try:
-                        agent._recreate_tools()
-                        print(f"[AgentManager] Updated MasterAgent instructions, length: {len(agent.instructions)}")
-                    except Exception as e:
-                        print(f"[AgentManager] Error updating MasterAgent instructions: {e}")
-                        import traceback
-                        traceback.print_exc()
-            elif isinstance(agent, NoteBookAgent):
-                # For NoteBookAgent, always ensure instructions are updated (to replace {notes} and {tools_usage})
-                # Check if instructions contain placeholders
-                if hasattr(agent, 'instructions') and ("{notes}" in agent.instructions or "{tools_usage}" in agent.instructions):
-                    print(f"[AgentManager] NoteBookAgent {agent.id} has placeholders in instructions, updating...")
-                    if hasattr(agent, '_recreate_tools'):
-                        try:
-                            agent._recreate_tools()
-                            print(f"[AgentManager] Updated NoteBookAgent instructions, length: {len(agent.instructions)}")
-                        except Exception as e:
-                            print(f"[AgentManager] Error updating NoteBookAgent instructions: {e}")
-                            import traceback
-                            traceback.print_exc()
-            return
-        
-        # Try to restore tools from database
-        tool_ids = agent._get_tool_ids_from_db()
-        if tool_ids:
-            # Restore tools from database
-            try:
-                agent._recreate_tools_from_db(tool_ids)
-                if agent.tools and len(agent.tools) > 0:
-                    # For TopLevelAgent, also update instructions
-                    from backend.agent.TopLevelAgent import TopLevelAgent
-                    if isinstance(agent, TopLevelAgent) and hasattr(agent, '_recreate_tools'):
-                        try:
-                            agent._recreate_tools()  # This will update instructions
-                        except Exception as e:
-                            print(f"[AgentManager] Error updating TopLevelAgent instructions: {e}")
-                    return  # Successfully restored
-            except Exception as e:
-                print(f"[AgentManager] Error restoring tools from DB for {agent.id}: {e}")
-        
-        # Fallback: use default _recreate_tools
-        if hasattr(agent, '_recreate_tools'):
-            try:
-                agent._recreate_tools()
-                # Mark as modified if tools were recreated (may need to save tool_ids)
-                if agent.tools and len(agent.tools) > 0:
-                    self._modified_agents.add(agent.id)
-            except Exception as e:
-                print(f"[AgentManager] Error in _recreate_tools for {agent.id}: {e}")
-                agent.tools = []
-        else:
+        if getattr(agent, 'tools', None) is None:
             agent.tools = []
     
     def mark_modified(self, agent_id: str) -> None:
         """Mark an agent as modified (needs to be saved)."""
-        self._modified_agents.add(agent_id)
+        with self._modified_lock:
+            self._modified_agents.add(agent_id)
     
     def save_if_modified(self, agent: BaseAgent) -> bool:
         """
@@ -281,27 +362,98 @@ class AgentManager:
         Returns:
             True if saved, False if not modified
         """
-        if agent.id in self._modified_agents:
-            save_agent(agent, db_path=getattr(agent, 'DB_PATH', None))
+        with self._modified_lock:
+            if agent.id not in self._modified_agents:
+                return False
             self._modified_agents.discard(agent.id)
-            return True
-        return False
+        
+        # Inside a unit of work this is deferred to the scope exit
+        agent.save_to_db()
+        return True
     
     def save_all_modified(self) -> int:
         """
-        Save all modified agents to database.
+        Save all modified agents to database in a single transaction.
+        
+        Agents that could not be saved stay marked as modified.
         
         Returns:
             Number of agents saved
         """
-        saved_count = 0
-        for agent_id in list(self._modified_agents):
-            if agent_id in self._agent_cache:
-                agent = self._agent_cache[agent_id]
-                save_agent(agent, db_path=getattr(agent, 'DB_PATH', None))
-                saved_count += 1
-            self._modified_agents.discard(agent_id)
-        return saved_count
+        with self._modified_lock:
+            modified_ids = sorted(self._modified_agents)
+        
+        # Lock in ID order (no deadlock with a concurrent flush), then hand the agents over:
+        # an agent being evicted meanwhile is saved by the eviction hook once we are done
+        locks = [self._save_lock(agent_id) for agent_id in modified_ids]
+        for lock in locks:
+            lock.acquire()
+        try:
+            agents = []
+            with self._modified_lock:
+                for agent_id in modified_ids:
+                    agent = self._agent_cache.peek(agent_id)
+                    if agent is not None and agent_id in self._modified_agents:
+                        self._modified_agents.discard(agent_id)
+                        agents.append(agent)
+            
+            with unit_of_work() as uow:
+                for agent in agents:
+                    agent.save_to_db()
+            # Agents that could not be saved (e.g. unresolvable concurrent edits) stay marked
+            failed_ids = {agent.id for agent in agents} & set(uow.failed_ids)
+            if failed_ids:
+                with self._modified_lock:
+                    self._modified_agents.update(failed_ids)
+                print(f"[AgentManager] {len(failed_ids)} modified agent(s) could not be saved, will retry")
+            return len(agents) - len(failed_ids)
+        finally:
+            for lock in locks:
+                lock.release()
+    
+    def start_write_behind(self, interval: float = 5.0) -> None:
+        """
+        Start a background thread that flushes modified agents every `interval` seconds.
+        
+        Agents marked with mark_modified() are then persisted even if no request
+        calls save_if_modified(); call stop_write_behind() on shutdown for a final flush.
+        
+        Args:
+            interval: Seconds between flushes
+        """
+        if self._write_behind_thread is not None and self._write_behind_thread.is_alive():
+            return
+        
+        self._write_behind_stop.clear()
+        
+        def run():
+            while not self._write_behind_stop.wait(interval):
+                try:
+                    saved = self.save_all_modified()
+                    if saved:
+                        print(f"[AgentManager] Write-behind flushed {saved} agent(s)")
+                    # Also drop agents that have been idle longer than the cache TTL
+                    self._agent_cache.sweep()
+                except Exception as e:
+                    print(f"[AgentManager] Write-behind flush failed: {e}")
+        
+        self._write_behind_thread = threading.Thread(target=run, name="agent-write-behind", daemon=True)
+        self._write_behind_thread.start()
+        print(f"[AgentManager] Write-behind started (interval: {interval}s)")
+    
+    def stop_write_behind(self) -> int:
+        """
+        Stop the write-behind thread and flush any remaining modified agents.
+        
+        Returns:
+            Number of agents saved by the final flush
+        """
+        thread = self._write_behind_thread
+        if thread is not None:
+            self._write_behind_stop.set()
+            thread.join(timeout=10)
+            self._write_behind_thread = None
+        return self.save_all_modified()
     
     def clear_cache(self, agent_id: Optional[str] = None) -> None:
         """
@@ -310,16 +462,19 @@ class AgentManager:
         Args:
             agent_id: If provided, clear only this agent. Otherwise clear all.
         """
-        if agent_id:
-            self._agent_cache.pop(agent_id, None)
-            self._modified_agents.discard(agent_id)
-        else:
-            self._agent_cache.clear()
-            self._modified_agents.clear()
+        with self._modified_lock:
+            if agent_id:
+                self._agent_cache.pop(agent_id, None)
+                self._modified_agents.discard(agent_id)
+                self._save_locks.pop(agent_id, None)
+            else:
+                self._agent_cache.clear()
+                self._modified_agents.clear()
+                self._save_locks.clear()
     
     def get_cached_agent(self, agent_id: str) -> Optional[BaseAgent]:
         """Get agent from cache without loading from database."""
-        return self._agent_cache.get(agent_id)
+        return self._agent_cache.peek(agent_id)
 
 
 # Global singleton instance
@@ -0,0 +1,217 @@
+"""Streamed chat runs as Server-Sent Events - 流式聊天（SSE）
+
+The streaming chat endpoints (POST .../chat/stream) run the agent with Runner.run_streamed
+and send Server-Sent Events while it runs:
+
+    event: session      {"session_id"}                        first event
+    event: delta        {"agent", "text"}                     text of the answer as it is generated
+    event: agent_start  {"agent", "agent_id", "message"}      a delegated agent (send_message etc.) starts
+    event: agent_end    {"agent", "agent_id", "output"}
+    event: tool_start   {"agent", "agent_id", "tool"}         tool calls of the agent and of delegated agents
+    event: tool_end     {"agent", "agent_id", "tool", "output"}
+    event: final        ChatResponse (response, session_id, structured_data)   last event
+    event: error        {"detail"}                            last event if the run failed
+
+Events of delegated agents come through the stream of the current context: delegated runs
+are awaited on the caller's event loop with the caller's context, and emit_stream_event
+is a no-op outside streamed chats. The conversation is persisted exactly as by the
+non-streaming endpoints (one ConversationSession turn).
+"""
+
+import asyncio
+import contextvars
+import json
+import re
+import traceback
+from typing import Any, AsyncIterator, Callable, Optional, Tuple
+
+# Longest output preview sent with agent_end/tool_end events
+_PREVIEW_CHARS = 500
+
+# Marks the end of the event queue
+_END = object()
+
+# Response headers of event streams (no caching, no proxy buffering)
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+class ChatStream:
+    """Event queue of one streamed chat; events emitted after the response ended are dropped."""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    def emit(self, event: str, data: Any) -> None:
+        if not self.closed:
+            self.queue.put_nowait((event, data))
+
+    def close(self) -> None:
+        if not self.closed:
+            self.queue.put_nowait(_END)
+            self.closed = True
+
+
+# Stream of the streamed chat the current context belongs to (None outside streamed chats)
+_current_stream: contextvars.ContextVar[Optional[ChatStream]] = contextvars.ContextVar('chat_stream', default=None)
+
+
+def emit_stream_event(event: str, **data: Any) -> None:
+    """Send an event to the client of the current streamed chat (no-op outside streamed chats)."""
+    stream = _current_stream.get()
+    if stream is not None:
+        stream.emit(event, data)
+
+
+def preview(value: Any) -> str:
+    """Shorten a value for an event."""
+    text = value if isinstance(value, str) else str(value)
+    return text if len(text) <= _PREVIEW_CHARS else text[:_PREVIEW_CHARS] + "…"
+
+
+def format_sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """Format one Server-Sent Event (with an ID, clients resume from it via Last-Event-ID)."""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class JsonFieldStream:
+    """
+    Extracts a string field from streamed JSON, e.g. the "message" of a structured output,
+    so that the text can be streamed while the JSON is still incomplete.
+    """
+
+    def __init__(self, field: str):
+        self._pattern = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self._buffer = ""
+        self._start: Optional[int] = None
+        self._emitted = ""
+        self._done = False
+
+    def feed(self, delta: str) -> str:
+        """
+        Add a chunk of the JSON text.
+
+        Returns:
+            The text of the field that became known with this chunk
+        """
+        if self._done:
+            return ""
+        self._buffer += delta
+        if self._start is None:
+            match = self._pattern.search(self._buffer)
+            if not match:
+                return ""
+            self._start = match.end()
+        raw = self._buffer[self._start:]
+        end, i = len(raw), 0
+        while i < len(raw):
+            if raw[i] == '\\':
+                i += 2
+                continue
+            if raw[i] == '"':
+                end = i
+                self._done = True
+                break
+            i += 1
+        chunk = raw[:end]
+        # An escape sequence may be cut off at the end of the chunk (e.g. "\\u4f")
+        for cut in range(0, 6):
+            try:
+                text = json.loads('"' + chunk[:len(chunk) - cut] + '"')
+                break
+            except ValueError:
+                continue
+        else:
+            return ""
+        new_text = text[len(self._emitted):]
+        self._emitted = text if len(text) > len(self._emitted) else self._emitted
+        return new_text
+
+
+def _text_delta(event: Any) -> Optional[str]:
+    """Text delta of a raw model event of the streamed run, if it is one."""
+    if getattr(event, 'type', None) != 'raw_response_event':
+        return None
+    data = getattr(event, 'data', None)
+    if getattr(data, 'type', None) == 'response.output_text.delta':
+        return getattr(data, 'delta', None) or None
+    return None
+
+
+async def stream_chat_run(
+    agent: Any,
+    runner_message: Any,
+    session: Any,
+    session_id: str,
+    user_message: str,
+    extract_response: Callable[[Any], Tuple[str, Optional[Any]]],
+    run_config: Optional[Any] = None
+) -> AsyncIterator[str]:
+    """
+    Run an agent as a streamed chat turn and yield Server-Sent Events (see module docstring).
+
+    Args:
+        agent: The agent to run (tools and instructions already bound)
+        runner_message: Input for the run
+        session: ConversationSession of the chat (the user message is already added)
+        session_id: The session ID
+        user_message: The user message (for tracing)
+        extract_response: Turns the finished run result into (response_text, structured_data)
+        run_config: Optional RunConfig
+
+    Yields:
+        Formatted SSE events
+    """
+    from backend.api.models import ChatResponse
+    from backend.utils.llm_scheduler import run_agent_streamed
+    from backend.utils.tool_logging_hooks import ToolLoggingHook
+    from backend.utils.tracing_collector import track_agent_run
+
+    stream = ChatStream()
+    agent_name = getattr(agent, 'name', None)
+    # Agents with structured output stream JSON; only its "message" field is shown
+    output_type = getattr(agent, 'output_type', None)
+    message_field = JsonFieldStream("message") if output_type not in (None, str) else None
+
+    async def run() -> None:
+        # The task has its own context: the stream is visible to this run and its delegated runs only
+        _current_stream.set(stream)
+        try:
+            async with session.turn():
+                with track_agent_run(session_id, agent, user_message):
+                    result = run_agent_streamed(
+                        agent, runner_message, session=session, hooks=ToolLoggingHook(), run_config=run_config
+                    )
+                    async for event in result.stream_events():
+                        text = _text_delta(event)
+                        if text and message_field is not None:
+                            text = message_field.feed(text)
+                        if text:
+                            stream.emit("delta", {"agent": agent_name, "text": text})
+
+                response_text, structured_data = extract_response(result)
+                session.add_message("assistant", response_text)
+
+            response = ChatResponse(response=response_text, session_id=session_id, structured_data=structured_data)
+            stream.emit("final", response.model_dump(mode="json"))
+        except Exception as e:
+            print(f"Error in streamed chat: {str(e)}")
+            print(f"Traceback: {traceback.format_exc()}")
+            stream.emit("error", {"detail": f"Error in chat: {str(e)}"})
+        finally:
+            stream.close()
+
+    yield format_sse("session", {"session_id": session_id})
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            item = await stream.queue.get()
+            if item is _END:
+                break
+            yield format_sse(*item)
+    finally:
+        # The client went away: stop the run (the turn keeps the transcript, as for failed runs)
+        stream.closed = True
+        if not task.done():
+            task.cancel()
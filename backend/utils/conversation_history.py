@@ -0,0 +1,178 @@
+"""Conversation history policy for chat sessions.
+
+Runner.run replays the session history on every turn, so without a bound the
+latency and token cost of a turn grow with the length of the session. The policy
+(environment variables, read per turn) decides what ConversationSession.get_items
+returns:
+
+    CHAT_HISTORY_POLICY      full | last_turns (default) | token_budget | summary
+    CHAT_HISTORY_MAX_TURNS   turns kept by last_turns; summary compacts above this (default 20)
+    CHAT_HISTORY_MAX_TOKENS  budget of token_budget, estimated from item size (default 8000)
+    CHAT_HISTORY_KEEP_TURNS  recent turns summary keeps verbatim after compacting (default 6)
+
+With "summary" (opt-in: it adds a summarization model call to the turns that compact),
+older turns are folded into a rolling summary stored on the session row (sessions.summary); only items after the summarized ones are read again, and
+the summary is extended incrementally the next time the tail grows too long.
+
+A turn starts at each user message; tool calls and outputs stay with their turn.
+Image and file payloads are replaced by short references before items are stored.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+FULL = "full"
+LAST_TURNS = "last_turns"
+TOKEN_BUDGET = "token_budget"
+SUMMARY = "summary"
+_MODES = (FULL, LAST_TURNS, TOKEN_BUDGET, SUMMARY)
+
+# Text parts longer than this (e.g. inlined file contents) are cut when stored
+MAX_STORED_TEXT_CHARS = 4000
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+# (session_items.id, item); id is None for items not stored yet
+ItemRow = Tuple[Optional[int], Dict[str, Any]]
+
+
+@dataclass
+class HistoryPolicy:
+    """How much session history is replayed to the model."""
+    mode: str = LAST_TURNS
+    max_turns: int = 20
+    max_tokens: int = 8000
+    keep_turns: int = 6
+
+    @classmethod
+    def from_env(cls) -> 'HistoryPolicy':
+        """Read the policy from CHAT_HISTORY_* environment variables."""
+        mode = os.getenv('CHAT_HISTORY_POLICY', LAST_TURNS).strip().lower()
+        policy = cls(
+            mode=mode if mode in _MODES else LAST_TURNS,
+            max_turns=int(os.getenv('CHAT_HISTORY_MAX_TURNS', '20')),
+            max_tokens=int(os.getenv('CHAT_HISTORY_MAX_TOKENS', '8000')),
+            keep_turns=int(os.getenv('CHAT_HISTORY_KEEP_TURNS', '6')),
+        )
+        policy.keep_turns = max(1, min(policy.keep_turns, policy.max_turns))
+        return policy
+
+
+def _is_user_message(item: Dict[str, Any]) -> bool:
+    return item.get('role') == 'user' and item.get('type', 'message') == 'message'
+
+
+def split_turns(rows: List[ItemRow]) -> List[List[ItemRow]]:
+    """Group item rows into turns (each starting at a user message)."""
+    turns: List[List[ItemRow]] = []
+    for row in rows:
+        if not turns or _is_user_message(row[1]):
+            turns.append([])
+        turns[-1].append(row)
+    return turns
+
+
+def estimate_tokens(item: Dict[str, Any]) -> int:
+    """Rough token estimate of an item (about 4 characters per token)."""
+    return len(json.dumps(item, ensure_ascii=False)) // 4 + 1
+
+
+def _strip_part(part: Any) -> Any:
+    if not isinstance(part, dict):
+        return part
+    part_type = part.get('type')
+    if part_type == 'input_image':
+        return {'type': 'input_text', 'text': "[image]"}
+    if part_type == 'input_file':
+        return {'type': 'input_text', 'text': f"[file: {part.get('filename') or part.get('file_id') or 'attachment'}]"}
+    if part_type in ('input_text', 'output_text') and len(part.get('text') or '') > MAX_STORED_TEXT_CHARS:
+        return {**part, 'text': _cut(part['text'])}
+    return part
+
+
+def _cut(text: str) -> str:
+    return text[:MAX_STORED_TEXT_CHARS] + f"\n[... {len(text) - MAX_STORED_TEXT_CHARS} characters omitted]"
+
+
+def strip_payloads(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace image/file payloads (and very long texts) in a message item with short references."""
+    content = item.get('content')
+    if isinstance(content, list):
+        return {**item, 'content': [_strip_part(part) for part in content]}
+    if isinstance(content, str) and len(content) > MAX_STORED_TEXT_CHARS and item.get('role') == 'user':
+        return {**item, 'content': _cut(content)}
+    return item
+
+
+def summary_item(summary: str) -> Dict[str, Any]:
+    """Input item carrying the rolling summary."""
+    return {'role': 'system', 'content': SUMMARY_PREFIX + summary}
+
+
+def bound_turns(turns: List[List[ItemRow]], policy: HistoryPolicy) -> List[List[ItemRow]]:
+    """Keep the most recent turns allowed by a last_turns or token_budget policy."""
+    if policy.mode == LAST_TURNS:
+        return turns[-policy.max_turns:]
+    if policy.mode == TOKEN_BUDGET:
+        kept: List[List[ItemRow]] = []
+        used = 0
+        for turn in reversed(turns):
+            cost = sum(estimate_tokens(item) for _, item in turn)
+            if kept and used + cost > policy.max_tokens:
+                break
+            kept.append(turn)
+            used += cost
+        return list(reversed(kept))
+    return turns
+
+
+def _render(items: List[Dict[str, Any]]) -> str:
+    """Plain-text transcript of items for the summarizer (tool traffic is abbreviated)."""
+    lines = []
+    for item in items:
+        role = item.get('role')
+        content = item.get('content')
+        if isinstance(content, list):
+            content = " ".join(
+                part.get('text', '') for part in content if isinstance(part, dict)
+            )
+        if role and content:
+            lines.append(f"{role}: {content}")
+        elif item.get('type') == 'function_call':
+            lines.append(f"(tool call {item.get('name')})")
+    return "\n".join(lines)
+
+
+async def summarize(previous_summary: Optional[str], items: List[Dict[str, Any]]) -> str:
+    """
+    Extend a rolling summary with the given items (one model call).
+
+    Args:
+        previous_summary: Summary of everything before items (None for the first one)
+        items: Items to fold into the summary
+
+    Returns:
+        The new summary text
+    """
+    from agents import Agent
+    from backend.utils.llm_scheduler import run_agent
+    from backend.config.model_config import get_model_name
+
+    summarizer = Agent(
+        name="ConversationSummarizer",
+        model=get_model_name(),
+        instructions=(
+            "You maintain a running summary of a conversation between a user and an assistant "
+            "that manages notebooks. Merge the previous summary with the new messages into one "
+            "concise summary (at most 300 words) in the conversation's language. Keep the user's "
+            "goals, decisions, notebook/agent names and IDs, and open questions; drop small talk."
+        ),
+    )
+    prompt = (
+        f"Previous summary:\n{previous_summary or '(none)'}\n\n"
+        f"New messages:\n{_render(items)}"
+    )
+    result = await run_agent(summarizer, prompt)
+    return str(result.final_output).strip()
@@ -2,7 +2,7 @@
 
 from typing import Optional, Any
 from backend.prompts.prompt_loader import load_prompt
-from backend.tools.utils import get_all_agent_info
+from backend.tools.utils import get_all_agent_info, get_agent_tree_info
 
 
 def get_default_instructions(agent_type: str, agent: Optional[Any] = None) -> str:
@@ -29,8 +29,7 @@ def get_default_instructions(agent_type: str, agent: Optional[Any] = None) -> st
         # For top level agent, we need current agent list
         # TopLevelAgent only manages MasterAgent directly, so max_depth=1 to avoid showing NotebookAgents
         if agent:
-            agent_dict = agent._load_sub_agents_dict() if hasattr(agent, '_load_sub_agents_dict') else {}
-            agents_list = get_all_agent_info(agent_dict, indent_level=0, max_depth=1)
+            agents_list = get_agent_tree_info(agent.id, max_depth=1, db_path=getattr(agent, 'DB_PATH', None))
         else:
             agents_list = get_all_agent_info({}, indent_level=0, max_depth=1)
         return load_prompt(
@@ -42,8 +41,7 @@ def get_default_instructions(agent_type: str, agent: Optional[Any] = None) -> st
     elif agent_type == 'master':
         # For master agent, we need current agent list
         if agent:
-            agent_dict = agent._load_sub_agents_dict() if hasattr(agent, '_load_sub_agents_dict') else {}
-            agents_list = get_all_agent_info(agent_dict)
+            agents_list = get_agent_tree_info(agent.id, db_path=getattr(agent, 'DB_PATH', None))
         else:
             agents_list = get_all_agent_info({})
         return load_prompt(
@@ -0,0 +1,269 @@
+"""Background job engine - 后台任务引擎
+
+Long-running work (notebook creation takes minutes) is submitted as a job instead of
+holding the chat request open:
+
+    job = get_job_engine().submit("create_notebook", run, title="...", session_id=session_id)
+    return job['id']   # the frontend polls GET /api/jobs/{id}
+
+Jobs run as tasks on the server's event loop; at most JOB_MAX_WORKERS (default 2)
+run at a time, the rest wait in status "queued". The job record (jobs table, see
+database/job_db.py) holds status, the latest progress message and the result, so any
+worker process can answer status requests. Progress reported through
+tracing_collector.update_current_activity_message inside a job is recorded on the job.
+Model requests made by jobs have bulk priority (see utils/llm_scheduler.py), so they
+yield to interactive chat.
+
+Job kinds registered with register_job_handler can be resumed: jobs whose owning process
+is gone (its lease expired, see job_db) are resumed at startup and by the lease keeper
+(resume_orphaned_jobs), failed or cancelled ones on request (POST /api/jobs/{id}/resume).
+Shutting down stops the jobs of the process but leaves them queued/running with their
+lease released, so the next server process resumes them; only cancel() records a job as
+cancelled. The handler gets the job record and re-runs it under the same job ID, so work
+checkpointed under that ID is reused.
+"""
+
+import asyncio
+import contextvars
+import os
+import traceback
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from backend.database import job_db
+from backend.database.async_db import run_db
+from backend.database.unit_of_work import detach_unit_of_work
+from backend.utils.llm_scheduler import BULK, set_llm_priority
+
+# ID of the job the current task is running (None outside jobs)
+_current_job: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_job', default=None)
+
+# Database of the job the current task is running (None: the default database)
+_current_job_db: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_job_db', default=None)
+
+# kind -> coroutine function re-running a job from its record (resumable job kinds)
+_job_handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {}
+
+
+def register_job_handler(kind: str, handler: Callable[[Dict[str, Any]], Awaitable[Any]]) -> None:
+    """
+    Make jobs of a kind resumable.
+
+    Args:
+        kind: Job kind (e.g. "create_notebook")
+        handler: Coroutine function taking the job dict (params, session_id, ...) and returning the result
+    """
+    _job_handlers[kind] = handler
+
+
+def is_resumable(kind: str) -> bool:
+    """Whether jobs of this kind can be resumed."""
+    return kind in _job_handlers
+
+
+def get_current_job_id() -> Optional[str]:
+    """ID of the job running in the current context, if any."""
+    return _current_job.get()
+
+
+def get_current_job_db_path() -> Optional[str]:
+    """Database of the job running in the current context (None: the default database)."""
+    return _current_job_db.get()
+
+
+def report_job_progress(message: str) -> None:
+    """Record a progress message on the current job (no-op outside jobs)."""
+    job_id = _current_job.get()
+    if job_id is None:
+        return
+    try:
+        job_db.update_job(job_id, progress=message, db_path=_current_job_db.get())
+    except Exception as e:
+        print(f"[JobEngine] Could not record progress of job {job_id}: {e}")
+
+
+class JobEngine:
+    """Runs submitted jobs on the event loop with bounded concurrency."""
+
+    def __init__(self, max_workers: Optional[int] = None, db_path: Optional[str] = None):
+        self.max_workers = max_workers if max_workers is not None else int(os.getenv('JOB_MAX_WORKERS', '2'))
+        # Database holding the job records (None: the default database)
+        self.db_path = db_path
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # job_id -> task, for jobs of this process that have not finished
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Set by shutdown(): stopped jobs keep their status to be resumed at the next startup
+        self._shutting_down = False
+        # Task renewing this process's job leases and resuming orphaned jobs (start_lease_keeper)
+        self._lease_keeper: Optional[asyncio.Task] = None
+
+    def submit(
+        self,
+        kind: str,
+        func: Callable[[], Awaitable[Any]],
+        title: Optional[str] = None,
+        session_id: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Record a job and schedule it on the running event loop.
+
+        Args:
+            kind: Job kind (e.g. "create_notebook")
+            func: Coroutine function doing the work; its JSON-serializable return value is the result
+            title: Short description shown to the user
+            session_id: Session the job was started from
+            params: JSON-serializable parameters stored with the job
+
+        Returns:
+            The job dict (status "queued")
+        """
+        # Jobs need a running event loop; fail before recording the job
+        asyncio.get_running_loop()
+        job = job_db.create_job(kind, title=title, session_id=session_id, params=params, db_path=self.db_path)
+        self._schedule(job['id'], func)
+        print(f"[JobEngine] Queued {kind} job {job['id']}")
+        return job
+    
+    def _schedule(self, job_id: str, func: Callable[[], Awaitable[Any]]) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Semaphores belong to one event loop
+            self._semaphore = asyncio.Semaphore(max(1, self.max_workers))
+            self._loop = loop
+        # The task copies the caller's context (tracing session etc.)
+        task = loop.create_task(self._run(job_id, func), name=f"job-{job_id[:8]}")
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+    
+    def resume(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Resume a job of a resumable kind in this process (under the same job ID).
+
+        Args:
+            job_id: The job ID
+
+        Returns:
+            The job dict (status "queued"), or None if the job does not exist, its kind is
+            not resumable or another process claimed it first
+        """
+        job = job_db.get_job(job_id, self.db_path)
+        if job is None or not is_resumable(job['kind']) or job_id in self._tasks:
+            return None
+        if not job_db.claim_job(job_id, job['status'], job['worker_token'], self.db_path):
+            return None
+        handler = _job_handlers[job['kind']]
+        self._schedule(job_id, lambda: handler(job))
+        print(f"[JobEngine] Resumed {job['kind']} job {job_id}")
+        return job_db.get_job(job_id, self.db_path)
+    
+    def resume_orphaned_jobs(self) -> Tuple[int, int]:
+        """
+        Resume unfinished jobs whose owning process is gone (lease expired); those that cannot be resumed are marked as failed.
+
+        Returns:
+            (number resumed, number failed)
+        """
+        resumed = failed = 0
+        for job in job_db.find_orphaned_jobs(self.db_path):
+            if is_resumable(job['kind']):
+                if self.resume(job['id']) is not None:
+                    resumed += 1
+            else:
+                job_db.update_job(job['id'], status='failed', error="Interrupted: the server restarted before the job finished", db_path=self.db_path)
+                failed += 1
+        return resumed, failed
+
+    def start_lease_keeper(self) -> None:
+        """
+        Renew the leases of this process's jobs on the running event loop and resume orphaned jobs.
+
+        Runs every JOB_LEASE_SECONDS / 4 until shutdown().
+        """
+        if self._lease_keeper is None or self._lease_keeper.done():
+            self._lease_keeper = asyncio.get_running_loop().create_task(self._keep_leases(), name="job-lease-keeper")
+
+    async def _keep_leases(self) -> None:
+        while True:
+            await asyncio.sleep(job_db.get_lease_seconds() / 4)
+            try:
+                await run_db(job_db.renew_job_leases, self.db_path)
+                # Jobs of a worker process that died (no graceful shutdown) once its lease expires
+                if await run_db(job_db.find_orphaned_jobs, self.db_path):
+                    resumed, failed = self.resume_orphaned_jobs()
+                    print(f"[JobEngine] Took over orphaned jobs: {resumed} resumed, {failed} failed")
+            except Exception as e:
+                print(f"[JobEngine] Could not renew job leases: {e}")
+
+    async def _run(self, job_id: str, func: Callable[[], Awaitable[Any]]) -> None:
+        semaphore = self._semaphore
+        try:
+            async with semaphore:
+                # The caller's unit of work has already committed when the job runs
+                detach_unit_of_work()
+                _current_job.set(job_id)
+                _current_job_db.set(self.db_path)
+                set_llm_priority(BULK)
+                await run_db(job_db.update_job, job_id, status='running', db_path=self.db_path)
+                result = await func()
+            await run_db(job_db.update_job, job_id, status='succeeded', result=result, db_path=self.db_path)
+            print(f"[JobEngine] Job {job_id} succeeded")
+        except asyncio.CancelledError:
+            if self._shutting_down:
+                print(f"[JobEngine] Job {job_id} stopped by shutdown; it resumes at the next startup")
+            else:
+                job_db.update_job(job_id, status='cancelled', db_path=self.db_path)
+                print(f"[JobEngine] Job {job_id} cancelled")
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            await run_db(job_db.update_job, job_id, status='failed', error=str(e), db_path=self.db_path)
+            print(f"[JobEngine] Job {job_id} failed: {e}")
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job running in this process (at the user's request; recorded as cancelled).
+
+        Returns:
+            True if the job was found in this process and cancelled
+        """
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            return False
+        return task.cancel()
+
+    def active_jobs(self) -> int:
+        """Number of jobs of this process that are queued or running."""
+        return len(self._tasks)
+
+    async def shutdown(self) -> int:
+        """
+        Stop the jobs of this process without recording them as cancelled.
+
+        They stay queued/running with their lease released, so the next server process
+        (or a sibling worker's lease keeper) resumes them right away.
+
+        Returns:
+            Number of jobs stopped
+        """
+        self._shutting_down = True
+        if self._lease_keeper is not None:
+            self._lease_keeper.cancel()
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await run_db(job_db.release_job_leases, self.db_path)
+        return len(tasks)
+
+
+# Global singleton instance
+_job_engine: Optional[JobEngine] = None
+
+
+def get_job_engine() -> JobEngine:
+    """Get the global JobEngine instance."""
+    global _job_engine
+    if _job_engine is None:
+        _job_engine = JobEngine()
+    return _job_engine
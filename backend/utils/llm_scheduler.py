@@ -0,0 +1,397 @@
+"""LLM call scheduler - 全局 LLM 调用调度器
+
+Every agent run goes through run_agent (a drop-in replacement for Runner.run) or
+run_agent_streamed (for Runner.run_streamed):
+
+    result = await run_agent(agent, message, session=session, hooks=hooks)
+
+run_agent gives the run a process-wide model provider whose models wait for the
+scheduler before each model request. Requests, not whole runs, are scheduled: an
+agent waiting for a sub-agent (send_message, agent-as-tool) holds no slot, so nested
+runs cannot deadlock.
+
+Per model the scheduler enforces:
+- a concurrency limit, adapted with AIMD: +1 slot per window of successful requests,
+  halved on a 429 and reduced when requests are slower than LLM_LATENCY_TARGET_SECONDS
+- a token rate limit (token bucket; the estimate of a request is corrected with its usage)
+- priorities: interactive requests (chat) are served before bulk ones (background jobs
+  such as notebook creation), and bulk requests may use only LLM_BULK_SHARE of the slots
+
+The priority is taken from the context (see llm_priority); background jobs run as bulk.
+
+Environment:
+    LLM_MAX_CONCURRENCY: Upper bound of concurrent requests per model (default 8)
+    LLM_MIN_CONCURRENCY: Lower bound the limit can shrink to (default 1)
+    LLM_TOKENS_PER_MINUTE: Token rate limit per model (default 0 = unlimited)
+    LLM_MODEL_LIMITS: JSON overrides per model, e.g.
+        {"gpt-5-mini-2025-08-07": {"max_concurrency": 4, "tokens_per_minute": 200000}}
+    LLM_BULK_SHARE: Fraction of the slots bulk requests may use (default 0.75)
+    LLM_LATENCY_TARGET_SECONDS: Requests slower than this shrink the limit (default 120, 0 = off)
+    LLM_RATE_LIMIT_RETRIES: Retries of a request rejected with 429 (default 2)
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from agents import Runner, RunConfig
+from agents.models.interface import Model, ModelProvider
+from agents.models.multi_provider import MultiProvider
+
+# Priorities (lower is served first)
+INTERACTIVE = 0
+BULK = 1
+
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+# Priority of the model requests made in the current context
+_current_priority: contextvars.ContextVar[int] = contextvars.ContextVar('llm_priority', default=INTERACTIVE)
+
+# Output tokens assumed for a request without max_tokens (corrected with the usage afterwards)
+_DEFAULT_OUTPUT_TOKENS = 1000
+
+# Minimum seconds between two decreases of a limit (a burst of 429s is one congestion event)
+_DECREASE_COOLDOWN_SECONDS = 2.0
+
+
+def get_llm_priority() -> int:
+    """Priority of the model requests made in the current context."""
+    return _current_priority.get()
+
+
+def set_llm_priority(priority: int) -> None:
+    """Set the priority of the model requests made in the current context (e.g. a job task)."""
+    _current_priority.set(priority)
+
+
+@contextlib.contextmanager
+def llm_priority(priority: int):
+    """Run the enclosed model requests (including sub-agent runs) with the given priority."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def _is_rate_limit_error(error: BaseException) -> bool:
+    return getattr(error, 'status_code', None) == 429 or type(error).__name__ == 'RateLimitError'
+
+
+def _retry_after_seconds(error: BaseException, attempt: int) -> float:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return max(0.0, float(headers.get('retry-after')))
+    except (TypeError, ValueError):
+        return float(2 ** attempt)
+
+
+def _estimate_tokens(system_instructions: Optional[str], input: Any, model_settings: Any) -> int:
+    """Rough token estimate of a request (~4 characters per token plus the expected output)."""
+    characters = len(system_instructions or "") + len(input if isinstance(input, str) else str(input))
+    output_tokens = getattr(model_settings, 'max_tokens', None) or _DEFAULT_OUTPUT_TOKENS
+    return characters // 4 + output_tokens
+
+
+class _ModelLane:
+    """Admission control for one model: adaptive concurrency, token bucket and priority queue."""
+
+    def __init__(self, model: str, max_concurrency: int, min_concurrency: int, tokens_per_minute: int):
+        self.model = model
+        self.max_limit = max(1, max_concurrency)
+        self.min_limit = max(1, min(min_concurrency, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.tokens_per_minute = tokens_per_minute
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._last_decrease = 0.0
+        self.active = {INTERACTIVE: 0, BULK: 0}
+        # (priority, seq, future, cost); futures resolve when the request may start
+        self._waiters: List[Tuple[int, int, asyncio.Future, int]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.counters = {"requests": 0, "rate_limited": 0, "latency_decreases": 0}
+
+    @property
+    def slots(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    def _bulk_slots(self) -> int:
+        share = float(os.getenv('LLM_BULK_SHARE', '0.75'))
+        return max(1, int(self.slots * share))
+
+    def _refill(self) -> None:
+        if not self.tokens_per_minute:
+            return
+        now = time.monotonic()
+        self._tokens = min(
+            float(self.tokens_per_minute),
+            self._tokens + (now - self._refilled_at) * self.tokens_per_minute / 60.0
+        )
+        self._refilled_at = now
+
+    def _dispatch(self) -> None:
+        """Start waiting requests in priority order while slots and tokens allow."""
+        self._timer = None
+        while self._waiters:
+            priority, _, future, cost = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if sum(self.active.values()) >= self.slots:
+                return
+            if priority == BULK and self.active[BULK] >= self._bulk_slots():
+                return
+            if self.tokens_per_minute:
+                self._refill()
+                if self._tokens < cost:
+                    # Wake up when the bucket holds enough tokens for the head of the queue
+                    wait = (cost - self._tokens) * 60.0 / self.tokens_per_minute
+                    self._timer = future.get_loop().call_later(wait, self._dispatch)
+                    return
+                self._tokens -= cost
+            heapq.heappop(self._waiters)
+            self.active[priority] += 1
+            future.set_result(None)
+
+    async def acquire(self, priority: int, cost: int) -> None:
+        """Wait until a request of the given priority and token cost may start."""
+        if self.tokens_per_minute:
+            cost = min(cost, self.tokens_per_minute)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future, cost))
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted and cancelled at the same time: give the slot back
+                self.release(priority)
+            raise
+        self.counters["requests"] += 1
+
+    def release(self, priority: int) -> None:
+        self.active[priority] -= 1
+        self._dispatch()
+
+    def correct_tokens(self, estimated: int, used: int) -> None:
+        """Charge the difference between the estimate and the actual usage of a request."""
+        if self.tokens_per_minute and used:
+            self._refill()
+            self._tokens = min(float(self.tokens_per_minute), self._tokens - (used - estimated))
+
+    def on_success(self, latency: float) -> None:
+        target = float(os.getenv('LLM_LATENCY_TARGET_SECONDS', '120'))
+        if target and latency > target:
+            if self._decrease(0.75):
+                self.counters["latency_decreases"] += 1
+            return
+        # Additive increase: about one slot per window of `limit` successful requests
+        self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        self._dispatch()
+
+    def on_rate_limited(self) -> None:
+        self.counters["rate_limited"] += 1
+        self._decrease(0.5)
+
+    def _decrease(self, factor: float) -> bool:
+        now = time.monotonic()
+        if now - self._last_decrease < _DECREASE_COOLDOWN_SECONDS:
+            return False
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * factor)
+        print(f"[LLMScheduler] {self.model}: concurrency limit reduced to {self.slots}")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        waiting = {name: 0 for name in _PRIORITY_NAMES.values()}
+        for priority, _, future, _ in self._waiters:
+            if not future.done():
+                waiting[_PRIORITY_NAMES[priority]] += 1
+        self._refill()
+        return {
+            "limit": self.slots,
+            "max_limit": self.max_limit,
+            "active": {_PRIORITY_NAMES[p]: count for p, count in self.active.items()},
+            "waiting": waiting,
+            "tokens_per_minute": self.tokens_per_minute or None,
+            "tokens_available": int(self._tokens) if self.tokens_per_minute else None,
+            **self.counters,
+        }
+
+
+class LLMScheduler:
+    """Process-wide scheduler of model requests (one lane per model)."""
+
+    def __init__(self):
+        self._lanes: Dict[str, _ModelLane] = {}
+
+    def lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            overrides = json.loads(os.getenv('LLM_MODEL_LIMITS', '{}') or '{}').get(model, {})
+            lane = _ModelLane(
+                model,
+                max_concurrency=int(overrides.get('max_concurrency', os.getenv('LLM_MAX_CONCURRENCY', '8'))),
+                min_concurrency=int(overrides.get('min_concurrency', os.getenv('LLM_MIN_CONCURRENCY', '1'))),
+                tokens_per_minute=int(overrides.get('tokens_per_minute', os.getenv('LLM_TOKENS_PER_MINUTE', '0'))),
+            )
+            self._lanes[model] = lane
+        return lane
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-model limit, active/waiting requests by priority, tokens and counters."""
+        return {model: lane.stats() for model, lane in self._lanes.items()}
+
+
+class ScheduledModel(Model):
+    """Wraps a model so that each request waits for the scheduler."""
+
+    def __init__(self, model: Model, model_name: str, scheduler: LLMScheduler):
+        self._model = model
+        self._lane = scheduler.lane(model_name)
+
+    async def get_response(self, system_instructions, input, model_settings, *args, **kwargs):
+        priority = get_llm_priority()
+        cost = _estimate_tokens(system_instructions, input, model_settings)
+        retries = int(os.getenv('LLM_RATE_LIMIT_RETRIES', '2'))
+        attempt = 0
+        while True:
+            await self._lane.acquire(priority, cost)
+            started = time.monotonic()
+            try:
+                response = await self._model.get_response(system_instructions, input, model_settings, *args, **kwargs)
+            except Exception as e:
+                if not _is_rate_limit_error(e):
+                    raise
+                self._lane.on_rate_limited()
+                if attempt >= retries:
+                    raise
+                delay = _retry_after_seconds(e, attempt)
+                attempt += 1
+                print(f"[LLMScheduler] {self._lane.model}: rate limited, retrying in {delay:g}s ({attempt}/{retries})")
+            else:
+                self._lane.on_success(time.monotonic() - started)
+                usage = getattr(response, 'usage', None)
+                self._lane.correct_tokens(cost, getattr(usage, 'total_tokens', 0) or 0)
+                return response
+            finally:
+                self._lane.release(priority)
+            await asyncio.sleep(delay)
+
+    async def stream_response(self, system_instructions, input, model_settings, *args, **kwargs) -> AsyncIterator[Any]:
+        priority = get_llm_priority()
+        cost = _estimate_tokens(system_instructions, input, model_settings)
+        await self._lane.acquire(priority, cost)
+        started = time.monotonic()
+        used = 0
+        try:
+            async for event in self._model.stream_response(system_instructions, input, model_settings, *args, **kwargs):
+                if getattr(event, 'type', None) == 'response.completed':
+                    usage = getattr(getattr(event, 'response', None), 'usage', None)
+                    used = getattr(usage, 'total_tokens', 0) or 0
+                yield event
+        except Exception as e:
+            if _is_rate_limit_error(e):
+                self._lane.on_rate_limited()
+            raise
+        else:
+            self._lane.on_success(time.monotonic() - started)
+            self._lane.correct_tokens(cost, used)
+        finally:
+            self._lane.release(priority)
+
+    async def _cleanup_on_run_end(self, owner: object) -> None:
+        await self._model._cleanup_on_run_end(owner)
+
+    async def close(self) -> None:
+        await self._model.close()
+
+    def get_retry_advice(self, request):
+        return self._model.get_retry_advice(request)
+
+
+class ScheduledModelProvider(ModelProvider):
+    """Model provider whose models wait for the scheduler before each request."""
+
+    def __init__(self, provider: ModelProvider, scheduler: LLMScheduler):
+        self._provider = provider
+        self._scheduler = scheduler
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        from backend.config.model_config import get_model_name
+        return ScheduledModel(self._provider.get_model(model_name), model_name or get_model_name(), self._scheduler)
+
+    async def aclose(self) -> None:
+        await self._provider.aclose()
+
+
+# Global singleton instances
+_llm_scheduler: Optional[LLMScheduler] = None
+_model_provider: Optional[ScheduledModelProvider] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Get the global LLMScheduler instance."""
+    global _llm_scheduler
+    if _llm_scheduler is None:
+        _llm_scheduler = LLMScheduler()
+    return _llm_scheduler
+
+
+def _scheduled_run_config(run_config: Optional[RunConfig]) -> RunConfig:
+    global _model_provider
+    if _model_provider is None:
+        # One provider for the process, so the OpenAI client (and its connections) are reused
+        _model_provider = ScheduledModelProvider(MultiProvider(), get_llm_scheduler())
+    if run_config is None:
+        return RunConfig(model_provider=_model_provider)
+    if isinstance(run_config.model_provider, ScheduledModelProvider):
+        return run_config
+    import dataclasses
+    provider = run_config.model_provider
+    if type(provider) is MultiProvider:
+        # The default provider of RunConfig() is replaced by the shared one
+        return dataclasses.replace(run_config, model_provider=_model_provider)
+    return dataclasses.replace(run_config, model_provider=ScheduledModelProvider(provider, get_llm_scheduler()))
+
+
+async def run_agent(starting_agent, input, *, run_config: Optional[RunConfig] = None, **kwargs):
+    """
+    Runner.run with scheduled model requests (see module docstring).
+
+    Args:
+        starting_agent: The agent to run
+        input: Message or input items
+        run_config: Optional RunConfig; its model provider is wrapped by the scheduler
+        **kwargs: Other Runner.run arguments (session, hooks, max_turns, ...)
+
+    Returns:
+        The RunResult
+    """
+    return await Runner.run(starting_agent, input, run_config=_scheduled_run_config(run_config), **kwargs)
+
+
+def run_agent_streamed(starting_agent, input, *, run_config: Optional[RunConfig] = None, **kwargs):
+    """
+    Runner.run_streamed with scheduled model requests.
+
+    Args:
+        starting_agent: The agent to run
+        input: Message or input items
+        run_config: Optional RunConfig; its model provider is wrapped by the scheduler
+        **kwargs: Other Runner.run_streamed arguments (session, hooks, max_turns, ...)
+
+    Returns:
+        The RunResultStreaming (iterate stream_events())
+    """
+    return Runner.run_streamed(starting_agent, input, run_config=_scheduled_run_config(run_config), **kwargs)
@@ -0,0 +1,67 @@
+"""Shared state across API worker processes - 多进程共享状态
+
+By default (SHARED_STATE_BACKEND=local) the agent cache and the trace store live in
+each process, which is right for a single uvicorn worker. With
+SHARED_STATE_BACKEND=sqlite several workers can serve the same database:
+
+1. Agent cache invalidation: triggers log every agent save and delete in the
+   agent_events table (migration 13). Each worker follows the log, at most once per
+   SHARED_STATE_POLL_SECONDS (default 0.5), and drops cached agents that were changed
+   by another process, instead of checking the row version on every cache hit.
+2. Traces: tracing_collector keeps activities in the traces table, so a tracing poll
+   can land on any worker.
+
+The TopLevelAgent / root MasterAgent bootstrap in api/utils.get_top_level_agent always
+runs inside a write transaction, so only one process at a time creates or cleans up
+the singletons.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+def shared_state_enabled() -> bool:
+    """Whether worker processes share the agent cache invalidation log and the trace store."""
+    return os.getenv('SHARED_STATE_BACKEND', 'local').strip().lower() == 'sqlite'
+
+
+class AgentInvalidationBus:
+    """Follows the agent_events log of each database and reports agents changed since the last poll."""
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval if interval is not None else float(os.getenv('SHARED_STATE_POLL_SECONDS', '0.5'))
+        # Absolute database path -> last event ID seen / time of the last poll
+        self._cursors: Dict[str, int] = {}
+        self._last_poll: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def poll(self, db_path: Optional[str] = None, force: bool = False) -> Optional[Dict[str, Optional[int]]]:
+        """
+        Agents changed since the previous poll of a database.
+
+        Args:
+            db_path: Optional database path
+            force: Poll even if the last poll was less than `interval` seconds ago
+
+        Returns:
+            {agent_id: new version, or None if deleted} ({} if nothing changed or the poll
+            was skipped), or None if the log could not be followed (first poll, or events
+            were pruned before being seen) and every cached agent must be revalidated
+        """
+        from backend.database.agent_db import get_agent_events, get_db_path
+
+        key = os.path.abspath(get_db_path(db_path))
+        now = time.monotonic()
+        with self._lock:
+            last_poll = self._last_poll.get(key)
+            if not force and last_poll is not None and now - last_poll < self.interval:
+                return {}
+            self._last_poll[key] = now
+            cursor = self._cursors.get(key)
+            last_id, changes, complete = get_agent_events(cursor, key)
+            self._cursors[key] = last_id
+        if cursor is None or not complete:
+            return None
+        return changes
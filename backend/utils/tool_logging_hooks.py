@@ -64,6 +64,10 @@ else:
                 f"agent={agent_name} (id={agent_id[:8] if agent_id else None})"
             )
             
+            # Report the call to the client of a streamed chat (no-op otherwise)
+            from backend.utils.chat_stream import emit_stream_event
+            emit_stream_event("tool_start", agent=agent_name, agent_id=agent_id, tool=tool_name)
+            
             # Track tool call in tracing system
             from backend.utils.tracing_collector import get_current_session_id, track_tool_call
             session_id = get_current_session_id()
@@ -96,6 +100,9 @@ else:
                 f"result_length={len(result)}, result_preview={result_preview}"
             )
             
+            from backend.utils.chat_stream import emit_stream_event, preview
+            emit_stream_event("tool_end", agent=agent_name, agent_id=agent_id, tool=tool_name, output=preview(result))
+            
             # End tool call tracking in tracing system
             if hasattr(tool, '_tracing_context'):
                 try:
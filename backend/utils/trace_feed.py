@@ -0,0 +1,249 @@
+"""Trace feed - 追踪事件推送
+
+tracing_collector publishes every change of a session's activities to the feed, and
+clients follow it over Server-Sent Events (GET /api/sessions/{id}/tracing/stream)
+instead of polling GET /api/sessions/{id}/tracing:
+
+    id: 42
+    event: activity     a new activity (agent run or tool call), all fields
+    event: update       {"id", <changed fields>}: progress message, or ended_at/status/error
+    event: snapshot     {"activities": [...]}: the current activities; sent first when the
+                        client cannot resume from its last event ID
+
+Each session keeps its newest TRACE_FEED_BUFFER (default 500) events, so a client that
+reconnects with Last-Event-ID gets only the events it missed. Publishing only takes the
+session's lock (one of _LOCK_STRIPES locks shared by sessions, no global lock): events
+are appended to the session's buffer and handed to each subscriber's event loop.
+A session's feed is dropped once it has no running activities and no subscribers; event
+IDs are unique across sessions, so a client reconnecting after that gets a snapshot.
+
+With SHARED_STATE_BACKEND=sqlite the activities may be written by another worker process,
+so the feed follows the trace change log instead (trace_events, see database/trace_db.py):
+every TRACE_FEED_POLL_SECONDS (default 1) it reads the session's events after the last
+one sent. Event IDs are the log's IDs, so Last-Event-ID resumes on any worker; update
+events then carry all fields of the activity.
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+from backend.utils.shared_state import shared_state_enabled
+
+# (event ID, event type, data)
+TraceEvent = Tuple[int, str, Dict[str, Any]]
+
+# Seconds without events after which subscribe() yields None (for keep-alive comments)
+_IDLE_SECONDS = 15.0
+
+# Events a subscriber may fall behind before it is resynchronized with a snapshot
+_SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Session locks (sessions share a lock by hash, so there is no lock object per session)
+_LOCK_STRIPES = 64
+
+
+class _Subscriber:
+    """Event queue of one client, fed from any thread."""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=_SUBSCRIBER_QUEUE_SIZE)
+        self.lagged = False
+
+    def deliver(self, event: TraceEvent) -> None:
+        # Always through the loop's callback queue (also from the loop itself), so events
+        # reach the queue in the order they were published
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event: TraceEvent) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+
+class _SessionFeed:
+    def __init__(self, buffer_size: int):
+        self.events: deque = deque(maxlen=buffer_size)
+        # ID of the last event published to this feed
+        self.last_id = 0
+        self.subscribers: Set[_Subscriber] = set()
+        # IDs of the activities still running (the feed is kept while there are any)
+        self.running: Set[str] = set()
+
+
+class TraceFeed:
+    """Per-session activity events with async subscribers."""
+
+    def __init__(self, buffer_size: Optional[int] = None):
+        self.buffer_size = buffer_size or int(os.getenv('TRACE_FEED_BUFFER', '500'))
+        self._feeds: Dict[str, _SessionFeed] = {}
+        self._seq = itertools.count(1)
+        self._locks = [threading.RLock() for _ in range(_LOCK_STRIPES)]
+
+    def session_lock(self, session_id: str) -> threading.RLock:
+        """
+        Lock guarding a session's feed: publishing, subscribing and dropping the feed.
+
+        tracing_collector holds it while it changes a session's traces and publishes the
+        change, so event IDs follow the order of the changes and a snapshot read under
+        it matches last_event_id.
+        """
+        return self._locks[hash(session_id) % _LOCK_STRIPES]
+
+    def _feed(self, session_id: str) -> _SessionFeed:
+        # Called with the session lock held
+        feed = self._feeds.get(session_id)
+        if feed is None:
+            feed = self._feeds[session_id] = _SessionFeed(self.buffer_size)
+        return feed
+
+    def _evict_if_idle(self, session_id: str, feed: _SessionFeed) -> None:
+        """Drop a session's feed once no activity is running and nobody is subscribed."""
+        with self.session_lock(session_id):
+            if not feed.running and not feed.subscribers and self._feeds.get(session_id) is feed:
+                del self._feeds[session_id]
+
+    def last_event_id(self, session_id: str) -> int:
+        """ID of the last event published for a session (0 if it has no feed)."""
+        with self.session_lock(session_id):
+            feed = self._feeds.get(session_id)
+            return feed.last_id if feed is not None else 0
+
+    def publish(self, session_id: str, event: str, data: Dict[str, Any]) -> None:
+        """
+        Publish an event of a session (callable from any thread).
+
+        Args:
+            session_id: The session ID
+            event: Event type ("activity" or "update")
+            data: Event data (not modified afterwards)
+        """
+        with self.session_lock(session_id):
+            feed = self._feed(session_id)
+            item = (next(self._seq), event, data)
+            feed.events.append(item)
+            feed.last_id = item[0]
+            if event == "activity" and data.get('status') == 'running':
+                feed.running.add(data['id'])
+            elif 'status' in data and data['status'] != 'running':
+                feed.running.discard(data.get('id'))
+            for subscriber in feed.subscribers:
+                subscriber.deliver(item)
+            if not feed.running:
+                self._evict_if_idle(session_id, feed)
+
+    def clear(self, session_id: str) -> None:
+        """Forget the buffered events of a session (subscribers stay connected)."""
+        with self.session_lock(session_id):
+            feed = self._feeds.get(session_id)
+            if feed is not None:
+                feed.events.clear()
+                feed.running.clear()
+                self._evict_if_idle(session_id, feed)
+
+    async def subscribe(self, session_id: str, last_event_id: Optional[int] = None) -> AsyncIterator[Optional[TraceEvent]]:
+        """
+        Follow the events of a session.
+
+        Args:
+            session_id: The session ID
+            last_event_id: ID of the last event the client received (resume), or None
+
+        Yields:
+            Events; None after _IDLE_SECONDS without events (to send a keep-alive)
+        """
+        if shared_state_enabled():
+            async for item in self._follow_shared_traces(session_id, last_event_id):
+                yield item
+            return
+
+        subscriber = _Subscriber()
+        with self.session_lock(session_id):
+            feed = self._feed(session_id)
+            feed.subscribers.add(subscriber)
+            buffered = list(feed.events)
+        try:
+            newest = buffered[-1][0] if buffered else 0
+            if last_event_id is not None and buffered and buffered[0][0] <= last_event_id + 1 <= newest + 1:
+                # Resume: only the events the client missed
+                for item in buffered:
+                    if item[0] > last_event_id:
+                        yield item
+                seen = newest
+            else:
+                # The snapshot includes exactly the events up to seen
+                seen, snapshot = await self._snapshot(session_id)
+                yield (seen, "snapshot", snapshot)
+            # Events published while replaying are in the queue too
+            while True:
+                if subscriber.lagged:
+                    subscriber.lagged = False
+                    while not subscriber.queue.empty():
+                        subscriber.queue.get_nowait()
+                    seen, snapshot = await self._snapshot(session_id)
+                    yield (seen, "snapshot", snapshot)
+                    continue
+                try:
+                    item = await asyncio.wait_for(subscriber.queue.get(), timeout=_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if item[0] <= seen:
+                    continue
+                seen = item[0]
+                yield item
+        finally:
+            with self.session_lock(session_id):
+                feed.subscribers.discard(subscriber)
+                self._evict_if_idle(session_id, feed)
+
+    async def _snapshot(self, session_id: str) -> Tuple[int, Dict[str, Any]]:
+        """The current activities and the ID of the last event they include."""
+        from backend.database.async_db import run_db
+        from backend.utils.tracing_collector import get_traces_snapshot
+        limit = int(os.getenv('TRACE_FEED_SNAPSHOT_LIMIT', '100'))
+        last_id, activities = await run_db(get_traces_snapshot, session_id, limit)
+        return last_id, {"activities": activities}
+
+    async def _follow_shared_traces(self, session_id: str, last_event_id: Optional[int]) -> AsyncIterator[Optional[TraceEvent]]:
+        """Shared-state mode: follow the trace change log (trace_events) by event ID."""
+        from backend.database import trace_db
+        from backend.database.async_db import run_db
+        interval = float(os.getenv('TRACE_FEED_POLL_SECONDS', '1'))
+        if last_event_id is not None and await run_db(trace_db.can_resume_trace_events, last_event_id):
+            # Resume: the log still holds every event the client missed
+            seen = last_event_id
+        else:
+            seen, snapshot = await self._snapshot(session_id)
+            yield (seen, "snapshot", snapshot)
+        idle = 0.0
+        while True:
+            events = await run_db(trace_db.get_trace_events, session_id, seen)
+            for item in events:
+                seen = item[0]
+                yield item
+            if events:
+                idle = 0.0
+                continue
+            await asyncio.sleep(interval)
+            idle += interval
+            if idle >= _IDLE_SECONDS:
+                idle = 0.0
+                yield None
+
+
+# Global singleton instance
+_trace_feed: Optional[TraceFeed] = None
+
+
+def get_trace_feed() -> TraceFeed:
+    """Get the global TraceFeed instance."""
+    global _trace_feed
+    if _trace_feed is None:
+        _trace_feed = TraceFeed()
+    return _trace_feed
@@ -1,25 +1,78 @@
 """
 Tracing Collector Module
 Collects tracing information from agent execution and stores it for frontend display.
+
+Traces are kept in memory, or in the traces table when SHARED_STATE_BACKEND=sqlite
+(so a tracing poll can be answered by any API worker process, see shared_state.py).
+Table writes are queued to one background thread, in order, so agent runs and tool
+calls on the event loop never wait for SQLite.
+In memory, every change is also published to the session's trace feed (trace_feed.py),
+which clients follow over Server-Sent Events instead of polling.
 """
 import asyncio
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 from collections import defaultdict
 import threading
 import contextvars
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from backend.utils.shared_state import shared_state_enabled
 
 # In-memory storage for traces (keyed by session_id)
 _traces: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
 _traces_lock = threading.Lock()
 
+# Writer of the traces table in shared-state mode (one thread: writes stay in order)
+_trace_writer: Optional[ThreadPoolExecutor] = None
+_trace_writer_lock = threading.Lock()
+
 # Context variable to track current trace
 _current_trace: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_trace', default=None)
 # Context variable to track current session_id
 _current_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_session', default=None)
 
 
+def _write_trace(func_name: str, *args: Any) -> None:
+    """Queue a trace_db write (shared-state mode)."""
+    global _trace_writer
+    if _trace_writer is None:
+        with _trace_writer_lock:
+            if _trace_writer is None:
+                _trace_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-writer")
+    
+    def write():
+        from backend.database import trace_db
+        getattr(trace_db, func_name)(*args)
+    
+    _trace_writer.submit(write).add_done_callback(_report_write_error)
+
+
+def _report_write_error(future: Future) -> None:
+    error = future.exception()
+    if error is not None:
+        print(f"[TracingCollector] Failed to write trace: {error}")
+
+
+def flush_trace_writes(timeout: Optional[float] = None) -> None:
+    """Wait until the queued trace writes are stored (e.g. before shutdown)."""
+    if _trace_writer is not None:
+        _trace_writer.submit(lambda: None).result(timeout)
+
+
+def _session_lock(session_id: str) -> threading.RLock:
+    """The trace feed's lock of a session, held around changing its in-memory traces and publishing the change."""
+    from backend.utils.trace_feed import get_trace_feed
+    return get_trace_feed().session_lock(session_id)
+
+
+def _publish(session_id: str, event: str, data: Dict[str, Any]):
+    """Publish a change of the in-memory traces to the session's trace feed (after _traces_lock is released)."""
+    from backend.utils.trace_feed import get_trace_feed
+    get_trace_feed().publish(session_id, event, data)
+
+
 class TracingContext:
     """Context manager to track agent execution."""
     
@@ -54,11 +107,16 @@ class TracingContext:
             'timestamp': self.started_at.isoformat(),
         }
         
-        with _traces_lock:
-            _traces[self.session_id].append(activity)
+        if shared_state_enabled():
+            _write_trace('add_trace', activity)
+        else:
+            with _session_lock(self.session_id):
+                with _traces_lock:
+                    _traces[self.session_id].append(activity)
+                _publish(self.session_id, "activity", dict(activity))
         
-        # Set context variables
-        _current_trace.set(self.activity_id)
+        # Set context variables (the previous trace is restored on exit, for nested agent runs)
+        self._trace_token = _current_trace.set(self.activity_id)
         _current_session.set(self.session_id)
         
         return self
@@ -67,17 +125,25 @@ class TracingContext:
         self.ended_at = datetime.now()
         
         # Update activity status
-        with _traces_lock:
-            session_traces = _traces.get(self.session_id, [])
-            for activity in reversed(session_traces):
-                if activity.get('id') == self.activity_id:
-                    activity['ended_at'] = self.ended_at.isoformat()
-                    activity['status'] = 'completed' if exc_type is None else 'failed'
-                    activity['error'] = str(exc_val) if exc_val else None
-                    break
+        fields = {
+            'ended_at': self.ended_at.isoformat(),
+            'status': 'completed' if exc_type is None else 'failed',
+            'error': str(exc_val) if exc_val else None,
+        }
+        if shared_state_enabled():
+            _write_trace('update_trace', self.activity_id, fields)
+        else:
+            with _session_lock(self.session_id):
+                with _traces_lock:
+                    session_traces = _traces.get(self.session_id, [])
+                    for activity in reversed(session_traces):
+                        if activity.get('id') == self.activity_id:
+                            activity.update(fields)
+                            break
+                _publish(self.session_id, "update", {'id': self.activity_id, **fields})
         
-        # Clear context variables
-        _current_trace.set(None)
+        # Restore the enclosing trace (None outside nested runs)
+        _current_trace.reset(self._trace_token)
         # Keep session_id in context for nested calls
         
         return False  # Don't suppress exceptions
@@ -103,12 +169,30 @@ def get_current_session_id() -> Optional[str]:
 
 def get_traces(session_id: str, limit: int = 100) -> List[Dict[str, Any]]:
     """Get traces for a session."""
+    if shared_state_enabled():
+        from backend.database import trace_db
+        return trace_db.get_traces(session_id, limit=limit)
     with _traces_lock:
         return _traces.get(session_id, [])[-limit:]
 
 
+def get_traces_snapshot(session_id: str, limit: int = 100) -> Tuple[int, List[Dict[str, Any]]]:
+    """Get copies of a session's traces and the ID of the last trace feed event they include."""
+    if shared_state_enabled():
+        from backend.database import trace_db
+        return trace_db.get_traces_snapshot(session_id, limit)
+    from backend.utils.trace_feed import get_trace_feed
+    with _session_lock(session_id):
+        with _traces_lock:
+            activities = [dict(activity) for activity in _traces.get(session_id, [])[-limit:]]
+        return get_trace_feed().last_event_id(session_id), activities
+
+
 def get_current_activity(session_id: str) -> Optional[Dict[str, Any]]:
     """Get current activity for a session."""
+    if shared_state_enabled():
+        from backend.database.trace_db import get_running_trace
+        return get_running_trace(session_id)
     with _traces_lock:
         session_traces = _traces.get(session_id, [])
         # Find the most recent active (not ended) activity
@@ -128,19 +212,40 @@ def update_current_activity_message(session_id: str, message: str):
         session_id: Session ID
         message: New message to display
     """
-    with _traces_lock:
-        session_traces = _traces.get(session_id, [])
-        # Find the most recent active (not ended) activity
-        for activity in reversed(session_traces):
-            if activity.get('status') == 'running' and not activity.get('ended_at'):
-                activity['message'] = message[:500] if len(message) > 500 else message
-                activity['timestamp'] = datetime.now().isoformat()
-                break
+    fields = {
+        'message': message[:500] if len(message) > 500 else message,
+        'timestamp': datetime.now().isoformat(),
+    }
+    # Inside a background job (e.g. notebook creation) the progress is also recorded on the job
+    from backend.utils.job_engine import report_job_progress
+    report_job_progress(fields['message'])
+    
+    if shared_state_enabled():
+        _write_trace('update_running_trace', session_id, fields)
+        return
+    with _session_lock(session_id):
+        activity_id = None
+        with _traces_lock:
+            session_traces = _traces.get(session_id, [])
+            # Find the most recent active (not ended) activity
+            for activity in reversed(session_traces):
+                if activity.get('status') == 'running' and not activity.get('ended_at'):
+                    activity.update(fields)
+                    activity_id = activity.get('id')
+                    break
+        if activity_id is not None:
+            _publish(session_id, "update", {'id': activity_id, **fields})
 
 
 def clear_traces(session_id: str):
     """Clear traces for a session."""
-    with _traces_lock:
-        if session_id in _traces:
-            del _traces[session_id]
+    if shared_state_enabled():
+        _write_trace('clear_traces', session_id)
+        return
+    from backend.utils.trace_feed import get_trace_feed
+    with _session_lock(session_id):
+        with _traces_lock:
+            if session_id in _traces:
+                del _traces[session_id]
+        get_trace_feed().clear(session_id)
 
@@ -50,6 +50,48 @@ export const sourceChatWithTopLevelAgent = (message, sessionId = null, filePath
     images: images || null
   })
 
+// Streamed chat (Server-Sent Events): onEvent(event, data) is called for session, delta,
+// agent_start/agent_end, tool_start/tool_end, and finally final (ChatResponse) or error
+export const streamChat = async (path, body, onEvent, signal = null) => {
+  const response = await fetch(`${API_BASE_URL}${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+    body: JSON.stringify(body),
+    signal,
+  })
+  if (!response.ok) {
+    const error = await response.json().catch(() => ({}))
+    throw new Error(error.detail || `HTTP ${response.status}`)
+  }
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  for (;;) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+      const event = block.match(/^event: (.*)$/m)?.[1]
+      const data = block.match(/^data: (.*)$/m)?.[1]
+      if (event && data) onEvent(event, JSON.parse(data))
+    }
+  }
+}
+
+export const streamChatWithTopLevelAgent = (message, sessionId, onEvent, signal = null) =>
+  streamChat('/api/top-level-agent/chat/stream', { message, session_id: sessionId }, onEvent, signal)
+
+export const streamSourceChatWithTopLevelAgent = (message, sessionId, filePath, images, onEvent, signal = null) =>
+  streamChat('/api/top-level-agent/source-chat/stream', {
+    message,
+    session_id: sessionId,
+    file_path: filePath || null,
+    images: images || null
+  }, onEvent, signal)
+
 // TopLevelAgent Sessions
 export const createTopLevelAgentSession = (title = null) =>
   api.post('/api/top-level-agent/sessions', { title })
@@ -126,6 +168,9 @@ export const chatWithAgent = (agentId, message, sessionId = null) => {
   return api.post(`/api/agents/${agentId}/chat`, { message, session_id: sessionId })
 }
 
+export const streamChatWithAgent = (agentId, message, sessionId, onEvent, signal = null) =>
+  streamChat(`/api/agents/${agentId}/chat/stream`, { message, session_id: sessionId }, onEvent, signal)
+
 // Tools
 export const listTools = () => {
   return api.get('/api/tools')
@@ -160,5 +205,42 @@ export const clearSessionTracing = (sessionId) => {
   return api.delete(`/api/sessions/${sessionId}/tracing`)
 }
 
+// Follow a session's tracing events (SSE). The server pushes only changes; EventSource
+// reconnects by itself and resumes from the last event ID. onCurrentActivity receives the
+// most recent running activity whenever it changes. Returns a function that stops following.
+export const subscribeSessionTracing = (sessionId, onCurrentActivity) => {
+  const activities = new Map()
+  const source = new EventSource(`${API_BASE_URL}/api/sessions/${sessionId}/tracing/stream`)
+  const notify = () => {
+    const running = [...activities.values()].filter((activity) => activity.status === 'running' && !activity.ended_at)
+    if (running.length) onCurrentActivity(running[running.length - 1])
+  }
+  source.addEventListener('snapshot', (e) => {
+    activities.clear()
+    for (const activity of JSON.parse(e.data).activities) activities.set(activity.id, activity)
+    notify()
+  })
+  source.addEventListener('activity', (e) => {
+    const activity = JSON.parse(e.data)
+    activities.set(activity.id, activity)
+    notify()
+  })
+  source.addEventListener('update', (e) => {
+    const fields = JSON.parse(e.data)
+    activities.set(fields.id, { ...activities.get(fields.id), ...fields })
+    notify()
+  })
+  return () => source.close()
+}
+
+// Background jobs
+export const getJob = (jobId) => {
+  return api.get(`/api/jobs/${jobId}`)
+}
+
+export const resumeJob = (jobId) => {
+  return api.post(`/api/jobs/${jobId}/resume`)
+}
+
 export default api
 
@@ -61,9 +61,10 @@ import {
   uploadFile,
   confirmOutlineAndCreateNotebook,
   reviseOutline,
-  getSessionTracing,
+  subscribeSessionTracing,
   getFileContent,
   getTopLevelAgentInfo,
+  getJob,
 } from '../api/client'
 import OutlineConfirmation from '../components/OutlineConfirmation'
 import AgentAvatar from '../components/AgentAvatar'
@@ -91,7 +92,6 @@ function ChatPage() {
   const [fileViewerContent, setFileViewerContent] = useState(null)
   const [fileViewerLoading, setFileViewerLoading] = useState(false)
   const [topLevelAgentId, setTopLevelAgentId] = useState(null) // TopLevelAgent ID for avatar
-  const tracingPollIntervalRef = useRef(null)
   const messagesEndRef = useRef(null)
   const inputRef = useRef(null)
   const fileInputRef = useRef(null)
@@ -111,40 +111,13 @@ function ChatPage() {
     scrollToBottom()
   }, [messages])
 
-  // Poll tracing information when sending
+  // Follow tracing information when sending (pushed by the server)
   useEffect(() => {
     if (sending && currentSessionId) {
-      // Start polling
-      const pollTracing = async () => {
-        try {
-          const response = await getSessionTracing(currentSessionId)
-          const currentActivity = response.data.current_activity
-          if (currentActivity) {
-            setCurrentActivity(currentActivity)
-          }
-        } catch (err) {
-          console.error('Failed to poll tracing:', err)
-        }
-      }
-
-      // Poll immediately and then every 500ms
-      pollTracing()
-      tracingPollIntervalRef.current = setInterval(pollTracing, 500)
-    } else {
-      // Stop polling
-      if (tracingPollIntervalRef.current) {
-        clearInterval(tracingPollIntervalRef.current)
-        tracingPollIntervalRef.current = null
-      }
-      // Clear current activity after a delay
-      setTimeout(() => setCurrentActivity(null), 1000)
-    }
-
-    return () => {
-      if (tracingPollIntervalRef.current) {
-        clearInterval(tracingPollIntervalRef.current)
-      }
+      return subscribeSessionTracing(currentSessionId, setCurrentActivity)
     }
+    // Clear current activity after a delay
+    setTimeout(() => setCurrentActivity(null), 1000)
   }, [sending, currentSessionId])
 
   // 加载会话列表
@@ -191,6 +164,47 @@ function ChatPage() {
     loadTopLevelAgentInfo()
   }, [])
 
+  // 后台创建笔记本的任务：轮询任务状态，完成后把消息替换为笔记本卡片
+  const pendingJobIds = messages
+    .map(m => m.structured_data?.message_type === 'notebook_creating' ? m.structured_data.job_id : null)
+    .filter(Boolean)
+    .join(',')
+
+  useEffect(() => {
+    if (!pendingJobIds) return
+    const timer = setInterval(async () => {
+      for (const jobId of pendingJobIds.split(',')) {
+        try {
+          const { data: job } = await getJob(jobId)
+          if (job.status === 'queued' || job.status === 'running') continue
+          setMessages(prev => prev.map(m => {
+            if (m.structured_data?.job_id !== jobId) return m
+            if (job.status === 'succeeded' && job.result?.notebook_id) {
+              return {
+                ...m,
+                content: `✅ 已成功创建笔记本！\n\n**标题：** ${job.result.notebook_title}\n**ID：** ${job.result.notebook_id}`,
+                structured_data: {
+                  ...m.structured_data,
+                  message_type: 'notebook_created',
+                  notebook_id: job.result.notebook_id,
+                  notebook_title: job.result.notebook_title,
+                },
+              }
+            }
+            return {
+              ...m,
+              content: `${m.content}\n\n❌ 笔记本创建失败：${job.error || job.status}`,
+              structured_data: { ...m.structured_data, message_type: 'regular' },
+            }
+          }))
+        } catch (err) {
+          console.error('Failed to poll job:', err)
+        }
+      }
+    }, 3000)
+    return () => clearInterval(timer)
+  }, [pendingJobIds])
+
   // 初始化
   useEffect(() => {
     const init = async () => {
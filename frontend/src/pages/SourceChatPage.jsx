@@ -54,7 +54,7 @@ import {
   uploadFile,
   confirmOutlineAndCreateNotebook,
   reviseOutline,
-  getSessionTracing,
+  subscribeSessionTracing,
 } from '../api/client'
 import OutlineConfirmation from '../components/OutlineConfirmation'
 import AgentAvatar from '../components/AgentAvatar'
@@ -78,7 +78,6 @@ function ChatPage() {
   const [pendingOutline, setPendingOutline] = useState(null) // { outline: object, userRequest: string, filePath: string }
   const [creatingNotebook, setCreatingNotebook] = useState(false)
   const [currentActivity, setCurrentActivity] = useState(null) // Current agent activity from tracing
-  const tracingPollIntervalRef = useRef(null)
   const messagesEndRef = useRef(null)
   const inputRef = useRef(null)
   const fileInputRef = useRef(null)
@@ -107,40 +106,13 @@ function ChatPage() {
     scrollToBottom()
   }, [messages])
 
-  // Poll tracing information when sending
+  // Follow tracing information when sending (pushed by the server)
   useEffect(() => {
     if (sending && currentSessionId) {
-      // Start polling
-      const pollTracing = async () => {
-        try {
-          const response = await getSessionTracing(currentSessionId)
-          const currentActivity = response.data.current_activity
-          if (currentActivity) {
-            setCurrentActivity(currentActivity)
-          }
-        } catch (err) {
-          console.error('Failed to poll tracing:', err)
-        }
-      }
-
-      // Poll immediately and then every 500ms
-      pollTracing()
-      tracingPollIntervalRef.current = setInterval(pollTracing, 500)
-    } else {
-      // Stop polling
-      if (tracingPollIntervalRef.current) {
-        clearInterval(tracingPollIntervalRef.current)
-        tracingPollIntervalRef.current = null
-      }
-      // Clear current activity after a delay
-      setTimeout(() => setCurrentActivity(null), 1000)
-    }
-
-    return () => {
-      if (tracingPollIntervalRef.current) {
-        clearInterval(tracingPollIntervalRef.current)
-      }
+      return subscribeSessionTracing(currentSessionId, setCurrentActivity)
     }
+    // Clear current activity after a delay
+    setTimeout(() => setCurrentActivity(null), 1000)
   }, [sending, currentSessionId])
 
   // 加载会话列表